@@ -0,0 +1,350 @@
+import os
+import sys
+import time
+import argparse
+
+
+def build_command(args):
+    from .batch import load_design, batch_build
+
+    boards = [board for board in args.boards.split(",") if board]
+
+    def progress(board, status):
+        print("[{}] {}".format(board, status), file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    results = batch_build(lambda: load_design(args.design), boards, jobs=args.jobs,
+                          build_dir=args.build_dir, name=args.name, toolchain=args.toolchain,
+                          compress_bitstream=args.compress_bitstream,
+                          measure_uncompressed=args.measure_uncompressed, progress=progress)
+    elapsed = time.perf_counter() - start
+
+    print(file=sys.stderr)
+    width = max(len(result.board) for result in results)
+    for result in results:
+        if result.error is not None:
+            status = result.error
+        elif result.bitstream is not None:
+            status = "ok, bitstream {} bytes".format(result.bitstream.size)
+            if result.bitstream.reduction is not None:
+                status += " ({:.1%} smaller than {} bytes)".format(
+                    result.bitstream.reduction, result.bitstream.uncompressed_size)
+        else:
+            status = "ok"
+        print("{:<{}}  {:>8.1f}s  {}".format(result.board, width, result.elapsed, status),
+              file=sys.stderr)
+    failures = sum(1 for result in results if result.error is not None)
+    print("\n{} boards built in {:.1f}s, {} failed".format(len(results), elapsed, failures),
+          file=sys.stderr)
+    return 1 if failures else 0
+
+
+def sweep_command(args):
+    from .batch import load_design
+    from .registry import get_platform
+    from .seeds import seed_sweep
+
+    if args.toolchain is None:
+        platform = get_platform(args.board)()
+    else:
+        platform = get_platform(args.board)(toolchain=args.toolchain)
+    seeds = range(args.first_seed, args.first_seed + args.seeds)
+    best, results = seed_sweep(platform, load_design(args.design), seeds, jobs=args.jobs,
+                               build_dir=args.build_dir, name=args.name, keep_all=args.keep_all)
+
+    for result in results:
+        if result.error is not None:
+            status = result.error
+        else:
+            status = ", ".join(
+                "{} {:.2f} MHz".format(clock, achieved) if constraint is None else
+                "{} {:.2f}/{:.2f} MHz".format(clock, achieved, constraint)
+                for clock, (achieved, constraint) in result.clocks.items())
+        print("seed {:<4} {}{}".format(result.seed, status,
+                                       " (best)" if result is best else ""), file=sys.stderr)
+    if best is None:
+        return 1
+    if best.worst_slack is not None:
+        print("\nbest seed {} with worst slack {:.3f} ns in {}".format(
+              best.seed, best.worst_slack, best.build_dir), file=sys.stderr)
+    else:
+        print("\nbest seed {} with Fmax {:.2f} MHz in {}".format(
+              best.seed, best.fmax, best.build_dir), file=sys.stderr)
+    return 0
+
+
+def program_command(args):
+    from amaranth.build.run import LocalBuildProducts
+
+    from .registry import get_platform
+    from .programmer import OpenOCDProgrammer, ProgramTarget, program_all
+
+    targets = []
+    for spec in args.boards.split(","):
+        if not spec:
+            continue
+        board, _, serial = spec.partition("@")
+        port = None
+        if serial.startswith("port:"):
+            serial, port = None, serial[len("port:"):]
+        products = LocalBuildProducts(os.path.join(args.build_dir, board))
+        platform = get_platform(board)()
+        options = {}
+        if args.jtag_khz is not None and isinstance(getattr(platform, "programmer", None),
+                                                    OpenOCDProgrammer):
+            options["jtag_khz"] = args.jtag_khz
+        targets.append(ProgramTarget(platform, products, name=args.name, serial=serial or None,
+                                     port=port, label=spec, mode=args.mode, options=options))
+
+    def progress(label, status):
+        print("[{}] {}".format(label, status), file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    results = program_all(targets, jobs=args.jobs, progress=progress)
+    elapsed = time.perf_counter() - start
+
+    print(file=sys.stderr)
+    width = max(len(result.label) for result in results)
+    for result in results:
+        if result.error is not None:
+            status = result.error
+        else:
+            status = "ok"
+            if result.mode is not None:
+                status += ", {}".format(result.mode)
+            if result.steps:
+                status += " ({})".format(", ".join("{} {:.1f}s".format(step, elapsed)
+                                                   for step, elapsed in result.steps.items()))
+        print("{:<{}}  {:>8.1f}s  {}".format(result.label, width, result.elapsed, status),
+              file=sys.stderr)
+        if result.error is not None and result.output:
+            print(result.output.rstrip(), file=sys.stderr)
+    failures = sum(1 for result in results if result.error is not None)
+    print("\n{} boards programmed in {:.1f}s, {} failed".format(len(results), elapsed, failures),
+          file=sys.stderr)
+    return 1 if failures else 0
+
+
+def probes_command(args):
+    from .registry import list_boards, get_platform
+    from .probes import ProbeCache, default_probe_cache, discover_probes
+
+    if args.boards is None:
+        boards = list_boards()
+    else:
+        boards = [board for board in args.boards.split(",") if board]
+    # The programmer is a class attribute, so the platforms are not instantiated; some of them
+    # cannot be with every version of Amaranth.
+    platforms = {}
+    for board in boards:
+        platform = get_platform(board)
+        if getattr(platform, "programmer", None) is not None:
+            platforms[board] = platform
+
+    cache = default_probe_cache() if args.ttl is None else ProbeCache(ttl=args.ttl)
+    try:
+        found = discover_probes(set(platforms.values()), cache=cache, refresh=args.refresh)
+    except NotImplementedError as e:
+        print("Cannot list probes: {}".format(e), file=sys.stderr)
+        return 1
+    matches = {}
+    for board, platform in platforms.items():
+        for probe in found[platform]:
+            matches.setdefault((probe.port, probe.usb_id), (probe, []))[1].append(board)
+    for probe, boards in sorted(matches.values(), key=lambda match: match[0].port):
+        print("{:<12} {}  {:<16} {:<24} {}".format(
+              probe.port, probe.usb_id, probe.serial or "-", probe.product or "-",
+              ",".join(boards)))
+    return 0
+
+
+def multiboot_command(args):
+    from .registry import get_platform
+    from .multiboot import MultibootImage
+
+    image = MultibootImage(get_platform(args.board)(), flash_size=args.flash_size,
+                           power_on=args.power_on)
+    for specs, add in ((args.bitstreams, image.add_bitstream), (args.data, image.add_data)):
+        for spec in specs:
+            offset, sep, filename = spec.partition(":")
+            if not sep:
+                offset, filename = None, spec
+            else:
+                offset = int(offset, 0)
+            with open(filename, "rb") as f:
+                add(f.read(), name=filename, offset=offset)
+    with open(args.output, "wb") as f:
+        f.write(image.image())
+
+    if image.base != 0:
+        print("image starts at {:#x}; write it there to preserve the bootloader"
+              .format(image.base), file=sys.stderr)
+    for region in image.regions:
+        print("{:#010x}..{:#010x}  {:<9}  {}".format(region.offset, region.end, region.kind,
+                                                   region.name), file=sys.stderr)
+    return 0
+
+
+def uart_bench_command(args):
+    from .uart import loopback_benchmark
+
+    try:
+        import serial
+    except ImportError:
+        print("The uart-bench command requires pySerial", file=sys.stderr)
+        return 1
+    with serial.Serial(args.device, args.baudrate, rtscts=args.rtscts, timeout=0.1) as port:
+        port.reset_input_buffer()
+        result = loopback_benchmark(port, length=args.length)
+    print("{} bytes sent, {} received, {} errors in {:.2f}s: {:.1f} kB/s ({:.0f}% of {} baud)"
+          .format(result["sent"], result["received"], result["errors"], result["elapsed"],
+                  result["throughput"] / 1e3, 100 * result["throughput"] * 10 / args.baudrate,
+                  args.baudrate), file=sys.stderr)
+    return 1 if result["errors"] else 0
+
+
+def usb_bench_command(args):
+    from .usb import bulk_benchmark
+
+    try:
+        import usb.core
+    except ImportError:
+        print("The usb-bench command requires PyUSB", file=sys.stderr)
+        return 1
+    device = usb.core.find(idVendor=args.vid, idProduct=args.pid)
+    if device is None:
+        print("No USB device {:04x}:{:04x} found".format(args.vid, args.pid), file=sys.stderr)
+        return 1
+    device.set_configuration()
+    result = bulk_benchmark(device, length=args.length)
+    print("{} bytes read at {:.2f} MB/s, {} errors; {} bytes written at {:.2f} MB/s"
+          .format(result["read"], result["read_throughput"] / 1e6, result["errors"],
+                  result["written"], result["write_throughput"] / 1e6), file=sys.stderr)
+    return 1 if result["errors"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m amaranth_boards")
+    subparsers = parser.add_subparsers(metavar="COMMAND", dest="command", required=True)
+
+    p_build = subparsers.add_parser("build",
+        help="build a design for several boards concurrently")
+    p_build.add_argument("--design", metavar="MODULE:CLASS", required=True,
+        help="design to build; the class is instantiated without arguments")
+    p_build.add_argument("--boards", metavar="BOARD,...", required=True,
+        help="comma-separated list of boards, as listed by amaranth_boards.registry")
+    p_build.add_argument("-j", "--jobs", metavar="N", type=int, default=os.cpu_count(),
+        help="number of parallel jobs; heavy toolchains use several (default: %(default)s)")
+    p_build.add_argument("--toolchain", metavar="TOOLCHAIN", default=None,
+        help="toolchain to use instead of the platform default")
+    p_build.add_argument("--build-dir", metavar="DIR", default="build",
+        help="directory in which each board is built in a subdirectory (default: %(default)s)")
+    p_build.add_argument("--name", metavar="NAME", default="top",
+        help="name of the design (default: %(default)s)")
+    p_build.add_argument("--compress-bitstream", action="store_true",
+        help="compress the bitstreams and report their size")
+    p_build.add_argument("--measure-uncompressed", action="store_true",
+        help="with --compress-bitstream, also report the size of uncompressed bitstreams; "
+             "Vivado builds generate the bitstream twice")
+    p_build.set_defaults(func=build_command)
+
+    p_sweep = subparsers.add_parser("sweep",
+        help="place and route a design with several nextpnr seeds and keep the best")
+    p_sweep.add_argument("--design", metavar="MODULE:CLASS", required=True,
+        help="design to build; the class is instantiated without arguments")
+    p_sweep.add_argument("--board", metavar="BOARD", required=True,
+        help="board to build for, as listed by amaranth_boards.registry")
+    p_sweep.add_argument("--seeds", metavar="K", type=int, default=8,
+        help="number of seeds to try (default: %(default)s)")
+    p_sweep.add_argument("--first-seed", metavar="SEED", type=int, default=1,
+        help="first seed to try (default: %(default)s)")
+    p_sweep.add_argument("-j", "--jobs", metavar="N", type=int, default=os.cpu_count(),
+        help="number of seeds to build in parallel (default: %(default)s)")
+    p_sweep.add_argument("--toolchain", metavar="TOOLCHAIN", default=None,
+        help="toolchain to use instead of the platform default")
+    p_sweep.add_argument("--build-dir", metavar="DIR", default="build",
+        help="directory in which each seed is built in a subdirectory (default: %(default)s)")
+    p_sweep.add_argument("--name", metavar="NAME", default="top",
+        help="name of the design (default: %(default)s)")
+    p_sweep.add_argument("--keep-all", action="store_true",
+        help="keep the builds for all seeds, not just the best one")
+    p_sweep.set_defaults(func=sweep_command)
+
+    p_program = subparsers.add_parser("program",
+        help="program several boards concurrently with previously built bitstreams")
+    p_program.add_argument("--boards", metavar="BOARD[@SERIAL|@port:PORT],...", required=True,
+        help="comma-separated list of boards, each optionally with the serial number of its "
+             "probe or the USB port it is plugged into (as listed by the probes command); "
+             "the same board may be listed several times")
+    p_program.add_argument("-j", "--jobs", metavar="N", type=int, default=None,
+        help="number of boards to program at once (default: all)")
+    p_program.add_argument("--build-dir", metavar="DIR", default="build",
+        help="directory containing the build of each board in a subdirectory, as written by "
+             "the build command (default: %(default)s)")
+    p_program.add_argument("--name", metavar="NAME", default="top",
+        help="name of the design (default: %(default)s)")
+    p_program.add_argument("--mode", choices=("sram", "flash"), default=None,
+        help="load the bitstreams into the FPGAs (sram) or write them to the configuration "
+             "flash (flash); by default, each board is programmed the way its programmer does")
+    p_program.add_argument("--jtag-khz", metavar="KHZ|auto", default=None,
+        type=lambda value: value if value == "auto" else int(value),
+        help="JTAG clock rate for boards programmed with OpenOCD, or 'auto' to use the fastest "
+             "rate that works with each probe")
+    p_program.set_defaults(func=program_command)
+
+    p_probes = subparsers.add_parser("probes",
+        help="list the attached probes and the boards that they could program")
+    p_probes.add_argument("--boards", metavar="BOARD,...", default=None,
+        help="comma-separated list of boards to look for probes of (default: all)")
+    p_probes.add_argument("--refresh", action="store_true",
+        help="rescan the USB bus even if the list of probes was recently scanned")
+    p_probes.add_argument("--ttl", metavar="SECONDS", type=float, default=None,
+        help="rescan the USB bus if the list of probes is older than this")
+    p_probes.set_defaults(func=probes_command)
+
+    p_multiboot = subparsers.add_parser("multiboot",
+        help="combine several bitstreams and user data into one configuration flash image")
+    p_multiboot.add_argument("--board", metavar="BOARD", required=True,
+        help="board the image is for, as listed by amaranth_boards.registry")
+    p_multiboot.add_argument("-o", "--output", metavar="FILE", required=True,
+        help="flash image to write")
+    p_multiboot.add_argument("--flash-size", metavar="BYTES", default=None,
+        type=lambda value: int(value, 0),
+        help="size of the configuration flash, if it is not known for the board")
+    p_multiboot.add_argument("--power-on", metavar="INDEX", type=int, default=0,
+        help="index of the bitstream loaded at power-on, for iCE40 (default: %(default)s)")
+    p_multiboot.add_argument("--data", metavar="[OFFSET:]FILE", action="append", default=[],
+        help="user data to place after the bitstreams; may be given several times")
+    p_multiboot.add_argument("bitstreams", metavar="[OFFSET:]BITSTREAM", nargs="+",
+        help="bitstreams to place in the image, the golden or power-on bitstream first")
+    p_multiboot.set_defaults(func=multiboot_command)
+
+    p_uart_bench = subparsers.add_parser("uart-bench",
+        help="measure the throughput of a serial port connected to a board running the "
+             "UARTLoopback design")
+    p_uart_bench.add_argument("--device", metavar="DEVICE", required=True,
+        help="serial port the board is connected to, e.g. /dev/ttyUSB1")
+    p_uart_bench.add_argument("--baudrate", metavar="BAUD", type=int, default=3_000_000,
+        help="baud rate the design was built for (default: %(default)s)")
+    p_uart_bench.add_argument("--rtscts", action="store_true",
+        help="use RTS/CTS flow control; the design must be built with flow control as well")
+    p_uart_bench.add_argument("--length", metavar="BYTES", type=int, default=1 << 20,
+        help="number of bytes to send (default: %(default)s)")
+    p_uart_bench.set_defaults(func=uart_bench_command)
+
+    p_usb_bench = subparsers.add_parser("usb-bench",
+        help="measure the bulk throughput of a board running the USBBenchmark design")
+    p_usb_bench.add_argument("--vid", metavar="VID", type=lambda value: int(value, 16),
+        default=0x1209, help="vendor ID of the device, in hexadecimal (default: 1209)")
+    p_usb_bench.add_argument("--pid", metavar="PID", type=lambda value: int(value, 16),
+        default=0x0001, help="product ID of the device, in hexadecimal (default: 0001)")
+    p_usb_bench.add_argument("--length", metavar="BYTES", type=int, default=16 << 20,
+        help="number of bytes to read, and then to write (default: %(default)s)")
+    p_usb_bench.set_defaults(func=usb_bench_command)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
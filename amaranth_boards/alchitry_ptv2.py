@@ -5,6 +5,7 @@ import subprocess
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .compression import merge_overrides
 
 
 __all__ = ["AlchitryPtV2Platform", "AlchitryPtV2AlphaPlatform"]
@@ -149,10 +150,14 @@ class AlchitryPtV2Platform(XilinxPlatform):
                 "set_property BITSTREAM.GENERAL.COMPRESS TRUE [current_design]\n"
                 "set_property BITSTREAM.CONFIG.SPI_BUSWIDTH 4 [current_design]",
         }
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
 
     # TODO: Support vivado and openocd for programming
-    def toolchain_program(self, products, name, *, flash=True):
+    def toolchain_program(self, products, name, *, flash=True, mode=None):
+        assert mode in (None, "sram", "flash")
+        if mode is not None:
+            flash = mode == "flash"
         loader = find_loader()
         with products.extract(f"{name}.bin") as bitstream_filename:
             subprocess.check_call([
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 
 __all__ = ["AX7325BPlatform"]
@@ -253,12 +251,10 @@ class AX7325BPlatform(XilinxPlatform):
                    "35": "M29", "36": "M19"}),
     ]
 
-    def toolchain_program(self, product, name):
-        # openfpgaloader
-        openfpgaloader = os.environ.get("OPENFPGALOADER", "openFPGALoader")
-        with product.extract("{}.bin".format(name)) as fn:
-            # included with board
-            subprocess.check_call([openfpgaloader, "-c", "ft232", fn])
+    programmer = OpenFPGALoaderProgrammer(cable="ft232", bitstream="{name}.bin")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import IntelPlatform
 from .resources import *
+from .programmer import QuartusProgrammer
 
 
 __all__ = ["ArrowDECAPlatform"]
@@ -49,11 +47,10 @@ class ArrowDECAPlatform(IntelPlatform):
             "W3"),
     ]
 
-    def toolchain_program(self, products, name):
-        quartus_pgm = os.environ.get("QUARTUS_PGM", "quartus_pgm")
-        with products.extract("{}.sof".format(name)) as bitstream_filename:
-            subprocess.check_call([quartus_pgm, "--haltcc", "--mode", "JTAG",
-                                   "--operation", "P;" + bitstream_filename])
+    programmer = QuartusProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
     @property
     def file_templates(self):
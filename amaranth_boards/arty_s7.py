@@ -5,6 +5,7 @@ import subprocess
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .compression import merge_overrides
 
 
 __all__ = ["ArtyS7_25Platform", "ArtyS7_50Platform"]
@@ -157,10 +158,14 @@ class _ArtyS7Platform(XilinxPlatform):
             "add_constraints":
                 "set_property INTERNAL_VREF 0.675 [get_iobanks 34]"
         }
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
 
-    def toolchain_program(self, product, name, *, programmer="vivado", flash=True):
+    def toolchain_program(self, product, name, *, programmer="vivado", flash=True, mode=None):
         assert programmer in ("vivado", "openocd")
+        assert mode in (None, "sram", "flash")
+        if mode is not None:
+            flash = mode == "flash"
 
         if programmer == "vivado":
             if flash:
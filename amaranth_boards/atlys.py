@@ -1,9 +1,7 @@
-import subprocess
-import textwrap
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import ImpactProgrammer
 
 
 __all__ = ["AtlysPlatform"]
@@ -207,16 +205,10 @@ class AtlysPlatform(XilinxPlatform):
         ),
     ]
 
-    def toolchain_program(self, products, name):
-        with products.extract("{}.bit".format(name)) as bitfile:
-            cmd = textwrap.dedent("""
-                setMode -bscan
-                setCable -port auto
-                addDevice -p 1 -file "{}"
-                program -p 1
-                exit
-            """).format(bitfile).encode('utf-8')
-            subprocess.run(["impact", "-batch"], input=cmd, check=True)
+    programmer = ImpactProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
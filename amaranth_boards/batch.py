@@ -0,0 +1,199 @@
+import os
+import sys
+import time
+import threading
+import importlib
+import subprocess
+import unittest
+
+from amaranth.build.run import LocalBuildProducts
+
+from .registry import get_platform
+from .compression import compression_overrides, bitstream_size
+
+
+__all__ = ["BuildResult", "run_plan", "batch_build"]
+
+
+# Relative cost of running a toolchain, in units of the job budget. Vendor toolchains routinely
+# use several cores and gigabytes of memory for a single build, while the open source toolchains
+# for small devices are mostly single-threaded and light.
+_TOOLCHAIN_WEIGHTS = {
+    "Vivado":   4,
+    "Quartus":  4,
+    "ISE":      2,
+    "Diamond":  2,
+    "Radiant":  2,
+    "Gowin":    2,
+    "iCECube2": 2,
+}
+
+
+def load_design(spec):
+    """Instantiate the design named by ``spec``, which has the form ``module:Class``."""
+    module_name, sep, class_name = spec.partition(":")
+    if not sep or not module_name or not class_name:
+        raise ValueError("Design {!r} must be specified as module:Class".format(spec))
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class BuildResult:
+    """Result of building a design for one board.
+
+    ``error`` is ``None`` if the build succeeded, and a description of the failure otherwise.
+    ``products`` is :class:`LocalBuildProducts` for a successful build, and ``None`` otherwise.
+    ``log_filename`` is the file the toolchain output was written to. ``bitstream`` is
+    :class:`~amaranth_boards.compression.BitstreamSize` if the bitstream was compressed, and
+    ``None`` otherwise.
+    """
+    def __init__(self, board, *, elapsed, error, products, log_filename, bitstream=None):
+        self.board        = board
+        self.elapsed      = elapsed
+        self.error        = error
+        self.products     = products
+        self.log_filename = log_filename
+        self.bitstream    = bitstream
+
+    def __repr__(self):
+        return "<BuildResult {} {}>".format(self.board, "ok" if self.error is None else "failed")
+
+
+class _JobBudget:
+    def __init__(self, jobs):
+        self.jobs  = jobs
+        self._free = jobs
+        self._cond = threading.Condition()
+
+    def acquire(self, weight):
+        weight = min(weight, self.jobs)
+        with self._cond:
+            self._cond.wait_for(lambda: self._free >= weight)
+            self._free -= weight
+        return weight
+
+    def release(self, weight):
+        with self._cond:
+            self._free += weight
+            self._cond.notify_all()
+
+
+def run_plan(plan, root, log_file):
+    """Extract ``plan`` to ``root`` and run its build script, writing the toolchain output to
+    ``log_file``. Raises :exc:`subprocess.CalledProcessError` if the build fails, and returns
+    the :class:`~amaranth.build.run.LocalBuildProducts` otherwise."""
+    build_dir = plan.extract(root)
+    if sys.platform.startswith("win32"):
+        args = ["cmd", "/c", "call {}.bat".format(plan.script)]
+    else:
+        args = ["sh", "{}.sh".format(plan.script)]
+    subprocess.run(args, cwd=build_dir, stdout=log_file, stderr=subprocess.STDOUT, check=True)
+    return LocalBuildProducts(build_dir)
+
+
+def batch_build(design, boards, *, jobs=None, build_dir="build", name="top", toolchain=None,
+                compress_bitstream=False, measure_uncompressed=False, progress=None, **kwargs):
+    """Build ``design`` for each of ``boards`` and run the toolchains concurrently.
+
+    ``design`` is a callable returning a new instance of the design, since elaboration may
+    modify it. ``boards`` are names from :mod:`amaranth_boards.registry`. Each board is built
+    in ``build_dir/<board>``, and the toolchain output is written to ``<name>.log`` in it.
+
+    At most ``jobs`` (the number of CPUs by default) units of work run at once; a build costs
+    more than one unit if its toolchain is known to be resource-heavy. Designs are elaborated
+    one at a time. ``progress``, if provided, is called with the board name and a status string
+    (``"elaborating"``, ``"building"``, ``"done"`` or ``"failed"``) as builds advance.
+    If ``compress_bitstream`` is true, the bitstreams are compressed (see
+    :func:`~amaranth_boards.compression.compression_overrides`) and their size is measured; if
+    ``measure_uncompressed`` is also true, so is the size they would have without compression,
+    which takes additional toolchain time.
+    Additional keyword arguments are passed to ``toolchain_prepare``.
+
+    Returns a list of :class:`BuildResult` in the order of ``boards``. Raises :exc:`ValueError`
+    if a board is listed more than once, since its builds would share a directory.
+    """
+    boards = list(boards)
+    for index, board in enumerate(boards):
+        if board in boards[:index]:
+            raise ValueError("Board {!r} is listed more than once".format(board))
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    budget = _JobBudget(jobs)
+    elaborate_lock = threading.Lock()
+    results = {}
+
+    def report(board, status):
+        if progress is not None:
+            progress(board, status)
+
+    def build_one(board):
+        board_dir = os.path.join(build_dir, board)
+        log_filename = os.path.join(board_dir, "{}.log".format(name))
+        start = time.perf_counter()
+        products = error = bitstream = None
+        try:
+            with elaborate_lock:
+                report(board, "elaborating")
+                if toolchain is None:
+                    platform = get_platform(board)()
+                else:
+                    platform = get_platform(board)(toolchain=toolchain)
+                overrides = kwargs
+                if compress_bitstream:
+                    overrides = compression_overrides(platform, name,
+                        measure_uncompressed=measure_uncompressed, **kwargs)
+                plan = platform.prepare(design(), name, **overrides)
+            weight = budget.acquire(_TOOLCHAIN_WEIGHTS.get(platform.toolchain, 1))
+            try:
+                report(board, "building")
+                os.makedirs(board_dir, exist_ok=True)
+                with open(log_filename, "w") as log_file:
+                    products = run_plan(plan, board_dir, log_file)
+            finally:
+                budget.release(weight)
+            if compress_bitstream:
+                bitstream = bitstream_size(platform, products, name,
+                                           measure_uncompressed=measure_uncompressed)
+        except subprocess.CalledProcessError as e:
+            error = "toolchain exited with status {}; see {}".format(e.returncode, log_filename)
+        except Exception as e:
+            error = "{}: {}".format(type(e).__name__, e)
+        report(board, "done" if error is None else "failed")
+        results[board] = BuildResult(board, elapsed=time.perf_counter() - start, error=error,
+                                     products=products, log_filename=log_filename,
+                                     bitstream=bitstream)
+
+    threads = [threading.Thread(target=build_one, args=(board,), daemon=True) for board in boards]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [results[board] for board in boards]
+
+
+class TestCase(unittest.TestCase):
+    def test_load_design(self):
+        from .test.blinky import Blinky
+        from .icebreaker import ICEBreakerPlatform
+        design = load_design("amaranth_boards.test.blinky:Blinky")
+        self.assertIsInstance(design, Blinky)
+        ICEBreakerPlatform().prepare(design)
+        with self.assertRaisesRegex(ValueError, r"must be specified as module:Class"):
+            load_design("amaranth_boards.test.blinky")
+
+    def test_budget(self):
+        budget = _JobBudget(4)
+        self.assertEqual(budget.acquire(8), 4)
+        budget.release(4)
+        self.assertEqual(budget.acquire(1), 1)
+        self.assertEqual(budget._free, 3)
+
+    def test_elaboration_failure(self):
+        results = batch_build(lambda: None, ["icebreaker"], build_dir="nonexistent")
+        self.assertEqual(len(results), 1)
+        self.assertIsNotNone(results[0].error)
+        self.assertIsNone(results[0].products)
+
+    def test_duplicate_board(self):
+        with self.assertRaisesRegex(ValueError,
+                r"^Board 'icebreaker' is listed more than once$"):
+            batch_build(lambda: None, ["icebreaker", "tinyfpga_bx", "icebreaker"])
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import unittest
+import importlib
+
+try:
+    import resource
+except ImportError: # :nocov:
+    resource = None # not available on Windows
+
+from . import __version__
+from .registry import list_boards, _BOARDS
+
+
+__all__ = ["measure_board", "run_benchmarks", "compare_reports"]
+
+
+def _peak_rss():
+    if resource is None: # :nocov:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak_rss # bytes
+    else:
+        return peak_rss * 1024 # kilobytes
+
+
+def _measure(name, build=True):
+    # Runs in a fresh interpreter; see `measure_board`.
+    result = {}
+    try:
+        start = time.perf_counter()
+        module_name, class_name = _BOARDS[name]
+        module = importlib.import_module("{}.{}".format(__package__, module_name))
+        result["import_time"] = time.perf_counter() - start
+        result["import_rss"] = _peak_rss()
+
+        start = time.perf_counter()
+        platform = getattr(module, class_name)()
+        result["instantiate_time"] = time.perf_counter() - start
+
+        if build:
+            from .test.blinky import Blinky
+            start = time.perf_counter()
+            platform.build(Blinky(), do_build=False)
+            result["build_time"] = time.perf_counter() - start
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    result["peak_rss"] = _peak_rss()
+    json.dump(result, sys.stdout)
+
+
+def measure_board(name, *, build=True):
+    """Measure the cost of using the board called ``name`` in a fresh interpreter.
+
+    Returns a dictionary with the wall time of importing its module (``import_time``), of
+    instantiating its platform (``instantiate_time``), and, if ``build`` is true, of elaborating
+    a blinky design with ``do_build=False`` (``build_time``), all in seconds; and the peak RSS
+    after importing the module (``import_rss``) and at exit (``peak_rss``), in bytes. If any of
+    the steps fails, ``error`` describes the failure and the later measurements are omitted.
+    """
+    if name not in _BOARDS:
+        raise LookupError("Unknown board {!r}".format(name))
+    # The build is done in a temporary directory so that measuring does not leave files behind.
+    with tempfile.TemporaryDirectory() as build_dir:
+        output = subprocess.check_output([sys.executable, "-c",
+            "from amaranth_boards.bench import _measure; _measure({!r}, build={!r})"
+            .format(name, build)
+        ], cwd=build_dir, env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)})
+    return json.loads(output)
+
+
+def run_benchmarks(boards=None, *, build=True, progress=None):
+    """Measure every board in ``boards`` (all known boards by default) and return a report.
+
+    The report is a JSON-serializable dictionary; see :func:`measure_board` for the format of
+    the per-board results.
+    """
+    if boards is None:
+        boards = list_boards()
+    results = {}
+    for name in boards:
+        results[name] = measure_board(name, build=build)
+        if progress is not None:
+            progress(name, results[name])
+    return {
+        "version": __version__,
+        "python": "{} {}".format(platform.python_implementation(), platform.python_version()),
+        "boards": results,
+    }
+
+
+def compare_reports(old, new, *, threshold=0.1):
+    """Compare two reports produced by :func:`run_benchmarks`.
+
+    Returns a list of ``(board, metric, old_value, new_value)`` for every measurement that
+    increased by more than ``threshold`` (a fraction of the old value).
+    """
+    regressions = []
+    for name, new_result in sorted(new["boards"].items()):
+        old_result = old["boards"].get(name, {})
+        for metric in ("import_time", "instantiate_time", "build_time", "import_rss", "peak_rss"):
+            old_value, new_value = old_result.get(metric), new_result.get(metric)
+            if old_value is None or new_value is None:
+                continue
+            if new_value > old_value * (1 + threshold):
+                regressions.append((name, metric, old_value, new_value))
+    return regressions
+
+
+def _format_result(result):
+    if "error" in result:
+        return "error: {}".format(result["error"])
+    fields = ["import {:.3f}s".format(result["import_time"]),
+              "instantiate {:.3f}s".format(result["instantiate_time"])]
+    if "build_time" in result:
+        fields.append("build {:.3f}s".format(result["build_time"]))
+    if result["peak_rss"] is not None:
+        fields.append("peak RSS {:.1f} MiB".format(result["peak_rss"] / 2 ** 20))
+    return ", ".join(fields)
+
+
+class TestCase(unittest.TestCase):
+    def test_measure(self):
+        report = run_benchmarks(["icebreaker"], build=False)
+        self.assertNotIn("error", report["boards"]["icebreaker"])
+        self.assertEqual(compare_reports(report, report), [])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m amaranth_boards.bench")
+    parser.add_argument("boards", metavar="BOARD", nargs="*",
+        help="boards to measure (default: all)")
+    parser.add_argument("-o", "--output", metavar="FILE", type=argparse.FileType("w"),
+        help="write the JSON report to FILE")
+    parser.add_argument("--no-build", dest="build", action="store_false",
+        help="do not measure elaboration of a blinky design")
+    parser.add_argument("--compare", metavar="FILE", type=argparse.FileType("r"),
+        help="compare against the JSON report in FILE and exit with status 1 on regressions")
+    parser.add_argument("--threshold", metavar="FRACTION", type=float, default=0.1,
+        help="relative increase considered a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    def progress(name, result):
+        print("{}: {}".format(name, _format_result(result)), file=sys.stderr)
+
+    report = run_benchmarks(args.boards or None, build=args.build, progress=progress)
+    if args.output is not None:
+        json.dump(report, args.output, indent=1, sort_keys=True)
+
+    if args.compare is not None:
+        regressions = compare_reports(json.load(args.compare), report, threshold=args.threshold)
+        for name, metric, old_value, new_value in regressions:
+            print("{}: {} regressed from {:.4g} to {:.4g}".format(name, metric, old_value,
+                                                                  new_value))
+        if regressions:
+            sys.exit(1)
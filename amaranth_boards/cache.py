@@ -0,0 +1,181 @@
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+from amaranth.build.run import BuildPlan, LocalBuildProducts
+
+
+__all__ = ["BuildCache"]
+
+
+def _user_cache_dir(name):
+    if sys.platform.startswith("win32"):
+        cache_home = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        cache_home = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(cache_home, "amaranth-boards", name)
+
+
+def _default_cache_dir():
+    if "AMARANTH_BOARDS_CACHE" in os.environ:
+        return os.environ["AMARANTH_BOARDS_CACHE"]
+    return _user_cache_dir("builds")
+
+
+def _tool_identity(tool):
+    # Mirrors the way Amaranth locates tools: an environment variable named after the tool
+    # overrides the executable that is used.
+    env_var = tool.upper().replace("-", "_").replace("+", "X")
+    path = shutil.which(os.environ.get(env_var, tool))
+    if path is None:
+        return "{}=".format(tool)
+    # Identifying a tool by its location, size and modification time is much cheaper than running
+    # it to ask for its version, and changes whenever the tool is upgraded or reinstalled.
+    stat = os.stat(path)
+    return "{}={}:{}:{}".format(tool, os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _tree_size(path):
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(dirpath, filename))
+    return size
+
+
+class BuildCache:
+    """Content-addressed cache of build products.
+
+    A build is identified by the files of its build plan, which include the elaborated design,
+    the constraints, and the toolchain scripts with all of the options passed to
+    ``toolchain_prepare`` applied; together with the identity of the tools used to run it.
+    If a build with the same identity has been run before, its products are copied into
+    the build directory instead of running the toolchain again.
+
+    The cache is stored in ``path``, which defaults to ``$AMARANTH_BOARDS_CACHE``, or
+    to ``amaranth-boards/builds`` in the user cache directory. Once the cache grows above
+    ``max_size`` bytes, the least recently used builds are evicted.
+    """
+    def __init__(self, path=None, *, max_size=10 * 2 ** 30):
+        if path is None:
+            path = _default_cache_dir()
+        self.path     = path
+        self.max_size = max_size
+        self.hits     = 0
+        self.misses   = 0
+
+    def key(self, plan, *, tools=(), env=None):
+        """Compute the cache key of ``plan``, built using ``tools``."""
+        hasher = hashlib.sha256(plan.digest())
+        for tool in sorted(tools):
+            hasher.update(_tool_identity(tool).encode("utf-8"))
+            hasher.update(b"\0")
+        if env is None:
+            env = os.environ
+        # Toolchain environment scripts (`AMARANTH_ENV_*`) select the tools when they are used.
+        hasher.update(repr(sorted((var, value) for var, value in env.items()
+                                  if var.startswith("AMARANTH_ENV_"))).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def execute(self, plan, root="build", *, tools=(), env=None):
+        """Execute ``plan`` in ``root``, or reuse the products of an identical earlier build.
+
+        Returns :class:`LocalBuildProducts`.
+        """
+        key = self.key(plan, tools=tools, env=env)
+        entry_dir = os.path.join(self.path, key)
+        if os.path.isdir(entry_dir):
+            self.hits += 1
+            os.utime(entry_dir)
+        else:
+            self.misses += 1
+            os.makedirs(self.path, exist_ok=True)
+            # Build in a scratch directory, so that stale files in `root` are never cached, and
+            # then move the products into place atomically, so that concurrent builds of the same
+            # plan do not observe a partially populated entry.
+            scratch_dir = tempfile.mkdtemp(prefix=".build-", dir=self.path)
+            try:
+                plan.execute_local(scratch_dir, env=env)
+                for filename in plan.files:
+                    os.remove(os.path.join(scratch_dir, filename))
+                try:
+                    os.rename(scratch_dir, entry_dir)
+                except OSError:
+                    pass # another build with the same key finished first
+            finally:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+            self.evict(keep=key)
+
+        build_dir = plan.extract(root)
+        shutil.copytree(entry_dir, build_dir, dirs_exist_ok=True)
+        return LocalBuildProducts(build_dir)
+
+    def build(self, platform, elaboratable, name="top", build_dir="build",
+              program_opts=None, do_program=False, **kwargs):
+        """Build ``elaboratable`` for ``platform`` like ``platform.build()``, using the cache.
+
+        Returns :class:`LocalBuildProducts`.
+        """
+        plan = platform.prepare(elaboratable, name, **kwargs)
+        products = self.execute(plan, build_dir, tools=platform.required_tools)
+        if do_program:
+            platform.toolchain_program(products, name, **(program_opts or {}))
+        return products
+
+    def evict(self, *, keep=None):
+        """Remove the least recently used builds until the cache is no larger than ``max_size``.
+
+        The build with key ``keep``, if any, is never removed.
+        """
+        entries = []
+        for key in os.listdir(self.path):
+            entry_dir = os.path.join(self.path, key)
+            if key.startswith(".") or not os.path.isdir(entry_dir):
+                continue
+            entries.append((os.stat(entry_dir).st_mtime, key, _tree_size(entry_dir)))
+
+        total_size = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+            total_size -= size
+
+
+@unittest.skipIf(sys.platform.startswith("win32"), "build script is a shell script")
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = BuildCache(os.path.join(self.tmp_dir.name, "cache"), max_size=100)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_plan(self, design):
+        plan = BuildPlan("build_top")
+        plan.add_file("top.il", design)
+        plan.add_file("build_top.sh", "cat top.il top.il >top.bit; echo >>builds\n")
+        return plan
+
+    def test_hit(self):
+        root = os.path.join(self.tmp_dir.name, "build")
+        products = self.cache.execute(self.make_plan("abc"), root)
+        self.assertEqual(products.get("top.bit"), b"abcabc")
+        os.remove(os.path.join(root, "top.bit"))
+        products = self.cache.execute(self.make_plan("abc"), root)
+        self.assertEqual(products.get("top.bit"), b"abcabc")
+        self.assertEqual(products.get("builds"), b"\n")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_evict(self):
+        root = os.path.join(self.tmp_dir.name, "build")
+        for design in ("a" * 40, "b" * 40, "c" * 40):
+            self.cache.execute(self.make_plan(design), root)
+        self.assertEqual(len(os.listdir(self.cache.path)), 1)
+        self.cache.execute(self.make_plan("c" * 40), root)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
@@ -1,10 +1,8 @@
-import os
-import subprocess
-
 from amaranth import *
 from amaranth.build import *
 from amaranth.vendor import IntelPlatform
 from .resources import *
+from .programmer import QuartusProgrammer
 
 
 __all__ = ["Chameleon96Platform"]
@@ -91,13 +89,12 @@ class Chameleon96Platform(IntelPlatform):
         ),
     ]
 
-    def toolchain_program(self, products, name):
-        quartus_pgm = os.environ.get("QUARTUS_PGM", "quartus_pgm")
-        with products.extract("{}.sof".format(name)) as bitstream_filename:
-            # The @2 selects the second device in the JTAG chain, because this chip
-            # puts the ARM cores first.
-            subprocess.check_call([quartus_pgm, "--haltcc", "--mode", "JTAG",
-                                   "--operation", "P;" + bitstream_filename + "@2"])
+    # The FPGA is the second device in the JTAG chain, because this chip puts the ARM
+    # cores first.
+    programmer = QuartusProgrammer(device_index=2)
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 """
 Example Usage:
@@ -74,12 +72,10 @@ class _CmodA7Platform(XilinxPlatform):
         })
     ]
 
-    def toolchain_program(self, products, name):
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call(["openFPGALoader",
-                "-b", "cmoda7_35t",
-                "{}".format(bitstream_filename)
-            ])
+    programmer = OpenFPGALoaderProgrammer(board="cmoda7_35t")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 class CmodA7_15Platform(_CmodA7Platform):
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 """
 Example Usage:
@@ -72,13 +70,10 @@ class CmodS7_Platform(XilinxPlatform):
         })
     ]
 
-    def toolchain_program(self, products, name):
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call(["openFPGALoader",
-                "-c", "digilent",
-                "--fpga-part", "xc7s25",
-                "{}".format(bitstream_filename)
-            ])
+    programmer = OpenFPGALoaderProgrammer(cable="digilent", fpga_part="xc7s25")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
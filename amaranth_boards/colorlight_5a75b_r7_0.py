@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeECP5Platform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 
 __all__ = ["Colorlight_5A75B_R70Platform"]
@@ -103,10 +101,10 @@ class Colorlight_5A75B_R70Platform(LatticeECP5Platform):
         overrides.update(kwargs)
         return super().toolchain_prepare(fragment, name, **overrides)
 
-    def toolchain_program(self, products, name):
-        tool = os.environ.get("OPENFPGALOADER", "openFPGALoader")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([tool, "-c", "ft232", "-m", bitstream_filename])
+    programmer = OpenFPGALoaderProgrammer(cable="ft232", sram=True)
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
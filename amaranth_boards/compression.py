@@ -0,0 +1,277 @@
+import os
+import tempfile
+import subprocess
+import unittest
+
+
+__all__ = ["merge_overrides", "compression_overrides", "BitstreamSize", "bitstream_size"]
+
+
+# Name of the bitstream written by each toolchain, whose size is reported by `bitstream_size`.
+_BITSTREAM_FILES = {
+    "Trellis":  "{name}.bit",
+    "Vivado":   "{name}.bit",
+    "ISE":      "{name}.bit",
+    "Quartus":  "{name}.rbf",
+    "Apicula":  "{name}.fs",
+    "Gowin":    "{name}.fs",
+}
+
+
+def _append_opts(overrides, var, opt):
+    opts = overrides.get(var, "")
+    if not isinstance(opts, str):
+        opts = " ".join(opts)
+    # An option is left out only if the same words are already there: `--compress` is not
+    # repeated, but `--seed 1` is added after `--seed 12`.
+    words, new = opts.split(), opt.split()
+    if not any(words[i:i + len(new)] == new for i in range(len(words) - len(new) + 1)):
+        opts = "{} {}".format(opts, opt).strip()
+    overrides[var] = opts
+
+
+def _append_script(overrides, var, script):
+    overrides[var] = "{}\n{}".format(overrides.get(var, ""), script).strip()
+
+
+def merge_overrides(overrides, kwargs):
+    """Return ``overrides`` extended with the toolchain overrides ``kwargs``.
+
+    Options (``*_opts``, as a string or a list) given in both are appended to those of
+    ``overrides``, unless they are already there, and scripts are appended on a new line; other
+    overrides in ``kwargs`` replace those in ``overrides``. Boards use this in
+    ``toolchain_prepare`` so that the overrides of the caller, e.g. those returned by
+    :func:`compression_overrides`, add to their own instead of colliding with them.
+    """
+    overrides = dict(overrides)
+    for var, value in kwargs.items():
+        if var not in overrides:
+            overrides[var] = value
+        elif var.endswith("_opts"):
+            _append_opts(overrides, var, value if isinstance(value, str) else " ".join(value))
+        elif var.startswith(("script_", "add_")):
+            _append_script(overrides, var, value)
+        else:
+            overrides[var] = value
+    return overrides
+
+
+def compression_overrides(platform, name="top", *, measure_uncompressed=False, **kwargs):
+    """Return ``kwargs`` with the overrides that make ``platform`` write a compressed bitstream.
+
+    The result is passed to ``platform.build()`` or ``platform.prepare()`` in place of
+    ``kwargs``; overrides already present in ``kwargs`` (e.g. ``ecppack_opts``) are extended
+    rather than replaced. ``name`` must be the name of the design that will be built.
+
+    Compression is supported by the Trellis toolchain for ECP5 (``ecppack --compress``), Vivado
+    (``BITSTREAM.GENERAL.COMPRESS``), ISE (``bitgen -g Compress``), Quartus (on-chip bitstream
+    decompression, which compresses the ``.sof`` and ``.rbf`` files), and the Apicula and Gowin
+    toolchains. If ``measure_uncompressed`` is true, Vivado additionally writes an uncompressed
+    ``{name}_uncompressed.bit`` for :func:`bitstream_size` to compare against; this generates
+    the bitstream a second time, and is not done by default.
+
+    Raises :exc:`NotImplementedError` if the toolchain of ``platform`` cannot compress
+    bitstreams.
+    """
+    toolchain = platform.toolchain
+    overrides = dict(kwargs)
+    if toolchain == "Trellis" and platform.family == "ecp5":
+        _append_opts(overrides, "ecppack_opts", "--compress")
+    elif toolchain == "Vivado":
+        _append_script(overrides, "script_before_bitstream",
+            "set_property BITSTREAM.GENERAL.COMPRESS TRUE [current_design]")
+        if measure_uncompressed:
+            _append_script(overrides, "script_after_bitstream",
+                "set_property BITSTREAM.GENERAL.COMPRESS FALSE [current_design]\n"
+                "write_bitstream -force {}_uncompressed.bit".format(name))
+    elif toolchain == "ISE":
+        # bitgen compresses bitstreams by default, but only if no other options are given.
+        overrides["bitgen_opts"] = overrides.get("bitgen_opts", "-g Compress")
+        _append_opts(overrides, "bitgen_opts", "-g Compress")
+    elif toolchain == "Quartus":
+        _append_script(overrides, "add_settings",
+            "set_global_assignment -name ON_CHIP_BITSTREAM_DECOMPRESSION ON")
+    elif toolchain == "Apicula":
+        _append_opts(overrides, "gowin_pack_opts", "--compress")
+    elif toolchain == "Gowin":
+        _append_script(overrides, "add_options", "set_option -bit_compress 1")
+    else:
+        raise NotImplementedError("Compressing bitstreams is not supported by the {} toolchain{}"
+                                  .format(toolchain, " for {}".format(platform.family)
+                                          if toolchain == "Trellis" else ""))
+    return overrides
+
+
+class BitstreamSize:
+    """Size of a bitstream, in bytes.
+
+    ``uncompressed_size`` is the size of the same bitstream without compression, or ``None`` if
+    it is not known.
+    """
+    def __init__(self, filename, size, *, uncompressed_size=None):
+        self.filename          = filename
+        self.size              = size
+        self.uncompressed_size = uncompressed_size
+
+    @property
+    def reduction(self):
+        """Fraction by which compression reduced the size of the bitstream, or ``None``."""
+        if not self.uncompressed_size:
+            return None
+        return 1 - self.size / self.uncompressed_size
+
+    def as_dict(self):
+        return {
+            "filename":          self.filename,
+            "size":              self.size,
+            "uncompressed_size": self.uncompressed_size,
+            "reduction":         self.reduction,
+        }
+
+    def __repr__(self):
+        if self.reduction is None:
+            return "<BitstreamSize {} {} bytes>".format(self.filename, self.size)
+        return "<BitstreamSize {} {} bytes ({:.1%} smaller)>".format(
+            self.filename, self.size, self.reduction)
+
+
+def _repack_ecp5(products, name):
+    # The uncompressed bitstream is cheap to produce from the textual configuration written by
+    # nextpnr, and does not need to be built alongside the compressed one.
+    ecppack = os.environ.get("ECPPACK", "ecppack")
+    with tempfile.TemporaryDirectory(prefix="amaranth-boards-compression-") as root:
+        config_filename = os.path.join(root, "{}.config".format(name))
+        bitstream_filename = os.path.join(root, "{}.bit".format(name))
+        with open(config_filename, "wb") as f:
+            f.write(products.get("{}.config".format(name)))
+        try:
+            subprocess.run([ecppack, "--input", config_filename, "--bit", bitstream_filename],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return os.path.getsize(bitstream_filename)
+
+
+def bitstream_size(platform, products, name="top", *, measure_uncompressed=False):
+    """Measure the bitstream among the products of building ``name`` for ``platform``.
+
+    If ``measure_uncompressed`` is true, the uncompressed size is measured as well for Vivado
+    builds prepared with ``compression_overrides(..., measure_uncompressed=True)``, and for ECP5
+    builds, which are repacked without compression using ``ecppack``; it is ``None`` otherwise.
+
+    Returns :class:`BitstreamSize`.
+    """
+    toolchain = platform.toolchain
+    if toolchain not in _BITSTREAM_FILES:
+        raise NotImplementedError("Measuring bitstreams of the {} toolchain is not supported"
+                                  .format(toolchain))
+    filename = _BITSTREAM_FILES[toolchain].format(name=name)
+    size = len(products.get(filename))
+    uncompressed_size = None
+    if measure_uncompressed and toolchain == "Vivado":
+        try:
+            uncompressed_size = len(products.get("{}_uncompressed.bit".format(name)))
+        except OSError:
+            pass
+    elif measure_uncompressed and toolchain == "Trellis":
+        try:
+            uncompressed_size = _repack_ecp5(products, name)
+        except OSError:
+            pass
+    return BitstreamSize(filename, size, uncompressed_size=uncompressed_size)
+
+
+class TestCase(unittest.TestCase):
+    def test_ecp5(self):
+        from .ulx3s import ULX3S_85F_Platform
+        self.assertEqual(compression_overrides(ULX3S_85F_Platform()),
+                         {"ecppack_opts": "--compress"})
+        self.assertEqual(compression_overrides(ULX3S_85F_Platform(),
+                                               ecppack_opts=["--freq", "62.0"]),
+                         {"ecppack_opts": "--freq 62.0 --compress"})
+        self.assertEqual(compression_overrides(ULX3S_85F_Platform(), ecppack_opts="--compress"),
+                         {"ecppack_opts": "--compress"})
+
+    def test_merge_overrides(self):
+        self.assertEqual(
+            merge_overrides({"nextpnr_opts": "--seed 12"}, {"nextpnr_opts": "--seed 1"}),
+            {"nextpnr_opts": "--seed 12 --seed 1"})
+        self.assertEqual(
+            merge_overrides({"ecppack_opts": "--compress --freq 38.8"},
+                            {"ecppack_opts": ["--freq", "3", "--compress"]}),
+            {"ecppack_opts": "--compress --freq 38.8 --freq 3 --compress"})
+        self.assertEqual(
+            merge_overrides({"ecppack_opts": "--compress --freq 38.8"},
+                            {"ecppack_opts": "--compress"}),
+            {"ecppack_opts": "--compress --freq 38.8"})
+        self.assertEqual(
+            merge_overrides({"script_after_read": "a", "verbose": False},
+                            {"script_after_read": "b", "verbose": True}),
+            {"script_after_read": "a\nb", "verbose": True})
+
+    def test_vivado(self):
+        from .arty_a7 import ArtyA7_35Platform
+        overrides = compression_overrides(ArtyA7_35Platform(), "blinky",
+                                          script_before_bitstream="# before")
+        self.assertEqual(overrides["script_before_bitstream"],
+                         "# before\nset_property BITSTREAM.GENERAL.COMPRESS TRUE [current_design]")
+        self.assertNotIn("script_after_bitstream", overrides)
+        overrides = compression_overrides(ArtyA7_35Platform(), "blinky",
+                                          measure_uncompressed=True)
+        self.assertIn("write_bitstream -force blinky_uncompressed.bit",
+                      overrides["script_after_bitstream"])
+
+    def test_ise(self):
+        from .mercury import MercuryPlatform
+        self.assertEqual(compression_overrides(MercuryPlatform()),
+                         {"bitgen_opts": "-g Compress"})
+        self.assertEqual(
+            compression_overrides(MercuryPlatform(), bitgen_opts="-g StartupClk:CClk"),
+            {"bitgen_opts": "-g StartupClk:CClk -g Compress"})
+
+    def test_prepare(self):
+        from .test.blinky import Blinky
+        from .arty_a7 import ArtyA7_35Platform
+        from .genesys2 import Genesys2Platform
+        from .supercon19badge import Supercon19BadgePlatform
+        from .tang_nano_9k import TangNano9kPlatform
+
+        # These boards have overrides of their own, which must be kept along with compression.
+        for platform, filename, expected in (
+                (ArtyA7_35Platform(), "top.tcl",
+                 ["SPI_BUSWIDTH 4", "GENERAL.COMPRESS TRUE", "-file top.bin"]),
+                (Genesys2Platform(), "top.tcl",
+                 ["auto_detect_xpm", "GENERAL.COMPRESS TRUE"]),
+                (Supercon19BadgePlatform(), "build_top.sh",
+                 ["--compress --freq 38.8 --input"]),
+                (TangNano9kPlatform(), "build_top.sh",
+                 ["--sspi_as_gpio --mspi_as_gpio --compress"])):
+            with self.subTest(platform=type(platform).__name__):
+                plan = platform.prepare(Blinky(), "top",
+                                        **compression_overrides(platform, "top"))
+                for text in expected:
+                    self.assertIn(text, plan.files[filename])
+
+    def test_unsupported(self):
+        from .icebreaker import ICEBreakerPlatform
+        with self.assertRaisesRegex(NotImplementedError,
+                r"^Compressing bitstreams is not supported by the IceStorm toolchain$"):
+            compression_overrides(ICEBreakerPlatform())
+
+    def test_bitstream_size(self):
+        from amaranth.build.run import BuildProducts
+        from .arty_a7 import ArtyA7_35Platform
+
+        class Products(BuildProducts):
+            files = {"top.bit": b"\0" * 300, "top_uncompressed.bit": b"\0" * 1200}
+
+            def get(self, filename, mode="b"):
+                try:
+                    return self.files[filename]
+                except KeyError:
+                    raise FileNotFoundError(filename) from None
+
+        size = bitstream_size(ArtyA7_35Platform(), Products())
+        self.assertEqual((size.size, size.uncompressed_size, size.reduction), (300, None, None))
+        size = bitstream_size(ArtyA7_35Platform(), Products(), measure_uncompressed=True)
+        self.assertEqual((size.size, size.uncompressed_size, size.reduction), (300, 1200, 0.75))
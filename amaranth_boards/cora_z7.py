@@ -1,10 +1,9 @@
-import os
-import subprocess
 import unittest
 
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import Xc3sprogProgrammer
 
 
 __all__ = ["CoraZ7_07SPlatform", "CoraZ7_10Platform"]
@@ -84,13 +83,10 @@ class _CoraZ7Platform(XilinxPlatform):
         }),
     ]
 
+    programmer = Xc3sprogProgrammer("jtaghs1_fast", position=1)
+
     def toolchain_program(self, products, name, **kwargs):
-        xc3sprog = os.environ.get("XC3SPROG", "xc3sprog")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.run(
-                [xc3sprog, "-c", "jtaghs1_fast", "-p", "1", bitstream_filename],
-                check=True
-            )
+        self.programmer.program(products, name, **kwargs)
 
 
 class CoraZ7_07SPlatform(_CoraZ7Platform):
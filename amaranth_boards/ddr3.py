@@ -0,0 +1,1245 @@
+import re
+import math
+import unittest
+
+from amaranth import *
+from amaranth.lib import io
+from amaranth.lib.cdc import FFSynchronizer
+from amaranth.lib.memory import Memory
+
+from .memory import MemoryPort, _cycles, _delay
+
+
+__all__ = [
+    "DDR3Chip", "ddr3_chip", "DDR3PHY", "SimDDR3PHY", "ECP5DDR3PHY", "Series7DDR3PHY",
+    "GowinDDR3PHY", "DDR3Controller", "DDR3",
+]
+
+
+class DDR3Chip:
+    """Geometry and timings of the DDR3 memory of a board.
+
+    ``rows``, ``cols`` and ``banks`` describe a single chip, and ``width`` is the width of the
+    whole data bus, which is wider than a chip if several chips share the address and command
+    signals. Timings are in nanoseconds, and are the minimums from the datasheet of the chip
+    for its slowest speed grade, except ``tREFI``, which is the maximum refresh interval.
+    """
+    def __init__(self, name, *, rows, cols=1024, banks=8, width=16, tRCD=13.75, tRP=13.75,
+                 tRAS=35.0, tRFC=350.0, tREFI=7800.0, tWR=15.0, tWTR=7.5, tRTP=7.5, tRRD=7.5,
+                 tFAW=40.0, tAA=13.75):
+        for what, value in (("rows", rows), ("cols", cols), ("banks", banks)):
+            if value < 1 or value & (value - 1):
+                raise ValueError("DDR3 {} must be a power of 2, not {}".format(what, value))
+        if width % 8:
+            raise ValueError("DDR3 data width must be a multiple of 8, not {}".format(width))
+
+        self.name  = name
+        self.rows  = rows
+        self.cols  = cols
+        self.banks = banks
+        self.width = width
+        self.tRCD  = tRCD
+        self.tRP   = tRP
+        self.tRAS  = tRAS
+        self.tRFC  = tRFC
+        self.tREFI = tREFI
+        self.tWR   = tWR
+        self.tWTR  = tWTR
+        self.tRTP  = tRTP
+        self.tRRD  = tRRD
+        self.tFAW  = tFAW
+        self.tAA   = tAA
+
+    @property
+    def row_bits(self):
+        return self.rows.bit_length() - 1
+
+    @property
+    def col_bits(self):
+        return self.cols.bit_length() - 1
+
+    @property
+    def bank_bits(self):
+        return self.banks.bit_length() - 1
+
+    @property
+    def size(self):
+        """Capacity of the memory, in bytes."""
+        return self.rows * self.cols * self.banks * self.width // 8
+
+    def latencies(self, clk_frequency):
+        """Return the CAS latency and CAS write latency, in memory clock cycles, when the
+        memory controller runs at ``clk_frequency`` Hz, and the memory at twice that."""
+        tck = 1e9 / (2 * clk_frequency)
+        for min_tck, cwl in ((2.5, 5), (1.875, 6), (1.5, 7), (1.25, 8), (1.07, 9), (0.938, 10)):
+            if tck >= min_tck:
+                break
+        else:
+            raise ValueError("DDR3 memory cannot run at {:.0f} MHz".format(2e-6 * clk_frequency))
+        cl = min(max(math.ceil(round(self.tAA / tck, 3)), cwl, 5), 16)
+        return cl, cwl
+
+    def as_dict(self):
+        return {
+            "name":  self.name,
+            "rows":  self.rows,
+            "cols":  self.cols,
+            "banks": self.banks,
+            "width": self.width,
+            "size":  self.size,
+            "tRCD":  self.tRCD,
+            "tRP":   self.tRP,
+            "tRAS":  self.tRAS,
+            "tRFC":  self.tRFC,
+            "tREFI": self.tREFI,
+            "tWR":   self.tWR,
+            "tWTR":  self.tWTR,
+            "tRTP":  self.tRTP,
+            "tRRD":  self.tRRD,
+            "tFAW":  self.tFAW,
+            "tAA":   self.tAA,
+        }
+
+    def __repr__(self):
+        return "<DDR3Chip {} {} MiB x{}>".format(self.name, self.size // 2 ** 20, self.width)
+
+
+# DDR3 memory of each board, keyed by the name of a class in the MRO of its platform.
+_DDR3_CHIPS = {
+    "AlchitryAuPlatform":      DDR3Chip("MT41K128M16",  rows=16384, tRFC=160),
+    "_ArtyA7Platform":         DDR3Chip("MT41K128M16",  rows=16384, tRFC=160),
+    "_ArtyS7Platform":         DDR3Chip("MT41K128M16",  rows=16384, tRFC=160),
+    "Genesys2Platform":        DDR3Chip("MT41J256M16",  rows=32768, width=32, tRFC=260),
+    "LitefuryPlatform":        DDR3Chip("MT41K256M16",  rows=32768, tRFC=260),
+    "NitefuryIIPlatform":      DDR3Chip("MT41K512M16",  rows=65536, tRFC=350),
+    "_ECPIX5Platform":         DDR3Chip("MT41K256M16",  rows=32768, tRFC=260),
+    "OrangeCrabR0_1Platform":  DDR3Chip("MT41K64M16",   rows=8192,  tRFC=110),
+    "_OrangeCrabR0_2Platform": DDR3Chip("MT41K64M16",   rows=8192,  tRFC=110),
+    "VersaECP5Platform":       DDR3Chip("MT41K64M16",   rows=8192,  tRFC=110),
+    "TangPrimer20kPlatform":   DDR3Chip("NT5CC64M16GP", rows=8192,  tRFC=110),
+}
+
+
+def ddr3_chip(platform, number=0):
+    """Return the :class:`DDR3Chip` describing the ``ddr3`` resource ``number`` of
+    ``platform``.
+
+    Boards whose memory is not known get a chip with as many rows as the address bus allows,
+    1024 columns, and conservative timings.
+    """
+    for cls in type(platform).__mro__:
+        if cls.__name__ in _DDR3_CHIPS:
+            return _DDR3_CHIPS[cls.__name__]
+    resource = platform.lookup("ddr3", number)
+    widths = {subsignal.name: len(subsignal.ios[0]) for subsignal in resource.ios}
+    return DDR3Chip("DDR3", rows=2 ** widths["a"], width=widths["dq"], tRFC=350)
+
+
+class _Phase:
+    def __init__(self, abits, babits):
+        self.address = Signal(abits)
+        self.bank    = Signal(babits)
+        self.cs_n    = Signal(init=1)
+        self.ras_n   = Signal(init=1)
+        self.cas_n   = Signal(init=1)
+        self.we_n    = Signal(init=1)
+
+
+def _beats(value, count=4):
+    width = len(value) // count
+    return [value[n * width:(n + 1) * width] for n in range(count)]
+
+
+def _window(older, newer, offset):
+    # The 4 beats starting `offset` beats into the 8 beats of two consecutive cycles.
+    return Cat(*(_beats(older) + _beats(newer))[offset:offset + 4])
+
+
+class DDR3PHY(Elaboratable):
+    """Base class of DDR3 PHYs, which move commands and data between a :class:`DDR3Controller`
+    and the memory.
+
+    The PHY runs in the ``sync`` domain at half the memory clock, and each of its cycles spans
+    two memory clock cycles, or four data beats. Commands for the first and the second memory
+    clock cycle are given in ``phases[0]`` and ``phases[1]``.
+
+    Writes: the data for a write is given by asserting ``wrdata_en`` in the cycle of the write
+    command and the next one, with 4 beats of ``wrdata`` and ``wrdata_mask`` per cycle, the
+    first beat in the least significant bits. The PHY delays it by the CAS write latency.
+
+    Reads: ``rddata_en`` is asserted in the cycle of the read command and the next one; the PHY
+    asserts ``rddata_valid`` ``read_latency`` cycles later for two cycles, with 4 beats of
+    ``rddata`` each.
+    """
+    def __init__(self, *, abits, babits, dq_width):
+        self.abits    = abits
+        self.babits   = babits
+        self.dq_width = dq_width
+        self.dm_width = dq_width // 8
+
+        self.phases       = [_Phase(abits, babits) for _ in range(2)]
+        self.cke          = Signal()
+        self.odt          = Signal()
+        self.reset_n      = Signal()
+
+        self.wrdata_en    = Signal()
+        self.wrdata       = Signal(4 * self.dq_width)
+        self.wrdata_mask  = Signal(4 * self.dm_width)
+
+        self.rddata_en    = Signal()
+        self.rddata       = Signal(4 * self.dq_width)
+        self.rddata_valid = Signal()
+
+        self.read_latency = None
+
+
+class SimDDR3PHY(DDR3PHY):
+    """Model of a DDR3 PHY and the memory behind it, for simulation.
+
+    The whole of ``chip`` is stored, so it should be a small one. Commands are checked against
+    the state of the banks and the timings of ``chip`` at ``clk_frequency``, and ``error`` is
+    asserted, and stays asserted, if one is issued too early or in the wrong state, or if the
+    memory is not refreshed often enough.
+    """
+    def __init__(self, chip, *, clk_frequency, read_latency=4):
+        super().__init__(abits=max(chip.row_bits, 13), babits=chip.bank_bits,
+                         dq_width=chip.width)
+        self.chip          = chip
+        self.clk_frequency = clk_frequency
+        self.read_latency  = read_latency
+
+        self.error    = Signal()
+        self.commands = Signal(32)
+        self.refreshes = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        chip, f = self.chip, self.clk_frequency
+        tRCD = _cycles(chip.tRCD, f)
+        tRP  = _cycles(chip.tRP, f)
+        tRAS = _cycles(chip.tRAS, f)
+        tRFC = _cycles(chip.tRFC, f)
+        tREFI_max = 9 * int(chip.tREFI * 1e-9 * f)
+
+        now = Signal(32, init=2 ** 20)
+        m.d.sync += now.eq(now + 1)
+
+        phase = self.phases[0]
+        bank  = phase.bank
+        cmd   = Cat(phase.we_n, phase.cas_n, phase.ras_n)
+        is_act, is_rd, is_wr, is_pre, is_ref = (
+            ~phase.cs_n & (cmd == code) for code in (0b011, 0b101, 0b100, 0b010, 0b001))
+
+        open_   = Signal(chip.banks)
+        rows    = Array(Signal(chip.row_bits, name="row{}".format(n)) for n in range(chip.banks))
+        t_act   = Array(Signal(32, name="t_act{}".format(n)) for n in range(chip.banks))
+        t_pre   = Array(Signal(32, name="t_pre{}".format(n)) for n in range(chip.banks))
+        t_ref   = Signal(32)
+        refresh = Signal()
+
+        def check(condition):
+            with m.If(~condition):
+                m.d.sync += self.error.eq(1)
+
+        with m.If(~phase.cs_n & (cmd != 0b111)):
+            m.d.sync += self.commands.eq(self.commands + 1)
+        with m.If(~self.phases[1].cs_n & (Cat(self.phases[1].we_n, self.phases[1].cas_n,
+                                              self.phases[1].ras_n) != 0b111)):
+            # Commands are only ever issued in the first phase.
+            m.d.sync += self.error.eq(1)
+
+        with m.If(is_act):
+            check(~open_.bit_select(bank, 1))
+            check(now - t_pre[bank] >= tRP)
+            check(now - t_ref >= tRFC)
+            m.d.sync += [
+                open_.bit_select(bank, 1).eq(1),
+                rows[bank].eq(phase.address),
+                t_act[bank].eq(now),
+            ]
+        with m.If(is_rd | is_wr):
+            check(open_.bit_select(bank, 1))
+            check(now - t_act[bank] >= tRCD)
+        with m.If(is_pre):
+            with m.If(phase.address[10]):
+                for n in range(chip.banks):
+                    with m.If(open_[n]):
+                        check(now - t_act[n] >= tRAS)
+                        m.d.sync += t_pre[n].eq(now)
+                m.d.sync += open_.eq(0)
+            with m.Else():
+                with m.If(open_.bit_select(bank, 1)):
+                    check(now - t_act[bank] >= tRAS)
+                    m.d.sync += t_pre[bank].eq(now)
+                m.d.sync += open_.bit_select(bank, 1).eq(0)
+        with m.If(is_ref):
+            check(open_ == 0)
+            m.d.sync += [
+                t_ref.eq(now),
+                refresh.eq(1),
+                self.refreshes.eq(self.refreshes + 1),
+            ]
+        with m.If(refresh & (now - t_ref > tREFI_max)):
+            m.d.sync += self.error.eq(1)
+
+        # Data is stored in halves of a burst, as transferred in one cycle.
+        m.submodules.storage = storage = Memory(shape=4 * chip.width,
+            depth=2 * chip.rows * chip.banks * chip.cols // 8, init=[])
+        wr_port = storage.write_port(granularity=8)
+        rd_port = storage.read_port()
+
+        burst  = Cat(phase.address[3:chip.col_bits], bank, rows[bank])
+        latch  = Signal(len(burst))
+        second = Signal()
+        m.d.sync += second.eq(0)
+        with m.If(is_rd | is_wr):
+            m.d.sync += [
+                latch.eq(burst),
+                second.eq(1),
+            ]
+        address = Mux(second, Cat(1, latch), Cat(0, burst))
+
+        m.d.comb += [
+            wr_port.addr.eq(address),
+            wr_port.data.eq(self.wrdata),
+            wr_port.en.eq(Mux(self.wrdata_en, ~self.wrdata_mask, 0)),
+            rd_port.addr.eq(address),
+        ]
+
+        m.d.comb += [
+            self.rddata.eq(_delay(m, rd_port.data, self.read_latency - 1)),
+            self.rddata_valid.eq(_delay(m, self.rddata_en, self.read_latency)),
+        ]
+
+        return m
+
+
+def _iobuf(family, port, bit, *, i=None, o=None, t=None):
+    # Instantiates the I/O buffer of a single pin, as `amaranth.lib.io.Buffer` would.
+    if family == "ecp5":
+        # Differential buffers of the ECP5 are instantiated on the true pin only.
+        pin = port.p[bit] if isinstance(port, io.DifferentialPort) else port.io[bit]
+        if i is None:
+            return Instance("OB", i_I=o, o_O=pin)
+        return Instance("BB", i_I=o, i_T=t, o_O=i, io_B=pin)
+    if family == "series7":
+        if isinstance(port, io.DifferentialPort):
+            if i is None:
+                return Instance("OBUFDS", i_I=o, o_O=port.p[bit], o_OB=port.n[bit])
+            return Instance("IOBUFDS", i_I=o, i_T=t, o_O=i,
+                            io_IO=port.p[bit], io_IOB=port.n[bit])
+        if i is None:
+            return Instance("OBUF", i_I=o, o_O=port.io[bit])
+        return Instance("IOBUF", i_I=o, i_T=t, o_O=i, io_IO=port.io[bit])
+    if family == "gowin":
+        if isinstance(port, io.DifferentialPort):
+            if i is None:
+                return Instance("TLVDS_OBUF", i_I=o, o_O=port.p[bit], o_OB=port.n[bit])
+            return Instance("TLVDS_IOBUF", i_I=o, i_OEN=t, o_O=i,
+                            io_IO=port.p[bit], io_IOB=port.n[bit])
+        if i is None:
+            return Instance("OBUF", i_I=o, o_O=port.io[bit])
+        return Instance("IOBUF", i_I=o, i_OEN=t, o_O=i, io_IO=port.io[bit])
+    assert False # :nocov:
+
+
+class _PadsPHY(DDR3PHY):
+    # Command path and data alignment shared by the PHYs that drive the `ddr3` resource of a
+    # board. Subclasses serialize `dq`, `dqs` and `dm` with the primitives of their family.
+    _capture_latency = 2
+
+    def __init__(self, pads, *, cl, cwl, read_delay=0, write_delay=0):
+        super().__init__(abits=len(pads.a), babits=len(pads.ba), dq_width=len(pads.dq))
+        if len(pads.dq) != 8 * len(pads.dqs) or len(pads.dm) != len(pads.dqs):
+            raise ValueError("DDR3 PHYs require one DQS and one DM signal per 8 DQ signals")
+        self.pads        = pads
+        self.cl          = cl
+        self.cwl         = cwl
+        self.read_delay  = read_delay
+        self.write_delay = write_delay
+
+        self.read_latency = (2 * cl + read_delay) // 4 + self._capture_latency + 1
+
+    def _elaborate_commands(self, m):
+        pads = self.pads
+
+        # The rising edge of the memory clock is in the middle of each command.
+        m.submodules.clk = clk = io.DDRBuffer("o", pads.clk, o_domain="sync2x")
+        m.d.comb += [
+            clk.o[0].eq(0),
+            clk.o[1].eq(1),
+        ]
+
+        for name, field in (("a", "address"), ("ba", "bank"), ("cs", "cs_n"),
+                            ("ras", "ras_n"), ("cas", "cas_n"), ("we", "we_n")):
+            # Boards with a single rank may tie `cs` to ground.
+            if not hasattr(pads, name):
+                continue
+            m.submodules[name] = buf = io.DDRBuffer("o", getattr(pads, name), o_domain="sync")
+            for n, phase in enumerate(self.phases):
+                value = getattr(phase, field)
+                m.d.comb += buf.o[n].eq(~value if field.endswith("_n") else value)
+
+        for name, value in (("clk_en", self.cke), ("odt", self.odt), ("rst", ~self.reset_n)):
+            if not hasattr(pads, name):
+                continue
+            m.submodules[name] = buf = io.FFBuffer("o", getattr(pads, name), o_domain="sync")
+            m.d.comb += buf.o.eq(value)
+
+    def _write_beats(self, m):
+        # Returns, for the current cycle, the 4 beats of DQ and DM, the beats in which DQ is
+        # driven, and the beats of DQS and in which DQS is driven, which starts one memory
+        # clock cycle early for the write preamble and ends one beat late for the postamble.
+        delay, offset = divmod(2 * self.cwl + self.write_delay, 4)
+        stages = [Cat(self.wrdata_en.replicate(4), self.wrdata, self.wrdata_mask)]
+        for _ in range(delay + 2):
+            stages.append(_delay(m, stages[-1], 1))
+
+        def window(n):
+            # Data delayed by `offset` beats more than the `n` cycles of `stages[n]`.
+            older, newer = stages[n + 1], stages[n]
+            fields = (slice(0, 4), slice(4, 4 + len(self.wrdata)),
+                      slice(4 + len(self.wrdata), None))
+            return [_window(older[field], newer[field], 4 - offset) for field in fields]
+
+        en, dq, dm = window(delay)
+        en_prev, _, _ = window(delay + 1)
+        en_next, _, _ = window(delay - 1)
+        around = Cat(en_prev, en, en_next)
+        dqs_oe = Cat(around[3 + n] | around[4 + n] | around[5 + n] | around[6 + n]
+                     for n in range(4))
+        dqs = Cat(en[n] if n % 2 == 0 else 0 for n in range(4))
+        return dq, dm, en, dqs, dqs_oe
+
+    def _read_beats(self, m, captured):
+        offset = (2 * self.cl + self.read_delay) % 4
+        previous = _delay(m, captured, 1)
+        m.d.comb += [
+            self.rddata.eq(_window(previous, captured, offset)),
+            self.rddata_valid.eq(_delay(m, self.rddata_en, self.read_latency)),
+        ]
+
+    def _read_window(self, m):
+        # Asserted while read data is expected on DQS, with a margin of a cycle on each side.
+        expected = _delay(m, self.rddata_en, (2 * self.cl + self.read_delay) // 4)
+        previous = _delay(m, expected, 1)
+        window = Signal()
+        m.d.comb += window.eq(expected | previous)
+        return window
+
+
+class ECP5DDR3PHY(_PadsPHY):
+    """DDR3 PHY for ECP5 FPGAs, using the DQS logic of the I/O cells.
+
+    Requires the ``sync`` domain, and the ``sync2x`` domain at twice its frequency and with an
+    aligned phase, which should be produced from the same PLL output with ``ECLKSYNCB`` and
+    ``CLKDIVF``. Reads are captured with the DQS strobe, delayed by 90 degrees by ``DQSBUFM``
+    and ``DDRDLLA``; ``read_clksel`` selects the read clock of ``DQSBUFM``.
+
+    ``cl`` and ``cwl`` are the CAS latency and CAS write latency, in memory clock cycles, and
+    ``read_delay`` and ``write_delay`` add the given number of data beats to the latency of
+    reads and writes to account for the board.
+    """
+    _capture_latency = 2
+
+    def __init__(self, pads, *, cl, cwl, read_delay=0, write_delay=0, read_clksel=0):
+        super().__init__(pads, cl=cl, cwl=cwl, read_delay=read_delay, write_delay=write_delay)
+        self.read_clksel = read_clksel
+
+    def elaborate(self, platform):
+        m = Module()
+
+        self._elaborate_commands(m)
+        dq_o, dm_o, dq_oe, dqs_o, dqs_oe = self._write_beats(m)
+        read_window = self._read_window(m)
+
+        # The DDRDLLA is frozen while the DQSBUFM cells are paused, then updated, as required
+        # by Lattice TN1265 after the DLL locks.
+        ddrdel = Signal()
+        lock   = Signal()
+        freeze = Signal()
+        update = Signal()
+        pause  = Signal(init=1)
+        m.submodules.ddrdll = Instance("DDRDLLA",
+            i_CLK=ClockSignal("sync2x"),
+            i_RST=ResetSignal("sync"),
+            i_UDDCNTLN=~update,
+            i_FREEZE=freeze,
+            o_DDRDEL=ddrdel,
+            o_LOCK=lock,
+        )
+        locked = Signal()
+        m.submodules.lock_sync = FFSynchronizer(lock, locked)
+        step = Signal(range(12))
+        timer = Signal(3)
+        with m.If(locked & (step != 11)):
+            m.d.sync += timer.eq(timer + 1)
+            with m.If(timer == 7):
+                m.d.sync += step.eq(step + 1)
+        m.d.comb += [
+            freeze.eq((step >= 1) & (step < 6)),
+            update.eq(step == 8),
+        ]
+        m.d.sync += pause.eq(step < 10)
+
+        captured = Signal(4 * self.dq_width)
+        for lane in range(len(self.pads.dqs)):
+            dqs_i   = Signal(name="dqs{}_i".format(lane))
+            dqs_buf = Signal(name="dqs{}_o".format(lane))
+            dqs_t   = Signal(name="dqs{}_t".format(lane))
+            dqsr90  = Signal(name="dqs{}_r90".format(lane))
+            dqsw    = Signal(name="dqs{}_w".format(lane))
+            dqsw270 = Signal(name="dqs{}_w270".format(lane))
+            rdpntr  = Signal(3, name="dqs{}_rdpntr".format(lane))
+            wrpntr  = Signal(3, name="dqs{}_wrpntr".format(lane))
+            m.submodules["dqsbuf{}".format(lane)] = Instance("DQSBUFM",
+                p_DQS_LI_DEL_ADJ="MINUS",
+                p_DQS_LI_DEL_VAL=1,
+                p_DQS_LO_DEL_ADJ="MINUS",
+                p_DQS_LO_DEL_VAL=4,
+                i_SCLK=ClockSignal("sync"),
+                i_ECLK=ClockSignal("sync2x"),
+                i_RST=ResetSignal("sync"),
+                i_DDRDEL=ddrdel,
+                i_PAUSE=pause,
+                i_DQSI=dqs_i,
+                i_READ0=read_window,
+                i_READ1=read_window,
+                i_READCLKSEL0=self.read_clksel & 1,
+                i_READCLKSEL1=(self.read_clksel >> 1) & 1,
+                i_READCLKSEL2=(self.read_clksel >> 2) & 1,
+                i_RDLOADN=0, i_RDMOVE=0, i_RDDIRECTION=1,
+                i_WRLOADN=0, i_WRMOVE=0, i_WRDIRECTION=1,
+                o_DQSR90=dqsr90,
+                o_DQSW=dqsw,
+                o_DQSW270=dqsw270,
+                o_RDPNTR0=rdpntr[0], o_RDPNTR1=rdpntr[1], o_RDPNTR2=rdpntr[2],
+                o_WRPNTR0=wrpntr[0], o_WRPNTR1=wrpntr[1], o_WRPNTR2=wrpntr[2],
+            )
+
+            m.submodules["dqs{}_oddr".format(lane)] = Instance("ODDRX2DQSB",
+                i_SCLK=ClockSignal("sync"),
+                i_ECLK=ClockSignal("sync2x"),
+                i_RST=ResetSignal("sync"),
+                i_DQSW=dqsw,
+                i_D0=dqs_o[0], i_D1=dqs_o[1], i_D2=dqs_o[2], i_D3=dqs_o[3],
+                o_Q=dqs_buf,
+            )
+            m.submodules["dqs{}_tsh".format(lane)] = Instance("TSHX2DQSA",
+                i_SCLK=ClockSignal("sync"),
+                i_ECLK=ClockSignal("sync2x"),
+                i_RST=ResetSignal("sync"),
+                i_DQSW=dqsw,
+                i_T0=~(dqs_oe[0] | dqs_oe[1]),
+                i_T1=~(dqs_oe[2] | dqs_oe[3]),
+                o_Q=dqs_t,
+            )
+            m.submodules["dqs{}_buf".format(lane)] = _iobuf("ecp5", self.pads.dqs, lane,
+                i=dqs_i, o=dqs_buf, t=dqs_t)
+
+            dm = Signal(name="dm{}_o".format(lane))
+            m.submodules["dm{}_oddr".format(lane)] = Instance("ODDRX2DQA",
+                i_SCLK=ClockSignal("sync"),
+                i_ECLK=ClockSignal("sync2x"),
+                i_RST=ResetSignal("sync"),
+                i_DQSW270=dqsw270,
+                **{"i_D{}".format(n): beat[lane] for n, beat in enumerate(_beats(dm_o))},
+                o_Q=dm,
+            )
+            m.submodules["dm{}_buf".format(lane)] = _iobuf("ecp5", self.pads.dm, lane, o=dm)
+
+            for bit in range(8 * lane, 8 * lane + 8):
+                dq_i     = Signal(name="dq{}_i".format(bit))
+                dq_delay = Signal(name="dq{}_delay".format(bit))
+                dq_buf   = Signal(name="dq{}_o".format(bit))
+                dq_t     = Signal(name="dq{}_t".format(bit))
+                m.submodules["dq{}_oddr".format(bit)] = Instance("ODDRX2DQA",
+                    i_SCLK=ClockSignal("sync"),
+                    i_ECLK=ClockSignal("sync2x"),
+                    i_RST=ResetSignal("sync"),
+                    i_DQSW270=dqsw270,
+                    **{"i_D{}".format(n): beat[bit] for n, beat in enumerate(_beats(dq_o))},
+                    o_Q=dq_buf,
+                )
+                m.submodules["dq{}_tsh".format(bit)] = Instance("TSHX2DQA",
+                    i_SCLK=ClockSignal("sync"),
+                    i_ECLK=ClockSignal("sync2x"),
+                    i_RST=ResetSignal("sync"),
+                    i_DQSW270=dqsw270,
+                    i_T0=~(dq_oe[0] | dq_oe[1]),
+                    i_T1=~(dq_oe[2] | dq_oe[3]),
+                    o_Q=dq_t,
+                )
+                m.submodules["dq{}_buf".format(bit)] = _iobuf("ecp5", self.pads.dq, bit,
+                    i=dq_i, o=dq_buf, t=dq_t)
+                m.submodules["dq{}_delay".format(bit)] = Instance("DELAYG",
+                    p_DEL_MODE="DQS_ALIGNED_X2",
+                    i_A=dq_i,
+                    o_Z=dq_delay,
+                )
+                m.submodules["dq{}_iddr".format(bit)] = Instance("IDDRX2DQA",
+                    i_SCLK=ClockSignal("sync"),
+                    i_ECLK=ClockSignal("sync2x"),
+                    i_RST=ResetSignal("sync"),
+                    i_DQSR90=dqsr90,
+                    i_RDPNTR0=rdpntr[0], i_RDPNTR1=rdpntr[1], i_RDPNTR2=rdpntr[2],
+                    i_WRPNTR0=wrpntr[0], i_WRPNTR1=wrpntr[1], i_WRPNTR2=wrpntr[2],
+                    i_D=dq_delay,
+                    **{"o_Q{}".format(n): beat[bit] for n, beat in enumerate(_beats(captured))},
+                )
+
+        self._read_beats(m, captured)
+        return m
+
+
+class Series7DDR3PHY(_PadsPHY):
+    """DDR3 PHY for Xilinx 7-series FPGAs, using ``OSERDESE2``, ``ISERDESE2`` and ``IDELAYE2``.
+
+    Requires the ``sync`` domain; the ``sync2x`` domain at twice its frequency and with an
+    aligned phase; the ``sync2x_dqs`` domain, like ``sync2x`` but shifted by 90 degrees, which
+    clocks DQS in the middle of each write data beat; and the ``idelay_ref`` domain at 200 MHz
+    for ``IDELAYCTRL``. Reads are captured with ``sync2x``, after a fixed delay of
+    ``input_delay`` ``IDELAYE2`` taps of 78 ps.
+
+    ``cl``, ``cwl``, ``read_delay`` and ``write_delay`` are as for :class:`ECP5DDR3PHY`.
+    """
+    _capture_latency = 2
+
+    def __init__(self, pads, *, cl, cwl, read_delay=0, write_delay=0, input_delay=0):
+        super().__init__(pads, cl=cl, cwl=cwl, read_delay=read_delay, write_delay=write_delay)
+        self.input_delay = input_delay
+
+    def _oserdes(self, m, name, beats, *, t_beats=None, domain="sync2x"):
+        q = Signal(name="{}_o".format(name))
+        t = Signal(name="{}_t".format(name))
+        if t_beats is None:
+            t_beats = C(0, 4)
+        m.submodules[name + "_oserdes"] = Instance("OSERDESE2",
+            p_DATA_RATE_OQ="DDR",
+            p_DATA_RATE_TQ="DDR",
+            p_DATA_WIDTH=4,
+            p_TRISTATE_WIDTH=4,
+            p_SERDES_MODE="MASTER",
+            i_CLK=ClockSignal(domain),
+            i_CLKDIV=ClockSignal("sync"),
+            i_RST=ResetSignal("sync"),
+            i_OCE=1,
+            i_TCE=1,
+            i_D1=beats[0], i_D2=beats[1], i_D3=beats[2], i_D4=beats[3],
+            i_T1=~t_beats[0], i_T2=~t_beats[1], i_T3=~t_beats[2], i_T4=~t_beats[3],
+            o_OQ=q,
+            o_TQ=t,
+        )
+        return q, t
+
+    def elaborate(self, platform):
+        m = Module()
+
+        self._elaborate_commands(m)
+        dq_o, dm_o, dq_oe, dqs_o, dqs_oe = self._write_beats(m)
+
+        m.submodules.idelayctrl = Instance("IDELAYCTRL",
+            i_REFCLK=ClockSignal("idelay_ref"),
+            i_RST=ResetSignal("idelay_ref"),
+        )
+
+        captured = Signal(4 * self.dq_width)
+        for lane in range(len(self.pads.dqs)):
+            dqs_i = Signal(name="dqs{}_i".format(lane))
+            dqs, dqs_t = self._oserdes(m, "dqs{}".format(lane), dqs_o, t_beats=dqs_oe,
+                                       domain="sync2x_dqs")
+            m.submodules["dqs{}_buf".format(lane)] = _iobuf("series7", self.pads.dqs, lane,
+                i=dqs_i, o=dqs, t=dqs_t)
+
+            dm, _ = self._oserdes(m, "dm{}".format(lane),
+                                  [beat[lane] for beat in _beats(dm_o)])
+            m.submodules["dm{}_buf".format(lane)] = _iobuf("series7", self.pads.dm, lane, o=dm)
+
+        for bit in range(self.dq_width):
+            dq_i     = Signal(name="dq{}_i".format(bit))
+            dq_delay = Signal(name="dq{}_delay".format(bit))
+            dq, dq_t = self._oserdes(m, "dq{}".format(bit),
+                                     [beat[bit] for beat in _beats(dq_o)], t_beats=dq_oe)
+            m.submodules["dq{}_buf".format(bit)] = _iobuf("series7", self.pads.dq, bit,
+                i=dq_i, o=dq, t=dq_t)
+            m.submodules["dq{}_idelay".format(bit)] = Instance("IDELAYE2",
+                p_IDELAY_TYPE="FIXED",
+                p_IDELAY_VALUE=self.input_delay,
+                p_DELAY_SRC="IDATAIN",
+                p_REFCLK_FREQUENCY=200.0,
+                p_HIGH_PERFORMANCE_MODE="TRUE",
+                p_SIGNAL_PATTERN="DATA",
+                i_IDATAIN=dq_i,
+                o_DATAOUT=dq_delay,
+            )
+            beats = _beats(captured)
+            m.submodules["dq{}_iserdes".format(bit)] = Instance("ISERDESE2",
+                p_DATA_RATE="DDR",
+                p_DATA_WIDTH=4,
+                p_INTERFACE_TYPE="NETWORKING",
+                p_NUM_CE=1,
+                p_IOBDELAY="IFD",
+                p_SERDES_MODE="MASTER",
+                i_DDLY=dq_delay,
+                i_CE1=1,
+                i_RST=ResetSignal("sync"),
+                i_CLK=ClockSignal("sync2x"),
+                i_CLKB=~ClockSignal("sync2x"),
+                i_CLKDIV=ClockSignal("sync"),
+                i_BITSLIP=0,
+                # The first bit received is in Q4.
+                o_Q4=beats[0][bit], o_Q3=beats[1][bit], o_Q2=beats[2][bit], o_Q1=beats[3][bit],
+            )
+
+        self._read_beats(m, captured)
+        return m
+
+
+class GowinDDR3PHY(_PadsPHY):
+    """DDR3 PHY for Gowin FPGAs, using ``OSER4``, ``IDES4`` and ``IODELAY``.
+
+    Requires the ``sync`` domain, the ``sync2x`` domain at twice its frequency and with an
+    aligned phase, and the ``sync2x_dqs`` domain, like ``sync2x`` but shifted by 90 degrees,
+    which clocks DQS in the middle of each write data beat. Reads are captured with
+    ``sync2x``, after a fixed delay of ``input_delay`` ``IODELAY`` taps.
+
+    ``cl``, ``cwl``, ``read_delay`` and ``write_delay`` are as for :class:`ECP5DDR3PHY`.
+    """
+    _capture_latency = 2
+
+    def __init__(self, pads, *, cl, cwl, read_delay=0, write_delay=0, input_delay=0):
+        super().__init__(pads, cl=cl, cwl=cwl, read_delay=read_delay, write_delay=write_delay)
+        self.input_delay = input_delay
+
+    def _oser4(self, m, name, beats, *, t_beats=None, domain="sync2x"):
+        q = Signal(name="{}_o".format(name))
+        t = Signal(name="{}_t".format(name))
+        if t_beats is None:
+            t_beats = C(0, 4)
+        m.submodules[name + "_oser4"] = Instance("OSER4",
+            p_GSREN="false",
+            p_LSREN="true",
+            p_HWL="false",
+            p_TXCLK_POL=0,
+            i_PCLK=ClockSignal("sync"),
+            i_FCLK=ClockSignal(domain),
+            i_RESET=ResetSignal("sync"),
+            i_D0=beats[0], i_D1=beats[1], i_D2=beats[2], i_D3=beats[3],
+            # The output is enabled for a whole memory clock cycle at a time.
+            i_TX0=~(t_beats[0] | t_beats[1]),
+            i_TX1=~(t_beats[2] | t_beats[3]),
+            o_Q0=q,
+            o_Q1=t,
+        )
+        return q, t
+
+    def elaborate(self, platform):
+        m = Module()
+
+        self._elaborate_commands(m)
+        dq_o, dm_o, dq_oe, dqs_o, dqs_oe = self._write_beats(m)
+
+        captured = Signal(4 * self.dq_width)
+        for lane in range(len(self.pads.dqs)):
+            dqs, dqs_t = self._oser4(m, "dqs{}".format(lane), dqs_o, t_beats=dqs_oe,
+                                     domain="sync2x_dqs")
+            m.submodules["dqs{}_buf".format(lane)] = _iobuf("gowin", self.pads.dqs, lane,
+                i=Signal(name="dqs{}_i".format(lane)), o=dqs, t=dqs_t)
+
+            dm, _ = self._oser4(m, "dm{}".format(lane), [beat[lane] for beat in _beats(dm_o)])
+            m.submodules["dm{}_buf".format(lane)] = _iobuf("gowin", self.pads.dm, lane, o=dm)
+
+        for bit in range(self.dq_width):
+            dq_i     = Signal(name="dq{}_i".format(bit))
+            dq_delay = Signal(name="dq{}_delay".format(bit))
+            dq, dq_t = self._oser4(m, "dq{}".format(bit),
+                                   [beat[bit] for beat in _beats(dq_o)], t_beats=dq_oe)
+            m.submodules["dq{}_buf".format(bit)] = _iobuf("gowin", self.pads.dq, bit,
+                i=dq_i, o=dq, t=dq_t)
+            m.submodules["dq{}_iodelay".format(bit)] = Instance("IODELAY",
+                p_C_STATIC_DLY=self.input_delay,
+                i_DI=dq_i,
+                i_SDTAP=0,
+                i_SETN=0,
+                i_VALUE=0,
+                o_DO=dq_delay,
+            )
+            beats = _beats(captured)
+            m.submodules["dq{}_ides4".format(bit)] = Instance("IDES4",
+                p_GSREN="false",
+                p_LSREN="true",
+                i_PCLK=ClockSignal("sync"),
+                i_FCLK=ClockSignal("sync2x"),
+                i_RESET=ResetSignal("sync"),
+                i_CALIB=0,
+                i_D=dq_delay,
+                o_Q0=beats[0][bit], o_Q1=beats[1][bit], o_Q2=beats[2][bit], o_Q3=beats[3][bit],
+            )
+
+        self._read_beats(m, captured)
+        return m
+
+
+def _family(platform):
+    family = getattr(platform, "family", None)
+    if family in ("ecp5", "series7"):
+        return family
+    if str(getattr(platform, "series", "")).startswith("GW"):
+        return "gowin"
+    raise NotImplementedError("DDR3 memory on {} is not supported"
+                              .format(type(platform).__name__))
+
+
+_PHYS = {
+    "ecp5":    ECP5DDR3PHY,
+    "series7": Series7DDR3PHY,
+    "gowin":   GowinDDR3PHY,
+}
+
+
+# Commands, as the values of RAS#, CAS# and WE#.
+_CMD_MRS = 0b000
+_CMD_REF = 0b001
+_CMD_PRE = 0b010
+_CMD_ACT = 0b011
+_CMD_WR  = 0b100
+_CMD_RD  = 0b101
+_CMD_ZQC = 0b110
+
+
+def _mode_registers(chip, clk_frequency):
+    # Returns the values of MR0 to MR3 for a burst length of 8, a 40 ohm output driver, and a
+    # 60 ohm nominal termination.
+    cl, cwl = chip.latencies(clk_frequency)
+    tck = 1e9 / (2 * clk_frequency)
+    wr = max(math.ceil(round(chip.tWR / tck, 3)), 5)
+    wr = min(n for n in (5, 6, 7, 8, 10, 12, 14, 16) if n >= min(wr, 16))
+    wr_code = {5: 1, 6: 2, 7: 3, 8: 4, 10: 5, 12: 6, 14: 7, 16: 0}[wr]
+    if cl <= 11:
+        cl_code = (cl - 4) << 4
+    else:
+        cl_code = (cl - 12) << 4 | 1 << 2
+    mr0 = cl_code | 1 << 8 | wr_code << 9
+    mr1 = 1 << 2
+    mr2 = (cwl - 5) << 3
+    mr3 = 0
+    return mr0, mr1, mr2, mr3
+
+
+class DDR3Controller(Elaboratable):
+    """DDR3 memory controller, for a :class:`DDR3PHY` driving ``chip``.
+
+    The controller runs at ``clk_frequency`` Hz, and the memory at twice that. After the memory
+    is initialized and ``init_done`` is asserted, it is accessed through ``port``, a
+    :class:`~amaranth_boards.memory.MemoryPort` whose transfers are whole bursts of 8 beats.
+
+    Consecutive addresses go to consecutive columns of a row, then to the next bank, then to
+    the next row, so that a sequential stream opens the next row in another bank. Rows are
+    left open until another row of the same bank is accessed, or the memory is refreshed.
+
+    Requests are served in order, one command per cycle, and refreshes are issued every
+    ``tREFI``. ``fast_init`` skips the 200 µs and 500 µs waits of the power-up sequence, for
+    simulation.
+    """
+    def __init__(self, phy, *, chip, clk_frequency, fast_init=False):
+        if phy.dq_width != chip.width:
+            raise ValueError("DDR3 PHY has a {}-bit data bus, but the {} memory is {}-bit wide"
+                             .format(phy.dq_width, chip.name, chip.width))
+        if phy.abits < max(chip.row_bits, 13):
+            raise ValueError("DDR3 PHY has {} address bits, but the {} memory needs {}"
+                             .format(phy.abits, chip.name, max(chip.row_bits, 13)))
+
+        self.phy           = phy
+        self.chip          = chip
+        self.clk_frequency = clk_frequency
+        self.fast_init     = fast_init
+        self.cl, self.cwl  = chip.latencies(clk_frequency)
+
+        self.port = MemoryPort(
+            addr_width=chip.col_bits - 3 + chip.bank_bits + chip.row_bits,
+            data_width=8 * chip.width)
+        self.init_done = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        phy, chip, port, f = self.phy, self.chip, self.port, self.clk_frequency
+        cl, cwl = self.cl, self.cwl
+
+        tRCD = _cycles(chip.tRCD, f)
+        tRP  = _cycles(chip.tRP, f)
+        tRAS = _cycles(chip.tRAS, f)
+        tRRD = max(_cycles(chip.tRRD, f, 4), math.ceil(_cycles(chip.tFAW, f) / 4))
+        tRFC = _cycles(chip.tRFC, f)
+        tCCD = 2
+        tRTP = _cycles(chip.tRTP, f, 4)
+        # Write to precharge and write to read are counted from the end of the write burst.
+        tWRP = math.ceil((cwl + 4) / 2) + _cycles(chip.tWR, f)
+        tWTR = math.ceil((cwl + 4) / 2) + _cycles(chip.tWTR, f, 4)
+        tRTW = math.ceil((cl + 4 + 2 - cwl) / 2)
+        tREFI = int(chip.tREFI * 1e-9 * f)
+
+        # Power-up and initialization sequence, as (RESET#, CKE, command, bank, address, wait).
+        mr0, mr1, mr2, mr3 = _mode_registers(chip, f)
+        if self.fast_init:
+            t_reset = t_cke = 4
+        else:
+            t_reset, t_cke = _cycles(200e3, f), _cycles(500e3, f)
+        init = [
+            (0, 0, None,     0, 0,       t_reset),
+            (1, 0, None,     0, 0,       t_cke),
+            (1, 1, None,     0, 0,       _cycles(chip.tRFC + 10, f, 5)),
+            (1, 1, _CMD_MRS, 2, mr2,     2),
+            (1, 1, _CMD_MRS, 3, mr3,     2),
+            (1, 1, _CMD_MRS, 1, mr1,     2),
+            (1, 1, _CMD_MRS, 0, mr0,     _cycles(15, f, 12)),
+            (1, 1, _CMD_ZQC, 0, 1 << 10, _cycles(0, f, 512)),
+        ]
+
+        command = phy.phases[0]
+
+        def issue(cmd, bank=0, address=0):
+            m.d.comb += [
+                command.cs_n.eq(0),
+                Cat(command.we_n, command.cas_n, command.ras_n).eq(cmd),
+                command.bank.eq(bank),
+                command.address.eq(address),
+            ]
+
+        def timer(name, limit):
+            count = Signal(range(limit + 1), name=name)
+            with m.If(count != 0):
+                m.d.sync += count.eq(count - 1)
+            return count
+
+        def restart(count, cycles):
+            # Forbids the command guarded by `count` for the next `cycles` cycles, unless it
+            # is already forbidden for longer.
+            if cycles > 1:
+                with m.If(count < cycles):
+                    m.d.sync += count.eq(cycles - 1)
+
+        limit = max(tRCD, tRP, tRAS, tRRD, tRFC, tCCD, tRTP, tWRP, tWTR, tRTW)
+        act_timers = [timer("act_wait{}".format(n), limit) for n in range(chip.banks)]
+        rw_timers  = [timer("rw_wait{}".format(n),  limit) for n in range(chip.banks)]
+        pre_timers = [timer("pre_wait{}".format(n), limit) for n in range(chip.banks)]
+        act_any = timer("act_any_wait", limit)
+        rd_any  = timer("rd_any_wait",  limit)
+        wr_any  = timer("wr_any_wait",  limit)
+
+        open_ = Signal(chip.banks)
+        rows  = Array(Signal(chip.row_bits, name="row{}".format(n)) for n in range(chip.banks))
+
+        col_bits = chip.col_bits - 3
+        col  = Cat(C(0, 3), port.addr[:col_bits])
+        bank = port.addr[col_bits:col_bits + chip.bank_bits]
+        row  = port.addr[col_bits + chip.bank_bits:]
+
+        def bank_timer(timers):
+            return Array(timers)[bank]
+
+        # The second half of a write burst, and of the read burst being returned.
+        wr_second = Signal()
+        wr_data   = Signal(4 * chip.width)
+        wr_mask   = Signal(chip.width // 2)
+        rd_second = Signal()
+        rd_first  = Signal(4 * chip.width)
+        m.d.sync += [
+            wr_second.eq(0),
+            rd_second.eq(0),
+        ]
+        with m.If(wr_second):
+            m.d.comb += [
+                phy.wrdata_en.eq(1),
+                phy.wrdata.eq(wr_data),
+                phy.wrdata_mask.eq(wr_mask),
+            ]
+        with m.If(rd_second):
+            m.d.comb += phy.rddata_en.eq(1)
+
+        rd_half = Signal()
+        with m.If(phy.rddata_valid):
+            m.d.sync += rd_half.eq(~rd_half)
+            with m.If(~rd_half):
+                m.d.sync += rd_first.eq(phy.rddata)
+            with m.Else():
+                m.d.comb += [
+                    port.rdata.eq(Cat(rd_first, phy.rddata)),
+                    port.rvalid.eq(1),
+                ]
+
+        refresh_due = Signal()
+        refi = Signal(range(tREFI + 1), init=tREFI)
+        with m.If(self.init_done):
+            m.d.sync += refi.eq(refi - 1)
+            with m.If(refi == 0):
+                m.d.sync += [
+                    refi.eq(tREFI),
+                    refresh_due.eq(1),
+                ]
+
+        reset_n = Signal()
+        cke     = Signal()
+        wait    = Signal(range(max(step[-1] for step in init) + 1))
+        m.d.comb += [
+            phy.reset_n.eq(reset_n),
+            phy.cke.eq(cke),
+            # A single rank is terminated by the memory whenever it is not driving the bus.
+            phy.odt.eq(self.init_done),
+        ]
+
+        with m.FSM():
+            for index, (step_reset_n, step_cke, cmd, ba, address, cycles) in enumerate(init):
+                with m.State("INIT-{}".format(index)):
+                    m.d.sync += [
+                        reset_n.eq(step_reset_n),
+                        cke.eq(step_cke),
+                        wait.eq(wait + 1),
+                    ]
+                    if cmd is not None:
+                        with m.If(wait == 0):
+                            issue(cmd, ba, address)
+                    with m.If(wait == cycles - 1):
+                        m.d.sync += wait.eq(0)
+                        if index + 1 == len(init):
+                            m.d.sync += self.init_done.eq(1)
+                            m.next = "IDLE"
+                        else:
+                            m.next = "INIT-{}".format(index + 1)
+
+            with m.State("IDLE"):
+                with m.If(refresh_due):
+                    m.next = "PRECHARGE-ALL"
+
+                with m.Elif(port.valid & open_.bit_select(bank, 1) & (rows[bank] == row)):
+                    with m.If(port.we & (wr_any == 0) & (bank_timer(rw_timers) == 0)):
+                        issue(_CMD_WR, bank, col)
+                        m.d.comb += [
+                            port.ready.eq(1),
+                            phy.wrdata_en.eq(1),
+                            phy.wrdata.eq(port.wdata[:4 * chip.width]),
+                            phy.wrdata_mask.eq(port.wmask[:chip.width // 2]),
+                        ]
+                        m.d.sync += [
+                            wr_second.eq(1),
+                            wr_data.eq(port.wdata[4 * chip.width:]),
+                            wr_mask.eq(port.wmask[chip.width // 2:]),
+                        ]
+                        restart(wr_any, tCCD)
+                        restart(rd_any, tWTR)
+                        with m.Switch(bank):
+                            for n in range(chip.banks):
+                                with m.Case(n):
+                                    restart(pre_timers[n], tWRP)
+                    with m.Elif(~port.we & (rd_any == 0) & (bank_timer(rw_timers) == 0)):
+                        issue(_CMD_RD, bank, col)
+                        m.d.comb += [
+                            port.ready.eq(1),
+                            phy.rddata_en.eq(1),
+                        ]
+                        m.d.sync += rd_second.eq(1)
+                        restart(rd_any, tCCD)
+                        restart(wr_any, tRTW)
+                        with m.Switch(bank):
+                            for n in range(chip.banks):
+                                with m.Case(n):
+                                    restart(pre_timers[n], tRTP)
+
+                with m.Elif(port.valid & open_.bit_select(bank, 1)):
+                    with m.If(bank_timer(pre_timers) == 0):
+                        issue(_CMD_PRE, bank)
+                        m.d.sync += open_.bit_select(bank, 1).eq(0)
+                        with m.Switch(bank):
+                            for n in range(chip.banks):
+                                with m.Case(n):
+                                    restart(act_timers[n], tRP)
+
+                with m.Elif(port.valid):
+                    with m.If((act_any == 0) & (bank_timer(act_timers) == 0)):
+                        issue(_CMD_ACT, bank, row)
+                        m.d.sync += [
+                            open_.bit_select(bank, 1).eq(1),
+                            rows[bank].eq(row),
+                        ]
+                        restart(act_any, tRRD)
+                        with m.Switch(bank):
+                            for n in range(chip.banks):
+                                with m.Case(n):
+                                    restart(rw_timers[n], tRCD)
+                                    restart(pre_timers[n], tRAS)
+
+            with m.State("PRECHARGE-ALL"):
+                with m.If((Cat(*pre_timers) == 0) & (wr_any == 0) & (rd_any == 0)):
+                    issue(_CMD_PRE, 0, 1 << 10)
+                    m.d.sync += open_.eq(0)
+                    restart(act_any, tRP)
+                    m.next = "REFRESH"
+
+            with m.State("REFRESH"):
+                with m.If(act_any == 0):
+                    issue(_CMD_REF)
+                    m.d.sync += refresh_due.eq(0)
+                    restart(act_any, tRFC)
+                    m.next = "IDLE"
+
+        return m
+
+
+class DDR3(Elaboratable):
+    """DDR3 memory controller and PHY for the ``ddr3`` resource of a board.
+
+    ``pads`` is the resource, requested with ``platform.request("ddr3", dir="-")``, and
+    ``chip`` describes the memory; it defaults to the memory of the board, as returned by
+    :func:`ddr3_chip`, but then requires the platform to be given as well. The PHY is chosen
+    for the FPGA family of the platform when elaborated (:class:`ECP5DDR3PHY`,
+    :class:`Series7DDR3PHY` or :class:`GowinDDR3PHY`), and its keyword arguments are taken from
+    ``phy_kwargs``; see those classes for the clock domains they require. The ``sync`` domain
+    must run at ``clk_frequency`` Hz.
+
+    The memory is accessed through ``port``, a :class:`~amaranth_boards.memory.MemoryPort`,
+    once ``init_done`` is asserted.
+    """
+    def __init__(self, pads, *, clk_frequency, chip=None, platform=None, **phy_kwargs):
+        if chip is None:
+            if platform is None:
+                raise ValueError("Either the DDR3 memory or the platform must be given")
+            chip = ddr3_chip(platform)
+        if len(pads.dq) != chip.width:
+            raise ValueError("DDR3 resource has a {}-bit data bus, but the {} memory is {}-bit "
+                             "wide".format(len(pads.dq), chip.name, chip.width))
+
+        self.pads          = pads
+        self.chip          = chip
+        self.clk_frequency = clk_frequency
+        self.phy_kwargs    = phy_kwargs
+        self.cl, self.cwl  = chip.latencies(clk_frequency)
+
+        self.port = MemoryPort(
+            addr_width=chip.col_bits - 3 + chip.bank_bits + chip.row_bits,
+            data_width=8 * chip.width)
+        self.init_done = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        phy_cls = _PHYS[_family(platform)]
+        m.submodules.phy = phy = phy_cls(self.pads, cl=self.cl, cwl=self.cwl, **self.phy_kwargs)
+        m.submodules.controller = controller = DDR3Controller(phy, chip=self.chip,
+            clk_frequency=self.clk_frequency)
+
+        m.d.comb += [
+            controller.port.valid.eq(self.port.valid),
+            controller.port.we.eq(self.port.we),
+            controller.port.addr.eq(self.port.addr),
+            controller.port.wdata.eq(self.port.wdata),
+            controller.port.wmask.eq(self.port.wmask),
+            self.port.ready.eq(controller.port.ready),
+            self.port.rdata.eq(controller.port.rdata),
+            self.port.rvalid.eq(controller.port.rvalid),
+            self.init_done.eq(controller.init_done),
+        ]
+
+        return m
+
+
+class _BenchmarkTop(Elaboratable):
+    def elaborate(self, platform):
+        from .memory import MemoryBenchmark
+
+        m = Module()
+        for name in ("sync", "sync2x", "sync2x_dqs", "idelay_ref"):
+            m.domains += ClockDomain(name)
+        m.submodules.ddr3 = ddr3 = DDR3(platform.request("ddr3", 0, dir="-"),
+                                        clk_frequency=200e6, platform=platform)
+        m.submodules.bench = MemoryBenchmark(ddr3.port)
+        return m
+
+
+class TestCase(unittest.TestCase):
+    def test_chip(self):
+        from .arty_a7 import ArtyA7_35Platform
+        from .genesys2 import Genesys2Platform
+        from .logicbone import LogicbonePlatform
+
+        chip = ddr3_chip(ArtyA7_35Platform())
+        self.assertEqual((chip.name, chip.size, chip.row_bits), ("MT41K128M16", 2 ** 28, 14))
+        self.assertEqual(ddr3_chip(Genesys2Platform()).width, 32)
+        chip = ddr3_chip(LogicbonePlatform())
+        self.assertEqual((chip.rows, chip.width, chip.tRFC), (2 ** 16, 16, 350))
+
+        self.assertEqual(chip.latencies(100e6), (5, 5))
+        self.assertEqual(chip.latencies(200e6), (6, 5))
+        self.assertEqual(chip.latencies(400e6), (11, 8))
+        with self.assertRaisesRegex(ValueError, r"^DDR3 memory cannot run at 2400 MHz$"):
+            chip.latencies(1200e6)
+
+    def test_mode_registers(self):
+        chip = DDR3Chip("MT41K128M16", rows=16384, tRFC=160)
+        self.assertEqual([hex(mr) for mr in _mode_registers(chip, 200e6)],
+                         ["0x520", "0x4", "0x0", "0x0"])
+        self.assertEqual([hex(mr) for mr in _mode_registers(chip, 400e6)],
+                         ["0xd70", "0x4", "0x18", "0x0"])
+
+    def test_controller(self):
+        from amaranth.sim import Simulator
+        from .memory import MemoryBenchmark, bandwidth
+
+        chip = DDR3Chip("test", rows=16, cols=64)
+        phy = SimDDR3PHY(chip, clk_frequency=100e6)
+        m = Module()
+        m.submodules.phy = phy
+        m.submodules.controller = controller = DDR3Controller(phy, chip=chip,
+            clk_frequency=100e6, fast_init=True)
+        m.submodules.bench = bench = MemoryBenchmark(controller.port)
+
+        results = {}
+        async def testbench(ctx):
+            await ctx.tick().until(controller.init_done)
+            for name, write, random in (("write", 1, 0), ("read", 0, 0), ("random", 0, 1)):
+                ctx.set(bench.write, write)
+                ctx.set(bench.random, random)
+                ctx.set(bench.length, 1024)
+                ctx.set(bench.start, 1)
+                await ctx.tick()
+                ctx.set(bench.start, 0)
+                await ctx.tick().until(~bench.busy)
+                results[name] = (ctx.get(bench.cycles), ctx.get(bench.transfers),
+                                 ctx.get(bench.errors))
+            results["error"] = ctx.get(phy.error)
+            results["refreshes"] = ctx.get(phy.refreshes)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-8)
+        sim.add_testbench(testbench)
+        sim.run()
+
+        self.assertFalse(results["error"])
+        self.assertGreater(results["refreshes"], 3)
+        for name in ("write", "read", "random"):
+            cycles, transfers, errors = results[name]
+            self.assertEqual((transfers, errors), (1024, 0), name)
+        # A burst of 8 beats takes 2 cycles, for a peak of 800 MB/s at 100 MHz.
+        for name, minimum in (("write", 600), ("read", 600), ("random", 150)):
+            cycles, transfers, errors = results[name]
+            self.assertGreater(bandwidth(cycles, transfers, data_width=128, clk_frequency=100e6),
+                               minimum, name)
+
+    def test_elaborate(self):
+        from .arty_a7 import ArtyA7_35Platform
+        from .ecpix5 import ECPIX545Platform
+        from .tang_primer_20k import TangPrimer20kDockPlatform
+
+        for platform, primitive in ((ArtyA7_35Platform(), "ISERDESE2"),
+                                    (ECPIX545Platform(), "IDDRX2DQA"),
+                                    (TangPrimer20kDockPlatform(), "IDES4")):
+            with self.subTest(platform=type(platform).__name__):
+                plan = platform.prepare(_BenchmarkTop())
+                netlist = plan.files.get("top.il", plan.files.get("top.v"))
+                self.assertEqual(len(re.findall(r"\b{}\b".format(primitive), netlist)), 16)
+
+    def test_unsupported(self):
+        from .de10_nano import DE10NanoPlatform
+        with self.assertRaisesRegex(NotImplementedError,
+                r"^DDR3 memory on DE10NanoPlatform is not supported$"):
+            _family(DE10NanoPlatform())
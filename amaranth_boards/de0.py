@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import IntelPlatform
 from .resources import *
+from .programmer import QuartusProgrammer
 
 
 __all__ = ["DE0Platform"]
@@ -99,11 +97,10 @@ class DE0Platform(IntelPlatform):
             "Y7   U8   V6   V7  "),
     ]
 
-    def toolchain_program(self, products, name):
-        quartus_pgm = os.environ.get("QUARTUS_PGM", "quartus_pgm")
-        with products.extract("{}.sof".format(name)) as bitstream_filename:
-            subprocess.check_call([quartus_pgm, "--haltcc", "--mode", "JTAG",
-                                   "--operation", "P;" + bitstream_filename])
+    programmer = QuartusProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import Xc3sprogProgrammer
 
 
 __all__ = ["EBAZ4205Platform"]
@@ -29,10 +27,10 @@ class EBAZ4205Platform(XilinxPlatform):
     connectors = [
     ]
 
+    programmer = Xc3sprogProgrammer("jtaghs1_fast", position=1)
+
     def toolchain_program(self, products, name, **kwargs):
-        xc3sprog = os.environ.get("XC3SPROG", "xc3sprog")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.run([xc3sprog, "-c", "jtaghs1_fast", "-p", "1", bitstream_filename], check=True)
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeECP5Platform
 from .resources import *
+from .programmer import OpenOCDProgrammer
 
 
 __all__ = ["ECP55GEVNPlatform"]
@@ -139,14 +137,11 @@ class ECP55GEVNPlatform(LatticeECP5Platform):
             """
         }
 
-    def toolchain_program(self, products, name):
-        openocd = os.environ.get("OPENOCD", "openocd")
-        with products.extract("{}-openocd.cfg".format(name), "{}.svf".format(name)) \
-                as (config_filename, vector_filename):
-            subprocess.check_call([openocd,
-                "-f", config_filename,
-                "-c", "transport select jtag; init; svf -quiet {}; exit".format(vector_filename)
-            ])
+    programmer = OpenOCDProgrammer(["svf -quiet {bitstream}"],
+        setup=["transport select jtag"], config="{name}-openocd.cfg", bitstream="{name}.svf")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
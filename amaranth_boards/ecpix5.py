@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeECP5Platform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 
 __all__ = ["ECPIX585Platform", "ECPIX545Platform"]
@@ -121,11 +119,10 @@ class _ECPIX5Platform(LatticeECP5Platform):
         Connector("pmod", 7, "D14 B14 E14 B16 - - C14 A14 A15 A16 - -"),
     ]
 
-    def toolchain_program(self, products, name):
-        import os, subprocess
-        tool = os.environ.get("OPENFPGALOADER", "openFPGALoader")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([tool, '-c', 'ft2232', '-m', bitstream_filename])
+    programmer = OpenFPGALoaderProgrammer(cable="ft2232", sram=True)
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 class ECPIX545Platform(_ECPIX5Platform):
     device      = "LFE5UM5G-45F"
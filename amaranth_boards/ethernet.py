@@ -0,0 +1,1043 @@
+import zlib
+import struct
+import unittest
+from functools import reduce
+from operator import xor
+
+from amaranth import *
+from amaranth.lib import io
+
+
+__all__ = [
+    "EthernetPHY", "RGMIIPHY", "MIIPHY", "RMIIPHY", "ethernet_phy", "EthernetMAC",
+    "UDPTransmitter", "UDPReceiver", "UDPBenchmark",
+]
+
+
+def _crc32_terms():
+    # The CRC-32 of Ethernet is linear in the previous CRC and the data, so each bit of the next
+    # CRC is the XOR of some bits of each.
+    def step(crc, byte):
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ (0xedb88320 if crc & 1 else 0)
+        return crc
+    terms = [([], []) for _ in range(32)]
+    for bit in range(32):
+        value = step(1 << bit, 0)
+        for out in range(32):
+            if value >> out & 1:
+                terms[out][0].append(bit)
+    for bit in range(8):
+        value = step(0, 1 << bit)
+        for out in range(32):
+            if value >> out & 1:
+                terms[out][1].append(bit)
+    return terms
+
+
+_CRC32_TERMS = _crc32_terms()
+
+# Value of the CRC register after a frame and its correct FCS.
+_CRC32_RESIDUE = 0xdebb20e3
+
+
+def _crc32_next(crc, byte):
+    return Cat(reduce(xor, [crc[bit] for bit in crc_bits] + [byte[bit] for bit in byte_bits])
+               for crc_bits, byte_bits in _CRC32_TERMS)
+
+
+def _subsignal(pads, *names):
+    # Boards disagree on the names of some subsignals, e.g. `tx_ctl` and `tx_ctrl`.
+    for name in names:
+        if hasattr(pads, name):
+            return getattr(pads, name)
+    raise AttributeError("Ethernet resource has none of the subsignals {}"
+                         .format(", ".join(names)))
+
+
+def _bytes_be(value, count):
+    return [value[8 * (count - 1 - n):8 * (count - n)] for n in range(count)]
+
+
+_PREAMBLE = 0x55
+_SFD      = 0xd5
+
+
+class EthernetPHY(Elaboratable):
+    """Byte-wide interface to an Ethernet PHY, common to every media-independent interface.
+
+    Transmission is in the ``tx_domain`` clock domain. In each cycle in which ``tx_ready`` is
+    asserted, ``tx_data`` is sent, as part of a frame if ``tx_en`` is asserted and as idle
+    otherwise. Reception is in the ``rx_domain`` clock domain: ``rx_dv`` is asserted during a
+    frame, starting at the latest with its start frame delimiter, and its bytes are ``rx_data``
+    in the cycles in which ``rx_valid`` is asserted; ``rx_er`` is asserted with the bytes the
+    PHY received with an error.
+
+    The clock domains clocked by the PHY must be defined by the design, e.g. with
+    ``m.domains.eth_rx = ClockDomain()``; the PHY only drives their clock.
+    """
+    def __init__(self, *, tx_domain, rx_domain):
+        self.tx_domain = tx_domain
+        self.rx_domain = rx_domain
+
+        self.tx_data  = Signal(8)
+        self.tx_en    = Signal()
+        self.tx_ready = Signal()
+        self.rx_data  = Signal(8)
+        self.rx_dv    = Signal()
+        self.rx_er    = Signal()
+        self.rx_valid = Signal()
+
+    def _release_reset(self, m, pads):
+        if hasattr(pads, "rst"):
+            m.submodules.rst = rst = io.Buffer("o", pads.rst)
+            m.d.comb += rst.o.eq(0)
+
+
+class RGMIIPHY(EthernetPHY):
+    """Gigabit PHY connected through RGMII.
+
+    ``pads`` is an ``eth_rgmii`` resource. The ``rx_domain`` clock domain is clocked by the
+    receive clock of the PHY; the ``tx_domain`` clock domain must be provided, and run at
+    125 MHz. Both directions transfer a byte in every cycle, using the DDR I/O
+    buffers of the FPGA.
+
+    The transmit clock is sent edge-aligned with the data, and the receive data is sampled
+    with the receive clock, so the PHY must delay both clocks (RGMII-ID), which is the default,
+    or a strap option, of most gigabit PHYs.
+    """
+    def __init__(self, pads, *, tx_domain="eth_tx", rx_domain="eth_rx"):
+        super().__init__(tx_domain=tx_domain, rx_domain=rx_domain)
+        self.pads = pads
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads = self.pads
+        self._release_reset(m, pads)
+
+        m.submodules.rx_clk = rx_clk = io.Buffer("i", pads.rx_clk)
+        m.d.comb += ClockSignal(self.rx_domain).eq(rx_clk.i)
+        if platform is not None:
+            platform.add_clock_constraint(rx_clk.i, 125e6)
+
+        # The low nibble and RX_DV are sent on the rising edge, and the high nibble and
+        # RX_DV XOR RX_ER on the falling edge.
+        m.submodules.rx_data = rx_data = io.DDRBuffer("i", pads.rx_data,
+                                                      i_domain=self.rx_domain)
+        m.submodules.rx_ctl = rx_ctl = io.DDRBuffer("i", _subsignal(pads, "rx_ctl", "rx_ctrl"),
+                                                    i_domain=self.rx_domain)
+        m.d.comb += [
+            self.rx_data.eq(Cat(rx_data.i[0], rx_data.i[1])),
+            self.rx_dv.eq(rx_ctl.i[0]),
+            self.rx_er.eq(rx_ctl.i[0] ^ rx_ctl.i[1]),
+            self.rx_valid.eq(1),
+        ]
+
+        m.submodules.tx_clk = tx_clk = io.DDRBuffer("o", pads.tx_clk, o_domain=self.tx_domain)
+        m.submodules.tx_data = tx_data = io.DDRBuffer("o", pads.tx_data,
+                                                      o_domain=self.tx_domain)
+        m.submodules.tx_ctl = tx_ctl = io.DDRBuffer("o", _subsignal(pads, "tx_ctl", "tx_ctrl"),
+                                                    o_domain=self.tx_domain)
+        m.d.comb += [
+            tx_clk.o[0].eq(1),
+            tx_clk.o[1].eq(0),
+            tx_data.o[0].eq(self.tx_data[:4]),
+            tx_data.o[1].eq(self.tx_data[4:]),
+            tx_ctl.o[0].eq(self.tx_en),
+            tx_ctl.o[1].eq(self.tx_en),
+            self.tx_ready.eq(1),
+        ]
+
+        return m
+
+
+class MIIPHY(EthernetPHY):
+    """10/100 Mbit PHY connected through MII.
+
+    ``pads`` is an ``eth_mii`` resource. The ``tx_domain`` and ``rx_domain`` clock domains are
+    clocked by the transmit and receive clocks of the PHY; a byte is transferred
+    every other cycle. If the PHY is clocked by the FPGA, ``ref_clk`` is the pin of its
+    25 MHz reference clock, which is driven by the ``ref_domain`` clock domain; it must be
+    provided.
+    """
+    def __init__(self, pads, *, tx_domain="eth_tx", rx_domain="eth_rx", ref_clk=None,
+                 ref_domain="eth_ref"):
+        super().__init__(tx_domain=tx_domain, rx_domain=rx_domain)
+        self.pads       = pads
+        self.ref_clk    = ref_clk
+        self.ref_domain = ref_domain
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads = self.pads
+        self._release_reset(m, pads)
+
+        if self.ref_clk is not None:
+            m.submodules.ref_clk = ref_clk = io.DDRBuffer("o", self.ref_clk,
+                                                          o_domain=self.ref_domain)
+            m.d.comb += [
+                ref_clk.o[0].eq(1),
+                ref_clk.o[1].eq(0),
+            ]
+
+        for name, domain in (("tx_clk", self.tx_domain), ("rx_clk", self.rx_domain)):
+            m.submodules[name] = clk = io.Buffer("i", getattr(pads, name))
+            m.d.comb += ClockSignal(domain).eq(clk.i)
+            if platform is not None:
+                platform.add_clock_constraint(clk.i, 25e6)
+
+        tx = m.d[self.tx_domain]
+        m.submodules.tx_data = tx_data = io.FFBuffer("o", pads.tx_data, o_domain=self.tx_domain)
+        m.submodules.tx_en = tx_en = io.FFBuffer("o", pads.tx_en, o_domain=self.tx_domain)
+        tx_high = Signal(4)
+        tx_hold = Signal()
+        tx_odd  = Signal()
+        tx += tx_odd.eq(~tx_odd)
+        with m.If(~tx_odd):
+            m.d.comb += self.tx_ready.eq(1)
+            tx += [
+                tx_high.eq(self.tx_data[4:]),
+                tx_hold.eq(self.tx_en),
+            ]
+        m.d.comb += [
+            tx_data.o.eq(Mux(tx_odd, tx_high, self.tx_data[:4])),
+            tx_en.o.eq(Mux(tx_odd, tx_hold, self.tx_en)),
+        ]
+
+        rx = m.d[self.rx_domain]
+        m.submodules.rx_data = rx_data = io.FFBuffer("i", pads.rx_data, i_domain=self.rx_domain)
+        m.submodules.rx_dv = rx_dv = io.FFBuffer("i", pads.rx_dv, i_domain=self.rx_domain)
+        rx_er = C(0)
+        if hasattr(pads, "rx_er"):
+            m.submodules.rx_er = rx_er_buf = io.FFBuffer("i", pads.rx_er,
+                                                         i_domain=self.rx_domain)
+            rx_er = rx_er_buf.i
+
+        # Nibbles are paired into bytes starting with the start frame delimiter, in case the
+        # PHY dropped a nibble of the preamble.
+        rx_low = Signal(4)
+        rx_odd = Signal()
+        rx += self.rx_valid.eq(0)
+        with m.If(~rx_dv.i):
+            rx += self.rx_dv.eq(0)
+        with m.Elif(~self.rx_dv):
+            with m.If(rx_data.i == _SFD >> 4):
+                rx += [
+                    self.rx_dv.eq(1),
+                    self.rx_data.eq(_SFD),
+                    self.rx_er.eq(rx_er),
+                    self.rx_valid.eq(1),
+                    rx_odd.eq(0),
+                ]
+        with m.Else():
+            rx += rx_odd.eq(~rx_odd)
+            with m.If(~rx_odd):
+                rx += rx_low.eq(rx_data.i)
+            with m.Else():
+                rx += [
+                    self.rx_data.eq(Cat(rx_low, rx_data.i)),
+                    self.rx_er.eq(rx_er),
+                    self.rx_valid.eq(1),
+                ]
+
+        return m
+
+
+class RMIIPHY(EthernetPHY):
+    """100 Mbit PHY connected through RMII.
+
+    ``pads`` is an ``eth_rmii`` resource. Both directions are in the ``domain`` clock domain,
+    which runs at 50 MHz, and a byte is transferred every fourth cycle. ``ref_clk`` is the
+    pin of the 50 MHz reference clock, if it is connected to the FPGA: if it is an input, the
+    clock domain is clocked by it, and otherwise it is driven by the clock domain,
+    which must be provided.
+    """
+    def __init__(self, pads, *, domain="eth", ref_clk=None):
+        super().__init__(tx_domain=domain, rx_domain=domain)
+        self.pads    = pads
+        self.domain  = domain
+        self.ref_clk = ref_clk
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads = self.pads
+        self._release_reset(m, pads)
+
+        if self.ref_clk is not None and self.ref_clk.direction == io.Direction.Input:
+            m.submodules.ref_clk = ref_clk = io.Buffer("i", self.ref_clk)
+            m.d.comb += ClockSignal(self.domain).eq(ref_clk.i)
+            if platform is not None:
+                platform.add_clock_constraint(ref_clk.i, 50e6)
+        elif self.ref_clk is not None:
+            m.submodules.ref_clk = ref_clk = io.DDRBuffer("o", self.ref_clk,
+                                                          o_domain=self.domain)
+            m.d.comb += [
+                ref_clk.o[0].eq(1),
+                ref_clk.o[1].eq(0),
+            ]
+
+        sync = m.d[self.domain]
+
+        m.submodules.tx_data = tx_data = io.FFBuffer("o", pads.tx_data, o_domain=self.domain)
+        m.submodules.tx_en = tx_en = io.FFBuffer("o", pads.tx_en, o_domain=self.domain)
+        tx_dibit = Signal(2)
+        tx_shreg = Signal(6)
+        tx_hold  = Signal()
+        sync += tx_dibit.eq(tx_dibit + 1)
+        with m.If(tx_dibit == 0):
+            m.d.comb += [
+                self.tx_ready.eq(1),
+                tx_data.o.eq(self.tx_data[:2]),
+                tx_en.o.eq(self.tx_en),
+            ]
+            sync += [
+                tx_shreg.eq(self.tx_data[2:]),
+                tx_hold.eq(self.tx_en),
+            ]
+        with m.Else():
+            m.d.comb += [
+                tx_data.o.eq(tx_shreg[:2]),
+                tx_en.o.eq(tx_hold),
+            ]
+            sync += tx_shreg.eq(tx_shreg >> 2)
+
+        m.submodules.rx_data = rx_data = io.FFBuffer("i", pads.rx_data, i_domain=self.domain)
+        m.submodules.crs_dv = crs_dv = io.FFBuffer("i", _subsignal(pads, "rx_crs_dv", "rx_crs"),
+                                                   i_domain=self.domain)
+        rx_er = C(0)
+        if hasattr(pads, "rx_er"):
+            m.submodules.rx_er = rx_er_buf = io.FFBuffer("i", pads.rx_er, i_domain=self.domain)
+            rx_er = rx_er_buf.i
+
+        # Dibits are grouped into bytes starting with the last dibit of the start frame
+        # delimiter. Once the carrier is lost, CRS_DV is low for the first dibit of each nibble
+        # the PHY still has to send, and high for the second one, so the frame only ends once
+        # it is low for two dibits in a row.
+        rx_dibit  = Signal(2)
+        rx_shreg  = Signal(6)
+        rx_crs_dv = Signal()
+        sync += [
+            self.rx_valid.eq(0),
+            rx_crs_dv.eq(crs_dv.i),
+        ]
+        with m.If(~self.rx_dv):
+            with m.If(crs_dv.i & (rx_data.i == _SFD >> 6)):
+                sync += [
+                    self.rx_dv.eq(1),
+                    self.rx_data.eq(_SFD),
+                    self.rx_er.eq(rx_er),
+                    self.rx_valid.eq(1),
+                    rx_dibit.eq(0),
+                ]
+        with m.Elif(~crs_dv.i & ~rx_crs_dv):
+            sync += self.rx_dv.eq(0)
+        with m.Else():
+            sync += [
+                rx_dibit.eq(rx_dibit + 1),
+                rx_shreg.eq(Cat(rx_shreg[2:], rx_data.i)),
+            ]
+            with m.If(rx_dibit == 3):
+                sync += [
+                    self.rx_data.eq(Cat(rx_shreg, rx_data.i)),
+                    self.rx_er.eq(rx_er),
+                    self.rx_valid.eq(1),
+                ]
+
+        return m
+
+
+def ethernet_phy(platform, number=0):
+    """Return an :class:`EthernetPHY` for the Ethernet PHY ``number`` of ``platform``, using the
+    fastest interface the board provides, and requesting its resources.
+    """
+    def has(name):
+        return (name, number) in platform.resources
+
+    if has("eth_rgmii"):
+        return RGMIIPHY(platform.request("eth_rgmii", number, dir="-"))
+    if has("eth_mii"):
+        ref_clk = platform.request("eth_clk25", number, dir="-") if has("eth_clk25") else None
+        return MIIPHY(platform.request("eth_mii", number, dir="-"), ref_clk=ref_clk)
+    if has("eth_rmii"):
+        ref_clk = platform.request("eth_clk50", number, dir="-") if has("eth_clk50") else None
+        return RMIIPHY(platform.request("eth_rmii", number, dir="-"), ref_clk=ref_clk)
+    raise NotImplementedError("{} has no RGMII, MII or RMII Ethernet PHY"
+                              .format(type(platform).__name__))
+
+
+class EthernetMAC(Elaboratable):
+    """Ethernet MAC for ``phy``, an :class:`EthernetPHY`.
+
+    Frames to send are written, without preamble and frame check sequence, in the
+    ``tx_domain`` of the PHY: ``tx_data`` is taken in each cycle in which ``tx_valid`` and
+    ``tx_ready`` are asserted, and ``tx_last`` is asserted with the last byte of a frame.
+    ``tx_valid`` must stay asserted until the end of the frame, since the PHY cannot wait.
+    Frames are padded to the minimum length, and followed by the minimum inter-frame gap.
+
+    Frames received are read, without preamble and frame check sequence, in the ``rx_domain``
+    of the PHY: ``rx_data`` is valid in each cycle in which ``rx_valid`` is asserted, and
+    ``rx_last`` is asserted with the last byte of a frame, together with ``rx_error`` if the
+    frame was too short, had a wrong frame check sequence, or was received with an error.
+    """
+    def __init__(self, phy):
+        self.phy = phy
+
+        self.tx_data  = Signal(8)
+        self.tx_valid = Signal()
+        self.tx_last  = Signal()
+        self.tx_ready = Signal()
+
+        self.rx_data  = Signal(8)
+        self.rx_valid = Signal()
+        self.rx_last  = Signal()
+        self.rx_error = Signal()
+
+        self.tx_frames = Signal(32)
+        self.rx_frames = Signal(32)
+        self.rx_errors = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        phy = self.phy
+        m.submodules.phy = phy
+
+        tx = m.d[phy.tx_domain]
+        tx_crc   = Signal(32)
+        tx_count = Signal(range(60))
+        with m.FSM(domain=phy.tx_domain):
+            with m.State("IDLE"):
+                with m.If(self.tx_valid):
+                    tx += tx_count.eq(0)
+                    m.next = "PREAMBLE"
+
+            with m.State("PREAMBLE"):
+                m.d.comb += [
+                    phy.tx_en.eq(1),
+                    phy.tx_data.eq(Mux(tx_count == 7, _SFD, _PREAMBLE)),
+                ]
+                with m.If(phy.tx_ready):
+                    tx += tx_count.eq(tx_count + 1)
+                    with m.If(tx_count == 7):
+                        tx += [
+                            tx_count.eq(0),
+                            tx_crc.eq(0xffffffff),
+                        ]
+                        m.next = "DATA"
+
+            with m.State("DATA"):
+                m.d.comb += [
+                    phy.tx_en.eq(1),
+                    phy.tx_data.eq(self.tx_data),
+                    self.tx_ready.eq(phy.tx_ready),
+                ]
+                with m.If(phy.tx_ready):
+                    tx += tx_crc.eq(_crc32_next(tx_crc, self.tx_data))
+                    with m.If(tx_count != 59):
+                        tx += tx_count.eq(tx_count + 1)
+                    with m.If(self.tx_last):
+                        with m.If(tx_count == 59):
+                            tx += tx_count.eq(0)
+                            m.next = "FCS"
+                        with m.Else():
+                            m.next = "PAD"
+
+            with m.State("PAD"):
+                m.d.comb += phy.tx_en.eq(1)
+                with m.If(phy.tx_ready):
+                    tx += [
+                        tx_crc.eq(_crc32_next(tx_crc, C(0, 8))),
+                        tx_count.eq(tx_count + 1),
+                    ]
+                    with m.If(tx_count == 59):
+                        tx += tx_count.eq(0)
+                        m.next = "FCS"
+
+            with m.State("FCS"):
+                m.d.comb += [
+                    phy.tx_en.eq(1),
+                    phy.tx_data.eq(~tx_crc.word_select(tx_count[:2], 8)),
+                ]
+                with m.If(phy.tx_ready):
+                    tx += tx_count.eq(tx_count + 1)
+                    with m.If(tx_count == 3):
+                        tx += [
+                            tx_count.eq(0),
+                            self.tx_frames.eq(self.tx_frames + 1),
+                        ]
+                        m.next = "GAP"
+
+            with m.State("GAP"):
+                with m.If(phy.tx_ready):
+                    tx += tx_count.eq(tx_count + 1)
+                    with m.If(tx_count == 11):
+                        tx += tx_count.eq(0)
+                        with m.If(self.tx_valid):
+                            m.next = "PREAMBLE"
+                        with m.Else():
+                            m.next = "IDLE"
+
+        # The last 4 bytes received are the frame check sequence, and the byte before them is
+        # held until the end of the frame is known, so that it can be marked as the last one.
+        rx = m.d[phy.rx_domain]
+        rx_crc   = Signal(32)
+        rx_count = Signal(range(65))
+        rx_error = Signal()
+        rx_delay = [Signal(8, name="rx_delay{}".format(n)) for n in range(5)]
+        rx += self.rx_valid.eq(0)
+        with m.FSM(domain=phy.rx_domain):
+            with m.State("IDLE"):
+                with m.If(phy.rx_dv & phy.rx_valid):
+                    with m.If(phy.rx_data == _SFD):
+                        rx += [
+                            rx_crc.eq(0xffffffff),
+                            rx_count.eq(0),
+                            rx_error.eq(phy.rx_er),
+                        ]
+                        m.next = "FRAME"
+                    with m.Elif(phy.rx_data != _PREAMBLE):
+                        m.next = "DISCARD"
+
+            with m.State("FRAME"):
+                with m.If(~phy.rx_dv):
+                    with m.If(rx_count >= 5):
+                        ok = ~rx_error & (rx_count == 64) & (rx_crc == _CRC32_RESIDUE)
+                        rx += [
+                            self.rx_data.eq(rx_delay[4]),
+                            self.rx_valid.eq(1),
+                            self.rx_last.eq(1),
+                            self.rx_error.eq(~ok),
+                        ]
+                        with m.If(ok):
+                            rx += self.rx_frames.eq(self.rx_frames + 1)
+                        with m.Else():
+                            rx += self.rx_errors.eq(self.rx_errors + 1)
+                    m.next = "IDLE"
+                with m.Elif(phy.rx_valid):
+                    rx += [
+                        rx_crc.eq(_crc32_next(rx_crc, phy.rx_data)),
+                        rx_error.eq(rx_error | phy.rx_er),
+                        Cat(rx_delay).eq(Cat(phy.rx_data, Cat(rx_delay[:4]))),
+                    ]
+                    with m.If(rx_count != 64):
+                        rx += rx_count.eq(rx_count + 1)
+                    with m.If(rx_count >= 5):
+                        rx += [
+                            self.rx_data.eq(rx_delay[4]),
+                            self.rx_valid.eq(1),
+                            self.rx_last.eq(0),
+                            self.rx_error.eq(0),
+                        ]
+
+            with m.State("DISCARD"):
+                with m.If(~phy.rx_dv):
+                    m.next = "IDLE"
+
+        return m
+
+
+_ETHERTYPE_IPV4 = 0x0800
+_IP_PROTOCOL_UDP = 17
+
+# Length of the Ethernet, IPv4 and UDP headers.
+_HEADER_LENGTH = 14 + 20 + 8
+
+
+class UDPTransmitter(Elaboratable):
+    """Send UDP datagrams over ``mac``, an :class:`EthernetMAC`.
+
+    The datagrams are sent from ``src_port`` of ``src_ip`` at ``src_mac`` to ``dst_port`` of
+    ``dst_ip`` at ``dst_mac``, which are signals initialized from the arguments of the same
+    names and may be changed between datagrams. The headers, including the IPv4 header checksum,
+    are generated in hardware; the UDP checksum is not used.
+
+    The payload is written in the ``tx_domain`` of the PHY: ``data`` is taken in each cycle in
+    which ``valid`` and ``ready`` are asserted, and ``length`` is the length of the payload in
+    bytes, at least 1, sampled with its first byte. As for :class:`EthernetMAC`, ``valid`` must
+    stay asserted until the end of the datagram; the payload is typically read from a FIFO
+    holding at least one datagram.
+    """
+    def __init__(self, mac, *, src_mac, src_ip, dst_mac, dst_ip, src_port, dst_port):
+        self.mac = mac
+
+        self.src_mac  = Signal(48, init=src_mac)
+        self.src_ip   = Signal(32, init=src_ip)
+        self.src_port = Signal(16, init=src_port)
+        self.dst_mac  = Signal(48, init=dst_mac)
+        self.dst_ip   = Signal(32, init=dst_ip)
+        self.dst_port = Signal(16, init=dst_port)
+
+        self.data   = Signal(8)
+        self.valid  = Signal()
+        self.ready  = Signal()
+        self.length = Signal(16)
+
+        self.datagrams = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        mac = self.mac
+        tx  = m.d[mac.phy.tx_domain]
+
+        length   = Signal(16)
+        ident    = Signal(16)
+        checksum = Signal(32)
+        step     = Signal(range(13))
+        index    = Signal(range(_HEADER_LENGTH))
+
+        ip_length  = (length + 28)[:16]
+        udp_length = (length + 8)[:16]
+        ip_words = [
+            C(0x4500, 16), ip_length, ident, C(0x4000, 16), C(64 << 8 | _IP_PROTOCOL_UDP, 16),
+            self.src_ip[16:], self.src_ip[:16], self.dst_ip[16:], self.dst_ip[:16],
+        ]
+        header = Array([
+            *_bytes_be(self.dst_mac, 6), *_bytes_be(self.src_mac, 6),
+            *_bytes_be(C(_ETHERTYPE_IPV4, 16), 2),
+            C(0x45, 8), C(0, 8), *_bytes_be(ip_length, 2), *_bytes_be(ident, 2),
+            C(0x40, 8), C(0, 8), C(64, 8), C(_IP_PROTOCOL_UDP, 8),
+            *_bytes_be(~checksum[:16], 2), *_bytes_be(self.src_ip, 4), *_bytes_be(self.dst_ip, 4),
+            *_bytes_be(self.src_port, 2), *_bytes_be(self.dst_port, 2),
+            *_bytes_be(udp_length, 2), C(0, 8), C(0, 8),
+        ])
+
+        # The IPv4 header checksum is summed one word per cycle, and is ready long before the
+        # MAC sends its byte, after the preamble and the 24 bytes before it.
+        with m.If(step < len(ip_words)):
+            tx += [
+                checksum.eq(checksum + Array(ip_words)[step]),
+                step.eq(step + 1),
+            ]
+        with m.Elif(step < len(ip_words) + 2):
+            tx += [
+                checksum.eq(checksum[:16] + checksum[16:]),
+                step.eq(step + 1),
+            ]
+
+        with m.FSM(domain=mac.phy.tx_domain):
+            with m.State("IDLE"):
+                with m.If(self.valid):
+                    tx += [
+                        length.eq(self.length),
+                        checksum.eq(0),
+                        step.eq(0),
+                        index.eq(0),
+                    ]
+                    m.next = "HEADER"
+
+            with m.State("HEADER"):
+                m.d.comb += [
+                    mac.tx_data.eq(header[index]),
+                    mac.tx_valid.eq(1),
+                ]
+                with m.If(mac.tx_ready):
+                    tx += index.eq(index + 1)
+                    with m.If(index == _HEADER_LENGTH - 1):
+                        m.next = "PAYLOAD"
+
+            with m.State("PAYLOAD"):
+                m.d.comb += [
+                    mac.tx_data.eq(self.data),
+                    mac.tx_valid.eq(self.valid),
+                    mac.tx_last.eq(length == 1),
+                    self.ready.eq(mac.tx_ready),
+                ]
+                with m.If(self.valid & mac.tx_ready):
+                    tx += length.eq(length - 1)
+                    with m.If(length == 1):
+                        tx += [
+                            ident.eq(ident + 1),
+                            self.datagrams.eq(self.datagrams + 1),
+                        ]
+                        m.next = "IDLE"
+
+        return m
+
+
+class UDPReceiver(Elaboratable):
+    """Receive UDP datagrams from ``mac``, an :class:`EthernetMAC`.
+
+    Datagrams are received if they are sent to ``local_port`` of ``local_ip``, at ``local_mac``
+    or the broadcast address; these are signals initialized from the arguments of the same
+    names. Other frames, including ARP requests, are dropped: the host must be given a static
+    ARP entry for ``local_ip`` (e.g. with ``ip neigh add``).
+
+    The payload is read in the ``rx_domain`` of the PHY: ``data`` is valid in each cycle in
+    which ``valid`` is asserted, and ``last`` is asserted with its last byte, together with
+    ``error`` if the frame was received with an error, in which case the datagram should be
+    discarded. ``src_ip`` and ``src_port`` are those of the datagram being received.
+    """
+    def __init__(self, mac, *, local_mac, local_ip, local_port):
+        self.mac = mac
+
+        self.local_mac  = Signal(48, init=local_mac)
+        self.local_ip   = Signal(32, init=local_ip)
+        self.local_port = Signal(16, init=local_port)
+
+        self.data     = Signal(8)
+        self.valid    = Signal()
+        self.last     = Signal()
+        self.error    = Signal()
+        self.src_ip   = Signal(32)
+        self.src_port = Signal(16)
+
+        self.datagrams = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        mac = self.mac
+        rx  = m.d[mac.phy.rx_domain]
+
+        header = Signal(_HEADER_LENGTH * 8)
+        index  = Signal(range(_HEADER_LENGTH + 1))
+        seen   = Signal(16)
+
+        def field(offset, size):
+            # Header fields are big-endian.
+            return Cat(*reversed([header.word_select(offset + n, 8) for n in range(size)]))
+
+        dst_mac    = field(0, 6)
+        udp_length = field(38, 2)
+        match = (((dst_mac == self.local_mac) | (dst_mac == 2 ** 48 - 1)) &
+                 (field(12, 2) == _ETHERTYPE_IPV4) &
+                 (field(14, 1) == 0x45) &
+                 (field(23, 1) == _IP_PROTOCOL_UDP) &
+                 (field(30, 4) == self.local_ip) &
+                 (field(36, 2) == self.local_port))
+        m.d.comb += [
+            self.src_ip.eq(field(26, 4)),
+            self.src_port.eq(field(34, 2)),
+        ]
+
+        # The last byte of the payload is held until the end of the frame, which carries the
+        # error flag, is known.
+        pending       = Signal(8)
+        pending_valid = Signal()
+        flush         = Signal()
+        error         = Signal()
+
+        rx += [
+            self.valid.eq(0),
+            flush.eq(0),
+        ]
+        with m.If(mac.rx_valid):
+            with m.If(index != _HEADER_LENGTH):
+                rx += [
+                    header.word_select(index, 8).eq(mac.rx_data),
+                    index.eq(index + 1),
+                    seen.eq(0),
+                ]
+            with m.Elif(match & (seen + 8 < udp_length)):
+                rx += [
+                    seen.eq(seen + 1),
+                    pending.eq(mac.rx_data),
+                    pending_valid.eq(1),
+                ]
+                with m.If(pending_valid):
+                    rx += [
+                        self.data.eq(pending),
+                        self.valid.eq(1),
+                        self.last.eq(0),
+                        self.error.eq(0),
+                    ]
+            with m.If(mac.rx_last):
+                rx += [
+                    index.eq(0),
+                    flush.eq(1),
+                    error.eq(mac.rx_error),
+                ]
+
+        with m.If(flush & pending_valid):
+            rx += [
+                self.data.eq(pending),
+                self.valid.eq(1),
+                self.last.eq(1),
+                self.error.eq(error),
+                pending_valid.eq(0),
+            ]
+            with m.If(~error):
+                rx += self.datagrams.eq(self.datagrams + 1)
+
+        return m
+
+
+class UDPBenchmark(Elaboratable):
+    """Stream UDP datagrams at line rate through ``phy``, an :class:`EthernetPHY`, and count the
+    ones received.
+
+    While ``enable`` is asserted, datagrams of ``payload_length`` bytes are sent back to back
+    from ``port`` of ``local_ip`` to ``port`` of ``remote_ip``; each starts with a 32-bit
+    big-endian sequence number, followed by a counting pattern. ``tx_datagrams`` counts them,
+    and ``tx_cycles`` counts the cycles of the ``tx_domain`` of the PHY during which ``enable``
+    was asserted.
+
+    Datagrams received on ``port`` of ``local_ip`` are counted in ``rx_datagrams``, and their
+    payload bytes in ``rx_bytes``; ``rx_errors`` counts the datagrams received with an error,
+    and ``rx_lost`` the datagrams missing from the sequence, if they come from another
+    benchmark. On a board, sending to the host and observing the stream with e.g. ``iperf`` or
+    a packet capture measures the throughput of the link.
+    """
+    def __init__(self, phy, *, local_mac, local_ip, remote_mac, remote_ip, port=5000,
+                 payload_length=1472):
+        if not 4 <= payload_length <= 1472:
+            raise ValueError("UDP benchmark payload length must be between 4 and 1472 bytes, "
+                             "not {}".format(payload_length))
+
+        self.mac = EthernetMAC(phy)
+        self.tx  = UDPTransmitter(self.mac, src_mac=local_mac, src_ip=local_ip,
+                                  dst_mac=remote_mac, dst_ip=remote_ip,
+                                  src_port=port, dst_port=port)
+        self.rx  = UDPReceiver(self.mac, local_mac=local_mac, local_ip=local_ip,
+                               local_port=port)
+        self.payload_length = payload_length
+
+        self.enable = Signal(init=1)
+
+        self.tx_datagrams = self.tx.datagrams
+        self.tx_cycles    = Signal(48)
+        self.rx_datagrams = Signal(32)
+        self.rx_bytes     = Signal(48)
+        self.rx_errors    = Signal(32)
+        self.rx_lost      = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.mac = mac = self.mac
+        m.submodules.tx  = tx  = self.tx
+        m.submodules.rx  = rx  = self.rx
+        tx_domain, rx_domain = mac.phy.tx_domain, mac.phy.rx_domain
+
+        sequence = Signal(32)
+        offset   = Signal(range(self.payload_length))
+        m.d.comb += [
+            tx.valid.eq(self.enable | (offset != 0)),
+            tx.length.eq(self.payload_length),
+            tx.data.eq(Mux(offset < 4, Array(_bytes_be(sequence, 4))[offset[:2]], offset[:8])),
+        ]
+        with m.If(self.enable):
+            m.d[tx_domain] += self.tx_cycles.eq(self.tx_cycles + 1)
+        with m.If(tx.valid & tx.ready):
+            m.d[tx_domain] += offset.eq(offset + 1)
+            with m.If(offset == self.payload_length - 1):
+                m.d[tx_domain] += [
+                    offset.eq(0),
+                    sequence.eq(sequence + 1),
+                ]
+
+        rx_sequence = Signal(32)
+        expected    = Signal(32)
+        rx_offset   = Signal(range(5))
+        with m.If(rx.valid):
+            m.d[rx_domain] += self.rx_bytes.eq(self.rx_bytes + 1)
+            with m.If(rx_offset < 4):
+                m.d[rx_domain] += [
+                    rx_sequence.eq(Cat(rx.data, rx_sequence)),
+                    rx_offset.eq(rx_offset + 1),
+                ]
+            with m.If(rx.last):
+                m.d[rx_domain] += rx_offset.eq(0)
+                with m.If(rx.error):
+                    m.d[rx_domain] += self.rx_errors.eq(self.rx_errors + 1)
+                with m.Else():
+                    m.d[rx_domain] += [
+                        self.rx_datagrams.eq(self.rx_datagrams + 1),
+                        self.rx_lost.eq(self.rx_lost + (rx_sequence - expected)),
+                        expected.eq(rx_sequence + 1),
+                    ]
+
+        return m
+
+
+class _LoopbackPHY(EthernetPHY):
+    # PHY whose transmitter is connected to its receiver, transferring a byte every `interval`
+    # cycles of the `sync` domain.
+    def __init__(self, interval=1):
+        super().__init__(tx_domain="sync", rx_domain="sync")
+        self.interval = interval
+
+    def elaborate(self, platform):
+        m = Module()
+        phase = Signal(range(self.interval))
+        if self.interval > 1:
+            m.d.sync += phase.eq(Mux(phase == self.interval - 1, 0, phase + 1))
+        m.d.comb += self.tx_ready.eq(phase == 0)
+        m.d.sync += self.rx_valid.eq(self.tx_ready & self.tx_en)
+        with m.If(self.tx_ready):
+            m.d.sync += [
+                self.rx_data.eq(self.tx_data),
+                self.rx_dv.eq(self.tx_en),
+            ]
+        return m
+
+
+class TestCase(unittest.TestCase):
+    LOCAL_MAC  = 0x02_00_00_00_00_01
+    REMOTE_MAC = 0x02_00_00_00_00_02
+    LOCAL_IP   = 0xc0_a8_01_32 # 192.168.1.50
+    REMOTE_IP  = 0xc0_a8_01_01 # 192.168.1.1
+
+    def test_crc(self):
+        from amaranth.sim import Simulator
+
+        frame = bytes(range(60))
+        crc = Signal(32, init=0xffffffff)
+        byte = Signal(8)
+        m = Module()
+        m.d.sync += crc.eq(_crc32_next(crc, byte))
+
+        async def testbench(ctx):
+            for value in frame + zlib.crc32(frame).to_bytes(4, "little"):
+                ctx.set(byte, value)
+                await ctx.tick()
+            self.assertEqual(ctx.get(crc), _CRC32_RESIDUE)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def simulate(self, phy, *, datagrams, payload_length, clock="sync", loopback=()):
+        from amaranth.sim import Simulator
+
+        # The benchmark sends to itself.
+        bench = UDPBenchmark(phy, local_mac=self.LOCAL_MAC, local_ip=self.LOCAL_IP,
+                             remote_mac=self.LOCAL_MAC, remote_ip=self.LOCAL_IP,
+                             payload_length=payload_length)
+        frames = []
+        results = {}
+        async def testbench(ctx):
+            frame = None
+            while ctx.get(bench.tx_datagrams) < datagrams:
+                tx_en, tx_ready = ctx.get(bench.mac.phy.tx_en), ctx.get(bench.mac.phy.tx_ready)
+                if tx_en and tx_ready:
+                    if frame is None:
+                        frame = bytearray()
+                    frame.append(ctx.get(bench.mac.phy.tx_data))
+                elif not tx_en and frame is not None:
+                    frames.append(bytes(frame))
+                    frame = None
+                await ctx.tick(clock)
+            cycles = ctx.get(bench.tx_cycles)
+            ctx.set(bench.enable, 0)
+            await ctx.tick(clock).repeat(200 * (payload_length + 100))
+            results.update(
+                cycles=cycles,
+                rx_datagrams=ctx.get(bench.rx_datagrams),
+                rx_bytes=ctx.get(bench.rx_bytes),
+                rx_errors=ctx.get(bench.rx_errors),
+                rx_lost=ctx.get(bench.rx_lost),
+                mac_errors=ctx.get(bench.mac.rx_errors),
+            )
+
+        m = Module()
+        m.submodules.bench = bench
+        m.d.comb += loopback
+
+        sim = Simulator(m)
+        sim.add_clock(8e-9, domain=clock)
+        sim.add_testbench(testbench)
+        sim.run()
+        return frames, results
+
+    def check_frame(self, frame, *, sequence, payload_length):
+        self.assertEqual(frame[:8], bytes([_PREAMBLE] * 7 + [_SFD]))
+        frame = frame[8:]
+        self.assertEqual(frame[-4:], zlib.crc32(frame[:-4]).to_bytes(4, "little"))
+        dst_mac, src_mac, ethertype = struct.unpack(">6s6sH", frame[:14])
+        self.assertEqual((dst_mac, src_mac, ethertype),
+                         (self.LOCAL_MAC.to_bytes(6, "big"), self.LOCAL_MAC.to_bytes(6, "big"),
+                          _ETHERTYPE_IPV4))
+        ip = frame[14:34]
+        self.assertEqual(ip[0], 0x45)
+        self.assertEqual(struct.unpack(">H", ip[2:4])[0], 28 + payload_length)
+        self.assertEqual(ip[9], _IP_PROTOCOL_UDP)
+        words = sum(struct.unpack(">10H", ip))
+        while words >> 16:
+            words = (words & 0xffff) + (words >> 16)
+        self.assertEqual(words, 0xffff)
+        src_port, dst_port, udp_length, _ = struct.unpack(">4H", frame[34:42])
+        self.assertEqual((src_port, dst_port, udp_length), (5000, 5000, 8 + payload_length))
+        payload = frame[42:42 + payload_length]
+        self.assertEqual(payload[:4], sequence.to_bytes(4, "big"))
+        self.assertEqual(list(payload[4:]), [n & 0xff for n in range(4, payload_length)])
+        self.assertEqual(len(frame), max(60, 42 + payload_length) + 4)
+
+    def test_line_rate(self):
+        frames, results = self.simulate(_LoopbackPHY(), datagrams=8, payload_length=1472)
+        for sequence, frame in enumerate(frames):
+            self.check_frame(frame, sequence=sequence, payload_length=1472)
+        # Datagrams are sent back to back, separated only by the preamble and the inter-frame
+        # gap: 1538 bytes on the wire for 1472 bytes of payload.
+        self.assertLessEqual(results["cycles"], 8 * 1538 + 2)
+        self.assertEqual((results["rx_datagrams"], results["rx_errors"], results["rx_lost"]),
+                         (8, 0, 0))
+        self.assertEqual(results["rx_bytes"], 8 * 1472)
+
+    def test_short(self):
+        # A payload of 4 bytes is padded to the minimum frame length, and the padding is not
+        # received as payload.
+        frames, results = self.simulate(_LoopbackPHY(interval=3), datagrams=4, payload_length=4)
+        for sequence, frame in enumerate(frames):
+            self.check_frame(frame, sequence=sequence, payload_length=4)
+        self.assertEqual((results["rx_datagrams"], results["rx_bytes"], results["rx_errors"]),
+                         (4, 16, 0))
+
+    def test_rmii(self):
+        class Pads:
+            tx_en     = io.SimulationPort("o", 1)
+            tx_data   = io.SimulationPort("o", 2)
+            rx_crs_dv = io.SimulationPort("i", 1)
+            rx_data   = io.SimulationPort("i", 2)
+
+        frames, results = self.simulate(RMIIPHY(Pads), datagrams=3, payload_length=100,
+                                        clock="eth", loopback=[
+            Pads.rx_crs_dv.i.eq(Pads.tx_en.o),
+            Pads.rx_data.i.eq(Pads.tx_data.o),
+        ])
+        for sequence, frame in enumerate(frames):
+            self.check_frame(frame, sequence=sequence, payload_length=100)
+        self.assertEqual((results["rx_datagrams"], results["rx_bytes"], results["rx_errors"],
+                          results["mac_errors"]), (3, 300, 0, 0))
+
+    def test_elaborate(self):
+        from .ecpix5 import ECPIX545Platform
+        from .arty_a7 import ArtyA7_35Platform
+        from .tang_primer_20k import TangPrimer20kDockPlatform
+        from .icebreaker import ICEBreakerPlatform
+
+        class Top(Elaboratable):
+            def __init__(self, phy_domains, domains):
+                self.phy_domains = phy_domains
+                self.domains     = domains
+
+            def elaborate(self, platform):
+                m = Module()
+                for domain in self.phy_domains:
+                    m.domains += ClockDomain(domain)
+                for domain in self.domains:
+                    m.domains += ClockDomain(domain)
+                    m.d.comb += ClockSignal(domain).eq(ClockSignal("sync"))
+                m.submodules.bench = UDPBenchmark(ethernet_phy(platform),
+                    local_mac=TestCase.LOCAL_MAC, local_ip=TestCase.LOCAL_IP,
+                    remote_mac=TestCase.REMOTE_MAC, remote_ip=TestCase.REMOTE_IP)
+                return m
+
+        for platform, phy_domains, domains, phy in (
+                (ECPIX545Platform(), ["eth_rx"], ["eth_tx"], "eth_rgmii"),
+                (ArtyA7_35Platform(), ["eth_tx", "eth_rx"], ["eth_ref"], "eth_mii"),
+                (TangPrimer20kDockPlatform(), ["eth"], [], "eth_rmii")):
+            with self.subTest(platform=type(platform).__name__):
+                plan = platform.prepare(Top(phy_domains, domains))
+                netlist = plan.files.get("top.il", plan.files.get("top.v"))
+                self.assertIn("{}_0__tx_data__io".format(phy), netlist)
+
+        with self.assertRaisesRegex(NotImplementedError,
+                r"^ICEBreakerPlatform has no RGMII, MII or RMII Ethernet PHY$"):
+            ethernet_phy(ICEBreakerPlatform())
@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import subprocess
+import unittest
+
+from .cache import _user_cache_dir
+from .programmer import IceprogProgrammer, OpenFPGALoaderProgrammer
+
+
+__all__ = ["SimulatedFlash", "IceprogFlash", "OpenFPGALoaderFlash", "FlashUpdate",
+           "flash_for_platform", "write_incremental", "flash_incremental"]
+
+
+# Image written to the configuration flash by each toolchain.
+_FLASH_IMAGES = {
+    "IceStorm": "{name}.bin",
+    "Trellis":  "{name}.bit",
+    "Vivado":   "{name}.bin",
+}
+
+# Boards that are usually programmed with a tool that cannot write the configuration flash,
+# but whose flash openFPGALoader can write through a JTAG to SPI bridge.
+_OPENFPGALOADER_BOARDS = {
+    "ArtyA7_35Platform":  "arty_a7_35t",
+    "ArtyA7_100Platform": "arty_a7_100t",
+}
+
+
+class SimulatedFlash:
+    """Model of a NOR SPI flash, for testing without hardware.
+
+    Like a real flash, erasing sets every bit of an erase block to 1, and programming can only
+    clear bits; programming bytes that are not erased raises :exc:`ValueError`. ``erase_count``
+    is the number of erase blocks erased so far, and ``bytes_written`` is the number of bytes
+    programmed so far.
+    """
+    def __init__(self, size, *, erase_size=65536):
+        if size % erase_size != 0:
+            raise ValueError("Flash size {} is not a multiple of the erase size {}"
+                             .format(size, erase_size))
+        self.size          = size
+        self.erase_size    = erase_size
+        self.data          = bytearray(b"\xff" * size)
+        self.erase_count   = 0
+        self.bytes_written = 0
+
+    def _check_range(self, offset, length):
+        if offset < 0 or offset + length > self.size:
+            raise ValueError("Range {:#x}..{:#x} is outside of the flash"
+                             .format(offset, offset + length))
+
+    def read(self, offset, length):
+        self._check_range(offset, length)
+        return bytes(self.data[offset:offset + length])
+
+    def erase(self, offset, length):
+        self._check_range(offset, length)
+        if offset % self.erase_size != 0 or length % self.erase_size != 0:
+            raise ValueError("Range {:#x}..{:#x} is not aligned to erase blocks"
+                             .format(offset, offset + length))
+        self.data[offset:offset + length] = b"\xff" * length
+        self.erase_count += length // self.erase_size
+
+    def program(self, offset, data):
+        self._check_range(offset, len(data))
+        for index, byte in enumerate(data):
+            if byte & ~self.data[offset + index] & 0xff:
+                raise ValueError("Byte at {:#x} is programmed without being erased"
+                                 .format(offset + index))
+            self.data[offset + index] = byte
+        self.bytes_written += len(data)
+
+    def write(self, offset, data):
+        """Erase the erase blocks at ``offset`` and write ``data`` to them."""
+        self.erase(offset, len(data))
+        self.program(offset, data)
+
+
+class _ToolFlash:
+    erase_size = 65536
+
+    def command(self, offset, filename):
+        raise NotImplementedError # :nocov:
+
+    def write(self, offset, data):
+        with tempfile.TemporaryDirectory(prefix="amaranth-boards-flash-") as root:
+            filename = os.path.join(root, "image.bin")
+            with open(filename, "wb") as f:
+                f.write(data)
+            subprocess.run(self.command(offset, filename), check=True)
+
+
+class IceprogFlash(_ToolFlash):
+    """Configuration flash of an iCE40 board, written with ``iceprog``.
+
+    ``usb_id`` and ``serial`` select the probe, like for
+    :class:`~amaranth_boards.programmer.IceprogProgrammer`.
+    """
+    def __init__(self, *, usb_id="0x0403:0x6010", serial=None):
+        self._programmer = IceprogProgrammer(usb_id=usb_id)
+        self.serial      = serial
+
+    def command(self, offset, filename):
+        args = self._programmer.command([filename], serial=self.serial)
+        return [*args[:-1], "-o", str(offset), filename]
+
+
+class OpenFPGALoaderFlash(_ToolFlash):
+    """Configuration flash of a board, written with ``openFPGALoader``.
+
+    ``board``, ``cable``, ``fpga_part`` and ``serial`` select the board, like for
+    :class:`~amaranth_boards.programmer.OpenFPGALoaderProgrammer`.
+    """
+    def __init__(self, *, board=None, cable=None, fpga_part=None, serial=None):
+        self._programmer = OpenFPGALoaderProgrammer(board=board, cable=cable,
+                                                    fpga_part=fpga_part)
+        self.serial      = serial
+
+    def command(self, offset, filename):
+        args = self._programmer.command([filename], serial=self.serial)
+        return [*args[:-1], "-f", "-o", str(offset), filename]
+
+
+def flash_for_platform(platform, *, serial=None):
+    """Return the configuration flash of the board described by ``platform``.
+
+    ``serial`` selects the probe the board is connected through. Raises
+    :exc:`NotImplementedError` if writing the flash of the board is not supported.
+    """
+    programmer = getattr(platform, "programmer", None)
+    board = _OPENFPGALOADER_BOARDS.get(type(platform).__name__)
+    if isinstance(programmer, IceprogProgrammer):
+        return IceprogFlash(usb_id=programmer.usb_id, serial=serial)
+    elif isinstance(programmer, OpenFPGALoaderProgrammer):
+        return OpenFPGALoaderFlash(board=programmer.board, cable=programmer.cable,
+                                   fpga_part=programmer.fpga_part, serial=serial)
+    elif board is not None:
+        return OpenFPGALoaderFlash(board=board, serial=serial)
+    else:
+        raise NotImplementedError("Writing the flash of {} is not supported"
+                                  .format(type(platform).__name__))
+
+
+class FlashUpdate:
+    """Result of writing an image with :func:`write_incremental`.
+
+    ``written`` is the list of the indexes of erase blocks that were rewritten, out of
+    ``total`` erase blocks covered by the image. ``bytes_written`` is the number of bytes
+    written, and ``elapsed`` the time it took in seconds.
+    """
+    def __init__(self, *, written, total, bytes_written, elapsed):
+        self.written       = written
+        self.total         = total
+        self.bytes_written = bytes_written
+        self.elapsed       = elapsed
+
+    def as_dict(self):
+        return {
+            "written":       self.written,
+            "total":         self.total,
+            "bytes_written": self.bytes_written,
+            "elapsed":       self.elapsed,
+        }
+
+    def __repr__(self):
+        return "<FlashUpdate {}/{} blocks in {:.3f}s>".format(
+            len(self.written), self.total, self.elapsed)
+
+
+def _load_manifest(filename, erase_size, offset):
+    try:
+        with open(filename) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if manifest.get("erase_size") != erase_size or manifest.get("offset") != offset:
+        return []
+    return manifest["blocks"]
+
+
+def _save_manifest(filename, erase_size, offset, blocks):
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    temp_filename = "{}.tmp".format(filename)
+    with open(temp_filename, "w") as f:
+        json.dump({"erase_size": erase_size, "offset": offset, "blocks": blocks}, f, indent=1)
+    os.replace(temp_filename, filename)
+
+
+def write_incremental(flash, image, manifest, *, offset=0, full=False):
+    """Write ``image`` to ``flash`` at ``offset``, rewriting only the erase blocks that changed.
+
+    ``manifest`` is the name of a file recording the hash of every erase block last written by
+    this function; it is compared against the image to find the blocks that changed, and
+    updated as they are written. A block whose write was interrupted is rewritten the next
+    time. The manifest cannot know about writes made with other tools; if ``full`` is true,
+    every block is rewritten regardless of the manifest.
+
+    ``flash`` is :class:`SimulatedFlash` or an object returned by :func:`flash_for_platform`,
+    and ``offset`` must be aligned to its erase blocks. Consecutive changed blocks are written
+    together. Returns :class:`FlashUpdate`.
+    """
+    erase_size = flash.erase_size
+    if offset % erase_size != 0:
+        raise ValueError("Offset {:#x} is not aligned to the erase size {:#x}"
+                         .format(offset, erase_size))
+    image = bytes(image)
+    if len(image) % erase_size != 0:
+        image += b"\xff" * (erase_size - len(image) % erase_size)
+    total = len(image) // erase_size
+    hashes = [hashlib.sha256(image[index * erase_size:(index + 1) * erase_size]).hexdigest()
+              for index in range(total)]
+
+    blocks = [] if full else _load_manifest(manifest, erase_size, offset)
+    blocks = (blocks + [None] * total)[:max(total, len(blocks))]
+    changed = [index for index in range(total) if blocks[index] != hashes[index]]
+
+    runs = []
+    for index in changed:
+        if runs and runs[-1][1] == index:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+
+    start = time.perf_counter()
+    for first, last in runs:
+        # Forget the blocks before writing them, so that an interrupted write is redone.
+        blocks[first:last] = [None] * (last - first)
+        _save_manifest(manifest, erase_size, offset, blocks)
+        flash.write(offset + first * erase_size, image[first * erase_size:last * erase_size])
+        blocks[first:last] = hashes[first:last]
+    _save_manifest(manifest, erase_size, offset, blocks)
+    return FlashUpdate(written=changed, total=total, bytes_written=len(changed) * erase_size,
+                       elapsed=time.perf_counter() - start)
+
+
+def flash_incremental(platform, products, name="top", *, serial=None, manifest=None,
+                      full=False, flash=None):
+    """Write the bitstream built for ``platform`` to the configuration flash of the board,
+    rewriting only the erase blocks that changed since it was last written.
+
+    ``serial`` selects the probe the board is connected through. ``manifest`` is the name of
+    the manifest file (see :func:`write_incremental`), and defaults to a file named after
+    the platform and the serial number in ``amaranth-boards/flash`` in the user cache
+    directory. ``flash`` defaults to the result of :func:`flash_for_platform`.
+
+    Returns :class:`FlashUpdate`.
+    """
+    toolchain = platform.toolchain
+    if toolchain not in _FLASH_IMAGES:
+        raise NotImplementedError("Writing flash images built by the {} toolchain is not "
+                                  "supported".format(toolchain))
+    if flash is None:
+        flash = flash_for_platform(platform, serial=serial)
+    if manifest is None:
+        manifest = os.path.join(_user_cache_dir("flash"), "{}-{}.json".format(
+            type(platform).__name__, "default" if serial is None else serial))
+    image = products.get(_FLASH_IMAGES[toolchain].format(name=name))
+    return write_incremental(flash, image, manifest, full=full)
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.manifest = os.path.join(self.root.name, "manifest.json")
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_simulated_flash(self):
+        flash = SimulatedFlash(8192, erase_size=4096)
+        flash.program(0, b"\x0f")
+        with self.assertRaisesRegex(ValueError,
+                r"^Byte at 0x0 is programmed without being erased$"):
+            flash.program(0, b"\xf0")
+        flash.write(0, b"\xf0" * 4096)
+        self.assertEqual(flash.read(0, 2), b"\xf0\xf0")
+        self.assertEqual(flash.erase_count, 1)
+
+    def test_incremental(self):
+        flash = SimulatedFlash(65536, erase_size=4096)
+        image = bytearray(os.urandom(4096 * 5 + 100))
+
+        update = write_incremental(flash, image, self.manifest)
+        self.assertEqual((update.written, update.total), ([0, 1, 2, 3, 4, 5], 6))
+        self.assertEqual(flash.read(0, len(image)), image)
+
+        update = write_incremental(flash, image, self.manifest)
+        self.assertEqual(update.written, [])
+
+        image[4096 * 3] ^= 0xff
+        image[4096 * 4] ^= 0xff
+        erase_count = flash.erase_count
+        update = write_incremental(flash, image, self.manifest)
+        self.assertEqual(update.written, [3, 4])
+        self.assertEqual(flash.erase_count - erase_count, 2)
+        self.assertEqual(flash.read(0, len(image)), image)
+
+        update = write_incremental(flash, image, self.manifest, full=True)
+        self.assertEqual(len(update.written), 6)
+
+    def test_interrupted(self):
+        flash = SimulatedFlash(65536, erase_size=4096)
+        write_incremental(flash, bytes(8192), self.manifest)
+
+        def fail(offset, data):
+            raise subprocess.CalledProcessError(1, ["iceprog"])
+        flash.write, write = fail, flash.write
+        with self.assertRaises(subprocess.CalledProcessError):
+            write_incremental(flash, b"\x01" * 8192, self.manifest)
+        flash.write = write
+        update = write_incremental(flash, bytes(8192), self.manifest)
+        self.assertEqual(update.written, [0, 1])
+
+    def test_flash_for_platform(self):
+        from .icebreaker import ICEBreakerPlatform
+        from .ulx3s import ULX3S_85F_Platform
+        from .arty_a7 import ArtyA7_35Platform
+        from .de10_nano import DE10NanoPlatform
+
+        self.assertEqual(flash_for_platform(ICEBreakerPlatform(), serial="ib1")
+                         .command(65536, "image.bin"),
+                         ["iceprog", "-d", "s:0x0403:0x6010:ib1", "-o", "65536", "image.bin"])
+        self.assertEqual(flash_for_platform(ULX3S_85F_Platform()).command(0, "image.bin"),
+                         ["openFPGALoader", "-b", "ulx3s", "-f", "-o", "0", "image.bin"])
+        self.assertEqual(flash_for_platform(ArtyA7_35Platform()).command(0, "image.bin"),
+                         ["openFPGALoader", "-b", "arty_a7_35t", "-f", "-o", "0", "image.bin"])
+        with self.assertRaisesRegex(NotImplementedError,
+                r"^Writing the flash of DE10NanoPlatform is not supported$"):
+            flash_for_platform(DE10NanoPlatform())
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeICE40Platform
 from .resources import *
+from .programmer import DFUUtilProgrammer
 
 
 __all__ = ["FomuHackerPlatform"]
@@ -40,10 +38,10 @@ class FomuHackerPlatform(LatticeICE40Platform):
         Connector("pin", 3, "F2"),
     ]
 
-    def toolchain_program(self, products, name):
-        dfu_util = os.environ.get("DFU_UTIL", "dfu-util")
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            subprocess.check_call([dfu_util, "-D", bitstream_filename])
+    programmer = DFUUtilProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,8 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import OpenOCDProgrammer
+from .compression import merge_overrides
 
 
 __all__ = ["Genesys2Platform"]
@@ -329,8 +328,8 @@ class Genesys2Platform(XilinxPlatform):
             set_property CFGBVS VCCO [current_design]
             set_property CONFIG_VOLTAGE 3.3 [current_design]
             """}
-        return super().toolchain_prepare(
-            fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
 
     @property
     def file_templates(self):
@@ -347,15 +346,10 @@ class Genesys2Platform(XilinxPlatform):
             """
         }
 
-    def toolchain_program(self, products, name):
-        openocd = os.environ.get("OPENOCD", "openocd")
-        with products.extract("{}-openocd.cfg".format(name),
-                              "{}.bit".format(name)) as (
-                                  config_filename, bitstream_filename):
-            subprocess.check_call([
-                openocd,
-                "-f", config_filename,
-                "-c", "init; pld load 0 {}; exit".format(bitstream_filename)])
+    programmer = OpenOCDProgrammer(["pld load 0 {bitstream}"], config="{name}-openocd.cfg")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
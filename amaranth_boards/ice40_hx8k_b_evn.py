@@ -1,10 +1,9 @@
-import os
-import subprocess
 import unittest
 
 from amaranth.build import *
 from amaranth.vendor import LatticeICE40Platform
 from .resources import *
+from .programmer import IceprogProgrammer
 
 
 __all__ = ["ICE40HX8KBEVNPlatform"]
@@ -57,11 +56,10 @@ class ICE40HX8KBEVNPlatform(LatticeICE40Platform):
             "-   -   D1  D2  C1  C2  B1  B2  -   -   "),
     ]
 
-    def toolchain_program(self, products, name):
-        iceprog = os.environ.get("ICEPROG", "iceprog")
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            # TODO: this should be factored out and made customizable
-            subprocess.check_call([iceprog, "-S", bitstream_filename])
+    programmer = IceprogProgrammer(sram=True)
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 class TestCase(unittest.TestCase):
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeICE40Platform
 from .resources import *
+from .programmer import IceprogProgrammer
 
 
 __all__ = ["ICE40UP5KBEVNPlatform"]
@@ -55,10 +53,10 @@ class ICE40UP5KBEVNPlatform(LatticeICE40Platform):
             "- 12 3 21 3 13 48 20 45 19 47 18 44 11 46 10 2 9 - 6"),
     ]
 
-    def toolchain_program(self, products, name):
-        iceprog = os.environ.get("ICEPROG", "iceprog")
-        with products.extract("{}.bin".format(name)) as bitstream_fn:
-            subprocess.check_call([iceprog, bitstream_fn])
+    programmer = IceprogProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeICE40Platform
 from .resources import *
+from .programmer import IceprogProgrammer
 
 
 __all__ = ["ICEStickPlatform"]
@@ -42,10 +40,10 @@ class ICEStickPlatform(LatticeICE40Platform):
         Connector("j", 3, "- -  62  61  60  56  48  47  45  44"), # J3
     ]
 
-    def toolchain_program(self, products, name):
-        iceprog = os.environ.get("ICEPROG", "iceprog")
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            subprocess.check_call([iceprog, bitstream_filename])
+    programmer = IceprogProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
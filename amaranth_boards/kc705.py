@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import OpenOCDProgrammer
 
 
 __all__ = ["KC705Platform"]
@@ -28,13 +26,11 @@ class KC705Platform(XilinxPlatform):
     ]
     connectors  = []
 
-    def toolchain_program(self, products, name):
-        openocd = os.environ.get("OPENOCD", "openocd")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([openocd,
-                "-c", "source [find board/kc705.cfg]; init; pld load 0 {}; exit"
-                      .format(bitstream_filename)
-            ])
+    programmer = OpenOCDProgrammer(["pld load 0 {bitstream}"],
+        setup=["source [find board/kc705.cfg]"])
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import OpenOCDProgrammer
 
 
 __all__ = ["KCU105Platform"]
@@ -23,13 +21,11 @@ class KCU105Platform(XilinxPlatform):
     ]
     connectors  = []
 
-    def toolchain_program(self, products, name):
-        openocd = os.environ.get("OPENOCD", "openocd")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([openocd,
-                "-c", "source [find board/kcu105.cfg]; init; pld load 0 {}; exit"
-                      .format(bitstream_filename)
-            ])
+    programmer = OpenOCDProgrammer(["pld load 0 {bitstream}"],
+        setup=["source [find board/kcu105.cfg]"])
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
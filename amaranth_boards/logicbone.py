@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeECP5Platform
 from .resources import *
+from .programmer import DFUUtilProgrammer
 
 
 __all__ = ["LogicbonePlatform", "Logicbone85FPlatform"]
@@ -108,13 +106,10 @@ class LogicbonePlatform(LatticeECP5Platform):
         overrides.update(kwargs)
         return super().toolchain_prepare(fragment, name, **overrides)
 
-    def toolchain_program(self, products, name):
-        dfu_util = os.environ.get("DFU_UTIL", "dfu-util")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([
-                dfu_util, "-d", "1d50:615d", "-a", "0", "-R",
-                "-D", bitstream_filename
-            ])
+    programmer = DFUUtilProgrammer(device="1d50:615d", alt=0, reset=True, bitstream="{name}.bit")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 class Logicbone85FPlatform(LogicbonePlatform):
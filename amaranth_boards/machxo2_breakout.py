@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeMachXO2Platform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 
 __all__ = ["MachXO2_7000HE_BreakoutPlatform", "MachXO2_1200ZE_BreakoutPlatform"]
@@ -111,10 +109,10 @@ class MachXO2_7000HE_BreakoutPlatform(LatticeMachXO2Platform):
                   "40 38 "),
     ]
 
-    def toolchain_program(self, products, name):
-        tool = os.environ.get("OPENFPGALOADER", "openFPGALoader")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([tool, "-b", "machXO2EVN", "-m", bitstream_filename])
+    programmer = OpenFPGALoaderProgrammer(board="machXO2EVN", sram=True)
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 # This is an older version of the board, that has an FPGA with less logic
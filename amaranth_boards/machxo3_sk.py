@@ -1,10 +1,9 @@
-import os
 import argparse
-import subprocess
 
 from amaranth.build import *
 from amaranth.vendor import LatticeMachXO3LPlatform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 
 __all__ = ["MachXO3LSKPlatform", "MachXO3LFSKPlatform"]
@@ -63,10 +62,10 @@ class _MachXO3SKPlatform(LatticeMachXO3LPlatform):
              "-  C2 C1  G3  B1  D3  E3  F3  F5  -   "),
     ]
 
-    def toolchain_program(self, products, name):
-        openFPGALoader = os.environ.get("OPENFPGALOADER", "openFPGALoader")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([openFPGALoader, bitstream_filename])
+    programmer = OpenFPGALoaderProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 class MachXO3LSKPlatform(_MachXO3SKPlatform):
@@ -0,0 +1,246 @@
+import math
+import unittest
+
+from amaranth import *
+from amaranth.lib.fifo import SyncFIFO
+from amaranth.lib.memory import Memory
+
+
+__all__ = ["MemoryPort", "MemoryBenchmark", "bandwidth"]
+
+
+def _cycles(t_ns, clk_frequency, nck=0):
+    # Number of controller cycles, at least one, that last at least `t_ns` and, for DDR3 where the
+    # memory clock runs at twice the controller clock, at least `nck` memory clock cycles.
+    return max(math.ceil(round(t_ns * 1e-9 * clk_frequency, 6)), math.ceil(nck / 2), 1)
+
+
+def _delay(m, value, cycles):
+    for _ in range(cycles):
+        delayed = Signal(len(value))
+        m.d.sync += delayed.eq(value)
+        value = delayed
+    return value
+
+
+class MemoryPort:
+    """Native port of a memory controller.
+
+    A transfer of ``data_width`` bits at ``addr`` is requested by asserting ``valid``, and is
+    accepted in the cycle in which both ``valid`` and ``ready`` are asserted. If ``we`` is
+    asserted, ``wdata`` is written, except for the bytes whose bit in ``wmask`` is set. Reads
+    complete in the order in which they were accepted, some cycles later, by asserting
+    ``rvalid`` for one cycle with the data in ``rdata``.
+    """
+    def __init__(self, *, addr_width, data_width, mask_width=None):
+        if mask_width is None:
+            mask_width = (data_width + 7) // 8
+
+        self.addr_width = addr_width
+        self.data_width = data_width
+        self.mask_width = mask_width
+
+        self.valid  = Signal()
+        self.ready  = Signal()
+        self.we     = Signal()
+        self.addr   = Signal(addr_width)
+        self.wdata  = Signal(data_width)
+        self.wmask  = Signal(mask_width)
+        self.rdata  = Signal(data_width)
+        self.rvalid = Signal()
+
+
+def _pattern(addr, width):
+    # Every chunk of the pattern is different, so that swapped or stale halves of a transfer do
+    # not go unnoticed.
+    chunks = []
+    while len(Cat(*chunks)) < width:
+        chunks.append((addr + len(chunks) * 0x9e37)[:len(addr)])
+    return Cat(*chunks)[:width]
+
+
+class MemoryBenchmark(Elaboratable):
+    """Measure the sustained bandwidth and the read latency of a :class:`MemoryPort`.
+
+    Asserting ``start`` for one cycle issues ``length`` transfers as fast as ``port`` accepts
+    them, writing if ``write`` is asserted and reading otherwise, at sequential addresses
+    starting from 0, or pseudorandom addresses if ``random`` is asserted. ``busy`` is asserted
+    until every transfer has completed.
+
+    Once done, ``cycles`` is the number of cycles the benchmark took, ``transfers`` the number of
+    transfers that completed, and, for reads, ``latency_sum`` and ``latency_max`` are the total
+    and the worst number of cycles between a read being accepted and its data being returned.
+    Writes store a pattern derived from the address, and ``errors`` counts the reads that did
+    not return it, so a write run followed by a read run with the same settings also checks the
+    memory. Use :func:`bandwidth` to convert the result to MB/s.
+
+    At most ``depth`` reads are in flight at once.
+    """
+    def __init__(self, port, *, depth=16):
+        self.port  = port
+        self.depth = depth
+
+        self.start  = Signal()
+        self.write  = Signal()
+        self.random = Signal()
+        self.length = Signal(32)
+        self.busy   = Signal()
+
+        self.cycles      = Signal(32)
+        self.transfers   = Signal(32)
+        self.errors      = Signal(32)
+        self.latency_sum = Signal(40)
+        self.latency_max = Signal(16)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        port = self.port
+
+        write  = Signal()
+        random = Signal()
+        issued = Signal(32)
+        now    = Signal(32)
+        addr   = Signal(port.addr_width)
+        lfsr   = Signal(32, init=1)
+
+        m.submodules.fifo = fifo = SyncFIFO(width=len(now) + port.addr_width, depth=self.depth)
+
+        m.d.sync += now.eq(now + 1)
+
+        with m.If(~self.busy):
+            with m.If(self.start):
+                m.d.sync += [
+                    self.busy.eq(1),
+                    write.eq(self.write),
+                    random.eq(self.random),
+                    issued.eq(0),
+                    addr.eq(0),
+                    lfsr.eq(1),
+                    self.cycles.eq(0),
+                    self.transfers.eq(0),
+                    self.errors.eq(0),
+                    self.latency_sum.eq(0),
+                    self.latency_max.eq(0),
+                ]
+
+        with m.Else():
+            m.d.sync += self.cycles.eq(self.cycles + 1)
+            with m.If(self.transfers == self.length):
+                m.d.sync += self.busy.eq(0)
+
+            m.d.comb += [
+                port.valid.eq((issued != self.length) & (write | fifo.w_rdy)),
+                port.we.eq(write),
+                port.addr.eq(Mux(random, lfsr, addr)),
+                port.wdata.eq(_pattern(port.addr, port.data_width)),
+                port.wmask.eq(0),
+            ]
+            with m.If(port.valid & port.ready):
+                m.d.sync += [
+                    issued.eq(issued + 1),
+                    addr.eq(addr + 1),
+                    # Galois LFSR with a maximal period.
+                    lfsr.eq(Mux(lfsr[0], (lfsr >> 1) ^ 0x80200003, lfsr >> 1)),
+                ]
+                with m.If(write):
+                    m.d.sync += self.transfers.eq(self.transfers + 1)
+                with m.Else():
+                    m.d.comb += [
+                        fifo.w_data.eq(Cat(now, port.addr)),
+                        fifo.w_en.eq(1),
+                    ]
+
+        issued_at = fifo.r_data[:len(now)]
+        expected  = _pattern(fifo.r_data[len(now):], port.data_width)
+        latency   = Signal(len(now))
+        m.d.comb += latency.eq(now - issued_at)
+        with m.If(port.rvalid):
+            m.d.comb += fifo.r_en.eq(1)
+            m.d.sync += [
+                self.transfers.eq(self.transfers + 1),
+                self.latency_sum.eq(self.latency_sum + latency),
+            ]
+            with m.If(latency > self.latency_max):
+                m.d.sync += self.latency_max.eq(latency)
+            with m.If(port.rdata != expected):
+                m.d.sync += self.errors.eq(self.errors + 1)
+
+        return m
+
+
+def bandwidth(cycles, transfers, *, data_width, clk_frequency):
+    """Return the bandwidth, in MB/s, of ``transfers`` of ``data_width`` bits that took
+    ``cycles`` of a clock running at ``clk_frequency`` Hz."""
+    if cycles == 0:
+        return 0.0
+    return transfers * data_width / 8 / (cycles / clk_frequency) / 1e6
+
+
+class _TestMemory(Elaboratable):
+    # Memory that accepts a transfer every other cycle and returns reads 2 cycles later.
+    def __init__(self, port, depth):
+        self.port  = port
+        self.depth = depth
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.mem = mem = Memory(shape=self.port.data_width, depth=self.depth, init=[])
+        wr_port = mem.write_port()
+        rd_port = mem.read_port()
+
+        toggle = Signal()
+        m.d.sync += toggle.eq(~toggle)
+        m.d.comb += [
+            self.port.ready.eq(toggle),
+            wr_port.addr.eq(self.port.addr),
+            wr_port.data.eq(self.port.wdata),
+            wr_port.en.eq(self.port.valid & self.port.ready & self.port.we),
+            rd_port.addr.eq(self.port.addr),
+        ]
+        pending = Signal(2)
+        m.d.sync += pending.eq(Cat(self.port.valid & self.port.ready & ~self.port.we, pending))
+        data = Signal.like(self.port.rdata)
+        m.d.sync += data.eq(rd_port.data)
+        m.d.comb += [
+            self.port.rdata.eq(data),
+            self.port.rvalid.eq(pending[1]),
+        ]
+        return m
+
+
+class TestCase(unittest.TestCase):
+    def test_benchmark(self):
+        from amaranth.sim import Simulator
+
+        port = MemoryPort(addr_width=6, data_width=32)
+        m = Module()
+        m.submodules.memory = _TestMemory(port, 64)
+        m.submodules.bench  = bench = MemoryBenchmark(port)
+
+        results = []
+        async def testbench(ctx):
+            for write, random in ((1, 0), (0, 0), (0, 1)):
+                ctx.set(bench.write, write)
+                ctx.set(bench.random, random)
+                ctx.set(bench.length, 64)
+                ctx.set(bench.start, 1)
+                await ctx.tick()
+                ctx.set(bench.start, 0)
+                await ctx.tick().until(~bench.busy)
+                results.append((ctx.get(bench.cycles), ctx.get(bench.transfers),
+                                ctx.get(bench.errors), ctx.get(bench.latency_max)))
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_testbench(testbench)
+        sim.run()
+
+        (w_cycles, w_transfers, _, _), (r_cycles, r_transfers, r_errors, r_latency), \
+            (_, _, random_errors, _) = results
+        self.assertEqual((w_transfers, r_transfers), (64, 64))
+        self.assertEqual((r_errors, random_errors), (0, 0))
+        self.assertEqual(r_latency, 2)
+        self.assertAlmostEqual(bandwidth(w_cycles, w_transfers, data_width=32,
+                                         clk_frequency=1e6), 2.0, delta=0.1)
+        self.assertGreater(r_cycles, 128)
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import MercpclProgrammer
 
 
 __all__ = ["MercuryPlatform"]
@@ -200,11 +198,10 @@ class MercuryPlatform(XilinxPlatform):
     baseboard_sram    = _buttons + _vga + _extclk + _ps2
     baseboard_no_sram = baseboard_sram + _switches + _sevenseg + _audio
 
-    def toolchain_program(self, products, name):
-        # https://github.com/cr1901/mercpcl
-        mercpcl = os.environ.get("MERCPCL", "mercpcl")
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            subprocess.check_call([mercpcl, bitstream_filename])
+    programmer = MercpclProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
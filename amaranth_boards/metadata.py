@@ -0,0 +1,145 @@
+import os
+import json
+import unittest
+
+
+__all__ = ["board_metadata", "find_boards"]
+
+
+# The index is generated from the board definitions by running `python -m amaranth_boards.metadata`
+# (or `pdm run metadata`), and is checked in so that it can be queried without importing amaranth
+# or any of the board modules. `TestCase.test_up_to_date` ensures that it does not go stale.
+_INDEX_FILENAME = os.path.join(os.path.dirname(__file__), "metadata.json")
+
+_index = None
+
+
+def _load_index():
+    global _index
+    if _index is None:
+        with open(_INDEX_FILENAME) as f:
+            _index = json.load(f)
+    return _index
+
+
+def board_metadata(name):
+    """Return the metadata for the board called ``name``.
+
+    The result is a dictionary with the following keys:
+
+    * ``module``, ``platform``: where the platform class is defined;
+    * ``vendor``: name of the ``amaranth.vendor`` platform the board is based on;
+    * ``device``, ``package``, ``speed`` (or ``part`` and ``family`` for Gowin boards);
+    * ``default_clk``, ``default_clk_frequency``: the default clock and its frequency in Hz;
+    * ``resources``: a mapping of resource names to the list of resource numbers;
+    * ``connectors``: a mapping of connector names to a mapping of connector numbers (as strings)
+      to the number of connected pins.
+    """
+    index = _load_index()
+    try:
+        return index[name.lower()]
+    except KeyError:
+        raise LookupError("Unknown board {!r}".format(name)) from None
+
+
+def find_boards(*, resources=(), connectors=(), vendor=None, device=None):
+    """Return the names of boards matching all of the given criteria, in sorted order.
+
+    ``resources`` and ``connectors`` are collections of names that must all be present on
+    the board. ``vendor`` and ``device`` must match the respective metadata fields exactly
+    (``device`` also matches the ``part`` field of Gowin boards).
+    """
+    if isinstance(resources, str):
+        resources = (resources,)
+    if isinstance(connectors, str):
+        connectors = (connectors,)
+
+    matches = []
+    for name, metadata in _load_index().items():
+        if vendor is not None and metadata["vendor"] != vendor:
+            continue
+        if device is not None and device not in (metadata.get("device"), metadata.get("part")):
+            continue
+        if not all(resource in metadata["resources"] for resource in resources):
+            continue
+        if not all(connector in metadata["connectors"] for connector in connectors):
+            continue
+        matches.append(name)
+    return sorted(matches)
+
+
+def _collect(name):
+    import sys
+    from .registry import get_platform
+
+    platform_cls = get_platform(name)
+    module = sys.modules[platform_cls.__module__]
+    # Record the name under which the board module (or the board module it derives from) imports
+    # its vendor platform, rather than the name of the class it resolves to, which differs between
+    # Amaranth versions.
+    vendor = next(vendor_name
+                  for base_cls in platform_cls.__mro__
+                  for vendor_name, value in vars(sys.modules[base_cls.__module__]).items()
+                  if isinstance(value, type) and value in platform_cls.__mro__ and
+                     value.__module__.startswith("amaranth.vendor"))
+
+    metadata = {
+        "module":   module.__name__,
+        "platform": platform_cls.__name__,
+        "vendor":   vendor,
+    }
+    for attr in ("device", "package", "speed", "part", "family"):
+        # Some vendor platforms derive these from other attributes using properties.
+        value = getattr(platform_cls, attr, None)
+        if isinstance(value, str):
+            metadata[attr] = value
+
+    # Avoid instantiating the platform unless the default clock is an on-chip oscillator, since
+    # instantiating it validates the device against the installed version of Amaranth.
+    metadata["default_clk"] = platform_cls.default_clk
+    metadata["default_clk_frequency"] = None
+    for resource in platform_cls.resources:
+        if (resource.name, resource.number) == (platform_cls.default_clk, 0):
+            metadata["default_clk_frequency"] = resource.clock.frequency
+            break
+    else:
+        if platform_cls.default_clk is not None:
+            metadata["default_clk_frequency"] = platform_cls().default_clk_frequency
+
+    metadata["resources"] = {}
+    for resource in platform_cls.resources:
+        metadata["resources"].setdefault(resource.name, []).append(resource.number)
+    metadata["connectors"] = {}
+    for connector in platform_cls.connectors:
+        metadata["connectors"].setdefault(connector.name, {})[str(connector.number)] = \
+            len(connector.mapping)
+    return metadata
+
+
+def _generate():
+    from .registry import list_boards
+
+    return {name: _collect(name) for name in list_boards()}
+
+
+def _dump(index):
+    return json.dumps(index, indent=1, sort_keys=True) + "\n"
+
+
+class TestCase(unittest.TestCase):
+    def test_up_to_date(self):
+        with open(_INDEX_FILENAME) as f:
+            self.assertEqual(f.read(), _dump(_generate()),
+                             "metadata index is stale; run `python -m amaranth_boards.metadata`")
+
+    def test_find_boards(self):
+        self.assertIn("ulx3s-85f", find_boards(resources=("sdram", "hdmi"),
+                                               vendor="LatticeECP5Platform"))
+        self.assertNotIn("icebreaker", find_boards(resources="ddr3"))
+        self.assertEqual(board_metadata("ULX3S-85F")["device"], "LFE5U-85F")
+
+
+if __name__ == "__main__":
+    index = _generate()
+    with open(_INDEX_FILENAME, "w") as f:
+        f.write(_dump(index))
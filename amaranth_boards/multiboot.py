@@ -0,0 +1,488 @@
+import unittest
+
+from amaranth import *
+from amaranth.lib import io
+
+from .compression import merge_overrides
+
+
+__all__ = ["FlashRegion", "MultibootImage", "boot_overrides", "WarmReboot"]
+
+
+# Size of the configuration flash of boards whose flash is always the same part. The resources
+# created by `SPIFlashResources` describe only the pins of the flash, and not its size.
+_FLASH_SIZES = {
+    "ICEBreakerPlatform":      16 * 2 ** 20, # W25Q128JV
+    "TinyFPGABXPlatform":      1 * 2 ** 20,  # AT25SF081
+    "_ULX3SPlatform":          4 * 2 ** 20,  # 4 MiB or larger, depending on the revision
+    "_OrangeCrabR0_2Platform": 16 * 2 ** 20, # W25Q128JV
+    "_ArtyA7Platform":         16 * 2 ** 20, # S25FL128S
+}
+
+# Boards whose flash starts with a bootloader that must be preserved, mapped to the offset of the
+# user bitstream loaded by the bootloader and the erase size of the flash. The warmboot header of
+# the bootloader selects that bitstream, so the image has no header of its own.
+_BOOTLOADERS = {
+    "TinyFPGABXPlatform": (0x28000, 4096), # tinyfpga-bootloader, user data from 0x50000
+}
+
+# An iCE40 warmboot header consists of one applet for the image loaded at power-on, followed
+# by one applet for each of the four images that can be selected with `SB_WARMBOOT`.
+_ICE40_APPLET_SIZE = 32
+_ICE40_IMAGES      = 4
+
+
+def _family(platform):
+    family = getattr(platform, "family", None)
+    if family in ("iCE40", "ecp5", "series7"):
+        return family
+    raise NotImplementedError("Multiboot images for {} are not supported"
+                              .format(type(platform).__name__))
+
+
+def _has_spi_flash(platform):
+    return any(name == "spi_flash" or name.startswith("spi_flash_")
+               for name, number in platform.resources)
+
+
+def _board_info(table, platform):
+    for cls in type(platform).__mro__:
+        if cls.__name__ in table:
+            return table[cls.__name__]
+    return None
+
+
+def _ice40_applet(offset, *, coldboot=False):
+    applet = bytes([
+        0x7e, 0xaa, 0x99, 0x7e,                                     # preamble
+        0x92, 0x00, 0x10 if coldboot else 0x00,                     # boot mode
+        0x44, 0x03, (offset >> 16) & 0xff, (offset >> 8) & 0xff, offset & 0xff, # boot address
+        0x82, 0x00, 0x00,                                           # bank offset
+        0x01, 0x08,                                                 # reboot
+    ])
+    return applet + b"\x00" * (_ICE40_APPLET_SIZE - len(applet))
+
+
+class FlashRegion:
+    """Region of a multiboot flash image.
+
+    ``kind`` is ``"reserved"``, ``"header"``, ``"bitstream"`` or ``"data"``. ``offset`` and
+    ``size`` are in bytes.
+    """
+    def __init__(self, name, offset, size, *, kind):
+        self.name   = name
+        self.offset = offset
+        self.size   = size
+        self.kind   = kind
+
+    @property
+    def end(self):
+        return self.offset + self.size
+
+    def as_dict(self):
+        return {
+            "name":   self.name,
+            "offset": self.offset,
+            "size":   self.size,
+            "kind":   self.kind,
+        }
+
+    def __repr__(self):
+        return "<FlashRegion {} {} {:#x}..{:#x}>".format(
+            self.kind, self.name, self.offset, self.end)
+
+
+class MultibootImage:
+    """Image of the SPI configuration flash of a board, holding several bitstreams and user data.
+
+    Every bitstream and data blob starts at an offset aligned to ``erase_size``, so that one of
+    them can be replaced in the field by rewriting only its own erase blocks (e.g. with
+    :func:`write_incremental`). The layout depends on the FPGA family of ``platform``:
+
+    * iCE40: the first erase block holds a warmboot header, and up to four bitstreams follow it.
+      The image loaded at power-on is the bitstream with index ``power_on``; the gateware can
+      switch to any of the four with :class:`WarmReboot`. If ``coldboot`` is true, the
+      power-on image is instead selected by the ``CBSEL`` pins.
+    * ECP5 and Xilinx 7-series: the first bitstream (the golden image) is at offset 0. Other
+      bitstreams are reached by building the golden image with :func:`boot_overrides`.
+
+    On boards with a USB bootloader in the flash (TinyFPGA BX), the bootloader is reserved
+    instead: the image holds only the user bitstream, at the offset the bootloader loads it
+    from, and user data after it. The image then starts at :attr:`base` rather than offset 0.
+
+    ``flash_size`` is the size of the flash in bytes; it is known for boards that always use
+    the same part, and must be given otherwise. ``erase_size`` defaults to 64 KiB, or to the
+    erase size of the flash on boards with a bootloader. Raises :exc:`ValueError` if the board
+    has no ``spi_flash`` resource, and :exc:`NotImplementedError` if its FPGA family does not
+    support multiboot.
+    """
+    def __init__(self, platform, *, flash_size=None, erase_size=None, power_on=0,
+                 coldboot=False):
+        self.family = _family(platform)
+        if not _has_spi_flash(platform):
+            raise ValueError("{} has no SPI configuration flash"
+                             .format(type(platform).__name__))
+        bootloader = _board_info(_BOOTLOADERS, platform)
+        if erase_size is None:
+            erase_size = 65536 if bootloader is None else bootloader[1]
+        if flash_size is None:
+            flash_size = _board_info(_FLASH_SIZES, platform)
+            if flash_size is None:
+                raise ValueError("The size of the configuration flash of {} is not known, and "
+                                 "must be specified".format(type(platform).__name__))
+        if flash_size % erase_size != 0:
+            raise ValueError("Flash size {} is not a multiple of the erase size {}"
+                             .format(flash_size, erase_size))
+        if self.family != "iCE40" and (power_on != 0 or coldboot):
+            raise ValueError("Only iCE40 multiboot images have a power-on image index or "
+                             "a cold boot mode")
+        if power_on not in range(_ICE40_IMAGES):
+            raise ValueError("Power-on image index must be between 0 and {}, not {}"
+                             .format(_ICE40_IMAGES - 1, power_on))
+        if bootloader is not None:
+            if power_on != 0 or coldboot:
+                raise ValueError("The bootloader of {} selects the power-on image"
+                                 .format(type(platform).__name__))
+            if bootloader[0] % erase_size != 0:
+                raise ValueError("User image offset {:#x} of {} is not aligned to the erase "
+                                 "size {:#x}".format(bootloader[0], type(platform).__name__,
+                                                     erase_size))
+
+        self.flash_size = flash_size
+        self.erase_size = erase_size
+        self.power_on   = power_on
+        self.coldboot   = coldboot
+        self.base       = 0
+        self.regions    = []
+        self._contents  = []
+        self._platform  = type(platform).__name__
+
+        if bootloader is not None:
+            self.base = bootloader[0]
+            self.regions.append(FlashRegion("bootloader", 0, self.base, kind="reserved"))
+            self._contents.append(None)
+        elif self.family == "iCE40":
+            self.regions.append(FlashRegion("warmboot", 0, _ICE40_APPLET_SIZE *
+                                            (_ICE40_IMAGES + 1), kind="header"))
+            self._contents.append(None)
+
+    @property
+    def bitstreams(self):
+        """Regions of the bitstreams, in the order they were added."""
+        return [region for region in self.regions if region.kind == "bitstream"]
+
+    def _next_offset(self):
+        end = max((region.end for region in self.regions), default=0)
+        return (end + self.erase_size - 1) // self.erase_size * self.erase_size
+
+    def _add(self, data, *, name, offset, kind):
+        data = bytes(data)
+        if offset is None:
+            offset = self._next_offset()
+        if offset % self.erase_size != 0:
+            raise ValueError("Offset {:#x} of {} is not aligned to the erase size {:#x}"
+                             .format(offset, name, self.erase_size))
+        region = FlashRegion(name, offset, len(data), kind=kind)
+        if region.end > self.flash_size:
+            raise ValueError("{} at {:#x}..{:#x} does not fit in the {:#x} byte flash"
+                             .format(name, region.offset, region.end, self.flash_size))
+        for other in self.regions:
+            # Regions may not share erase blocks, or they could not be rewritten separately.
+            other_end = (other.end + self.erase_size - 1) // self.erase_size * self.erase_size
+            if region.offset < other_end and other.offset < region.end:
+                raise ValueError("{} at {:#x}..{:#x} overlaps {} at {:#x}..{:#x}"
+                                 .format(name, region.offset, region.end,
+                                         other.name, other.offset, other.end))
+        self.regions.append(region)
+        self._contents.append(data)
+        return region
+
+    def add_bitstream(self, data, *, name=None, offset=None):
+        """Add a bitstream, by default at the first aligned offset after the last region.
+
+        For ECP5 and Xilinx 7-series, the first bitstream added is the golden image and must be
+        at offset 0. Returns :class:`FlashRegion`.
+        """
+        index = len(self.bitstreams)
+        if name is None:
+            name = "bitstream{}".format(index)
+        if self.base != 0:
+            if index == 1:
+                raise ValueError("The bootloader of {} loads only one user bitstream"
+                                 .format(self._platform))
+            if offset not in (None, self.base):
+                raise ValueError("The user bitstream of {} must be at offset {:#x}, not {:#x}"
+                                 .format(self._platform, self.base, offset))
+        if self.family == "iCE40" and index == _ICE40_IMAGES:
+            raise ValueError("iCE40 multiboot images hold at most {} bitstreams"
+                             .format(_ICE40_IMAGES))
+        if self.family != "iCE40" and index == 0 and offset not in (None, 0):
+            raise ValueError("The golden bitstream must be at offset 0, not {:#x}"
+                             .format(offset))
+        return self._add(data, name=name, offset=offset, kind="bitstream")
+
+    def add_data(self, data, *, name, offset=None):
+        """Add a user data blob, by default at the first aligned offset after the last region.
+
+        Returns :class:`FlashRegion`.
+        """
+        return self._add(data, name=name, offset=offset, kind="data")
+
+    def _header(self):
+        offsets = [region.offset for region in self.bitstreams]
+        if self.power_on >= len(offsets):
+            raise ValueError("Power-on image {} has not been added".format(self.power_on))
+        # Images that are not present boot the power-on image, like `icemulti` does.
+        offsets += [offsets[self.power_on]] * (_ICE40_IMAGES - len(offsets))
+        return b"".join([
+            _ice40_applet(offsets[self.power_on], coldboot=self.coldboot),
+            *(_ice40_applet(offset) for offset in offsets),
+        ])
+
+    def image(self):
+        """Return the contents of the flash from :attr:`base` up to the end of the erase block
+        of the last region.
+
+        Erased bytes are ``0xff``. Reserved regions are not included, and must be written at
+        :attr:`base`.
+        """
+        if not self.bitstreams:
+            raise ValueError("A multiboot image needs at least one bitstream")
+        if self.family != "iCE40" and self.bitstreams[0].offset != 0:
+            raise ValueError("The golden bitstream must be at offset 0")
+        image = bytearray(b"\xff" * (self._next_offset() - self.base))
+        for region, data in zip(self.regions, self._contents):
+            if region.kind == "reserved":
+                continue
+            if region.kind == "header":
+                data = self._header()
+            image[region.offset - self.base:region.end - self.base] = data
+        return bytes(image)
+
+
+def boot_overrides(platform, *, next_offset=None, fallback=False, **kwargs):
+    """Return ``kwargs`` with the overrides that build a bitstream for a multiboot image.
+
+    ``next_offset`` is the offset in the flash of the bitstream that is loaded when the
+    bitstream being built reboots the FPGA with :class:`WarmReboot` (ECP5, where the bitstream
+    is loaded once ``program`` is asserted), or immediately after it is loaded (Xilinx 7-series,
+    where this is the golden image skipping to the update image). If ``fallback`` is true,
+    a Xilinx 7-series FPGA that fails to load this bitstream falls back to the golden image.
+
+    iCE40 images are selected by the warmboot header written by :class:`MultibootImage` and
+    need no overrides. Overrides already present in ``kwargs`` are extended.
+    """
+    family = _family(platform)
+    overrides = dict(kwargs)
+    if family == "iCE40":
+        if next_offset is not None or fallback:
+            raise ValueError("iCE40 bitstreams are selected by the warmboot header, and do not "
+                             "have a next boot address or fallback")
+    elif family == "ecp5":
+        if platform.toolchain != "Trellis":
+            raise NotImplementedError("Multiboot images are not supported by the {} toolchain"
+                                      .format(platform.toolchain))
+        if fallback:
+            raise ValueError("ECP5 bitstreams do not have a fallback")
+        if next_offset is not None:
+            overrides = merge_overrides(overrides,
+                                        {"ecppack_opts": "--bootaddr {:#x}".format(next_offset)})
+    elif family == "series7":
+        if platform.toolchain != "Vivado":
+            raise NotImplementedError("Multiboot images are not supported by the {} toolchain"
+                                      .format(platform.toolchain))
+        script = []
+        if next_offset is not None:
+            script.append("set_property BITSTREAM.CONFIG.NEXT_CONFIG_ADDR 0x{:08X} "
+                          "[current_design]".format(next_offset))
+            script.append("set_property BITSTREAM.CONFIG.NEXT_CONFIG_REBOOT ENABLE "
+                          "[current_design]")
+        if fallback:
+            script.append("set_property BITSTREAM.CONFIG.CONFIGFALLBACK ENABLE [current_design]")
+        if script:
+            overrides = merge_overrides(overrides,
+                                        {"script_before_bitstream": "\n".join(script)})
+    return overrides
+
+
+def _bitswap_bytes(word):
+    # ICAPE2 expects the bits of each byte in reverse order.
+    result = 0
+    for index in range(32):
+        if word & (1 << index):
+            result |= 1 << (index // 8 * 8 + 7 - index % 8)
+    return result
+
+
+def _iprog_words(address):
+    return [
+        0xffffffff, # dummy word
+        0xaa995566, # sync word
+        0x20000000, # NOOP
+        0x30020001, # write WBSTAR
+        address,
+        0x30008001, # write CMD
+        0x0000000f, # IPROG
+        0x20000000, # NOOP
+    ]
+
+
+class WarmReboot(Elaboratable):
+    """Reconfigure the FPGA from another bitstream in the configuration flash.
+
+    Asserting ``boot`` for one cycle of the ``sync`` domain reboots the FPGA:
+
+    * iCE40: into the bitstream selected by ``image`` in the warmboot header.
+    * ECP5: into the bitstream at the address set by :func:`boot_overrides`, by asserting the
+      ``program`` resource of the board.
+    * Xilinx 7-series: into the bitstream at ``address``, using ICAPE2. If the bitstream cannot be
+      loaded, the FPGA falls back to the golden image.
+    """
+    def __init__(self, *, address=0):
+        self.address = address
+
+        self.boot  = Signal()
+        self.image = Signal(2)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        family = _family(platform)
+        if family == "iCE40":
+            m.submodules.warmboot = Instance("SB_WARMBOOT",
+                i_BOOT=self.boot,
+                i_S1=self.image[1],
+                i_S0=self.image[0],
+            )
+
+        elif family == "ecp5":
+            m.submodules.program = program = io.Buffer("o",
+                platform.request("program", 0, dir="-"))
+            with m.If(self.boot):
+                m.d.sync += program.o.eq(1)
+
+        elif family == "series7":
+            words = Array(Const(_bitswap_bytes(word), 32)
+                          for word in _iprog_words(self.address))
+            index = Signal(range(len(words) + 1), init=len(words))
+            with m.If(self.boot):
+                m.d.sync += index.eq(0)
+            with m.Elif(index != len(words)):
+                m.d.sync += index.eq(index + 1)
+            m.submodules.icap = Instance("ICAPE2",
+                p_ICAP_WIDTH="X32",
+                i_CLK=ClockSignal(),
+                i_CSIB=index == len(words),
+                i_RDWRB=0,
+                i_I=words[index],
+            )
+
+        return m
+
+
+class TestCase(unittest.TestCase):
+    def test_ice40(self):
+        from .icebreaker import ICEBreakerPlatform
+        image = MultibootImage(ICEBreakerPlatform(), power_on=1)
+        self.assertEqual(image.flash_size, 16 * 2 ** 20)
+        image.add_bitstream(b"\x01" * 100)
+        image.add_bitstream(b"\x02" * 70000)
+        image.add_data(b"\x03" * 10, name="firmware", offset=0x100000)
+        self.assertEqual([(region.name, region.offset) for region in image.regions], [
+            ("warmboot", 0), ("bitstream0", 0x10000), ("bitstream1", 0x20000),
+            ("firmware", 0x100000),
+        ])
+        data = image.image()
+        self.assertEqual(len(data), 0x110000)
+        self.assertEqual(data[:32], bytes.fromhex(
+            "7eaa997e 920000 4403020000 820000 0108".replace(" ", "")) + b"\x00" * 15)
+        self.assertEqual([data[32 * n + 9:32 * n + 12] for n in range(1, 5)],
+                         [b"\x01\x00\x00", b"\x02\x00\x00", b"\x02\x00\x00", b"\x02\x00\x00"])
+        self.assertEqual(data[0x10000:0x10065], b"\x01" * 100 + b"\xff")
+        self.assertEqual(data[0x100000:0x10000b], b"\x03" * 10 + b"\xff")
+
+    def test_ice40_limits(self):
+        from .icebreaker import ICEBreakerPlatform
+        image = MultibootImage(ICEBreakerPlatform(), flash_size=2 ** 20)
+        for _ in range(4):
+            image.add_bitstream(b"\x00" * 100)
+        with self.assertRaisesRegex(ValueError,
+                r"^iCE40 multiboot images hold at most 4 bitstreams$"):
+            image.add_bitstream(b"\x00")
+        with self.assertRaisesRegex(ValueError,
+                r"^big at 0xf0000..0x110000 does not fit in the 0x100000 byte flash$"):
+            image.add_data(b"\x00" * 0x20000, name="big", offset=0xf0000)
+
+    def test_bootloader(self):
+        from .tinyfpga_bx import TinyFPGABXPlatform
+        image = MultibootImage(TinyFPGABXPlatform())
+        self.assertEqual((image.base, image.erase_size), (0x28000, 4096))
+        with self.assertRaisesRegex(ValueError,
+                r"^The user bitstream of TinyFPGABXPlatform must be at offset 0x28000, "
+                r"not 0x0$"):
+            image.add_bitstream(b"\x01" * 100, offset=0)
+        with self.assertRaisesRegex(ValueError,
+                r"^firmware at 0x10000..0x1000a overlaps bootloader at 0x0..0x28000$"):
+            image.add_data(b"\x03" * 10, name="firmware", offset=0x10000)
+        image.add_bitstream(b"\x01" * 100)
+        with self.assertRaisesRegex(ValueError,
+                r"^The bootloader of TinyFPGABXPlatform loads only one user bitstream$"):
+            image.add_bitstream(b"\x02" * 100)
+        image.add_data(b"\x03" * 10, name="firmware", offset=0x50000)
+        with self.assertRaisesRegex(ValueError,
+                r"^big at 0xf0000..0x110000 does not fit in the 0x100000 byte flash$"):
+            image.add_data(b"\x00" * 0x20000, name="big", offset=0xf0000)
+        self.assertEqual([(region.name, region.offset) for region in image.regions], [
+            ("bootloader", 0), ("bitstream0", 0x28000), ("firmware", 0x50000),
+        ])
+        data = image.image()
+        self.assertEqual(len(data), 0x51000 - 0x28000)
+        self.assertEqual(data[:101], b"\x01" * 100 + b"\xff")
+        self.assertEqual(data[0x28000:0x2800b], b"\x03" * 10 + b"\xff")
+        with self.assertRaisesRegex(ValueError,
+                r"^The bootloader of TinyFPGABXPlatform selects the power-on image$"):
+            MultibootImage(TinyFPGABXPlatform(), power_on=1)
+
+    def test_golden(self):
+        from .arty_a7 import ArtyA7_35Platform
+        image = MultibootImage(ArtyA7_35Platform())
+        image.add_bitstream(b"\x00" * 0x1000, name="golden")
+        with self.assertRaisesRegex(ValueError,
+                r"^update at 0x0..0x1000 overlaps golden at 0x0..0x1000$"):
+            image.add_bitstream(b"\x00" * 0x1000, name="update", offset=0)
+        with self.assertRaisesRegex(ValueError,
+                r"^Offset 0x400 of update is not aligned to the erase size 0x10000$"):
+            image.add_bitstream(b"\x00" * 0x1000, name="update", offset=0x400)
+        image.add_bitstream(b"\x00" * 0x1000, name="update", offset=0x400000)
+        self.assertEqual(len(image.image()), 0x410000)
+
+    def test_unknown_size(self):
+        from .versa_ecp5 import VersaECP5Platform
+        with self.assertRaisesRegex(ValueError,
+                r"^The size of the configuration flash of VersaECP5Platform is not known"):
+            MultibootImage(VersaECP5Platform())
+        MultibootImage(VersaECP5Platform(), flash_size=16 * 2 ** 20)
+
+    def test_boot_overrides(self):
+        from .ulx3s import ULX3S_85F_Platform
+        from .arty_a7 import ArtyA7_35Platform
+        self.assertEqual(boot_overrides(ULX3S_85F_Platform(), next_offset=0x200000),
+                         {"ecppack_opts": "--bootaddr 0x200000"})
+        overrides = boot_overrides(ArtyA7_35Platform(), next_offset=0x400000)
+        self.assertIn("NEXT_CONFIG_ADDR 0x00400000", overrides["script_before_bitstream"])
+        overrides = boot_overrides(ArtyA7_35Platform(), fallback=True)
+        self.assertIn("CONFIGFALLBACK ENABLE", overrides["script_before_bitstream"])
+
+    def test_iprog(self):
+        self.assertEqual(_bitswap_bytes(0xaa995566), 0x5599aa66)
+        self.assertEqual(_bitswap_bytes(0x30020001), 0x0c400080)
+
+    def test_warm_reboot(self):
+        from amaranth.hdl import Fragment
+        from .icebreaker import ICEBreakerPlatform
+        from .orangecrab_r0_2 import OrangeCrabR0_2_25FPlatform
+        from .arty_a7 import ArtyA7_35Platform
+        for platform in (ICEBreakerPlatform(), OrangeCrabR0_2_25FPlatform(), ArtyA7_35Platform()):
+            with self.subTest(platform=type(platform).__name__):
+                Fragment.get(WarmReboot(address=0x400000), platform)
+
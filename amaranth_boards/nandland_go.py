@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeICE40Platform
 from .resources import *
+from .programmer import IceprogProgrammer
 
 
 __all__ = ["NandlandGoPlatform"]
@@ -39,10 +37,10 @@ class NandlandGoPlatform(LatticeICE40Platform):
         Connector("pmod", 0, "65 64 63 62 - - 78 79 80 81 - -"),
     ]
 
-    def toolchain_program(self, products, name):
-        iceprog = os.environ.get("ICEPROG", "iceprog")
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            subprocess.check_call([iceprog, bitstream_filename])
+    programmer = IceprogProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
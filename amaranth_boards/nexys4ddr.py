@@ -1,9 +1,8 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import Xc3sprogProgrammer
+from .compression import merge_overrides
 
 
 __all__ = ["Nexys4DDRPlatform"]
@@ -170,12 +169,13 @@ class Nexys4DDRPlatform(XilinxPlatform):
                 set_property CONFIG_VOLTAGE 3.3 [current_design]
                 """
         }
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
+
+    programmer = Xc3sprogProgrammer("nexys4")
 
-    def toolchain_program(self, products, name):
-        xc3sprog = os.environ.get("XC3SPROG", "xc3sprog")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.run([xc3sprog, "-c", "nexys4", bitstream_filename], check=True)
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -6,6 +6,7 @@ import unittest
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .compression import merge_overrides
 
 
 __all__ = ["NitefuryIIPlatform", "LitefuryPlatform"]
@@ -75,10 +76,15 @@ class _BasePlatform(XilinxPlatform):
                 set_property CONFIG_VOLTAGE 3.3 [current_design]
                 """
         }
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
 
-    def toolchain_program(self, product, name, *, programmer="openfpgaloader", flash=True):
+    def toolchain_program(self, product, name, *, programmer="openfpgaloader", flash=True,
+                          mode=None):
         assert programmer in ("vivado", "openfpgaloader")
+        assert mode in (None, "sram", "flash")
+        if mode is not None:
+            flash = mode == "flash"
 
         if programmer == "vivado":
             if flash:
@@ -121,7 +127,10 @@ class _BasePlatform(XilinxPlatform):
             openfpgaloader = os.environ.get("OPENFPGALOADER", "openFPGALoader")
             with product.extract("{}.bin".format(name)) as fn:
                 # TODO: @timkpaine has digilent_hs3 cable
-                subprocess.check_call([openfpgaloader, "-c", "digilent_hs3", fn])
+                args = [openfpgaloader, "-c", "digilent_hs3"]
+                if mode is not None:
+                    args += ["-f" if flash else "-m"]
+                subprocess.check_call([*args, fn])
 
 
 class LitefuryPlatform(_BasePlatform):
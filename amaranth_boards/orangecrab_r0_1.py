@@ -1,10 +1,9 @@
-import os
-import subprocess
 import shutil
 
 from amaranth.build import *
 from amaranth.vendor import LatticeECP5Platform
 from .resources import *
+from .programmer import DFUUtilProgrammer
 
 
 __all__ = ["OrangeCrabR0_1Platform"]
@@ -111,10 +110,10 @@ class OrangeCrabR0_1Platform(LatticeECP5Platform):
         overrides.update(kwargs)
         return super().toolchain_prepare(fragment, name, **overrides)
 
-    def toolchain_program(self, products, name):
-        dfu_util = os.environ.get("DFU_UTIL", "dfu-util")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([dfu_util, "-D", bitstream_filename])
+    programmer = DFUUtilProgrammer(bitstream="{name}.bit")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
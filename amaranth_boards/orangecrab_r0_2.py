@@ -1,10 +1,9 @@
-import os
-import subprocess
 import shutil
 
 from amaranth.build import *
 from amaranth.vendor import LatticeECP5Platform
 from .resources import *
+from .programmer import DFUUtilProgrammer
 
 # NOTE: Keep OrangeCrabR0_2Platform for backwards compatibility
 # Originally, there was only OrangeCrabR0_2Platform, but the 85F variant
@@ -121,10 +120,10 @@ class _OrangeCrabR0_2Platform(LatticeECP5Platform):
         overrides.update(kwargs)
         return super().toolchain_prepare(fragment, name, **overrides)
 
-    def toolchain_program(self, products, name):
-        dfu_util = os.environ.get("DFU_UTIL", "dfu-util")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([dfu_util, "-a 0", "-D", bitstream_filename])
+    programmer = DFUUtilProgrammer(alt=0, bitstream="{name}.bit")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 class OrangeCrabR0_2Platform(_OrangeCrabR0_2Platform):
     device      = "LFE5U-25F"
@@ -0,0 +1,171 @@
+import unittest
+import weakref
+from collections import namedtuple
+
+from amaranth.build import *
+
+
+__all__ = ["PinUser", "pin_index", "pin_users", "find_conflicts", "check_requests"]
+
+
+#: A use of a physical pin by a resource or a connector.
+#:
+#: ``resource`` is the ``(name, number)`` pair of the resource, or ``None`` if the pin is only
+#: routed to a connector; ``subsignal`` is the tuple of subsignal names leading to the pin (empty
+#: for resources without subsignals); ``connector_pin`` is the connector pin (e.g. ``"pmod_0:1"``)
+#: through which the pin is reached, or ``None`` if it is used directly.
+PinUser = namedtuple("PinUser", ("resource", "subsignal", "connector_pin"))
+
+
+class _PinIndex:
+    def __init__(self, platform):
+        # Resources and connectors can be added to a platform at any time; remember how many
+        # there were so that the index can be rebuilt if it goes stale.
+        self.key = (len(platform.resources), len(platform.connectors))
+
+        conn_pins = {}
+        for connector in platform.connectors.values():
+            for conn_pin, plat_pin in connector:
+                conn_pins[conn_pin] = plat_pin
+
+        self.by_pin = {}
+        self.by_resource = {}
+
+        def add_user(name, user):
+            while name in conn_pins:
+                name = conn_pins[name]
+            self.by_pin.setdefault(name, []).append(user)
+            return name
+
+        def add_resource(key, ios, path):
+            for io in ios:
+                if isinstance(io, Subsignal):
+                    add_resource(key, io.ios, path + (io.name,))
+                elif isinstance(io, Pins):
+                    for name in io.names:
+                        self.by_resource[key].append(add_user(name,
+                            PinUser(key, path, name if ":" in name else None)))
+                elif isinstance(io, DiffPairs):
+                    for name in io.p.names + io.n.names:
+                        self.by_resource[key].append(add_user(name,
+                            PinUser(key, path, name if ":" in name else None)))
+
+        for key, resource in platform.resources.items():
+            self.by_resource[key] = []
+            add_resource(key, resource.ios, ())
+
+        # Connector pins not used by any resource are recorded too, so that a resource defined
+        # by physical pin name (such as a differential version of connector I/O) can be matched
+        # to the connector pin it overlaps.
+        used_conn_pins = {user.connector_pin for users in self.by_pin.values() for user in users}
+        for conn_pin in conn_pins:
+            if conn_pin not in used_conn_pins:
+                add_user(conn_pin, PinUser(None, (), conn_pin))
+
+        self.by_pin = {pin: tuple(users) for pin, users in self.by_pin.items()}
+        self.by_resource = {key: tuple(pins) for key, pins in self.by_resource.items()}
+
+
+_indexes = weakref.WeakKeyDictionary()
+
+
+def _get_index(platform):
+    index = _indexes.get(platform)
+    if index is None or index.key != (len(platform.resources), len(platform.connectors)):
+        index = _indexes[platform] = _PinIndex(platform)
+    return index
+
+
+def pin_index(platform):
+    """Return a mapping of every physical pin of ``platform`` to a tuple of :class:`PinUser`.
+
+    The index is built on first use and cached for the lifetime of the platform (or until
+    resources or connectors are added to it).
+    """
+    return _get_index(platform).by_pin
+
+
+def pin_users(platform, pin):
+    """Return a tuple of :class:`PinUser` for the physical pin ``pin`` of ``platform``."""
+    return _get_index(platform).by_pin.get(pin, ())
+
+
+def _normalize_request(request):
+    if isinstance(request, str):
+        return (request, 0)
+    name, number = request
+    return (name, number)
+
+
+def find_conflicts(platform, requests):
+    """Find physical pins that would be used by more than one of ``requests``.
+
+    ``requests`` is an iterable of resource names (implying number 0) or ``(name, number)``
+    pairs. Returns a dictionary mapping each pin used more than once to the tuple of
+    :class:`PinUser` for the requested resources that use it.
+    """
+    index = _get_index(platform)
+    claimed = {}
+    for request in requests:
+        key = _normalize_request(request)
+        if key not in index.by_resource:
+            raise ResourceError("Resource {}#{} does not exist".format(*key))
+        for pin in index.by_resource[key]:
+            claimed.setdefault(pin, set()).add(key)
+
+    conflicts = {}
+    for pin, keys in claimed.items():
+        if len(keys) > 1:
+            conflicts[pin] = tuple(user for user in index.by_pin[pin] if user.resource in keys)
+    return conflicts
+
+
+def check_requests(platform, requests):
+    """Check that ``requests`` can all be requested from ``platform`` at the same time.
+
+    Raises :exc:`ResourceError` describing every shared physical pin otherwise. Unlike calling
+    ``platform.request()`` for each resource, this does not modify the platform.
+    """
+    conflicts = find_conflicts(platform, requests)
+    if conflicts:
+        def describe(user):
+            description = "{}#{}".format(*user.resource)
+            if user.subsignal:
+                description += "." + ".".join(user.subsignal)
+            if user.connector_pin is not None:
+                description += " (via {})".format(user.connector_pin)
+            return description
+
+        raise ResourceError("Requested resources use the same physical pins: {}".format("; ".join(
+            "{} is used by {}".format(pin, ", ".join(describe(user) for user in users))
+            for pin, users in conflicts.items())))
+
+
+class TestCase(unittest.TestCase):
+    def test_shared_pins(self):
+        from .tang_primer_20k import TangPrimer20kDockPlatform
+        platform = TangPrimer20kDockPlatform()
+        self.assertEqual({user.resource for user in pin_users(platform, "T9") if user.resource},
+                         {("ws2812", 0), ("mic_led", 0)})
+        self.assertIs(pin_index(platform), pin_index(platform))
+        self.assertEqual(find_conflicts(platform, ["ws2812", ("led", 0)]), {})
+        with self.assertRaisesRegex(ResourceError,
+                r"^Requested resources use the same physical pins: F14 is used by "):
+            check_requests(platform, ["hdmi", "eth_rmii"])
+
+    def test_connector_overlap(self):
+        from .ulx3s import ULX3S_85F_Platform
+        platform = ULX3S_85F_Platform()
+        self.assertEqual(pin_users(platform, "B11"), (
+            PinUser(("diff_gpio", 0), (), None),
+            PinUser(None, (), "gpio_0:0+"),
+        ))
+        self.assertEqual(set(find_conflicts(platform, ["button_fire", ("button", 0)])), {"R1"})
+
+    def test_stale(self):
+        from .icebreaker import ICEBreakerPlatform
+        platform = ICEBreakerPlatform()
+        self.assertEqual(pin_users(platform, "26"), (PinUser(None, (), "pmod_2:7"),))
+        platform.add_resources(platform.break_off_pmod)
+        self.assertEqual({user.resource for user in pin_users(platform, "26")},
+                         {("led", 2), ("led_r", 1)})
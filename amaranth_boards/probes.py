@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+
+from .cache import _user_cache_dir
+
+
+__all__ = ["Probe", "scan_usb", "ProbeCache", "default_probe_cache", "discover_probes"]
+
+
+# USB IDs of the FTDI chips used as JTAG and SPI probes by most boards.
+_FTDI_USB_IDS = ("0403:6001", "0403:6010", "0403:6011", "0403:6014", "0403:6015")
+
+
+def _normalize_usb_id(usb_id):
+    vendor, product = usb_id.split(":")
+    return "{:04x}:{:04x}".format(int(vendor, 16), int(product, 16))
+
+
+class Probe:
+    """A USB device that can be used to program a board.
+
+    ``usb_id`` is the ``vendor:product`` USB ID in hexadecimal, and ``serial`` is the serial
+    number of the device, or ``None`` if it has none. ``port`` is the location of the device
+    in the USB topology, as the bus number followed by the port numbers of each hub on the way
+    to it (e.g. ``"1-2.3"``); it stays the same as long as the device is plugged into the same
+    port. ``bus`` and ``address`` are the bus number and device address, which change every
+    time the device is plugged in.
+    """
+    def __init__(self, *, usb_id, serial, port, bus=None, address=None, product=None):
+        self.usb_id  = _normalize_usb_id(usb_id)
+        self.serial  = serial
+        self.port    = port
+        self.bus     = bus
+        self.address = address
+        self.product = product
+
+    def as_dict(self):
+        return {
+            "usb_id":  self.usb_id,
+            "serial":  self.serial,
+            "port":    self.port,
+            "bus":     self.bus,
+            "address": self.address,
+            "product": self.product,
+        }
+
+    def __repr__(self):
+        return "<Probe {} {} at {}>".format(self.usb_id, self.serial, self.port)
+
+
+def scan_usb(sysfs="/sys/bus/usb/devices"):
+    """Return a list of :class:`Probe` for every USB device attached to the host.
+
+    Devices are enumerated through ``sysfs``, which is only available on Linux; raises
+    :exc:`NotImplementedError` on other systems.
+    """
+    if not os.path.isdir(sysfs):
+        raise NotImplementedError("Enumerating USB devices requires the Linux sysfs, and {} "
+                                  "does not exist".format(sysfs))
+
+    def read(path, name):
+        try:
+            with open(os.path.join(path, name)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    probes = []
+    for port in sorted(os.listdir(sysfs)):
+        # Interfaces are named like `1-2.3:1.0`, and root hubs like `usb1`.
+        if ":" in port or port.startswith("usb"):
+            continue
+        path = os.path.join(sysfs, port)
+        vendor, product = read(path, "idVendor"), read(path, "idProduct")
+        if vendor is None or product is None:
+            continue
+        bus, address = read(path, "busnum"), read(path, "devnum")
+        probes.append(Probe(usb_id="{}:{}".format(vendor, product), serial=read(path, "serial"),
+                            port=port, bus=None if bus is None else int(bus),
+                            address=None if address is None else int(address),
+                            product=read(path, "product")))
+    return probes
+
+
+class ProbeCache:
+    """Record of the USB devices attached to the host, rescanned at most every ``ttl`` seconds.
+
+    Scanning the USB bus is slow, and scans from several processes programming boards at once
+    interfere with each other; the record is therefore shared by all processes through the file
+    ``path``, which defaults to ``probes.json`` in ``amaranth-boards/probes`` in the user cache
+    directory. ``scan`` is called to enumerate the devices, and defaults to :func:`scan_usb`.
+    """
+    def __init__(self, path=None, *, ttl=60, scan=None):
+        if path is None:
+            path = os.path.join(_user_cache_dir("probes"), "probes.json")
+        self.path  = path
+        self.ttl   = ttl
+        self._scan = scan_usb if scan is None else scan
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - record["time"] > self.ttl:
+            return None
+        return [Probe(**probe) for probe in record["probes"]]
+
+    def _store(self, probes):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(os.path.abspath(self.path)),
+                                         delete=False) as f:
+            json.dump({"time": time.time(), "probes": [probe.as_dict() for probe in probes]},
+                      f, indent=1)
+        os.replace(f.name, self.path)
+
+    def probes(self, *, refresh=False):
+        """Return the list of :class:`Probe` attached to the host, rescanning the bus if
+        ``refresh`` is true or the record is older than ``ttl``."""
+        with self._lock:
+            probes = None if refresh else self._load()
+            if probes is None:
+                probes = self._scan()
+                self._store(probes)
+            return probes
+
+    def invalidate(self):
+        """Forget the record, e.g. after a device was plugged in or out."""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def find(self, usb_ids=None, *, serial=None, port=None):
+        """Return the probes with one of ``usb_ids`` (any, if ``None``), and the given
+        ``serial`` and ``port`` if they are not ``None``.
+
+        If no probe matches a ``serial`` or ``port``, the bus is rescanned once in case the
+        device was plugged in since the last scan.
+        """
+        if usb_ids is not None:
+            usb_ids = {_normalize_usb_id(usb_id) for usb_id in usb_ids}
+
+        def matching(probes):
+            return [probe for probe in probes
+                    if (usb_ids is None or probe.usb_id in usb_ids) and
+                       (serial is None or probe.serial == serial) and
+                       (port is None or probe.port == port)]
+
+        probes = matching(self.probes())
+        if not probes and (serial is not None or port is not None):
+            probes = matching(self.probes(refresh=True))
+        return probes
+
+
+_default_probe_cache = None
+
+
+def default_probe_cache():
+    """Return the :class:`ProbeCache` used when none is specified."""
+    global _default_probe_cache
+    if _default_probe_cache is None:
+        _default_probe_cache = ProbeCache()
+    return _default_probe_cache
+
+
+def discover_probes(platforms, *, cache=None, refresh=False):
+    """Find the probes that could program each of ``platforms``.
+
+    A probe could program a board if its USB ID is one of the ``usb_ids`` of the programmer of
+    the board's platform; boards with the same kind of probe (e.g. several iCEstick boards, or
+    boards built around the same FTDI chip) share the same probes, which are then told apart
+    by their serial number or USB port.
+
+    Returns a dictionary mapping each platform to a list of :class:`Probe`.
+    """
+    if cache is None:
+        cache = default_probe_cache()
+    probes = cache.probes(refresh=refresh)
+    result = {}
+    for platform in platforms:
+        usb_ids = getattr(getattr(platform, "programmer", None), "usb_ids", ())
+        usb_ids = {_normalize_usb_id(usb_id) for usb_id in usb_ids}
+        result[platform] = [probe for probe in probes if probe.usb_id in usb_ids]
+    return result
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.sysfs = os.path.join(self.root.name, "devices")
+        self.add_device("usb1", "1d6b", "0002")
+        self.add_device("1-1", "0403", "6010", serial="ib1", busnum=1, devnum=5)
+        self.add_device("1-1:1.0")
+        self.add_device("1-2.3", "0403", "6015", serial="D00123", busnum=1, devnum=9)
+        self.add_device("1-2.4", "0403", "6010", busnum=1, devnum=10)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def add_device(self, port, vendor=None, product=None, **attrs):
+        path = os.path.join(self.sysfs, port)
+        os.makedirs(path)
+        for name, value in dict(idVendor=vendor, idProduct=product, **attrs).items():
+            if value is not None:
+                with open(os.path.join(path, name), "w") as f:
+                    f.write("{}\n".format(value))
+
+    def test_scan_usb(self):
+        probes = scan_usb(self.sysfs)
+        self.assertEqual([(probe.port, probe.usb_id, probe.serial) for probe in probes], [
+            ("1-1", "0403:6010", "ib1"), ("1-2.3", "0403:6015", "D00123"),
+            ("1-2.4", "0403:6010", None),
+        ])
+        self.assertEqual((probes[0].bus, probes[0].address), (1, 5))
+
+    def test_cache(self):
+        scans = []
+        def scan():
+            scans.append(None)
+            return scan_usb(self.sysfs)
+
+        cache = ProbeCache(os.path.join(self.root.name, "probes.json"), scan=scan)
+        self.assertEqual([probe.port for probe in cache.find(["0x0403:0x6010"])],
+                         ["1-1", "1-2.4"])
+        self.assertEqual(cache.find(port="1-2.3")[0].serial, "D00123")
+        self.assertEqual(len(scans), 1)
+
+        self.add_device("1-2.1", "0403", "6010", serial="ib2")
+        self.assertEqual(cache.find(serial="ib2")[0].port, "1-2.1")
+        self.assertEqual(len(scans), 2)
+        self.assertEqual(cache.find(serial="missing"), [])
+        self.assertEqual(len(scans), 3)
+
+        cache.ttl = 0
+        cache.probes()
+        self.assertEqual(len(scans), 4)
+
+    def test_discover_probes(self):
+        from .icebreaker import ICEBreakerPlatform
+        from .ulx3s import ULX3S_85F_Platform
+
+        cache = ProbeCache(os.path.join(self.root.name, "probes.json"),
+                           scan=lambda: scan_usb(self.sysfs))
+        icebreaker, ulx3s = ICEBreakerPlatform(), ULX3S_85F_Platform()
+        probes = discover_probes([icebreaker, ulx3s], cache=cache)
+        self.assertEqual([probe.port for probe in probes[icebreaker]], ["1-1", "1-2.4"])
+        self.assertEqual([probe.port for probe in probes[ulx3s]], ["1-2.3"])
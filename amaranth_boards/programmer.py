@@ -0,0 +1,1239 @@
+import os
+import sys
+import json
+import time
+import inspect
+import tempfile
+import contextlib
+import textwrap
+import threading
+import subprocess
+import unittest
+
+from .cache import _user_cache_dir
+from .probes import _FTDI_USB_IDS, default_probe_cache
+
+
+__all__ = ["Programmer", "IceprogProgrammer", "OpenFPGALoaderProgrammer", "JTAGRateCache",
+           "OpenOCDProgrammer", "OpenOCDSession", "Xc3sprogProgrammer", "QuartusProgrammer",
+           "DFUUtilProgrammer", "TinyprogProgrammer", "MercpclProgrammer", "ImpactProgrammer",
+           "FakeProgrammer", "ProgramTarget", "ProgramResult", "program_boards", "program_all",
+           "program_board"]
+
+
+def _step_timer(on_step):
+    # Returns a function that reports the time elapsed since it was last called (or created)
+    # to `on_step`, under the name of the step that just finished.
+    last = time.perf_counter()
+    def step(name):
+        nonlocal last
+        now = time.perf_counter()
+        if on_step is not None:
+            on_step(name, now - last)
+        last = now
+    return step
+
+
+class Programmer:
+    """Description of how to program a board with a command line tool.
+
+    A board that is programmed with one of the common tools sets the ``programmer`` attribute of
+    its platform to an instance of a subclass, and its ``toolchain_program`` calls
+    :meth:`program`. The same description is used by :func:`program_boards` to program many
+    boards at once.
+
+    Subclasses set ``tool`` to the name of the tool (which can be overridden with the environment
+    variable named like the tool, e.g. ``DFU_UTIL`` for ``dfu-util``), and implement
+    :meth:`command`. ``files`` are the names of the build products used, which are formatted
+    with the name of the design. Programmers may accept options specific to the tool, which are
+    passed through :meth:`program` to :meth:`command`.
+
+    ``modes`` lists the ways the tool can program a board: ``"sram"`` loads the bitstream
+    directly into the FPGA, which is fast but lost at power-off, and ``"flash"`` writes it to
+    the configuration flash. The ``mode`` option selects one of them, and defaults to
+    :attr:`default_mode`.
+
+    ``usb_ids`` lists the ``vendor:product`` USB IDs of the probes the tool works with, which
+    allows selecting a probe by the USB port it is plugged into (see :meth:`serial_for_port`).
+    """
+    tool    = None
+    modes   = ()
+    usb_ids = ()
+
+    def __init__(self, *, files):
+        self.files = tuple(files)
+
+    @property
+    def tool_env_var(self):
+        return self.tool.upper().replace("-", "_").replace("+", "X")
+
+    def tool_path(self):
+        return os.environ.get(self.tool_env_var, self.tool)
+
+    @property
+    def default_mode(self):
+        return self.modes[0]
+
+    def _mode_error(self, mode):
+        return ValueError("{} cannot program a board in {} mode".format(self.tool, mode))
+
+    def _mode(self, mode):
+        if mode is None:
+            return self.default_mode
+        if mode not in self.modes:
+            raise self._mode_error(mode)
+        return mode
+
+    def serial_for_port(self, port, *, cache=None):
+        """Return the serial number of the probe plugged into the USB ``port`` (e.g. ``"1-2.3"``).
+
+        The probes attached to the host are looked up in ``cache`` (:class:`ProbeCache`), which
+        defaults to the one shared by all programmers. Raises :exc:`LookupError` if no probe
+        for this tool is plugged into ``port``.
+        """
+        if not self.usb_ids:
+            raise ValueError("{} probes cannot be selected by USB port".format(self.tool))
+        if cache is None:
+            cache = default_probe_cache()
+        probes = cache.find(self.usb_ids, port=port)
+        if not probes:
+            raise LookupError("No {} probe is plugged into USB port {}".format(self.tool, port))
+        probe, = probes
+        if probe.serial is None:
+            raise ValueError("The {} probe plugged into USB port {} has no serial number"
+                             .format(self.tool, port))
+        return probe.serial
+
+    def _port_serial(self, serial, port):
+        if port is None:
+            return serial
+        if serial is not None:
+            raise ValueError("A probe can be selected by serial number or by USB port, but "
+                             "not both")
+        return self.serial_for_port(port)
+
+    def command(self, filenames, *, serial=None, mode=None, **options):
+        """Return the command line programming a board with the extracted ``filenames``.
+
+        ``filenames`` are in the order of ``files``. If ``serial`` is not ``None``, the command
+        must only program the board connected through the probe with that serial number.
+        Raises :exc:`ValueError` if ``mode`` is not one of ``modes``.
+        """
+        raise NotImplementedError # :nocov:
+
+    def input(self, filenames):
+        """Return the data written to the standard input of the tool, or ``None``."""
+        return None
+
+    def _unsupported_serial(self):
+        return ValueError("{} cannot select a probe by serial number".format(self.tool))
+
+    def _extract(self, products, name):
+        return products.extract(*(filename.format(name=name) for filename in self.files))
+
+    @staticmethod
+    def _as_tuple(filenames):
+        return (filenames,) if isinstance(filenames, str) else tuple(filenames)
+
+    def program(self, products, name, *, serial=None, port=None, on_step=None, **options):
+        """Program the board with the build ``products``, waiting until it is done.
+
+        The board is selected by the ``serial`` number of its probe, or by the USB ``port`` its
+        probe is plugged into, if either is provided. ``on_step``, if provided, is called with
+        the name and duration in seconds of each step of programming: ``"extract"`` (writing
+        the build products to temporary files), ``"prepare"`` (building the command line) and
+        ``"run"`` (running the tool).
+        """
+        serial = self._port_serial(serial, port)
+        step = _step_timer(on_step)
+        with self._extract(products, name) as filenames:
+            filenames = self._as_tuple(filenames)
+            step("extract")
+            args = self.command(filenames, serial=serial, **options)
+            step("prepare")
+            subprocess.run(args, input=self.input(filenames), check=True)
+            step("run")
+
+    async def program_async(self, products, name, *, serial=None, port=None, on_step=None,
+                            **options):
+        """Program the board with the build ``products`` without blocking the event loop.
+
+        The output of the tool is returned instead of being printed, so that the output of
+        several tools running at once is not interleaved. Raises
+        :exc:`subprocess.CalledProcessError` if the tool fails. ``on_step`` is called like
+        for :meth:`program`.
+        """
+        import asyncio
+
+        if port is not None:
+            serial = await asyncio.to_thread(self._port_serial, serial, port)
+        step = _step_timer(on_step)
+        with self._extract(products, name) as filenames:
+            filenames = self._as_tuple(filenames)
+            step("extract")
+            # Building the command line may involve running the tool, e.g. to find a working
+            # JTAG clock rate.
+            args  = await asyncio.to_thread(self.command, filenames, serial=serial, **options)
+            input = self.input(filenames)
+            step("prepare")
+            process = await asyncio.create_subprocess_exec(*args,
+                stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            output, _ = await process.communicate(input)
+            step("run")
+        output = output.decode("utf-8", errors="replace")
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, args, output)
+        return output
+
+    def __repr__(self):
+        return "<{} {}>".format(type(self).__name__, " ".join(self.files))
+
+
+class IceprogProgrammer(Programmer):
+    """Program an iCE40 board through an FTDI probe with ``iceprog``.
+
+    The bitstream is written to the SPI flash, or loaded directly into the FPGA if ``sram`` is
+    true or the ``mode`` option is ``"sram"``. ``usb_id`` is the ``vendor:product`` USB ID of
+    the probe, used to select it by serial number.
+    """
+    tool  = "iceprog"
+    modes = ("flash", "sram")
+
+    def __init__(self, *, sram=False, usb_id="0x0403:0x6010"):
+        super().__init__(files=["{name}.bin"])
+        self.sram    = sram
+        self.usb_id  = usb_id
+        self.usb_ids = (usb_id,)
+
+    @property
+    def default_mode(self):
+        return "sram" if self.sram else "flash"
+
+    def command(self, filenames, *, serial=None, mode=None):
+        args = [self.tool_path()]
+        if serial is not None:
+            args += ["-d", "s:{}:{}".format(self.usb_id, serial)]
+        if self._mode(mode) == "sram":
+            args += ["-S"]
+        return [*args, *filenames]
+
+
+class OpenFPGALoaderProgrammer(Programmer):
+    """Program a board with ``openFPGALoader``.
+
+    ``board``, ``cable`` and ``fpga_part`` are passed as the ``-b``, ``-c`` and ``--fpga-part``
+    options if provided. The bitstream is loaded directly into the FPGA with ``-m`` if ``sram``
+    is true or the ``mode`` option is ``"sram"``, and written to the configuration flash with
+    ``-f`` if the ``mode`` option is ``"flash"``; otherwise, ``openFPGALoader`` loads it into
+    the FPGA by default. Probes are selected by the serial number of their FTDI chip;
+    ``usb_ids`` are the USB IDs of the probes that may be used, and default to those of the
+    common FTDI chips.
+    """
+    tool  = "openFPGALoader"
+    modes = ("sram", "flash")
+
+    def __init__(self, *, board=None, cable=None, fpga_part=None, sram=False,
+                 bitstream="{name}.bit", usb_ids=_FTDI_USB_IDS):
+        super().__init__(files=[bitstream])
+        self.board     = board
+        self.cable     = cable
+        self.fpga_part = fpga_part
+        self.sram      = sram
+        self.usb_ids   = tuple(usb_ids)
+
+    def command(self, filenames, *, serial=None, mode=None):
+        args = [self.tool_path()]
+        if self.board is not None:
+            args += ["-b", self.board]
+        if self.cable is not None:
+            args += ["-c", self.cable]
+        if self.fpga_part is not None:
+            args += ["--fpga-part", self.fpga_part]
+        if serial is not None:
+            args += ["--ftdi-serial", serial]
+        if mode is not None:
+            args += ["-m" if self._mode(mode) == "sram" else "-f"]
+        elif self.sram:
+            args += ["-m"]
+        return [*args, *filenames]
+
+
+# JTAG clock rates tried when negotiating the rate, in kHz.
+_JTAG_RATES = (30000, 25000, 20000, 15000, 10000, 6000, 3000, 1000, 500, 100)
+
+# Shifts patterns through the IDCODE register of a chain with a single TAP, which is selected
+# after `jtag arp_init`; each pattern comes out after the 32 bits of the IDCODE.
+_JTAG_LOOPBACK = (
+    "if {[llength [jtag names]] == 1} { "
+    "foreach pattern {0xa5c3e10f 0x5a3c1ef0} { "
+    "set out [drscan [jtag names] 32 $pattern 32 0]; "
+    "if {[expr 0x[lindex $out 1]] != $pattern} { "
+    "error \"Error: JTAG data read back as 0x[lindex $out 1] instead of $pattern\" "
+    "} } }"
+)
+
+
+class JTAGRateCache:
+    """Record of the JTAG clock rate that works with each probe, by serial number.
+
+    The record is stored in ``path``, which defaults to ``jtag_rates.json`` in
+    ``amaranth-boards/jtag`` in the user cache directory. Probes without a serial number are
+    recorded as ``"default"``.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(_user_cache_dir("jtag"), "jtag_rates.json")
+        self.path  = path
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _store(self, rates):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(os.path.abspath(self.path)),
+                                         delete=False) as f:
+            json.dump(rates, f, indent=1)
+        os.replace(f.name, self.path)
+
+    @staticmethod
+    def _key(serial):
+        return "default" if serial is None else serial
+
+    def get(self, serial):
+        return self._load().get(self._key(serial))
+
+    def set(self, serial, jtag_khz):
+        with self._lock:
+            rates = self._load()
+            rates[self._key(serial)] = jtag_khz
+            self._store(rates)
+
+    def forget(self, serial):
+        with self._lock:
+            rates = self._load()
+            if rates.pop(self._key(serial), None) is not None:
+                self._store(rates)
+
+
+class OpenOCDProgrammer(Programmer):
+    """Program a board over JTAG with ``openocd``.
+
+    ``config``, if provided, is the name of an OpenOCD configuration file among the build
+    products. ``setup`` are the TCL commands run before ``init`` (such as sourcing a board
+    configuration), and ``commands`` are those run after it, with ``{bitstream}`` replaced by
+    the path to the extracted ``bitstream``.
+
+    The ``jtag_khz`` option sets the JTAG clock rate in kHz, overriding the configuration.
+    If it is ``"auto"``, the fastest rate up to ``max_jtag_khz`` at which the scan chain and
+    data shifted through it are read back reliably is used (see :meth:`negotiate_jtag_khz`),
+    and recorded in ``rate_cache`` (:class:`JTAGRateCache`) for the next time the same probe is
+    used.
+
+    The ``session`` option programs the board through an :class:`OpenOCDSession` opened with
+    :meth:`open_session` instead of starting OpenOCD. Only loading the bitstream directly into
+    the FPGA is supported.
+    """
+    tool    = "openocd"
+    modes   = ("sram",)
+    usb_ids = _FTDI_USB_IDS
+
+    def __init__(self, commands, *, setup=(), config=None, bitstream="{name}.bit",
+                 max_jtag_khz=30000, rate_cache=None):
+        super().__init__(files=[bitstream] if config is None else [config, bitstream])
+        self.commands     = list(commands)
+        self.setup        = list(setup)
+        self.config       = config
+        self.max_jtag_khz = max_jtag_khz
+        self._rate_cache  = rate_cache
+
+    @property
+    def rate_cache(self):
+        if self._rate_cache is None:
+            self._rate_cache = JTAGRateCache()
+        return self._rate_cache
+
+    def _setup_commands(self, *, serial=None, jtag_khz=None):
+        setup = list(self.setup)
+        if serial is not None:
+            setup.append("adapter serial {}".format(serial))
+        if jtag_khz is not None:
+            setup.append("adapter speed {}".format(jtag_khz))
+        return setup
+
+    def _script(self, commands, *, serial=None, jtag_khz=None):
+        return "; ".join([*self._setup_commands(serial=serial, jtag_khz=jtag_khz), "init",
+                          *commands, "exit"])
+
+    def script(self, bitstream_filename, *, serial=None, jtag_khz=None):
+        return self._script([command.format(bitstream=bitstream_filename)
+                             for command in self.commands],
+                            serial=serial, jtag_khz=jtag_khz)
+
+    def _args(self, config_filename):
+        args = [self.tool_path()]
+        if config_filename is not None:
+            args += ["-f", config_filename]
+        return args
+
+    def negotiate_jtag_khz(self, config_filename=None, *, serial=None, rescans=8, run=None):
+        """Find the fastest JTAG clock rate at which the board responds reliably.
+
+        Starting from ``max_jtag_khz``, the rate is lowered until OpenOCD reads back the
+        IDCODE of every device in the scan chain without errors, ``rescans`` times over. If the
+        chain has a single device, each rescan also shifts two 32-bit patterns through its
+        IDCODE register and checks that they come out unchanged, so that a rate at which only
+        the IDCODE can be read is not chosen; longer chains are only checked by their IDCODEs.
+        ``config_filename`` is the extracted ``config``, if any. ``run`` is called with the
+        command line and must return a tuple of the exit status and output; it defaults to
+        running the command.
+
+        Raises :exc:`RuntimeError` if no rate works.
+        """
+        if run is None:
+            def run(args):
+                result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        stdin=subprocess.DEVNULL)
+                return result.returncode, result.stdout.decode("utf-8", errors="replace")
+        checks = ["jtag arp_init", _JTAG_LOOPBACK] * rescans
+        for jtag_khz in (rate for rate in _JTAG_RATES if rate <= self.max_jtag_khz):
+            returncode, output = run([*self._args(config_filename), "-c",
+                                      self._script(checks, serial=serial, jtag_khz=jtag_khz)])
+            if returncode == 0 and "Error" not in output and "UNEXPECTED" not in output:
+                return jtag_khz
+        raise RuntimeError("No JTAG clock rate works with the probe{}"
+                           .format("" if serial is None else " {}".format(serial)))
+
+    def _resolve_jtag_khz(self, config_filename, serial, jtag_khz):
+        if jtag_khz == "auto":
+            jtag_khz = self.rate_cache.get(serial)
+            if jtag_khz is None:
+                jtag_khz = self.negotiate_jtag_khz(config_filename, serial=serial)
+                self.rate_cache.set(serial, jtag_khz)
+        return jtag_khz
+
+    def command(self, filenames, *, serial=None, mode=None, jtag_khz=None):
+        self._mode(mode)
+        config_filename = None
+        if self.config is not None:
+            config_filename, *filenames = filenames
+        bitstream_filename, = filenames
+        jtag_khz = self._resolve_jtag_khz(config_filename, serial, jtag_khz)
+        return [*self._args(config_filename), "-c",
+                self.script(bitstream_filename, serial=serial, jtag_khz=jtag_khz)]
+
+    def open_session(self, products=None, name="top", *, serial=None, port=None, jtag_khz=None,
+                     timeout=10):
+        """Start OpenOCD and keep it running, returning an :class:`OpenOCDSession`.
+
+        ``products`` are the build products containing ``config``, if it is used; the session
+        can then program any bitstream built for the same board. The probe and JTAG clock rate
+        are selected like for :meth:`program`. ``timeout`` is the time in seconds to wait for
+        OpenOCD to start.
+        """
+        serial = self._port_serial(serial, port)
+        stack = contextlib.ExitStack()
+        try:
+            config_filename = None
+            if self.config is not None:
+                config_filename = stack.enter_context(
+                    products.extract(self.config.format(name=name)))
+            jtag_khz = self._resolve_jtag_khz(config_filename, serial, jtag_khz)
+            return OpenOCDSession(self, config_filename, serial=serial, jtag_khz=jtag_khz,
+                                  timeout=timeout, on_close=stack.close)
+        except:
+            stack.close()
+            raise
+
+    def program(self, products, name, *, serial=None, port=None, jtag_khz=None, session=None,
+                **options):
+        if session is not None:
+            if serial is not None or port is not None or jtag_khz is not None:
+                raise ValueError("The probe and JTAG clock rate of a session are selected when "
+                                 "it is opened")
+            session.program(products, name, **options)
+            return
+        serial = self._port_serial(serial, port)
+        try:
+            super().program(products, name, serial=serial, jtag_khz=jtag_khz, **options)
+        except subprocess.CalledProcessError:
+            # The recorded rate may have stopped working, e.g. if the cable was changed.
+            if jtag_khz == "auto":
+                self.rate_cache.forget(serial)
+            raise
+
+    async def program_async(self, products, name, *, serial=None, port=None, jtag_khz=None,
+                            **options):
+        import asyncio
+
+        if port is not None:
+            serial = await asyncio.to_thread(self._port_serial, serial, port)
+        try:
+            return await super().program_async(products, name, serial=serial, jtag_khz=jtag_khz,
+                                               **options)
+        except subprocess.CalledProcessError:
+            if jtag_khz == "auto":
+                self.rate_cache.forget(serial)
+            raise
+
+
+def _free_tcp_port():
+    import socket
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class OpenOCDSession:
+    """OpenOCD process that is kept running to program a board many times.
+
+    Starting OpenOCD and bringing up the probe and the scan chain often takes longer than loading
+    a bitstream. A session does it once, and then runs commands through the TCL server of
+    OpenOCD, so that any number of bitstreams can be loaded (with :meth:`program`) and other
+    operations performed (with :meth:`command`, e.g. writing a flash through ``jtagspi``)
+    without starting OpenOCD again.
+
+    Sessions are opened with :meth:`OpenOCDProgrammer.open_session`, and must be closed with
+    :meth:`close`, or used as a context manager. Commands from several threads are run one
+    at a time.
+    """
+    def __init__(self, programmer, config_filename=None, *, serial=None, jtag_khz=None,
+                 timeout=10, on_close=None):
+        import socket
+
+        self.programmer = programmer
+        self.serial     = serial
+        self.tcl_port   = _free_tcp_port()
+        self._on_close  = on_close
+        self._lock      = threading.Lock()
+        self._socket    = None
+
+        script = "; ".join([
+            *programmer._setup_commands(serial=serial, jtag_khz=jtag_khz),
+            "tcl_port {}".format(self.tcl_port),
+            "telnet_port disabled",
+            "gdb_port disabled",
+            "init",
+        ])
+        self._log = tempfile.TemporaryFile()
+        self._process = subprocess.Popen([*programmer._args(config_filename), "-c", script],
+            stdin=subprocess.DEVNULL, stdout=self._log, stderr=subprocess.STDOUT)
+
+        deadline = time.monotonic() + timeout
+        while self._socket is None:
+            if self._process.poll() is not None:
+                output = self.log()
+                self.close()
+                raise subprocess.CalledProcessError(self._process.returncode,
+                                                    self._process.args, output)
+            try:
+                self._socket = socket.create_connection(("127.0.0.1", self.tcl_port))
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    self.close()
+                    raise TimeoutError("OpenOCD did not start within {} s".format(timeout))
+                time.sleep(0.05)
+
+    def log(self):
+        """Return the output of OpenOCD so far."""
+        self._log.seek(0)
+        return self._log.read().decode("utf-8", errors="replace")
+
+    def _request(self, request):
+        self._socket.sendall(request.encode("utf-8") + b"\x1a")
+        response = b""
+        while not response.endswith(b"\x1a"):
+            data = self._socket.recv(65536)
+            if not data:
+                raise ConnectionError("OpenOCD closed the connection")
+            response += data
+        return response[:-1].decode("utf-8", errors="replace")
+
+    def command(self, command):
+        """Run the TCL ``command``, returning its output.
+
+        Raises :exc:`RuntimeError` if the command fails.
+        """
+        with self._lock:
+            response = self._request(
+                "if {[catch {capture {" + command + "}} __result]} "
+                "{set __result \"ERROR $__result\"} else {set __result \"OK $__result\"}")
+        status, _, output = response.partition(" ")
+        if status != "OK":
+            raise RuntimeError("OpenOCD command {!r} failed: {}".format(command, output.strip()))
+        return output
+
+    def program(self, products, name="top", *, mode=None, on_step=None):
+        """Load the bitstream among the build ``products`` into the FPGA, returning the output
+        of the commands.
+
+        ``on_step`` is called with the duration of the ``"extract"`` and ``"run"`` steps.
+        """
+        self.programmer._mode(mode)
+        step = _step_timer(on_step)
+        with products.extract(self.programmer.files[-1].format(name=name)) as bitstream_filename:
+            step("extract")
+            output = "".join(self.command(command.format(bitstream=bitstream_filename))
+                             for command in self.programmer.commands)
+            step("run")
+        return output
+
+    def close(self):
+        """Stop OpenOCD."""
+        if self._socket is not None:
+            try:
+                self._socket.sendall(b"shutdown\x1a")
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+        if self._process.poll() is None:
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        self._log.close()
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return "<OpenOCDSession {} on port {}>".format(self.serial or "default", self.tcl_port)
+
+
+class Xc3sprogProgrammer(Programmer):
+    """Program a Xilinx FPGA board over JTAG with ``xc3sprog``.
+
+    ``cable`` is the name of the JTAG cable, and ``position``, if provided, is the position of
+    the FPGA in the JTAG chain. Probes are selected by the serial number of their FTDI chip.
+    Only loading the bitstream directly into the FPGA is supported.
+    """
+    tool    = "xc3sprog"
+    modes   = ("sram",)
+    usb_ids = _FTDI_USB_IDS
+
+    def __init__(self, cable, *, position=None):
+        super().__init__(files=["{name}.bit"])
+        self.cable    = cable
+        self.position = position
+
+    def command(self, filenames, *, serial=None, mode=None):
+        self._mode(mode)
+        args = [self.tool_path(), "-c", self.cable]
+        if serial is not None:
+            args += ["-s", serial]
+        if self.position is not None:
+            args += ["-p", str(self.position)]
+        return [*args, *filenames]
+
+
+class QuartusProgrammer(Programmer):
+    """Program an Intel FPGA board over JTAG with ``quartus_pgm``.
+
+    ``device_index``, if provided, is the position of the FPGA in the JTAG chain (e.g. 2 on
+    SoC FPGAs, which put the ARM cores first). Probes are selected by their cable name, as shown
+    by ``quartus_pgm -l``, in place of a serial number. Only loading the bitstream directly into
+    the FPGA is supported.
+    """
+    tool  = "quartus_pgm"
+    modes = ("sram",)
+
+    def __init__(self, *, device_index=None):
+        super().__init__(files=["{name}.sof"])
+        self.device_index = device_index
+
+    def command(self, filenames, *, serial=None, mode=None):
+        self._mode(mode)
+        bitstream_filename, = filenames
+        args = [self.tool_path()]
+        if serial is not None:
+            args += ["-c", serial]
+        operation = "P;" + bitstream_filename
+        if self.device_index is not None:
+            operation += "@{}".format(self.device_index)
+        return [*args, "--haltcc", "--mode", "JTAG", "--operation", operation]
+
+
+class DFUUtilProgrammer(Programmer):
+    """Program a board through its USB DFU bootloader with ``dfu-util``.
+
+    ``device`` is the ``vendor:product`` USB ID of the bootloader, ``alt`` is the DFU
+    alternate setting, and the board is reset after programming if ``reset`` is true. The
+    bootloader writes the bitstream to the configuration flash.
+    """
+    tool  = "dfu-util"
+    modes = ("flash",)
+
+    def __init__(self, *, device=None, alt=None, reset=False, bitstream="{name}.bin"):
+        super().__init__(files=[bitstream])
+        self.device  = device
+        self.alt     = alt
+        self.reset   = reset
+        self.usb_ids = () if device is None else (device,)
+
+    def command(self, filenames, *, serial=None, mode=None):
+        self._mode(mode)
+        bitstream_filename, = filenames
+        args = [self.tool_path()]
+        if self.device is not None:
+            args += ["-d", self.device]
+        if serial is not None:
+            args += ["-S", serial]
+        if self.alt is not None:
+            args += ["-a", str(self.alt)]
+        if self.reset:
+            args += ["-R"]
+        return [*args, "-D", bitstream_filename]
+
+
+class TinyprogProgrammer(Programmer):
+    """Program a TinyFPGA board through its USB bootloader with ``tinyprog``.
+
+    Boards are selected by their bootloader ID in place of a serial number. The bootloader
+    writes the bitstream to the configuration flash.
+    """
+    tool    = "tinyprog"
+    modes   = ("flash",)
+    usb_ids = ("1d50:6130",)
+
+    def __init__(self):
+        super().__init__(files=["{name}.bin"])
+
+    def command(self, filenames, *, serial=None, mode=None):
+        self._mode(mode)
+        bitstream_filename, = filenames
+        args = [self.tool_path()]
+        if serial is not None:
+            args += ["-i", serial]
+        return [*args, "-p", bitstream_filename]
+
+
+class MercpclProgrammer(Programmer):
+    """Program a Micro-Nova Mercury board with ``mercpcl``
+    (https://github.com/cr1901/mercpcl), which writes the configuration flash."""
+    tool  = "mercpcl"
+    modes = ("flash",)
+
+    def __init__(self):
+        super().__init__(files=["{name}.bin"])
+
+    def command(self, filenames, *, serial=None, mode=None):
+        self._mode(mode)
+        if serial is not None:
+            raise self._unsupported_serial()
+        return [self.tool_path(), *filenames]
+
+
+class ImpactProgrammer(Programmer):
+    """Program a Xilinx FPGA board over JTAG with iMPACT from ISE, loading the bitstream
+    directly into the FPGA."""
+    tool  = "impact"
+    modes = ("sram",)
+
+    def __init__(self):
+        super().__init__(files=["{name}.bit"])
+
+    def command(self, filenames, *, serial=None, mode=None):
+        self._mode(mode)
+        if serial is not None:
+            raise self._unsupported_serial()
+        return [self.tool_path(), "-batch"]
+
+    def input(self, filenames):
+        bitstream_filename, = filenames
+        return textwrap.dedent("""
+            setMode -bscan
+            setCable -port auto
+            addDevice -p 1 -file "{}"
+            program -p 1
+            exit
+        """).format(bitstream_filename).encode("utf-8")
+
+
+class FakeProgrammer(Programmer):
+    """Programmer that pretends to program a board, for testing without hardware.
+
+    Programming takes ``latency`` seconds, and fails for the serial numbers in ``failing``.
+    The build products must contain ``bitstream``. Every successful programming is recorded in
+    ``programmed`` as a tuple of the design name, serial number and bitstream, and the mode and
+    other options it was given are recorded in ``options``.
+    """
+    tool  = "fake"
+    modes = ("sram", "flash")
+
+    def __init__(self, *, latency=0, failing=(), bitstream="{name}.bin"):
+        super().__init__(files=[bitstream])
+        self.latency    = latency
+        self.failing    = set(failing)
+        self.programmed = []
+        self.options    = []
+
+    def _fake_program(self, products, name, serial, mode, options):
+        mode = self._mode(mode)
+        bitstream = products.get(self.files[0].format(name=name))
+        if serial in self.failing:
+            raise subprocess.CalledProcessError(1, [self.tool], "no probe with serial {!r}"
+                                                .format(serial))
+        self.programmed.append((name, serial, bitstream))
+        self.options.append({"mode": mode, **options})
+
+    def program(self, products, name, *, serial=None, mode=None, on_step=None, **options):
+        step = _step_timer(on_step)
+        time.sleep(self.latency)
+        self._fake_program(products, name, serial, mode, options)
+        step("run")
+
+    async def program_async(self, products, name, *, serial=None, mode=None, on_step=None,
+                            **options):
+        import asyncio
+
+        step = _step_timer(on_step)
+        await asyncio.sleep(self.latency)
+        self._fake_program(products, name, serial, mode, options)
+        step("run")
+        return ""
+
+
+class ProgramTarget:
+    """A board to program with :func:`program_boards`.
+
+    ``programmer`` defaults to the ``programmer`` attribute of ``platform``. Boards without one
+    are programmed with their ``toolchain_program`` in a thread, and cannot be selected by
+    ``serial``. The probe may instead be selected by the USB ``port`` it is plugged into, which
+    is looked up when the target is created. ``label`` identifies the board in results and
+    progress reports, and defaults to the name of the platform and the serial number or port.
+    ``mode`` is ``"sram"``, ``"flash"``, or
+    ``None`` to program the board the way its programmer does by default. ``options`` are
+    passed to the programmer (or ``toolchain_program``), e.g. ``{"jtag_khz": "auto"}`` for
+    OpenOCD.
+    """
+    def __init__(self, platform, products, *, name="top", serial=None, port=None,
+                 programmer=None, label=None, mode=None, options=None):
+        if programmer is None:
+            programmer = getattr(platform, "programmer", None)
+        if label is None:
+            label = type(platform).__name__
+            if serial is not None or port is not None:
+                label += "@{}".format(serial if port is None else port)
+        if port is not None:
+            if programmer is None:
+                raise ValueError("Platform {!r} has no programmer that can select a probe by "
+                                 "USB port".format(type(platform).__name__))
+            serial = programmer._port_serial(serial, port)
+        if mode not in (None, "sram", "flash"):
+            raise ValueError("Programming mode must be 'sram' or 'flash', not {!r}"
+                             .format(mode))
+        self.platform   = platform
+        self.products   = products
+        self.name       = name
+        self.serial     = serial
+        self.port       = port
+        self.programmer = programmer
+        self.label      = label
+        self.mode       = mode
+        self.options    = dict(options or {})
+
+    @property
+    def default_mode(self):
+        if self.programmer is None or not self.programmer.modes:
+            return None
+        return self.programmer.default_mode
+
+    def __repr__(self):
+        return "<ProgramTarget {}>".format(self.label)
+
+
+class ProgramResult:
+    """Result of programming one board.
+
+    ``elapsed`` is the time taken by the programmer in seconds, not including the time spent
+    waiting for a free job slot or probe. ``error`` is ``None`` if programming succeeded, and
+    a description of the failure otherwise. ``output`` is the output of the programming tool.
+    ``mode`` is the mode the board was programmed in, if known, and ``steps`` maps the name
+    of each step of programming (see :meth:`Programmer.program`) to its duration in seconds.
+    """
+    def __init__(self, label, *, serial, elapsed, error, output, mode=None, steps=None):
+        self.label   = label
+        self.serial  = serial
+        self.elapsed = elapsed
+        self.error   = error
+        self.output  = output
+        self.mode    = mode
+        self.steps   = dict(steps or {})
+
+    def as_dict(self):
+        return {
+            "label":   self.label,
+            "serial":  self.serial,
+            "elapsed": self.elapsed,
+            "error":   self.error,
+            "mode":    self.mode,
+            "steps":   self.steps,
+        }
+
+    def __repr__(self):
+        return "<ProgramResult {} {}>".format(self.label, "ok" if self.error is None else "failed")
+
+
+def _alternative_flash(platform, serial):
+    from .flash import _FLASH_IMAGES, flash_for_platform
+
+    if platform.toolchain not in _FLASH_IMAGES:
+        return None
+    try:
+        return flash_for_platform(platform, serial=serial)
+    except NotImplementedError:
+        return None
+
+
+async def _program_target(target, steps):
+    import asyncio
+
+    def on_step(name, elapsed):
+        steps[name] = elapsed
+
+    platform, programmer, mode = target.platform, target.programmer, target.mode
+    if programmer is not None and (mode is None or mode in programmer.modes):
+        return await programmer.program_async(target.products, target.name,
+                                              serial=target.serial, mode=mode, on_step=on_step,
+                                              **target.options)
+
+    # Some boards are programmed with a tool that can only load the FPGA, but have a flash that
+    # can be written in another way, e.g. through a JTAG to SPI bridge.
+    flash = _alternative_flash(platform, target.serial) if mode == "flash" else None
+    if flash is not None:
+        from .flash import flash_incremental
+
+        step = _step_timer(on_step)
+        await asyncio.to_thread(flash_incremental, platform, target.products, target.name,
+                                serial=target.serial, full=True, flash=flash)
+        step("flash")
+        return ""
+
+    if programmer is not None:
+        raise programmer._mode_error(mode)
+    if target.serial is not None:
+        raise ValueError("Platform {!r} has no programmer that can select a probe by serial "
+                         "number".format(type(platform).__name__))
+    options = dict(target.options)
+    if mode is not None:
+        if "mode" not in inspect.signature(platform.toolchain_program).parameters:
+            raise ValueError("Platform {!r} cannot be programmed in {} mode"
+                             .format(type(platform).__name__, mode))
+        options["mode"] = mode
+    step = _step_timer(on_step)
+    await asyncio.to_thread(platform.toolchain_program, target.products, target.name, **options)
+    step("run")
+    return ""
+
+
+async def program_boards(targets, *, jobs=None, progress=None):
+    """Program each of ``targets`` (:class:`ProgramTarget`) concurrently.
+
+    At most ``jobs`` (all of them by default) boards are programmed at once. Boards that would
+    be programmed through the same probe, i.e. with the same tool and serial number (or without
+    a serial number), are programmed one after another. ``progress``, if provided, is called
+    with the label of the target and a status string (``"programming"``, ``"done"`` or
+    ``"failed"``).
+
+    A board whose programmer cannot write its configuration flash is flashed another way if
+    possible (see :func:`flash_for_platform`) when its target has the ``"flash"`` mode.
+
+    Returns a list of :class:`ProgramResult` in the order of ``targets``.
+    """
+    import asyncio
+
+    targets = list(targets)
+    semaphore = asyncio.Semaphore(jobs or len(targets) or 1)
+    probe_locks = {}
+
+    def report(target, status):
+        if progress is not None:
+            progress(target.label, status)
+
+    async def run_one(target):
+        probe = (getattr(target.programmer, "tool", type(target.platform)), target.serial)
+        probe_lock = probe_locks.setdefault(probe, asyncio.Lock())
+        async with semaphore, probe_lock:
+            report(target, "programming")
+            start = time.perf_counter()
+            output = error = None
+            steps = {}
+            try:
+                output = await _program_target(target, steps)
+            except subprocess.CalledProcessError as e:
+                output = e.output
+                error = "programmer exited with status {}".format(e.returncode)
+            except Exception as e:
+                error = "{}: {}".format(type(e).__name__, e)
+            elapsed = time.perf_counter() - start
+        report(target, "done" if error is None else "failed")
+        return ProgramResult(target.label, serial=target.serial, elapsed=elapsed, error=error,
+                             output=output, mode=target.mode or target.default_mode,
+                             steps=steps)
+
+    return list(await asyncio.gather(*(run_one(target) for target in targets)))
+
+
+def program_all(targets, *, jobs=None, progress=None):
+    """Program each of ``targets`` like :func:`program_boards`, from synchronous code."""
+    import asyncio
+
+    return asyncio.run(program_boards(targets, jobs=jobs, progress=progress))
+
+
+def program_board(platform, products, name="top", *, mode=None, serial=None, port=None,
+                  programmer=None, **options):
+    """Program one board with the build ``products``, waiting until it is done.
+
+    ``mode`` is ``"sram"`` to load the bitstream directly into the FPGA, which is the fastest
+    way to try out a design, ``"flash"`` to write it to the configuration flash so that it is
+    kept at power-off, or ``None`` to program the board the way its programmer does by
+    default. The other arguments are as for :class:`ProgramTarget`.
+
+    Returns :class:`ProgramResult` with the duration of each step. Raises
+    :exc:`ValueError` if the board cannot be programmed in ``mode``, and
+    :exc:`subprocess.CalledProcessError` if the programming tool fails.
+    """
+    target = ProgramTarget(platform, products, name=name, serial=serial, port=port,
+                           programmer=programmer, mode=mode, options=options)
+    import asyncio
+
+    steps = {}
+    start = time.perf_counter()
+    output = asyncio.run(_program_target(target, steps))
+    return ProgramResult(target.label, serial=target.serial, elapsed=time.perf_counter() - start,
+                         error=None, output=output, mode=mode or target.default_mode,
+                         steps=steps)
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        from amaranth.build.run import BuildProducts
+
+        class Products(BuildProducts):
+            def get(self, filename, mode="b"):
+                if filename != "top.bin":
+                    raise FileNotFoundError(filename)
+                return b"bitstream"
+
+        self.products = Products()
+
+    def test_commands(self):
+        self.assertEqual(
+            IceprogProgrammer(sram=True).command(["top.bin"], serial="ib1"),
+            ["iceprog", "-d", "s:0x0403:0x6010:ib1", "-S", "top.bin"])
+        self.assertEqual(
+            OpenFPGALoaderProgrammer(board="ulx3s", sram=True).command(["top.bit"]),
+            ["openFPGALoader", "-b", "ulx3s", "-m", "top.bit"])
+        self.assertEqual(
+            OpenOCDProgrammer(["svf -quiet {bitstream}"], setup=["transport select jtag"],
+                              config="{name}-openocd.cfg", bitstream="{name}.svf")
+                .command(["top-openocd.cfg", "top.svf"], serial="FT1"),
+            ["openocd", "-f", "top-openocd.cfg", "-c",
+             "transport select jtag; adapter serial FT1; init; svf -quiet top.svf; exit"])
+        self.assertEqual(
+            QuartusProgrammer(device_index=2).command(["top.sof"]),
+            ["quartus_pgm", "--haltcc", "--mode", "JTAG", "--operation", "P;top.sof@2"])
+        self.assertEqual(
+            DFUUtilProgrammer(device="1d50:615d", alt=0, reset=True)
+                .command(["top.bit"], serial="X"),
+            ["dfu-util", "-d", "1d50:615d", "-S", "X", "-a", "0", "-R", "-D", "top.bit"])
+        with self.assertRaisesRegex(ValueError,
+                r"^mercpcl cannot select a probe by serial number$"):
+            MercpclProgrammer().command(["top.bin"], serial="X")
+
+    def test_negotiate_jtag_khz(self):
+        attempts = []
+        def run(args):
+            jtag_khz = int(args[-1].split("adapter speed ")[1].split(";")[0])
+            attempts.append(jtag_khz)
+            run.args = args
+            if jtag_khz > 10000:
+                return 0, "Error: JTAG scan chain interrogation failed: all ones"
+            return 0, "Info : JTAG tap: ecp5.tap tap/device found: 0x41112043"
+
+        with tempfile.TemporaryDirectory() as root:
+            cache = JTAGRateCache(os.path.join(root, "rates.json"))
+            programmer = OpenOCDProgrammer(["svf -quiet {bitstream}"],
+                setup=["transport select jtag"], config="{name}-openocd.cfg",
+                bitstream="{name}.svf", max_jtag_khz=25000, rate_cache=cache)
+            self.assertEqual(programmer.negotiate_jtag_khz("top-openocd.cfg", serial="FT1",
+                                                           run=run), 10000)
+            self.assertEqual(attempts, [25000, 20000, 15000, 10000])
+            self.assertIn("drscan [jtag names] 32 $pattern 32 0", run.args[-1])
+            with self.assertRaisesRegex(RuntimeError,
+                    r"^No JTAG clock rate works with the probe FT1$"):
+                programmer.negotiate_jtag_khz(serial="FT1", run=lambda args: (1, ""))
+
+            cache.set("FT1", 10000)
+            self.assertEqual(
+                programmer.command(["top-openocd.cfg", "top.svf"], serial="FT1",
+                                   jtag_khz="auto")[-1],
+                "transport select jtag; adapter serial FT1; adapter speed 10000; init; "
+                "svf -quiet top.svf; exit")
+            cache.forget("FT1")
+            self.assertIsNone(cache.get("FT1"))
+
+    def test_tool_env_var(self):
+        self.assertEqual(DFUUtilProgrammer().tool_env_var, "DFU_UTIL")
+        self.assertEqual(OpenFPGALoaderProgrammer().tool_env_var, "OPENFPGALOADER")
+
+    def test_program_boards(self):
+        from .icebreaker import ICEBreakerPlatform
+
+        programmer = FakeProgrammer(latency=0.2, failing={"bad"})
+        targets = [ProgramTarget(ICEBreakerPlatform(), self.products, serial=serial,
+                                 programmer=programmer)
+                   for serial in ["a", "b", "c", "bad"]]
+        start = time.perf_counter()
+        results = program_all(targets)
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual([result.label for result in results],
+                         ["ICEBreakerPlatform@a", "ICEBreakerPlatform@b", "ICEBreakerPlatform@c",
+                          "ICEBreakerPlatform@bad"])
+        self.assertEqual([result.error for result in results],
+                         [None, None, None, "programmer exited with status 1"])
+        self.assertEqual(sorted(serial for _, serial, _ in programmer.programmed),
+                         ["a", "b", "c"])
+        for result in results:
+            self.assertGreaterEqual(result.elapsed, 0.2)
+
+    def test_same_probe(self):
+        from .icebreaker import ICEBreakerPlatform
+
+        programmer = FakeProgrammer(latency=0.1)
+        targets = [ProgramTarget(ICEBreakerPlatform(), self.products, programmer=programmer)
+                   for _ in range(3)]
+        start = time.perf_counter()
+        results = program_all(targets)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+        self.assertTrue(all(result.error is None for result in results))
+
+    def test_modes(self):
+        self.assertEqual(IceprogProgrammer(sram=True).command(["top.bin"], mode="flash"),
+                         ["iceprog", "top.bin"])
+        self.assertEqual(IceprogProgrammer().command(["top.bin"], mode="sram"),
+                         ["iceprog", "-S", "top.bin"])
+        self.assertEqual(
+            OpenFPGALoaderProgrammer(board="ulx3s", sram=True).command(["top.bit"], mode="flash"),
+            ["openFPGALoader", "-b", "ulx3s", "-f", "top.bit"])
+        with self.assertRaisesRegex(ValueError,
+                r"^dfu-util cannot program a board in sram mode$"):
+            DFUUtilProgrammer().command(["top.bin"], mode="sram")
+
+    def test_program_board(self):
+        from .icebreaker import ICEBreakerPlatform
+        from .genesys2 import Genesys2Platform
+
+        programmer = FakeProgrammer()
+        result = program_board(ICEBreakerPlatform(), self.products, mode="flash",
+                               programmer=programmer)
+        self.assertEqual(result.mode, "flash")
+        self.assertEqual(list(result.steps), ["run"])
+        self.assertEqual(programmer.options, [{"mode": "flash"}])
+        with self.assertRaisesRegex(ValueError,
+                r"^openocd cannot program a board in flash mode$"):
+            program_board(Genesys2Platform(), self.products, mode="flash")
+
+    @unittest.skipIf(sys.platform.startswith("win32"), "requires the true command")
+    def test_steps(self):
+        import unittest.mock
+        from .icebreaker import ICEBreakerPlatform
+
+        with unittest.mock.patch.dict(os.environ, {"ICEPROG": "true"}):
+            result = program_board(ICEBreakerPlatform(), self.products, mode="sram")
+        self.assertEqual(result.mode, "sram")
+        self.assertEqual(list(result.steps), ["extract", "prepare", "run"])
+
+    def test_serial_for_port(self):
+        from .probes import Probe, ProbeCache
+
+        with tempfile.TemporaryDirectory() as root:
+            cache = ProbeCache(os.path.join(root, "probes.json"), scan=lambda: [
+                Probe(usb_id="0403:6010", serial="ib1", port="1-1"),
+                Probe(usb_id="0403:6010", serial=None, port="1-2"),
+                Probe(usb_id="1d50:6130", serial="bx1", port="1-3"),
+            ])
+            programmer = IceprogProgrammer()
+            self.assertEqual(programmer.serial_for_port("1-1", cache=cache), "ib1")
+            with self.assertRaisesRegex(ValueError,
+                    r"^The iceprog probe plugged into USB port 1-2 has no serial number$"):
+                programmer.serial_for_port("1-2", cache=cache)
+            with self.assertRaisesRegex(LookupError,
+                    r"^No iceprog probe is plugged into USB port 1-3$"):
+                programmer.serial_for_port("1-3", cache=cache)
+            self.assertEqual(TinyprogProgrammer().serial_for_port("1-3", cache=cache), "bx1")
+            with self.assertRaisesRegex(ValueError,
+                    r"^quartus_pgm probes cannot be selected by USB port$"):
+                QuartusProgrammer().serial_for_port("1-1", cache=cache)
+
+    @unittest.skipIf(sys.platform.startswith("win32"), "fake OpenOCD is a script")
+    def test_openocd_session(self):
+        import unittest.mock
+
+        with tempfile.TemporaryDirectory() as root:
+            log_filename = os.path.join(root, "log")
+            openocd = os.path.join(root, "openocd")
+            with open(openocd, "w") as f:
+                f.write(textwrap.dedent("""\
+                    #!{}
+                    import re, sys, socket
+                    script = sys.argv[sys.argv.index("-c") + 1]
+                    log = open({!r}, "a")
+                    log.write("start: " + script + "\\n")
+                    server = socket.socket()
+                    server.bind(("127.0.0.1", int(re.search(r"tcl_port (\\d+)", script)[1])))
+                    server.listen(1)
+                    conn, _ = server.accept()
+                    buffer = b""
+                    while True:
+                        buffer += conn.recv(4096)
+                        while b"\\x1a" in buffer:
+                            request, buffer = buffer.split(b"\\x1a", 1)
+                            match = re.search(r"capture \\{{(.*)\\}}\\}} __result",
+                                              request.decode())
+                            if match is None:
+                                log.write(request.decode() + "\\n")
+                                sys.exit(0)
+                            log.write(match[1] + "\\n")
+                            log.flush()
+                            reply = "ERROR boom" if "fail" in match[1] else "OK done\\n"
+                            conn.sendall(reply.encode() + b"\\x1a")
+                """).format(sys.executable, log_filename))
+            os.chmod(openocd, 0o755)
+
+            programmer = OpenOCDProgrammer(["svf -quiet {bitstream}"],
+                                           setup=["transport select jtag"], bitstream="{name}.bin")
+            with unittest.mock.patch.dict(os.environ, {"OPENOCD": openocd}):
+                with programmer.open_session(serial="FT1") as session:
+                    steps = {}
+                    self.assertEqual(session.program(self.products, on_step=steps.__setitem__),
+                                     "done\n")
+                    self.assertEqual(list(steps), ["extract", "run"])
+                    programmer.program(self.products, "top", session=session)
+                    with self.assertRaisesRegex(RuntimeError,
+                            r"^OpenOCD command 'fail' failed: boom$"):
+                        session.command("fail")
+            with open(log_filename) as f:
+                log = f.read().splitlines()
+        self.assertEqual(log[0], "start: transport select jtag; adapter serial FT1; "
+                                 "tcl_port {}; telnet_port disabled; gdb_port disabled; init"
+                                 .format(session.tcl_port))
+        self.assertEqual([line.split(" ")[:2] for line in log[1:3]],
+                         [["svf", "-quiet"], ["svf", "-quiet"]])
+        self.assertEqual(log[3:], ["fail", "shutdown"])
@@ -0,0 +1,639 @@
+import re
+import unittest
+
+from amaranth import *
+from amaranth.lib import io
+from amaranth.lib.memory import Memory
+
+from .memory import MemoryPort, _cycles
+
+
+__all__ = ["QSPIFlashReader", "QSPIFlashModel", "QSPIFlash"]
+
+
+_CMD_RELEASE_POWER_DOWN = 0xab
+_CMD_FAST_READ_QUAD_IO  = 0xeb
+
+# Mode bits sent after the address of a quad I/O read. Winbond, Macronix, GigaDevice and ISSI
+# flashes stay in continuous read mode, where the next read starts with the address instead of
+# the command, if the bits are 0xa0, and leave it if they are 0xff.
+_MODE_CONTINUOUS = 0xa0
+_MODE_NORMAL     = 0xff
+
+
+class QSPIFlashReader(Elaboratable):
+    """Execute-in-place reader of a quad SPI flash.
+
+    The flash is read through ``port``, a read-only :class:`~amaranth_boards.memory.MemoryPort`
+    of 32-bit little-endian words; writes are accepted and ignored. The first ``2 **
+    addr_width`` words of the flash are mapped, and ``addr_width`` may be at most 22, as the
+    flash is read with 3-byte addresses.
+
+    Words are cached in a direct-mapped cache of ``lines`` lines of ``line_words`` words each,
+    and lines missing from the cache are read from the flash with a Fast Read Quad I/O
+    command. Once a line is read, the read is paused but not ended, and the next line is read
+    ahead into a prefetch buffer whenever the flash is idle; a miss on that line then only
+    swaps it into the cache, so sequential reads (e.g. instruction fetches, or streaming data)
+    cost one command for the whole stream. If ``continuous`` is true, the flash is put into
+    continuous read mode, and reads that cannot continue the previous one skip the command
+    byte. ``dummy_cycles`` is the number of dummy clock cycles after the mode bits.
+
+    The flash is clocked at half the frequency of the ``sync`` domain, which runs at
+    ``clk_frequency`` Hz. The ``cs``, ``clk``, ``dq_o`` and ``dq_oe`` signals drive the pins of
+    the flash, and must be registered once before reaching them, and the ``dq`` pins must be
+    registered once before reaching ``dq_i``; see :class:`QSPIFlash`.
+
+    The quad enable bit of the flash must be set; it is a non-volatile bit set at the factory
+    on most quad flashes sold for use with FPGAs, and can be set with a programmer otherwise.
+    """
+    def __init__(self, *, clk_frequency, addr_width=22, line_words=8, lines=4, dummy_cycles=4,
+                 continuous=True):
+        if addr_width > 22:
+            raise ValueError("Flash address width must be at most 22 words, not {}"
+                             .format(addr_width))
+        for what, value in (("line_words", line_words), ("lines", lines)):
+            if value < 1 or value & (value - 1):
+                raise ValueError("Flash cache {} must be a power of 2, not {}"
+                                 .format(what, value))
+        if line_words * lines > 2 ** addr_width:
+            raise ValueError("Flash cache of {} words is larger than the {} mapped words"
+                             .format(line_words * lines, 2 ** addr_width))
+
+        self.clk_frequency = clk_frequency
+        self.line_words    = line_words
+        self.lines         = lines
+        self.dummy_cycles  = dummy_cycles
+        self.continuous    = continuous
+
+        self.port = MemoryPort(addr_width=addr_width, data_width=32)
+
+        self.cs    = Signal()
+        self.clk   = Signal()
+        self.dq_o  = Signal(4)
+        self.dq_oe = Signal()
+        self.dq_i  = Signal(4)
+
+        self.fills         = Signal(32)
+        self.prefetch_hits = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        port = self.port
+        lw   = self.line_words
+
+        word_bits  = lw.bit_length() - 1
+        index_bits = self.lines.bit_length() - 1
+        line_width = port.addr_width - word_bits
+
+        line  = port.addr[word_bits:]
+        word  = port.addr[:word_bits]
+        index = line[:index_bits]
+
+        # The cache and the prefetch buffer share one memory of `lines + 1` slots. Each line
+        # of the cache points to the slot holding its data, and the prefetch buffer is the slot
+        # no line points to; moving a line from the prefetch buffer to the cache swaps slots.
+        m.submodules.data = data = Memory(shape=32, depth=(self.lines + 1) * lw, init=[])
+        wr_port = data.write_port()
+        rd_port = data.read_port()
+
+        tags    = Array(Signal(line_width, name="tag{}".format(n)) for n in range(self.lines))
+        slots   = Array(Signal(range(self.lines + 1), name="slot{}".format(n), init=n)
+                        for n in range(self.lines))
+        valid   = Signal(self.lines)
+        pf_slot = Signal(range(self.lines + 1), init=self.lines)
+        pf_line = Signal(line_width)
+        pf_busy = Signal()
+        pf_done = Signal()
+        # Whether the line in the prefetch buffer was read ahead, or because of a miss.
+        pf_ahead = Signal()
+
+        hit     = valid.bit_select(index, 1) & (tags[index] == line)
+        pf_hit  = pf_done & (pf_line == line)
+        miss    = port.valid & ~port.we & ~hit & ~pf_hit & ~(pf_busy & (pf_line == line))
+
+        m.d.comb += [
+            port.ready.eq(port.we | hit),
+            rd_port.addr.eq(Cat(word, slots[index])),
+            port.rdata.eq(rd_port.data),
+        ]
+        m.d.sync += port.rvalid.eq(port.valid & port.ready & ~port.we)
+
+        with m.If(port.valid & ~port.we & ~hit & pf_hit):
+            m.d.sync += [
+                slots[index].eq(pf_slot),
+                pf_slot.eq(slots[index]),
+                tags[index].eq(line),
+                valid.bit_select(index, 1).eq(1),
+                pf_done.eq(0),
+            ]
+            with m.If(pf_ahead):
+                m.d.sync += self.prefetch_hits.eq(self.prefetch_hits + 1)
+
+        # The line the flash will return next, if a read is in progress.
+        stream_line = Signal(line_width)
+        continuous  = Signal()
+
+        # Lines are filled one nibble per clock cycle of the flash, captured two cycles after
+        # the falling edge of the clock that shifts it out: one cycle for the output register,
+        # and one for the input register.
+        capture = Signal(2)
+        nibbles = Signal(range(8))
+        shreg   = Signal(32)
+        fill_at = Signal(range(lw))
+        m.d.sync += capture.eq(capture << 1)
+        with m.If(capture[1]):
+            m.d.sync += [
+                shreg.eq(Cat(shreg[4:], self.dq_i)),
+                nibbles.eq(nibbles + 1),
+            ]
+        # Nibbles arrive most significant first within each byte, and bytes in address order.
+        nibbles_in = Cat(shreg[4:], self.dq_i)
+        m.d.comb += [
+            wr_port.addr.eq(Cat(fill_at, pf_slot)),
+            wr_port.data.eq(Cat(Cat(nibbles_in[8 * n + 4:8 * n + 8], nibbles_in[8 * n:8 * n + 4])
+                                for n in range(4))),
+        ]
+        with m.If(capture[1] & (nibbles == 7)):
+            m.d.comb += wr_port.en.eq(1)
+            m.d.sync += fill_at.eq(fill_at + 1)
+            with m.If(fill_at == lw - 1):
+                m.d.sync += [
+                    pf_busy.eq(0),
+                    pf_done.eq(1),
+                ]
+
+        # Shift register and counters of the command, address, mode and dummy phases.
+        sr     = Signal(32)
+        clocks = Signal(range(max(8 * lw, 32) + 1))
+        phase  = Signal()
+        wait   = Signal(range(_cycles(3000, self.clk_frequency) + 3))
+
+        def shift_out(width, oe=True):
+            m.d.comb += [
+                self.cs.eq(1),
+                self.dq_oe.eq(oe),
+            ]
+            if width == 1:
+                # WP# and HOLD# must be held high while the flash is used as a 1x SPI flash.
+                m.d.comb += self.dq_o.eq(Cat(sr[31], C(0b111, 3)))
+            else:
+                m.d.comb += self.dq_o.eq(sr[28:])
+            with m.If(phase == 0):
+                m.d.sync += phase.eq(1)
+            with m.Else():
+                m.d.comb += self.clk.eq(1)
+                m.d.sync += [
+                    phase.eq(0),
+                    sr.eq(sr << width),
+                    clocks.eq(clocks - 1),
+                ]
+            return (phase == 1) & (clocks == 1)
+
+        def load(value, count):
+            m.d.sync += [
+                sr.eq(value << (32 - len(Value.cast(value)))),
+                clocks.eq(count),
+            ]
+
+        t_deselect = _cycles(50, self.clk_frequency) + 1
+        mode = _MODE_CONTINUOUS if self.continuous else _MODE_NORMAL
+
+        def address(line):
+            return Cat(C(0, 2 + word_bits), line, C(0, 22 - port.addr_width))
+
+        def start_read(line, *, ahead=False):
+            m.d.sync += [
+                stream_line.eq(line),
+                pf_line.eq(line),
+                pf_busy.eq(1),
+                pf_done.eq(0),
+                pf_ahead.eq(ahead),
+                fill_at.eq(0),
+                nibbles.eq(0),
+                capture.eq(0),
+            ]
+            if not ahead:
+                m.d.sync += self.fills.eq(self.fills + 1)
+
+        def begin_command(line):
+            with m.If(continuous):
+                load(address(line), 6)
+                m.next = "ADDRESS"
+            with m.Else():
+                load(C(_CMD_FAST_READ_QUAD_IO, 8), 8)
+                m.next = "COMMAND"
+
+        with m.FSM():
+            # A previous user of the flash may have left it in continuous read mode, which is
+            # left by mode bits of all ones, and iCE40 FPGAs power it down after configuration.
+            with m.State("RESET"):
+                load(C(0xffffffff, 32), 8)
+                m.next = "RESET-CONTINUOUS"
+
+            with m.State("RESET-CONTINUOUS"):
+                with m.If(shift_out(4)):
+                    m.d.sync += wait.eq(t_deselect)
+                    m.next = "RESET-DESELECT"
+
+            with m.State("RESET-DESELECT"):
+                m.d.sync += wait.eq(wait - 1)
+                with m.If(wait == 0):
+                    load(C(_CMD_RELEASE_POWER_DOWN, 8), 8)
+                    m.next = "RESET-WAKE"
+
+            with m.State("RESET-WAKE"):
+                with m.If(shift_out(1)):
+                    m.d.sync += wait.eq(_cycles(3000, self.clk_frequency))
+                    m.next = "RESET-WAIT"
+
+            with m.State("RESET-WAIT"):
+                m.d.sync += wait.eq(wait - 1)
+                with m.If(wait == 0):
+                    m.next = "IDLE"
+
+            with m.State("IDLE"):
+                with m.If(miss):
+                    start_read(line)
+                    begin_command(line)
+
+            with m.State("COMMAND"):
+                with m.If(shift_out(1)):
+                    load(address(stream_line), 6)
+                    m.next = "ADDRESS"
+
+            with m.State("ADDRESS"):
+                with m.If(shift_out(4)):
+                    load(C(mode, 8), 2)
+                    m.next = "MODE"
+
+            with m.State("MODE"):
+                with m.If(shift_out(4)):
+                    m.d.sync += continuous.eq(self.continuous)
+                    if self.dummy_cycles:
+                        load(C(0, 8), self.dummy_cycles)
+                        m.next = "DUMMY"
+                    else:
+                        m.d.sync += clocks.eq(8 * lw)
+                        m.next = "DATA"
+
+            with m.State("DUMMY"):
+                with m.If(shift_out(4, oe=False)):
+                    m.d.sync += clocks.eq(8 * lw)
+                    m.next = "DATA"
+
+            with m.State("DATA"):
+                m.d.comb += self.cs.eq(1)
+                with m.If(miss):
+                    m.next = "DESELECT"
+                with m.Elif(clocks != 0):
+                    with m.If(phase == 0):
+                        m.d.sync += [
+                            phase.eq(1),
+                            capture[0].eq(1),
+                        ]
+                    with m.Else():
+                        m.d.comb += self.clk.eq(1)
+                        m.d.sync += [
+                            phase.eq(0),
+                            clocks.eq(clocks - 1),
+                        ]
+                with m.Elif(pf_done):
+                    m.d.sync += stream_line.eq(stream_line + 1)
+                    m.next = "PAUSE"
+
+            with m.State("PAUSE"):
+                m.d.comb += self.cs.eq(1)
+                with m.If(miss):
+                    with m.If(line == stream_line):
+                        start_read(line)
+                        m.d.sync += clocks.eq(8 * lw)
+                        m.next = "DATA"
+                    with m.Else():
+                        m.next = "DESELECT"
+                # Read ahead once the prefetch buffer has been moved to the cache.
+                with m.Elif(~pf_done):
+                    start_read(stream_line, ahead=True)
+                    m.d.sync += clocks.eq(8 * lw)
+                    m.next = "DATA"
+
+            with m.State("DESELECT"):
+                m.d.sync += [
+                    wait.eq(wait + 1),
+                    pf_busy.eq(0),
+                    pf_done.eq(0),
+                    capture.eq(0),
+                ]
+                with m.If(wait == t_deselect - 1):
+                    m.d.sync += wait.eq(0)
+                    m.next = "IDLE"
+
+        return m
+
+
+class QSPIFlashModel(Elaboratable):
+    """Model of a quad SPI flash holding ``data``, for simulation, driven by the pins of
+    ``reader``.
+
+    The flash starts powered down, and supports the Release Power-Down and Fast Read Quad I/O
+    commands and continuous read mode; other commands are ignored. The pins are registered,
+    like the I/O buffers used by :class:`QSPIFlash` register them. ``error`` is asserted, and
+    stays asserted, if the flash is read while powered down, or if the reader and the flash
+    drive the data pins at once. ``commands`` counts the commands received.
+    """
+    def __init__(self, reader, data):
+        if len(data) & (len(data) - 1):
+            raise ValueError("Flash model size must be a power of 2, not {}".format(len(data)))
+
+        self.reader = reader
+        self.data   = bytes(data)
+
+        self.error    = Signal()
+        self.commands = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        reader = self.reader
+        cs, clk, dq, oe = (Signal.like(value) for value in
+                           (reader.cs, reader.clk, reader.dq_o, reader.dq_oe))
+        m.d.sync += [
+            cs.eq(reader.cs),
+            clk.eq(reader.clk),
+            dq.eq(reader.dq_o),
+            oe.eq(reader.dq_oe),
+        ]
+        clk_prev = Signal()
+        m.d.sync += clk_prev.eq(clk)
+        rise = cs & clk & ~clk_prev
+        fall = cs & ~clk & clk_prev
+
+        m.submodules.storage = storage = Memory(shape=8, depth=len(self.data),
+                                                init=self.data)
+        rd_port = storage.read_port(domain="comb")
+
+        awake      = Signal()
+        continuous = Signal()
+        sr         = Signal(24)
+        count      = Signal(range(32))
+        addr       = Signal(24)
+        low        = Signal()
+        out        = Signal(4)
+        driving    = Signal()
+        # Value of the data pins, which change right after the falling edge of the clock.
+        pins       = Signal(4)
+        pins_oe    = Signal()
+        m.d.comb += [
+            rd_port.addr.eq(addr),
+            pins.eq(out),
+            pins_oe.eq(driving),
+        ]
+
+        with m.FSM():
+            with m.State("DESELECTED"):
+                m.d.sync += [
+                    count.eq(0),
+                    driving.eq(0),
+                ]
+                with m.If(cs):
+                    with m.If(continuous):
+                        m.next = "ADDRESS"
+                    with m.Else():
+                        m.next = "COMMAND"
+
+            def deselect():
+                with m.If(~cs):
+                    m.d.sync += [
+                        count.eq(0),
+                        driving.eq(0),
+                    ]
+                    with m.If(continuous):
+                        m.next = "ADDRESS"
+                    with m.Else():
+                        m.next = "COMMAND"
+
+            with m.State("COMMAND"):
+                with m.If(rise):
+                    m.d.sync += [
+                        sr.eq(Cat(dq[0], sr)),
+                        count.eq(count + 1),
+                    ]
+                    with m.If(count == 7):
+                        m.d.sync += [
+                            count.eq(0),
+                            self.commands.eq(self.commands + 1),
+                        ]
+                        with m.Switch(Cat(dq[0], sr[:7])):
+                            with m.Case(_CMD_RELEASE_POWER_DOWN):
+                                m.d.sync += awake.eq(1)
+                                m.next = "IGNORE"
+                            with m.Case(_CMD_FAST_READ_QUAD_IO):
+                                with m.If(~awake):
+                                    m.d.sync += self.error.eq(1)
+                                m.next = "ADDRESS"
+                            with m.Default():
+                                m.next = "IGNORE"
+                deselect()
+
+            with m.State("IGNORE"):
+                deselect()
+
+            with m.State("ADDRESS"):
+                with m.If(rise):
+                    m.d.sync += [
+                        sr.eq(Cat(dq, sr)),
+                        count.eq(count + 1),
+                    ]
+                    with m.If(count == 5):
+                        m.d.sync += [
+                            addr.eq(Cat(dq, sr)),
+                            count.eq(0),
+                        ]
+                        m.next = "MODE"
+                deselect()
+
+            with m.State("MODE"):
+                with m.If(rise):
+                    m.d.sync += [
+                        sr.eq(Cat(dq, sr)),
+                        count.eq(count + 1),
+                    ]
+                    with m.If(count == 1):
+                        m.d.sync += [
+                            continuous.eq(Cat(dq, sr)[4:6] == 0b10),
+                            count.eq(0),
+                        ]
+                        if self.reader.dummy_cycles == 0:
+                            m.next = "DATA"
+                        else:
+                            m.next = "DUMMY"
+                deselect()
+
+            with m.State("DUMMY"):
+                with m.If(rise):
+                    m.d.sync += count.eq(count + 1)
+                    with m.If(count == self.reader.dummy_cycles - 1):
+                        m.d.sync += low.eq(0)
+                        m.next = "DATA"
+                deselect()
+
+            with m.State("DATA"):
+                with m.If(fall):
+                    m.d.comb += [
+                        pins.eq(Mux(low, rd_port.data[:4], rd_port.data[4:])),
+                        pins_oe.eq(1),
+                    ]
+                    m.d.sync += [
+                        driving.eq(1),
+                        out.eq(pins),
+                        low.eq(~low),
+                    ]
+                    with m.If(low):
+                        m.d.sync += addr.eq(addr + 1)
+                deselect()
+
+        with m.If(pins_oe & oe):
+            m.d.sync += self.error.eq(1)
+        m.d.sync += reader.dq_i.eq(Mux(pins_oe, pins, 0))
+
+        return m
+
+
+class QSPIFlash(Elaboratable):
+    """Execute-in-place reader of the quad SPI flash of a board.
+
+    ``pads`` is the ``spi_flash_4x`` resource, requested with
+    ``platform.request("spi_flash_4x", dir="-")``. The other arguments are those of
+    :class:`QSPIFlashReader`, whose ``port`` is available as ``port``.
+
+    On ECP5 FPGAs, the clock of the configuration flash is driven through the ``USRMCLK``
+    primitive, and the ``clk`` pin of the resource, if there is one, is not used.
+    """
+    def __init__(self, pads, **kwargs):
+        self.pads   = pads
+        self.reader = QSPIFlashReader(**kwargs)
+
+        self.port = self.reader.port
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads, reader = self.pads, self.reader
+        m.submodules.reader = reader
+
+        m.submodules.cs = cs = io.FFBuffer("o", pads.cs)
+        m.d.comb += cs.o.eq(reader.cs)
+
+        if getattr(platform, "family", None) == "ecp5":
+            clk = Signal()
+            m.d.sync += clk.eq(reader.clk)
+            m.submodules.usrmclk = Instance("USRMCLK",
+                i_USRMCLKI=clk,
+                i_USRMCLKTS=0,
+            )
+        else:
+            m.submodules.clk = clk = io.FFBuffer("o", pads.clk)
+            m.d.comb += clk.o.eq(reader.clk)
+
+        m.submodules.dq = dq = io.FFBuffer("io", pads.dq)
+        m.d.comb += [
+            dq.o.eq(reader.dq_o),
+            dq.oe.eq(reader.dq_oe),
+            reader.dq_i.eq(dq.i),
+        ]
+
+        return m
+
+
+class TestCase(unittest.TestCase):
+    @staticmethod
+    def pattern(addr, addr_width):
+        # The data `MemoryBenchmark` expects at `addr`.
+        value, bits, chunk = 0, 0, 0
+        while bits < 32:
+            value |= ((addr + chunk * 0x9e37) % 2 ** addr_width) << bits
+            bits, chunk = bits + addr_width, chunk + 1
+        return value % 2 ** 32
+
+    def simulate(self, runs, **kwargs):
+        from amaranth.sim import Simulator
+        from .memory import MemoryBenchmark
+
+        addr_width = 10
+        data = b"".join(self.pattern(addr, addr_width).to_bytes(4, "little")
+                        for addr in range(2 ** addr_width))
+
+        m = Module()
+        m.submodules.reader = reader = QSPIFlashReader(clk_frequency=1e6, addr_width=addr_width,
+                                                       **kwargs)
+        m.submodules.model = model = QSPIFlashModel(reader, data)
+        m.submodules.bench = bench = MemoryBenchmark(reader.port)
+
+        results = []
+        async def testbench(ctx):
+            for random, length in runs:
+                ctx.set(bench.write, 0)
+                ctx.set(bench.random, random)
+                ctx.set(bench.length, length)
+                ctx.set(bench.start, 1)
+                await ctx.tick()
+                ctx.set(bench.start, 0)
+                await ctx.tick().until(~bench.busy)
+                results.append((ctx.get(bench.cycles), ctx.get(bench.transfers),
+                                ctx.get(bench.errors)))
+            results.append((ctx.get(model.error), ctx.get(model.commands),
+                            ctx.get(reader.fills), ctx.get(reader.prefetch_hits)))
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_testbench(testbench)
+        sim.run()
+        return results
+
+    def test_sequential(self):
+        (seq_cycles, seq_transfers, seq_errors), (_, _, cold_errors), \
+            (hot_cycles, hot_transfers, hot_errors), (error, commands, fills, prefetch_hits) = \
+            self.simulate([(0, 512), (0, 32), (0, 32)])
+        self.assertFalse(error)
+        self.assertEqual((seq_transfers, hot_transfers), (512, 32))
+        self.assertEqual((seq_errors, cold_errors, hot_errors), (0, 0, 0))
+        # Sequential reads stream from a single read command at 16 cycles per word...
+        self.assertLess(seq_cycles, 512 * 16 * 1.1)
+        self.assertGreater(prefetch_hits, 60)
+        # ... and reads of cached lines take a cycle each.
+        self.assertLess(hot_cycles, 32 + 4)
+        # Release Power-Down, mode bits reset, and one read in continuous read mode.
+        self.assertEqual(commands, 3)
+
+    def test_random(self):
+        for continuous in (True, False):
+            with self.subTest(continuous=continuous):
+                (cycles, transfers, errors), (error, commands, fills, _) = \
+                    self.simulate([(1, 64)], continuous=continuous)
+                self.assertFalse(error)
+                self.assertEqual((transfers, errors), (64, 0))
+                # Without continuous read mode, every read that does not continue the previous
+                # one starts with a command.
+                if continuous:
+                    self.assertEqual(commands, 3)
+                else:
+                    self.assertGreater(commands, 2 + fills // 2)
+
+    def test_elaborate(self):
+        from .icebreaker import ICEBreakerPlatform
+        from .ecpix5 import ECPIX545Platform
+        from .supercon19badge import Supercon19BadgePlatform
+
+        class Top(Elaboratable):
+            def elaborate(self, platform):
+                m = Module()
+                m.submodules.flash = QSPIFlash(platform.request("spi_flash_4x", 0, dir="-"),
+                                               clk_frequency=platform.default_clk_frequency)
+                return m
+
+        for platform, usrmclk in ((ICEBreakerPlatform(), False), (ECPIX545Platform(), True),
+                                  (Supercon19BadgePlatform(), True)):
+            with self.subTest(platform=type(platform).__name__):
+                netlist = platform.prepare(Top()).files["top.il"]
+                self.assertEqual(bool(re.search(r"\bUSRMCLK\b", netlist)), usrmclk)
+                self.assertTrue(re.search(r"\bspi_flash_4x_0__dq__io\b", netlist))
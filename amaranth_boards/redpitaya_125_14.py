@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import XilinxPlatform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 
 __all__ = ["RedPitaya14Platform"]
@@ -53,9 +51,10 @@ class RedPitaya14Platform(XilinxPlatform):
         })
     ]
 
+    programmer = OpenFPGALoaderProgrammer(cable="digilent_hs2")
+
     def toolchain_program(self, products, name, **kwargs):
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call(["openFPGALoader", "-c", "digilent_hs2", bitstream_filename])
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
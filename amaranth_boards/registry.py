@@ -0,0 +1,150 @@
+import importlib
+import unittest
+
+
+__all__ = ["list_boards", "get_platform"]
+
+
+# Board name -> (module name, platform class name). This table is intentionally static: looking up
+# a board must not import any board module other than the one that defines it, since each board
+# module pulls in the corresponding `amaranth.vendor` platform.
+_BOARDS = {
+    "alchitry_au":              ("alchitry_au",             "AlchitryAuPlatform"),
+    "alchitry_ptv2":            ("alchitry_ptv2",           "AlchitryPtV2Platform"),
+    "alchitry_ptv2-alpha":      ("alchitry_ptv2",           "AlchitryPtV2AlphaPlatform"),
+    "alinx_ax7325b":            ("alinx_ax7325b",           "AX7325BPlatform"),
+    "arrow_deca":               ("arrow_deca",              "ArrowDECAPlatform"),
+    "arty_a7-35":               ("arty_a7",                 "ArtyA7_35Platform"),
+    "arty_a7-100":              ("arty_a7",                 "ArtyA7_100Platform"),
+    "arty_s7-25":               ("arty_s7",                 "ArtyS7_25Platform"),
+    "arty_s7-50":               ("arty_s7",                 "ArtyS7_50Platform"),
+    "arty_z7-20":               ("arty_z7",                 "ArtyZ720Platform"),
+    "atlys":                    ("atlys",                   "AtlysPlatform"),
+    "blackice":                 ("blackice",                "BlackIcePlatform"),
+    "blackice_ii":              ("blackice_ii",             "BlackIceIIPlatform"),
+    "chameleon96":              ("chameleon96",             "Chameleon96Platform"),
+    "cmod_a7-15":               ("cmod_a7",                 "CmodA7_15Platform"),
+    "cmod_a7-35":               ("cmod_a7",                 "CmodA7_35Platform"),
+    "cmod_s7":                  ("cmod_s7",                 "CmodS7_Platform"),
+    "colorlight_5a75b_r7_0":    ("colorlight_5a75b_r7_0",   "Colorlight_5A75B_R70Platform"),
+    "cora_z7-07s":              ("cora_z7",                 "CoraZ7_07SPlatform"),
+    "cora_z7-10":               ("cora_z7",                 "CoraZ7_10Platform"),
+    "de0":                      ("de0",                     "DE0Platform"),
+    "de0_cv":                   ("de0_cv",                  "DE0CVPlatform"),
+    "de0nano":                  ("de0nano",                 "DE0NanoPlatform"),
+    "de10_lite":                ("de10_lite",               "DE10LitePlatform"),
+    "de10_nano":                ("de10_nano",               "DE10NanoPlatform"),
+    "de1_soc":                  ("de1_soc",                 "DE1SoCPlatform"),
+    "ebaz4205":                 ("ebaz4205",                "EBAZ4205Platform"),
+    "ecp5_5g_evn":              ("ecp5_5g_evn",             "ECP55GEVNPlatform"),
+    "ecpix5-45":                ("ecpix5",                  "ECPIX545Platform"),
+    "ecpix5-85":                ("ecpix5",                  "ECPIX585Platform"),
+    "fomu_hacker":              ("fomu_hacker",             "FomuHackerPlatform"),
+    "fomu_pvt":                 ("fomu_pvt",                "FomuPVTPlatform"),
+    "genesys2":                 ("genesys2",                "Genesys2Platform"),
+    "ice40_hx1k_blink_evn":     ("ice40_hx1k_blink_evn",    "ICE40HX1KBlinkEVNPlatform"),
+    "ice40_hx8k_b_evn":         ("ice40_hx8k_b_evn",        "ICE40HX8KBEVNPlatform"),
+    "ice40_up5k_b_evn":         ("ice40_up5k_b_evn",        "ICE40UP5KBEVNPlatform"),
+    "icebreaker":               ("icebreaker",              "ICEBreakerPlatform"),
+    "icebreaker_bitsy":         ("icebreaker_bitsy",        "ICEBreakerBitsyPlatform"),
+    "icestick":                 ("icestick",                "ICEStickPlatform"),
+    "icesugar":                 ("icesugar",                "ICESugarPlatform"),
+    "icesugar_nano":            ("icesugar_nano",           "ICESugarNanoPlatform"),
+    "kc705":                    ("kc705",                   "KC705Platform"),
+    "kcu105":                   ("kcu105",                  "KCU105Platform"),
+    "litefury":                 ("nitefury",                "LitefuryPlatform"),
+    "logicbone":                ("logicbone",               "LogicbonePlatform"),
+    "logicbone-85f":            ("logicbone",               "Logicbone85FPlatform"),
+    "machxo2_breakout-1200ze":  ("machxo2_breakout",        "MachXO2_1200ZE_BreakoutPlatform"),
+    "machxo2_breakout-7000he":  ("machxo2_breakout",        "MachXO2_7000HE_BreakoutPlatform"),
+    "machxo3_sk-l":             ("machxo3_sk",              "MachXO3LSKPlatform"),
+    "machxo3_sk-lf":            ("machxo3_sk",              "MachXO3LFSKPlatform"),
+    "mercury":                  ("mercury",                 "MercuryPlatform"),
+    "microzed_z010":            ("microzed_z010",           "MicroZedZ010Platform"),
+    "microzed_z020":            ("microzed_z020",           "MicroZedZ020Platform"),
+    "mist":                     ("mist",                    "MiSTPlatform"),
+    "mister":                   ("mister",                  "MisterPlatform"),
+    "nandland_go":              ("nandland_go",             "NandlandGoPlatform"),
+    "nexys4ddr":                ("nexys4ddr",               "Nexys4DDRPlatform"),
+    "nitefury_ii":              ("nitefury",                "NitefuryIIPlatform"),
+    "numato_mimas":             ("numato_mimas",            "NumatoMimasPlatform"),
+    "orangecrab_r0_1":          ("orangecrab_r0_1",         "OrangeCrabR0_1Platform"),
+    "orangecrab_r0_2":          ("orangecrab_r0_2",         "OrangeCrabR0_2Platform"),
+    "orangecrab_r0_2-25f":      ("orangecrab_r0_2",         "OrangeCrabR0_2_25FPlatform"),
+    "orangecrab_r0_2-85f":      ("orangecrab_r0_2",         "OrangeCrabR0_2_85FPlatform"),
+    "quickfeather":             ("quickfeather",            "QuickfeatherPlatform"),
+    "redpitaya_125_14":         ("redpitaya_125_14",        "RedPitaya14Platform"),
+    "rz_easyfpga_a2_2":         ("rz_easyfpga_a2_2",        "RZEasyFPGAA2_2Platform"),
+    "sk_xc6slx9":               ("sk_xc6slx9",              "SK_XC6SLX9Platform"),
+    "stepmxo2":                 ("stepmxo2",                "StepMXO2Platform"),
+    "supercon19badge":          ("supercon19badge",         "Supercon19BadgePlatform"),
+    "tang_mega_138k_pro_dock":  ("tang_mega_138k_pro_dock", "TangMega138kProDockPlatform"),
+    "tang_nano":                ("tang_nano",               "TangNanoPlatform"),
+    "tang_nano_9k":             ("tang_nano_9k",            "TangNano9kPlatform"),
+    "tang_primer_20k":          ("tang_primer_20k",         "TangPrimer20kPlatform"),
+    "tang_primer_20k-dock":     ("tang_primer_20k",         "TangPrimer20kDockPlatform"),
+    "tang_primer_20k-lite":     ("tang_primer_20k",         "TangPrimer20kLitePlatform"),
+    "te0714_03_50_2i":          ("te0714_03_50_2I",         "TE0714_03_50_2IPlatform"),
+    "tinyfpga_ax1":             ("tinyfpga_ax1",            "TinyFPGAAX1Platform"),
+    "tinyfpga_ax2":             ("tinyfpga_ax2",            "TinyFPGAAX2Platform"),
+    "tinyfpga_bx":              ("tinyfpga_bx",             "TinyFPGABXPlatform"),
+    "ulx3s-12f":                ("ulx3s",                   "ULX3S_12F_Platform"),
+    "ulx3s-25f":                ("ulx3s",                   "ULX3S_25F_Platform"),
+    "ulx3s-45f":                ("ulx3s",                   "ULX3S_45F_Platform"),
+    "ulx3s-85f":                ("ulx3s",                   "ULX3S_85F_Platform"),
+    "upduino_v1":               ("upduino_v1",              "UpduinoV1Platform"),
+    "upduino_v2":               ("upduino_v2",              "UpduinoV2Platform"),
+    "upduino_v3":               ("upduino_v3",              "UpduinoV3Platform"),
+    "versa_ecp5":               ("versa_ecp5",              "VersaECP5Platform"),
+    "versa_ecp5_5g":            ("versa_ecp5_5g",           "VersaECP55GPlatform"),
+    "zturn_lite_z007s":         ("zturn_lite_z007s",        "ZTurnLiteZ007SPlatform"),
+    "zturn_lite_z010":          ("zturn_lite_z010",         "ZTurnLiteZ010Platform"),
+}
+
+
+def list_boards():
+    """Return the names of all known boards, in sorted order."""
+    return sorted(_BOARDS)
+
+
+def get_platform(name):
+    """Return the platform class for the board called ``name``.
+
+    Only the module that defines the requested board is imported.
+    """
+    try:
+        module_name, class_name = _BOARDS[name.lower()]
+    except KeyError:
+        raise LookupError("Unknown board {!r}; use list_boards() to see the known boards"
+                          .format(name)) from None
+    module = importlib.import_module("{}.{}".format(__package__, module_name))
+    return getattr(module, class_name)
+
+
+class TestCase(unittest.TestCase):
+    def test_unknown(self):
+        with self.assertRaisesRegex(LookupError, r"^Unknown board 'nonexistent'"):
+            get_platform("nonexistent")
+
+    def test_case_insensitive(self):
+        self.assertIs(get_platform("ULX3S-85F"), get_platform("ulx3s-85f"))
+
+    def test_complete(self):
+        import pkgutil
+        from . import __path__ as package_path
+
+        exported = set()
+        for module_info in pkgutil.iter_modules(package_path):
+            if module_info.ispkg or module_info.name in ("registry",):
+                continue
+            module = importlib.import_module("{}.{}".format(__package__, module_info.name))
+            for class_name in getattr(module, "__all__", []):
+                if class_name.endswith("Platform"):
+                    exported.add((module_info.name, class_name))
+            for class_name, value in vars(module).items():
+                if (class_name.endswith("Platform") and not class_name.startswith("_") and
+                        isinstance(value, type) and value.__module__ == module.__name__):
+                    exported.add((module_info.name, class_name))
+        self.assertEqual(set(_BOARDS.values()), exported)
+        for name in _BOARDS:
+            self.assertEqual(get_platform(name).__name__, _BOARDS[name][1])
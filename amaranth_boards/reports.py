@@ -0,0 +1,440 @@
+import re
+import json
+import unittest
+
+from .seeds import parse_nextpnr_timing
+
+
+__all__ = ["ClockReport", "BuildReport", "collect_report"]
+
+
+class ClockReport:
+    """Timing of one clock. Frequencies are in MHz and slack is in nanoseconds; any of them may be
+    ``None`` if the toolchain does not report it."""
+    def __init__(self, name, *, fmax=None, constraint=None, worst_slack=None):
+        self.name        = name
+        self.fmax        = fmax
+        self.constraint  = constraint
+        self.worst_slack = worst_slack
+        if self.worst_slack is None and self.fmax and self.constraint:
+            self.worst_slack = 1e3 / self.constraint - 1e3 / self.fmax
+
+    def as_dict(self):
+        return {
+            "fmax":        self.fmax,
+            "constraint":  self.constraint,
+            "worst_slack": self.worst_slack,
+        }
+
+    def __repr__(self):
+        return "<ClockReport {} fmax={} constraint={} slack={}>".format(
+            self.name, self.fmax, self.constraint, self.worst_slack)
+
+
+class BuildReport:
+    """Timing and utilization of a build, collected from the toolchain reports.
+
+    ``clocks`` maps clock names to :class:`ClockReport`. ``utilization`` maps the categories
+    ``"lut"``, ``"ff"``, ``"bram"``, ``"dsp"`` and ``"io"`` to ``(used, available)`` pairs, for
+    the categories the toolchain reports; ``available`` may be ``None``. ``cells`` has the same
+    format and contains the utilization exactly as reported by the toolchain. ``io_requested``
+    is the number of pins constrained by the platform, i.e. used by the requested resources.
+    Any of them is ``None`` if it is not known, e.g. because the reports of the toolchain are
+    not parsed.
+    """
+    def __init__(self, toolchain, *, clocks=None, utilization=None, cells=None,
+                 io_requested=None):
+        self.toolchain    = toolchain
+        self.clocks       = clocks
+        self.utilization  = utilization
+        self.cells        = cells
+        self.io_requested = io_requested
+
+    def as_dict(self):
+        def usage(counts):
+            if counts is None:
+                return None
+            return {key: {"used": used, "available": available}
+                    for key, (used, available) in counts.items()}
+        return {
+            "toolchain":    self.toolchain,
+            "clocks":       None if self.clocks is None else
+                            {name: clock.as_dict() for name, clock in self.clocks.items()},
+            "utilization":  usage(self.utilization),
+            "cells":        usage(self.cells),
+            "io_requested": self.io_requested,
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+
+def _int(text):
+    return int(text.replace(",", ""))
+
+
+def _float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None # e.g. "inf" or "NA"
+
+
+_nextpnr_util_re = re.compile(r"^Info:\s+(\w+):\s+(\d+)/\s*(\d+)\s+\d+%", re.MULTILINE)
+
+_nextpnr_categories = {
+    # ECP5, Nexus, iCE40 (a logic cell is a LUT and a flip-flop), Gowin
+    "lut":  ("TRELLIS_COMB", "OXIDE_COMB", "ICESTORM_LC", "LUT4"),
+    "ff":   ("TRELLIS_FF", "OXIDE_FF", "DFF"),
+    "bram": ("DP16KD", "OXIDE_EBR", "ICESTORM_RAM", "BSRAM"),
+    "dsp":  ("MULT18X18D", "MULT18_CORE", "ICESTORM_DSP", "MULT18X18"),
+    "io":   ("TRELLIS_IO", "SEIO33_CORE", "SB_IO", "IOB"),
+}
+
+
+def _parse_nextpnr(log):
+    clocks = {
+        clock: ClockReport(clock, fmax=achieved, constraint=constraint)
+        for clock, (achieved, constraint) in parse_nextpnr_timing(log).items()
+    }
+    # Like timing, utilization may be reported more than once; the last report is used.
+    cells = {}
+    for match in _nextpnr_util_re.finditer(log):
+        cells[match.group(1)] = (int(match.group(2)), int(match.group(3)))
+    utilization = {}
+    for category, cell_types in _nextpnr_categories.items():
+        for cell_type in cell_types:
+            if cell_type in cells:
+                utilization[category] = cells[cell_type]
+                break
+    return clocks, utilization, cells
+
+
+def _vivado_section(report, title):
+    # Returns the rows of the first table following the section header `| title`.
+    lines = report.splitlines()
+    for index, line in enumerate(lines):
+        if line.strip() == "| {}".format(title):
+            break
+    else:
+        return []
+    rows = []
+    in_table = False
+    for prev_line, line in zip(lines[index:], lines[index + 1:]):
+        if not in_table:
+            # The table header is underlined with dashes, like the section header is boxed.
+            in_table = line.startswith("-----") and prev_line.strip() and \
+                not prev_line.startswith(("|", "-"))
+        elif line.strip():
+            rows.append(line)
+        else:
+            break
+    return rows
+
+
+def _parse_vivado_timing(report):
+    clocks = {}
+    for row in _vivado_section(report, "Clock Summary"):
+        fields = row.split()
+        clocks[fields[0]] = {"constraint": _float(fields[-1]), "period": _float(fields[-2])}
+    for row in _vivado_section(report, "Intra Clock Table"):
+        fields = row.split()
+        if fields[0] in clocks:
+            clocks[fields[0]]["worst_slack"] = _float(fields[1])
+
+    reports = {}
+    for name, clock in clocks.items():
+        fmax = None
+        worst_slack = clock.get("worst_slack")
+        if clock["period"] is not None and worst_slack is not None:
+            fmax = 1e3 / (clock["period"] - worst_slack)
+        reports[name] = ClockReport(name, fmax=fmax, constraint=clock["constraint"],
+                                    worst_slack=worst_slack)
+    return reports
+
+
+_vivado_categories = {
+    "lut":  ("Slice LUTs", "CLB LUTs"),
+    "ff":   ("Slice Registers", "CLB Registers"),
+    "bram": ("Block RAM Tile",),
+    "dsp":  ("DSPs",),
+    "io":   ("Bonded IOB",),
+}
+
+
+def _parse_vivado_utilization(report):
+    cells = {}
+    for line in report.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        # | Site Type | Used | Fixed | [Prohibited |] Available | Util% |
+        if len(fields) < 7 or fields[0] or fields[-1]:
+            continue
+        try:
+            cells.setdefault(fields[1], (_int(fields[2]), _int(fields[-3])))
+        except ValueError:
+            continue # header
+    utilization = {}
+    for category, site_types in _vivado_categories.items():
+        for site_type in site_types:
+            if site_type in cells:
+                utilization[category] = cells[site_type]
+                break
+    return utilization, cells
+
+
+def _quartus_tables(report):
+    # Quartus reports consist of tables delimited by `+---+` lines, with cells separated by `;`.
+    # The first row of a table is its title and the second row is the header.
+    tables = {}
+    rows = []
+    for line in report.splitlines() + [""]:
+        if line.startswith(";"):
+            rows.append([cell.strip() for cell in line.strip().strip(";").split(";")])
+        elif not line.startswith("+"):
+            if len(rows) >= 2:
+                tables.setdefault(rows[0][0], rows[1:])
+            rows = []
+    return tables
+
+
+def _parse_quartus_timing(report):
+    tables = _quartus_tables(report)
+    clocks = {}
+    for title, rows in tables.items():
+        # The slow model at the highest temperature is reported first, and is the worst case.
+        if title.endswith("Model Fmax Summary"):
+            for fmax, restricted_fmax, name, *_ in rows[1:]:
+                clocks.setdefault(name, {}).setdefault("fmax",
+                    _float(restricted_fmax.replace("MHz", "")))
+        if title.endswith("Model Setup Summary"):
+            for name, slack, *_ in rows[1:]:
+                clocks.setdefault(name, {}).setdefault("worst_slack", _float(slack))
+    for name, type_, period, frequency, *_ in tables.get("Clocks", [[]] * 2)[1:]:
+        if name in clocks:
+            clocks[name]["constraint"] = _float(frequency.replace("MHz", ""))
+    return {name: ClockReport(name, **clock) for name, clock in clocks.items()}
+
+
+_quartus_util_re = re.compile(r"^\s*(.+?)\s*:\s*([\d,]+)(?:\s*/\s*([\d,]+))?", re.MULTILINE)
+
+_quartus_categories = {
+    "lut":  ("Total logic elements", "Logic utilization (in ALMs)"),
+    "ff":   ("Total registers",),
+    "bram": ("Total memory bits", "Total block memory bits"),
+    "dsp":  ("Embedded Multiplier 9-bit elements", "Total DSP Blocks"),
+    "io":   ("Total pins",),
+}
+
+
+def _parse_key_value_utilization(report, regex, categories):
+    cells = {}
+    for match in regex.finditer(report):
+        available = match.group(3)
+        cells.setdefault(match.group(1), (_int(match.group(2)),
+                                          None if available is None else _int(available)))
+    utilization = {}
+    for category, keys in categories.items():
+        for key in keys:
+            if key in cells:
+                utilization[category] = cells[key]
+                break
+    return utilization, cells
+
+
+_gowin_util_re = re.compile(r"^\s*(\w[\w/ ]*?)\s*\|\s*(\d+)(?:/(\d+))?", re.MULTILINE)
+
+_gowin_categories = {
+    "lut":  ("Logic",),
+    "ff":   ("Register",),
+    "bram": ("BSRAM",),
+    "dsp":  ("DSP",),
+    "io":   ("I/O Port",),
+}
+
+
+def _get(products, filename):
+    try:
+        return products.get(filename, mode="t")
+    except OSError:
+        return None
+
+
+def _constrained_pins(platform, products, name):
+    # Pins are counted from the constraint file, since that is where the platform records
+    # the location of every pin used by a requested resource.
+    toolchain = platform.toolchain
+    if toolchain in ("Trellis", "Diamond", "Oxide", "Radiant"):
+        filename, regex = "{}.lpf".format(name), r"^LOCATE COMP .* SITE \"(\S+)\""
+        if toolchain in ("Oxide", "Radiant"):
+            filename, regex = "{}.pdc".format(name), r"^ldc_set_location -site \{(\S+)\}"
+    elif toolchain in ("IceStorm", "iCECube2"):
+        filename, regex = "{}.pcf".format(name), r"^set_io \S+ (\S+)"
+    elif toolchain in ("Apicula", "Gowin"):
+        filename, regex = "{}.cst".format(name), r"^IO_LOC \"\S+\" (\S+);"
+    elif toolchain in ("Vivado", "Symbiflow", "Xray"):
+        filename, regex = "{}.xdc".format(name), r"PACKAGE_PIN (\S+)"
+    elif toolchain == "ISE":
+        filename, regex = "{}.ucf".format(name), r"LOC=(\S+)"
+    elif toolchain in ("Quartus", "Mistral"):
+        filename, regex = "{}.qsf".format(name), r"^set_location_assignment -to \S+ PIN_(\S+)"
+    else:
+        return None
+    constraints = _get(products, filename)
+    if constraints is None:
+        return None
+    return len(set(re.findall(regex, constraints, re.MULTILINE)))
+
+
+def collect_report(platform, products, name="top"):
+    """Collect timing and utilization from the products of building ``name`` for ``platform``.
+
+    Timing and utilization are collected for the nextpnr-based toolchains, Vivado and Quartus.
+    Only utilization is collected for the Gowin IDE, whose timing report is not parsed, so
+    ``clocks`` is ``None`` for it. For other toolchains (e.g. ISE, Diamond, iCECube2, Radiant
+    and Symbiflow), only ``io_requested`` is known. Reports that are missing from ``products``
+    are skipped.
+
+    Returns :class:`BuildReport`.
+    """
+    toolchain = platform.toolchain
+    clocks, utilization, cells = {}, {}, {}
+    if any(tool.startswith("nextpnr-") for tool in platform.required_tools):
+        log = _get(products, "{}.tim".format(name))
+        if log is not None:
+            clocks, utilization, cells = _parse_nextpnr(log)
+    elif toolchain == "Vivado":
+        timing = _get(products, "{}_timing.rpt".format(name))
+        if timing is not None:
+            clocks = _parse_vivado_timing(timing)
+        report = _get(products, "{}_utilization_place.rpt".format(name))
+        if report is not None:
+            utilization, cells = _parse_vivado_utilization(report)
+    elif toolchain == "Quartus":
+        timing = _get(products, "{}.sta.rpt".format(name))
+        if timing is not None:
+            clocks = _parse_quartus_timing(timing)
+        summary = _get(products, "{}.fit.summary".format(name))
+        if summary is not None:
+            utilization, cells = _parse_key_value_utilization(summary, _quartus_util_re,
+                                                              _quartus_categories)
+    elif toolchain == "Gowin":
+        report = _get(products, "impl/pnr/project.rpt.txt")
+        if report is not None:
+            utilization, cells = _parse_key_value_utilization(report, _gowin_util_re,
+                                                              _gowin_categories)
+        clocks = None
+    else:
+        clocks, utilization, cells = None, None, None
+    return BuildReport(toolchain, clocks=clocks, utilization=utilization, cells=cells,
+                       io_requested=_constrained_pins(platform, products, name))
+
+
+class TestCase(unittest.TestCase):
+    def test_nextpnr(self):
+        clocks, utilization, cells = _parse_nextpnr(
+            "Info: Device utilisation:\n"
+            "Info: \t          TRELLIS_IO:     9/    365     2%\n"
+            "Info: \t        TRELLIS_COMB:    41/  83640     0%\n"
+            "Info: \t          TRELLIS_FF:    26/  83640     0%\n"
+            "Info: \t              DP16KD:     0/    208     0%\n"
+            "Info: Max frequency for clock '$glbnet$clk': 212.31 MHz (PASS at 25.00 MHz)\n")
+        self.assertEqual(clocks["$glbnet$clk"].fmax, 212.31)
+        self.assertEqual(utilization, {"lut": (41, 83640), "ff": (26, 83640), "bram": (0, 208),
+                                       "io": (9, 365)})
+        self.assertEqual(len(cells), 4)
+
+    def test_vivado(self):
+        clocks = _parse_vivado_timing(
+            "------------------------------------------------------------------\n"
+            "| Clock Summary\n"
+            "| -------------\n"
+            "------------------------------------------------------------------\n"
+            "\n"
+            "Clock  Waveform(ns)       Period(ns)      Frequency(MHz)\n"
+            "-----  ------------       ----------      --------------\n"
+            "clk    {0.000 5.000}      10.000          100.000\n"
+            "\n"
+            "------------------------------------------------------------------\n"
+            "| Intra Clock Table\n"
+            "| -----------------\n"
+            "------------------------------------------------------------------\n"
+            "\n"
+            "Clock             WNS(ns)      TNS(ns)  TNS Failing Endpoints\n"
+            "-----             -------      -------  ---------------------\n"
+            "clk                 7.500        0.000                      0\n"
+            "\n")
+        self.assertEqual(clocks["clk"].as_dict(),
+                         {"fmax": 400.0, "constraint": 100.0, "worst_slack": 7.5})
+        utilization, cells = _parse_vivado_utilization(
+            "+-------------------------+------+-------+------------+-----------+-------+\n"
+            "|        Site Type        | Used | Fixed | Prohibited | Available | Util% |\n"
+            "+-------------------------+------+-------+------------+-----------+-------+\n"
+            "| Slice LUTs              |   20 |     0 |          0 |     20800 |  0.10 |\n"
+            "| Slice Registers         |   30 |     0 |          0 |     41600 |  0.07 |\n"
+            "| Bonded IOB              |    9 |     9 |          0 |       210 |  4.29 |\n")
+        self.assertEqual(utilization, {"lut": (20, 20800), "ff": (30, 41600), "io": (9, 210)})
+
+    def test_quartus(self):
+        clocks = _parse_quartus_timing(
+            "+----------------------------------------------------------+\n"
+            "; Clocks                                                   ;\n"
+            "+------------+------+--------+-----------+-------+--------+\n"
+            "; Clock Name ; Type ; Period ; Frequency ; Rise  ; Fall   ;\n"
+            "+------------+------+--------+-----------+-------+--------+\n"
+            "; clk50      ; Base ; 20.000 ; 50.0 MHz  ; 0.000 ; 10.000 ;\n"
+            "+------------+------+--------+-----------+-------+--------+\n"
+            "\n"
+            "+-----------------------------------------------+\n"
+            "; Slow 1200mV 85C Model Fmax Summary            ;\n"
+            "+-----------+-----------------+------------+----+\n"
+            "; Fmax      ; Restricted Fmax ; Clock Name ; Note ;\n"
+            "+-----------+-----------------+------------+----+\n"
+            "; 250.0 MHz ; 250.0 MHz       ; clk50      ;    ;\n"
+            "+-----------+-----------------+------------+----+\n"
+            "\n"
+            "+---------------------------------------+\n"
+            "; Slow 1200mV 85C Model Setup Summary   ;\n"
+            "+--------+--------+---------------+\n"
+            "; Clock  ; Slack  ; End Point TNS ;\n"
+            "+--------+--------+---------------+\n"
+            "; clk50  ; 16.000 ; 0.000         ;\n"
+            "+--------+--------+---------------+\n")
+        self.assertEqual(clocks["clk50"].as_dict(),
+                         {"fmax": 250.0, "constraint": 50.0, "worst_slack": 16.0})
+        utilization, cells = _parse_key_value_utilization(
+            "Total logic elements : 45 / 22,320 ( < 1 % )\n"
+            "Total registers : 30\n"
+            "Total pins : 9 / 154 ( 6 % )\n",
+            _quartus_util_re, _quartus_categories)
+        self.assertEqual(utilization, {"lut": (45, 22320), "ff": (30, None), "io": (9, 154)})
+
+    def test_constrained_pins(self):
+        from .test.blinky import Blinky
+        from .icebreaker import ICEBreakerPlatform
+        platform = ICEBreakerPlatform()
+        plan = platform.build(Blinky(), do_build=False)
+
+        class Products:
+            def get(self, filename, mode):
+                return plan.files[filename]
+
+        self.assertEqual(_constrained_pins(platform, Products(), "top"), 4)
+
+    def test_unparsed(self):
+        from .test.blinky import Blinky
+        from .mercury import MercuryPlatform
+        platform = MercuryPlatform()
+        plan = platform.build(Blinky(), do_build=False)
+
+        class Products:
+            def get(self, filename, mode):
+                try:
+                    return plan.files[filename]
+                except KeyError:
+                    raise FileNotFoundError(filename) from None
+
+        report = collect_report(platform, Products())
+        self.assertEqual(report.as_dict(), {"toolchain": "ISE", "clocks": None,
+                                            "utilization": None, "cells": None,
+                                            "io_requested": report.io_requested})
+        self.assertGreater(report.io_requested, 0)
@@ -0,0 +1,800 @@
+import re
+import unittest
+
+from amaranth import *
+from amaranth.lib import io
+from amaranth.lib.memory import Memory
+
+from .memory import MemoryPort, _cycles, _delay
+
+
+__all__ = ["SDRAMChip", "sdram_chip", "SDRAMController", "SDRAMModel", "SDRAM"]
+
+
+class SDRAMChip:
+    """Geometry and timings of the SDR SDRAM of a board.
+
+    ``rows``, ``cols`` and ``banks`` describe a single chip, and ``width`` is the width of the
+    whole data bus. Timings are in nanoseconds, and are the minimums from the datasheet of the
+    chip for its slowest speed grade, except ``tREFI``, which is the maximum refresh interval.
+    ``tCK_cl2`` is the shortest clock period at a CAS latency of 2, and ``tCK`` the shortest
+    clock period at all.
+    """
+    def __init__(self, name, *, rows, cols, banks=4, width=16, tRCD=20.0, tRP=20.0, tRAS=45.0,
+                 tRC=65.0, tRFC=70.0, tWR=15.0, tRRD=15.0, tREFI=7800.0, tCK_cl2=10.0,
+                 tCK=7.0):
+        for what, value in (("rows", rows), ("cols", cols), ("banks", banks)):
+            if value < 1 or value & (value - 1):
+                raise ValueError("SDRAM {} must be a power of 2, not {}".format(what, value))
+        if width % 8:
+            raise ValueError("SDRAM data width must be a multiple of 8, not {}".format(width))
+
+        self.name    = name
+        self.rows    = rows
+        self.cols    = cols
+        self.banks   = banks
+        self.width   = width
+        self.tRCD    = tRCD
+        self.tRP     = tRP
+        self.tRAS    = tRAS
+        self.tRC     = tRC
+        self.tRFC    = tRFC
+        self.tWR     = tWR
+        self.tRRD    = tRRD
+        self.tREFI   = tREFI
+        self.tCK_cl2 = tCK_cl2
+        self.tCK     = tCK
+
+    @property
+    def row_bits(self):
+        return self.rows.bit_length() - 1
+
+    @property
+    def col_bits(self):
+        return self.cols.bit_length() - 1
+
+    @property
+    def bank_bits(self):
+        return self.banks.bit_length() - 1
+
+    @property
+    def size(self):
+        """Capacity of the memory, in bytes."""
+        return self.rows * self.cols * self.banks * self.width // 8
+
+    def cas_latency(self, clk_frequency):
+        """Return the CAS latency, in clock cycles, of the memory clocked at ``clk_frequency``
+        Hz."""
+        tck = 1e9 / clk_frequency
+        if tck < self.tCK:
+            raise ValueError("{} SDRAM cannot run at {:.0f} MHz"
+                             .format(self.name, 1e-6 * clk_frequency))
+        return 2 if tck >= self.tCK_cl2 else 3
+
+    def as_dict(self):
+        return {
+            "name":    self.name,
+            "rows":    self.rows,
+            "cols":    self.cols,
+            "banks":   self.banks,
+            "width":   self.width,
+            "size":    self.size,
+            "tRCD":    self.tRCD,
+            "tRP":     self.tRP,
+            "tRAS":    self.tRAS,
+            "tRC":     self.tRC,
+            "tRFC":    self.tRFC,
+            "tWR":     self.tWR,
+            "tRRD":    self.tRRD,
+            "tREFI":   self.tREFI,
+            "tCK_cl2": self.tCK_cl2,
+            "tCK":     self.tCK,
+        }
+
+    def __repr__(self):
+        return "<SDRAMChip {} {} MiB x{}>".format(self.name, self.size // 2 ** 20, self.width)
+
+
+# SDRAM of each board, keyed by the name of a class in the MRO of its platform.
+_SDRAM_CHIPS = {
+    "_ULX3SPlatform":               SDRAMChip("MT48LC16M16A2", rows=8192, cols=512),
+    "DE10LitePlatform":             SDRAMChip("IS42S16320D",  rows=8192, cols=1024),
+    "DE0CVPlatform":                SDRAMChip("IS42S16320D",  rows=8192, cols=1024),
+    "DE0NanoPlatform":              SDRAMChip("IS42S16160B",  rows=8192, cols=512),
+    "DE0Platform":                  SDRAMChip("A3V64S40ETP",  rows=4096, cols=256,
+                                              tREFI=15600),
+    "MisterPlatform":               SDRAMChip("AS4C16M16SA",  rows=8192, cols=512),
+    "MiSTPlatform":                 SDRAMChip("MT48LC16M16A2", rows=8192, cols=512),
+    "RZEasyFPGAA2_2Platform":       SDRAMChip("HY57V641620",  rows=4096, cols=256,
+                                              tREFI=15600),
+    "Supercon19BadgePlatform":      SDRAMChip("AS4C32M8SA",   rows=8192, cols=1024, width=8),
+    "Colorlight_5A75B_R70Platform": SDRAMChip("W9816G6JH",    rows=2048, cols=256, banks=2,
+                                              width=32, tREFI=15600),
+}
+
+
+def sdram_chip(platform, number=0):
+    """Return the :class:`SDRAMChip` describing the ``sdram`` resource ``number`` of
+    ``platform``.
+
+    Boards whose memory is not known get a chip with as many rows and banks as the address bus
+    allows, 256 columns, and conservative timings.
+    """
+    for cls in type(platform).__mro__:
+        if cls.__name__ in _SDRAM_CHIPS:
+            return _SDRAM_CHIPS[cls.__name__]
+    resource = platform.lookup("sdram", number)
+    widths = {subsignal.name: len(subsignal.ios[0]) for subsignal in resource.ios}
+    return SDRAMChip("SDRAM", rows=2 ** widths["a"], cols=256, banks=2 ** widths["ba"],
+                     width=widths["dq"])
+
+
+# Commands, as the values of RAS, CAS and WE (active high).
+_CMD_MRS = 0b111
+_CMD_REF = 0b110
+_CMD_PRE = 0b101
+_CMD_ACT = 0b100
+_CMD_WR  = 0b011
+_CMD_RD  = 0b010
+
+
+class _Request:
+    def __init__(self, name, port):
+        self.valid = Signal(name="{}_valid".format(name))
+        self.we    = Signal(name="{}_we".format(name))
+        self.addr  = Signal(port.addr_width, name="{}_addr".format(name))
+        self.wdata = Signal(port.data_width, name="{}_wdata".format(name))
+        self.wmask = Signal(port.mask_width, name="{}_wmask".format(name))
+
+    def eq(self, other):
+        return [getattr(self, name).eq(getattr(other, name))
+                for name in ("valid", "we", "addr", "wdata", "wmask")]
+
+
+class SDRAMController(Elaboratable):
+    """SDR SDRAM controller for ``chip``, running at ``clk_frequency`` Hz.
+
+    After the memory is initialized and ``init_done`` is asserted, it is accessed through
+    ``port``, a :class:`~amaranth_boards.memory.MemoryPort` whose transfers are whole bursts of
+    ``burst_length`` words. Consecutive addresses go to consecutive columns of a row, then to
+    the next bank, then to the next row.
+
+    Rows are left open, in every bank, until another row of the same bank is accessed. The
+    request after the one being served is looked ahead at, and if it is for another bank, the
+    row it needs is opened while the data of the current request is transferred, so that
+    accesses spread over several banks keep the data bus busy.
+
+    Refreshes are postponed while there are requests to serve, and issued when the controller
+    is idle, up to ``max_postponed`` of them; once that many are owed, one is forced.
+
+    The memory pins are driven by the ``a``, ``ba``, ``cs``, ``ras``, ``cas``, ``we``, ``cke``,
+    ``dqm``, ``dq_o`` and ``dq_oe`` signals (all active high), which are registered once before
+    the memory samples them, and read data is taken from ``dq_i`` ``read_latency`` cycles after
+    a read command; see :class:`SDRAM`. ``fast_init`` skips the 200 µs wait of the power-up
+    sequence, for simulation.
+    """
+    def __init__(self, chip, *, clk_frequency, burst_length=4, read_delay=0, max_postponed=8,
+                 fast_init=False):
+        if burst_length not in (1, 2, 4, 8):
+            raise ValueError("SDRAM burst length must be 1, 2, 4 or 8, not {}"
+                             .format(burst_length))
+        if burst_length > chip.cols:
+            raise ValueError("SDRAM burst length must not exceed the {} columns of a row"
+                             .format(chip.cols))
+
+        self.chip          = chip
+        self.clk_frequency = clk_frequency
+        self.burst_length  = burst_length
+        self.max_postponed = max_postponed
+        self.fast_init     = fast_init
+        self.cl            = chip.cas_latency(clk_frequency)
+        # The command is registered before the memory samples it, and the data after the
+        # memory drives it.
+        self.read_latency  = 1 + self.cl + 1 + read_delay
+
+        self.port = MemoryPort(
+            addr_width=chip.col_bits - (burst_length.bit_length() - 1) + chip.bank_bits +
+                       chip.row_bits,
+            data_width=burst_length * chip.width)
+        self.init_done = Signal()
+
+        self.a     = Signal(max(chip.row_bits, 11))
+        self.ba    = Signal(chip.bank_bits)
+        self.cs    = Signal()
+        self.ras   = Signal()
+        self.cas   = Signal()
+        self.we    = Signal()
+        self.cke   = Signal()
+        self.dqm   = Signal(chip.width // 8)
+        self.dq_o  = Signal(chip.width)
+        self.dq_oe = Signal()
+        self.dq_i  = Signal(chip.width)
+
+        self.refreshes = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        chip, port, f = self.chip, self.port, self.clk_frequency
+        bl, cl = self.burst_length, self.cl
+
+        tRCD = _cycles(chip.tRCD, f)
+        tRP  = _cycles(chip.tRP, f)
+        tRAS = _cycles(chip.tRAS, f)
+        tRC  = _cycles(chip.tRC, f)
+        tRFC = _cycles(chip.tRFC, f)
+        tRRD = _cycles(chip.tRRD, f)
+        tMRD = 2
+        # Write to precharge is counted from the last word of the burst, and read to write
+        # leaves a cycle for the data bus to turn around.
+        tWRP = bl - 1 + _cycles(chip.tWR, f) + 1
+        tRTW = cl + bl + 1
+        tREFI = int(chip.tREFI * 1e-9 * f)
+
+        def issue(cmd, bank=0, address=0):
+            m.d.comb += [
+                self.cs.eq(1),
+                Cat(self.we, self.cas, self.ras).eq(cmd),
+                self.ba.eq(bank),
+                self.a.eq(address),
+            ]
+
+        def timer(name, limit):
+            count = Signal(range(limit + 1), name=name)
+            with m.If(count != 0):
+                m.d.sync += count.eq(count - 1)
+            return count
+
+        def restart(count, cycles):
+            # Forbids the command guarded by `count` for the next `cycles` cycles, unless it
+            # is already forbidden for longer.
+            if cycles > 1:
+                with m.If(count < cycles):
+                    m.d.sync += count.eq(cycles - 1)
+
+        def restart_bank(timers, bank, cycles):
+            with m.Switch(bank):
+                for n, count in enumerate(timers):
+                    with m.Case(n):
+                        restart(count, cycles)
+
+        limit = max(tRCD, tRP, tRAS, tRC, tRFC, tRRD, tMRD, tWRP, tRTW, bl)
+        act_timers = [timer("act_wait{}".format(n), limit) for n in range(chip.banks)]
+        rw_timers  = [timer("rw_wait{}".format(n),  limit) for n in range(chip.banks)]
+        pre_timers = [timer("pre_wait{}".format(n), limit) for n in range(chip.banks)]
+        act_any = timer("act_any_wait", limit)
+        rd_any  = timer("rd_any_wait",  limit)
+        wr_any  = timer("wr_any_wait",  limit)
+
+        open_ = Signal(chip.banks)
+        rows  = Array(Signal(chip.row_bits, name="row{}".format(n)) for n in range(chip.banks))
+
+        # Requests are queued in two stages: the one being served, and the next one, which is
+        # looked ahead at.
+        head = _Request("head", port)
+        queued = _Request("next", port)
+        head_done = Signal()
+        advance = Signal()
+        m.d.comb += [
+            advance.eq(~head.valid | head_done),
+            port.ready.eq(self.init_done & (~queued.valid | advance)),
+        ]
+        with m.If(advance):
+            m.d.sync += head.eq(queued)
+            m.d.sync += queued.valid.eq(0)
+        with m.If(port.valid & port.ready):
+            m.d.sync += [
+                queued.valid.eq(1),
+                queued.we.eq(port.we),
+                queued.addr.eq(port.addr),
+                queued.wdata.eq(port.wdata),
+                queued.wmask.eq(port.wmask),
+            ]
+
+        col_bits = chip.col_bits - (bl.bit_length() - 1)
+        def decode(request):
+            col  = Cat(C(0, bl.bit_length() - 1), request.addr[:col_bits])
+            bank = request.addr[col_bits:col_bits + chip.bank_bits]
+            row  = request.addr[col_bits + chip.bank_bits:]
+            return col, bank, row
+        head_col, head_bank, head_row = decode(head)
+        _,        next_bank, next_row = decode(queued)
+
+        def bank_ready(timers, bank):
+            return Array(count == 0 for count in timers)[bank]
+
+        head_open = open_.bit_select(head_bank, 1)
+        head_hit  = head_open & (rows[head_bank] == head_row)
+        next_open = open_.bit_select(next_bank, 1)
+        lookahead = queued.valid & head.valid & (next_bank != head_bank)
+
+        # Write data is sent one word per cycle, starting with the write command.
+        wr_left = Signal(range(bl))
+        wr_data = Signal(max((bl - 1) * chip.width, 1))
+        wr_mask = Signal(max((bl - 1) * chip.width // 8, 1))
+        with m.If(wr_left != 0):
+            m.d.sync += [
+                wr_left.eq(wr_left - 1),
+                wr_data.eq(wr_data >> chip.width),
+                wr_mask.eq(wr_mask >> (chip.width // 8)),
+            ]
+            m.d.comb += [
+                self.dq_o.eq(wr_data[:chip.width]),
+                self.dqm.eq(wr_mask[:chip.width // 8]),
+                self.dq_oe.eq(1),
+            ]
+
+        # Read data is collected one word per cycle, `read_latency` cycles after the command.
+        rd_issue = Signal()
+        rd_pipe  = Signal(self.read_latency + bl)
+        m.d.sync += rd_pipe.eq(Cat(rd_issue, rd_pipe))
+        rd_data  = Signal(max((bl - 1) * chip.width, 1))
+        with m.If(rd_pipe[self.read_latency - 1:self.read_latency - 1 + bl].any()):
+            m.d.sync += rd_data.eq(Cat(rd_data, self.dq_i)[chip.width:])
+        m.d.comb += [
+            port.rdata.eq(Cat(rd_data[:(bl - 1) * chip.width], self.dq_i)),
+            port.rvalid.eq(rd_pipe[self.read_latency - 1 + bl - 1]),
+        ]
+
+        refresh_owed = Signal(range(self.max_postponed + 1))
+        refresh_done = Signal()
+        refi = Signal(range(tREFI + 1), init=tREFI)
+        with m.If(self.init_done):
+            m.d.sync += refi.eq(refi - 1)
+        with m.If(refi == 0):
+            m.d.sync += refi.eq(tREFI)
+            with m.If(~refresh_done & (refresh_owed != self.max_postponed)):
+                m.d.sync += refresh_owed.eq(refresh_owed + 1)
+        with m.Elif(refresh_done):
+            m.d.sync += refresh_owed.eq(refresh_owed - 1)
+        with m.If(refresh_done):
+            m.d.sync += self.refreshes.eq(self.refreshes + 1)
+
+        if self.fast_init:
+            t_power_up = 4
+        else:
+            t_power_up = _cycles(200e3, f)
+        bl_code = bl.bit_length() - 1
+        mode = bl_code | cl << 4
+        # Power-up and initialization sequence, as (command, address, wait).
+        init = [
+            (None,     0,       t_power_up),
+            (_CMD_PRE, 1 << 10, tRP),
+            *[(_CMD_REF, 0, tRFC)] * 8,
+            (_CMD_MRS, mode,    tMRD),
+        ]
+        wait = Signal(range(max(cycles for *_, cycles in init) + 1))
+
+        with m.FSM():
+            for index, (cmd, address, cycles) in enumerate(init):
+                with m.State("INIT-{}".format(index)):
+                    m.d.sync += wait.eq(wait + 1)
+                    if index > 0:
+                        m.d.comb += self.cke.eq(1)
+                    if cmd is not None:
+                        with m.If(wait == 0):
+                            issue(cmd, 0, address)
+                    with m.If(wait == cycles - 1):
+                        m.d.sync += wait.eq(0)
+                        if index + 1 == len(init):
+                            m.d.sync += self.init_done.eq(1)
+                            m.next = "SERVE"
+                        else:
+                            m.next = "INIT-{}".format(index + 1)
+
+            with m.State("SERVE"):
+                m.d.comb += self.cke.eq(1)
+
+                # A command for the request after the current one, if the current one cannot
+                # issue its own.
+                def look_ahead():
+                    with m.If(lookahead & next_open & (rows[next_bank] != next_row)):
+                        with m.If(bank_ready(pre_timers, next_bank)):
+                            issue(_CMD_PRE, next_bank)
+                            m.d.sync += open_.bit_select(next_bank, 1).eq(0)
+                            restart_bank(act_timers, next_bank, tRP)
+                    with m.Elif(lookahead & ~next_open):
+                        with m.If(bank_ready(act_timers, next_bank) & (act_any == 0)):
+                            activate(next_bank, next_row)
+
+                def activate(bank, row):
+                    issue(_CMD_ACT, bank, row)
+                    m.d.sync += [
+                        open_.bit_select(bank, 1).eq(1),
+                        rows[bank].eq(row),
+                    ]
+                    restart(act_any, tRRD)
+                    restart_bank(rw_timers, bank, tRCD)
+                    restart_bank(pre_timers, bank, tRAS)
+                    restart_bank(act_timers, bank, tRC)
+
+                with m.If(refresh_owed == self.max_postponed):
+                    m.next = "PRECHARGE-ALL"
+
+                with m.Elif(head.valid & head_hit):
+                    with m.If(head.we & (wr_any == 0) & bank_ready(rw_timers, head_bank)):
+                        issue(_CMD_WR, head_bank, head_col)
+                        m.d.comb += [
+                            head_done.eq(1),
+                            self.dq_o.eq(head.wdata[:chip.width]),
+                            self.dqm.eq(head.wmask[:chip.width // 8]),
+                            self.dq_oe.eq(1),
+                        ]
+                        if bl > 1:
+                            m.d.sync += [
+                                wr_left.eq(bl - 1),
+                                wr_data.eq(head.wdata[chip.width:]),
+                                wr_mask.eq(head.wmask[chip.width // 8:]),
+                            ]
+                        restart(wr_any, bl)
+                        restart(rd_any, bl)
+                        restart_bank(pre_timers, head_bank, tWRP)
+                    with m.Elif(~head.we & (rd_any == 0) & bank_ready(rw_timers, head_bank)):
+                        issue(_CMD_RD, head_bank, head_col)
+                        m.d.comb += [
+                            head_done.eq(1),
+                            rd_issue.eq(1),
+                        ]
+                        restart(rd_any, bl)
+                        restart(wr_any, tRTW)
+                        restart_bank(pre_timers, head_bank, bl)
+                    with m.Else():
+                        look_ahead()
+
+                with m.Elif(head.valid & head_open):
+                    with m.If(bank_ready(pre_timers, head_bank)):
+                        issue(_CMD_PRE, head_bank)
+                        m.d.sync += open_.bit_select(head_bank, 1).eq(0)
+                        restart_bank(act_timers, head_bank, tRP)
+                    with m.Else():
+                        look_ahead()
+
+                with m.Elif(head.valid):
+                    with m.If(bank_ready(act_timers, head_bank) & (act_any == 0)):
+                        activate(head_bank, head_row)
+                    with m.Else():
+                        look_ahead()
+
+                with m.Elif(~queued.valid & ~port.valid & (refresh_owed != 0)):
+                    m.next = "PRECHARGE-ALL"
+
+            with m.State("PRECHARGE-ALL"):
+                m.d.comb += self.cke.eq(1)
+                with m.If((Cat(count == 0 for count in pre_timers).all()) &
+                          (wr_any == 0) & (rd_any == 0)):
+                    with m.If(open_ != 0):
+                        issue(_CMD_PRE, 0, 1 << 10)
+                        m.d.sync += open_.eq(0)
+                        restart(act_any, tRP)
+                    m.next = "REFRESH"
+
+            with m.State("REFRESH"):
+                m.d.comb += self.cke.eq(1)
+                with m.If((act_any == 0) & Cat(count == 0 for count in act_timers).all()):
+                    issue(_CMD_REF)
+                    m.d.comb += refresh_done.eq(1)
+                    restart(act_any, tRFC)
+                    m.next = "SERVE"
+
+        return m
+
+
+class SDRAMModel(Elaboratable):
+    """Model of an SDR SDRAM chip, for simulation, driven by the pins of ``controller``.
+
+    The whole of the memory of the controller is stored, so it should be a small one. The pins
+    are registered, like the I/O buffers used by :class:`SDRAM` register them, and read data is
+    delayed by another ``read_delay`` cycles. Commands are checked against the state of the
+    banks and the timings of the memory, and ``error`` is asserted, and stays asserted, if one is
+    issued too early or in the wrong state, if the controller and the memory drive the data bus
+    at once, or if refreshes are further apart than the controller allows.
+    """
+    def __init__(self, controller, *, read_delay=0):
+        self.controller = controller
+        self.chip       = controller.chip
+        self.read_delay = read_delay
+
+        self.error = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        ctrl, chip, f = self.controller, self.chip, self.controller.clk_frequency
+        tRCD = _cycles(chip.tRCD, f)
+        tRP  = _cycles(chip.tRP, f)
+        tRAS = _cycles(chip.tRAS, f)
+        tRC  = _cycles(chip.tRC, f)
+        tRFC = _cycles(chip.tRFC, f)
+        tRRD = _cycles(chip.tRRD, f)
+        tWR  = _cycles(chip.tWR, f)
+        tREFI_max = (ctrl.max_postponed + 1) * int(chip.tREFI * 1e-9 * f) + tRFC + tRC
+
+        # Pins as sampled by the memory.
+        a, ba, cs, cmd, dqm, dq, dq_oe = (Signal.like(value) for value in (
+            ctrl.a, ctrl.ba, ctrl.cs, Cat(ctrl.we, ctrl.cas, ctrl.ras), ctrl.dqm, ctrl.dq_o,
+            ctrl.dq_oe))
+        m.d.sync += [
+            a.eq(ctrl.a),
+            ba.eq(ctrl.ba),
+            cs.eq(ctrl.cs),
+            cmd.eq(Cat(ctrl.we, ctrl.cas, ctrl.ras)),
+            dqm.eq(ctrl.dqm),
+            dq.eq(ctrl.dq_o),
+            dq_oe.eq(ctrl.dq_oe),
+        ]
+
+        mode = Signal(7)
+        bl   = Signal(4)
+        cl   = Signal(2)
+        m.d.comb += [
+            bl.eq(1 << mode[:2]),
+            cl.eq(mode[4:6]),
+        ]
+
+        now = Signal(32, init=2 ** 20)
+        m.d.sync += now.eq(now + 1)
+
+        is_act, is_rd, is_wr, is_pre, is_ref, is_mrs = (
+            cs & (cmd == code) for code in (_CMD_ACT, _CMD_RD, _CMD_WR, _CMD_PRE, _CMD_REF,
+                                            _CMD_MRS))
+
+        open_   = Signal(chip.banks)
+        rows    = Array(Signal(chip.row_bits, name="row{}".format(n)) for n in range(chip.banks))
+        t_act   = Array(Signal(32, name="t_act{}".format(n)) for n in range(chip.banks))
+        t_pre   = Array(Signal(32, name="t_pre{}".format(n)) for n in range(chip.banks))
+        t_write = Array(Signal(32, name="t_write{}".format(n)) for n in range(chip.banks))
+        t_act_any = Signal(32)
+        t_ref   = Signal(32)
+        refresh = Signal()
+
+        def check(condition):
+            with m.If(~condition):
+                m.d.sync += self.error.eq(1)
+
+        with m.If(is_mrs):
+            check(open_ == 0)
+            m.d.sync += mode.eq(a)
+        with m.If(is_act):
+            check(~open_.bit_select(ba, 1))
+            check(now - t_pre[ba] >= tRP)
+            check(now - t_act[ba] >= tRC)
+            check(now - t_act_any >= tRRD)
+            check(now - t_ref >= tRFC)
+            m.d.sync += [
+                open_.bit_select(ba, 1).eq(1),
+                rows[ba].eq(a),
+                t_act[ba].eq(now),
+                t_act_any.eq(now),
+            ]
+        with m.If(is_rd | is_wr):
+            check(open_.bit_select(ba, 1))
+            check(now - t_act[ba] >= tRCD)
+        with m.If(is_pre):
+            for n in range(chip.banks):
+                with m.If((a[10] | (ba == n)) & open_[n]):
+                    check(now - t_act[n] >= tRAS)
+                    check(now - t_write[n] >= tWR)
+                    m.d.sync += t_pre[n].eq(now)
+            with m.If(a[10]):
+                m.d.sync += open_.eq(0)
+            with m.Else():
+                m.d.sync += open_.bit_select(ba, 1).eq(0)
+        with m.If(is_ref):
+            check(open_ == 0)
+            check(now - t_act_any >= tRC)
+            m.d.sync += [
+                t_ref.eq(now),
+                refresh.eq(1),
+            ]
+        with m.If(refresh & (now - t_ref > tREFI_max)):
+            m.d.sync += self.error.eq(1)
+
+        m.submodules.storage = storage = Memory(shape=chip.width,
+            depth=chip.rows * chip.banks * chip.cols, init=[])
+        wr_port = storage.write_port(granularity=8)
+        rd_port = storage.read_port()
+
+        # Bursts in progress, as the address of the next word and the number of words left.
+        wr_addr  = Signal(chip.row_bits + chip.bank_bits + chip.col_bits)
+        wr_left  = Signal(4)
+        rd_addr  = Signal.like(wr_addr)
+        rd_left  = Signal(4)
+        rd_start = Signal(4)
+        rd_first = Signal.like(rd_addr)
+        address  = Cat(a[:chip.col_bits], ba, rows[ba])
+
+        with m.If(is_wr):
+            m.d.comb += wr_port.addr.eq(address)
+            m.d.sync += [
+                wr_addr.eq(address + 1),
+                wr_left.eq(bl - 1),
+            ]
+        with m.Else():
+            m.d.comb += wr_port.addr.eq(wr_addr)
+            with m.If(wr_left != 0):
+                m.d.sync += [
+                    wr_addr.eq(wr_addr + 1),
+                    wr_left.eq(wr_left - 1),
+                ]
+        with m.If(is_wr | (wr_left != 0)):
+            check(dq_oe)
+            m.d.comb += wr_port.en.eq(~dqm)
+            m.d.sync += t_write[Mux(is_wr, ba, wr_addr[chip.col_bits:][:chip.bank_bits])].eq(now)
+        m.d.comb += wr_port.data.eq(dq)
+
+        # Read data is driven from `cl` cycles after the command; the read port adds one.
+        with m.If(is_rd):
+            m.d.sync += [
+                rd_first.eq(address),
+                rd_start.eq(cl - 1),
+            ]
+        with m.Elif(rd_start != 0):
+            m.d.sync += rd_start.eq(rd_start - 1)
+        with m.If(rd_start == 1):
+            m.d.comb += rd_port.addr.eq(rd_first)
+            m.d.sync += [
+                rd_addr.eq(rd_first + 1),
+                rd_left.eq(bl),
+            ]
+        with m.Else():
+            m.d.comb += rd_port.addr.eq(rd_addr)
+            with m.If(rd_left != 0):
+                m.d.sync += [
+                    rd_addr.eq(rd_addr + 1),
+                    rd_left.eq(rd_left - 1),
+                ]
+        driving = Signal()
+        m.d.sync += driving.eq((rd_start == 1) | (rd_left > 1))
+        with m.If(driving & dq_oe):
+            m.d.sync += self.error.eq(1)
+
+        # The data is registered by the input buffer of the FPGA.
+        m.d.sync += ctrl.dq_i.eq(_delay(m, Mux(driving, rd_port.data, 0), self.read_delay))
+
+        return m
+
+
+class SDRAM(Elaboratable):
+    """SDR SDRAM controller for the ``sdram`` resource of a board.
+
+    ``pads`` is the resource, requested with ``platform.request("sdram", dir="-")``, and
+    ``chip`` describes the memory; it defaults to the memory of the board, as returned by
+    :func:`sdram_chip`, but then requires the platform to be given as well. The memory is
+    clocked by the inverted ``sync`` clock, which must run at ``clk_frequency`` Hz, so that
+    commands are sampled in the middle of the cycle in which they are driven. Above 80 MHz or
+    so, read data arrives after the next rising edge, and ``read_delay`` must be 1.
+
+    The memory is accessed through ``port``, a :class:`~amaranth_boards.memory.MemoryPort`,
+    once ``init_done`` is asserted. The other arguments are those of :class:`SDRAMController`.
+    """
+    def __init__(self, pads, *, clk_frequency, chip=None, platform=None, burst_length=4,
+                 read_delay=0, max_postponed=8):
+        if chip is None:
+            if platform is None:
+                raise ValueError("Either the SDRAM memory or the platform must be given")
+            chip = sdram_chip(platform)
+        if len(pads.dq) != chip.width:
+            raise ValueError("SDRAM resource has a {}-bit data bus, but the {} memory is {}-bit "
+                             "wide".format(len(pads.dq), chip.name, chip.width))
+
+        self.pads       = pads
+        self.controller = SDRAMController(chip, clk_frequency=clk_frequency,
+                                          burst_length=burst_length, read_delay=read_delay,
+                                          max_postponed=max_postponed)
+
+        self.port      = self.controller.port
+        self.init_done = self.controller.init_done
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads, ctrl = self.pads, self.controller
+        m.submodules.controller = ctrl
+
+        m.submodules.clk = clk = io.DDRBuffer("o", pads.clk)
+        m.d.comb += [
+            clk.o[0].eq(0),
+            clk.o[1].eq(1),
+        ]
+
+        for name, value in (("a", ctrl.a), ("ba", ctrl.ba), ("cs", ctrl.cs),
+                            ("ras", ctrl.ras), ("cas", ctrl.cas), ("we", ctrl.we),
+                            ("clk_en", ctrl.cke), ("dqm", ctrl.dqm)):
+            # Some boards tie `cs` low, `clk_en` high, or `dqm` low.
+            if not hasattr(pads, name) or len(getattr(pads, name)) == 0:
+                continue
+            m.submodules[name] = buf = io.FFBuffer("o", getattr(pads, name))
+            m.d.comb += buf.o.eq(value[:len(buf.o)])
+
+        m.submodules.dq = dq = io.FFBuffer("io", pads.dq)
+        m.d.comb += [
+            dq.o.eq(ctrl.dq_o),
+            dq.oe.eq(ctrl.dq_oe),
+            ctrl.dq_i.eq(dq.i),
+        ]
+
+        return m
+
+
+class TestCase(unittest.TestCase):
+    def test_chip(self):
+        from .ulx3s import ULX3S_85F_Platform
+        from .colorlight_5a75b_r7_0 import Colorlight_5A75B_R70Platform
+
+        chip = sdram_chip(ULX3S_85F_Platform())
+        self.assertEqual((chip.name, chip.size), ("MT48LC16M16A2", 32 * 2 ** 20))
+        chip = sdram_chip(Colorlight_5A75B_R70Platform())
+        self.assertEqual((chip.banks, chip.width, chip.size), (2, 32, 4 * 2 ** 20))
+        self.assertEqual((chip.cas_latency(50e6), chip.cas_latency(125e6)), (2, 3))
+        with self.assertRaisesRegex(ValueError,
+                r"^W9816G6JH SDRAM cannot run at 200 MHz$"):
+            chip.cas_latency(200e6)
+
+    def simulate(self, chip, *, clk_frequency, burst_length, length, read_delay=0):
+        from amaranth.sim import Simulator
+        from .memory import MemoryBenchmark
+
+        m = Module()
+        m.submodules.controller = controller = SDRAMController(chip,
+            clk_frequency=clk_frequency, burst_length=burst_length, read_delay=read_delay,
+            fast_init=True)
+        m.submodules.model = model = SDRAMModel(controller, read_delay=read_delay)
+        m.submodules.bench = bench = MemoryBenchmark(controller.port)
+
+        results = {}
+        async def testbench(ctx):
+            await ctx.tick().until(controller.init_done)
+            for name, write, random in (("write", 1, 0), ("read", 0, 0), ("random", 0, 1)):
+                ctx.set(bench.write, write)
+                ctx.set(bench.random, random)
+                ctx.set(bench.length, length)
+                ctx.set(bench.start, 1)
+                await ctx.tick()
+                ctx.set(bench.start, 0)
+                await ctx.tick().until(~bench.busy)
+                results[name] = (ctx.get(bench.cycles), ctx.get(bench.transfers),
+                                 ctx.get(bench.errors))
+            results["error"] = ctx.get(model.error)
+            results["refreshes"] = ctx.get(controller.refreshes)
+
+        sim = Simulator(m)
+        sim.add_clock(1 / clk_frequency)
+        sim.add_testbench(testbench)
+        sim.run()
+        return results
+
+    def test_controller(self):
+        chip = SDRAMChip("test", rows=16, cols=64, tREFI=3000)
+        for burst_length, read_delay, efficiency in ((1, 0, 0.5), (4, 1, 0.75), (8, 0, 0.8)):
+            with self.subTest(burst_length=burst_length):
+                results = self.simulate(chip, clk_frequency=100e6, burst_length=burst_length,
+                                        length=4096 // burst_length, read_delay=read_delay)
+                self.assertFalse(results["error"])
+                self.assertGreater(results["refreshes"], 1)
+                for name in ("write", "read", "random"):
+                    cycles, transfers, errors = results[name]
+                    self.assertEqual((transfers, errors), (4096 // burst_length, 0), name)
+                # Sequential transfers keep the data bus busy most of the time.
+                for name in ("write", "read"):
+                    cycles, transfers, errors = results[name]
+                    self.assertGreater(transfers * burst_length / cycles, efficiency, name)
+
+    def test_elaborate(self):
+        from .ulx3s import ULX3S_85F_Platform
+        from .de10_lite import DE10LitePlatform
+        from .mister import MisterPlatform
+        from .memory import MemoryBenchmark
+
+        class Top(Elaboratable):
+            def elaborate(self, platform):
+                m = Module()
+                m.submodules.sdram = sdram = SDRAM(platform.request("sdram", 0, dir="-"),
+                                                   clk_frequency=50e6, platform=platform)
+                m.submodules.bench = MemoryBenchmark(sdram.port)
+                return m
+
+        for platform in (ULX3S_85F_Platform(), DE10LitePlatform(), MisterPlatform()):
+            with self.subTest(platform=type(platform).__name__):
+                plan = platform.prepare(Top())
+                netlist = plan.files.get("top.il", plan.files.get("top.v"))
+                self.assertTrue(re.search(r"\bsdram_0__dq__io\b", netlist))
@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import shutil
+import threading
+import subprocess
+import unittest
+
+from amaranth.build.run import BuildPlan
+
+from .batch import run_plan
+
+
+__all__ = ["SeedResult", "parse_nextpnr_timing", "seed_sweep"]
+
+
+_SEED_PLACEHOLDER = "__amaranth_boards_seed__"
+
+_fmax_re = re.compile(
+    r"Max frequency for clock +'(?P<clock>[^']+)': (?P<achieved>[\d.]+) MHz"
+    r"(?: \((?:PASS|FAIL) at (?P<constraint>[\d.]+) MHz\))?")
+
+
+def parse_nextpnr_timing(log):
+    """Parse the timing summary from the text of a nextpnr log.
+
+    Returns a dictionary mapping clock names to ``(achieved, constraint)`` frequencies in MHz;
+    ``constraint`` is ``None`` if nextpnr does not report one. nextpnr reports timing after
+    placement and again after routing; the last report is used.
+    """
+    clocks = {}
+    for match in _fmax_re.finditer(log):
+        constraint = match.group("constraint")
+        clocks[match.group("clock")] = (float(match.group("achieved")),
+                                        None if constraint is None else float(constraint))
+    return clocks
+
+
+class SeedResult:
+    """Result of placing and routing a design with one nextpnr seed.
+
+    ``clocks`` maps clock names to ``(achieved, constraint)`` frequencies in MHz.
+    ``worst_slack`` is the smallest slack across all constrained clocks, in nanoseconds, and
+    ``fmax`` is the lowest achieved frequency across all clocks, in MHz. ``error`` is ``None``
+    if the build succeeded, and a description of the failure otherwise.
+    """
+    def __init__(self, seed, *, build_dir, clocks=None, error=None):
+        self.seed      = seed
+        self.build_dir = build_dir
+        self.clocks    = clocks or {}
+        self.error     = error
+
+    @property
+    def worst_slack(self):
+        if self.error is not None:
+            return None
+        slacks = [1e3 / constraint - 1e3 / achieved
+                  for achieved, constraint in self.clocks.values() if constraint]
+        return min(slacks, default=None)
+
+    @property
+    def fmax(self):
+        if self.error is not None or not self.clocks:
+            return None
+        return min(achieved for achieved, constraint in self.clocks.values())
+
+    def as_dict(self):
+        return {
+            "seed":        self.seed,
+            "build_dir":   self.build_dir,
+            "clocks":      {clock: {"achieved": achieved, "constraint": constraint}
+                            for clock, (achieved, constraint) in self.clocks.items()},
+            "worst_slack": self.worst_slack,
+            "fmax":        self.fmax,
+            "error":       self.error,
+        }
+
+    def __repr__(self):
+        return "<SeedResult {} slack={}>".format(self.seed, self.worst_slack)
+
+
+def _best_result(results):
+    # Rank by worst slack if any build reports it, and by the lowest Fmax otherwise (e.g. if no
+    # clock is constrained).
+    for key in (lambda result: result.worst_slack, lambda result: result.fmax):
+        candidates = [result for result in results if key(result) is not None]
+        if candidates:
+            return max(candidates, key=key)
+    return None
+
+
+def seed_sweep(platform, elaboratable, seeds, *, jobs=None, build_dir="build", name="top",
+               keep_all=False, **kwargs):
+    """Build ``elaboratable`` for ``platform`` with each of the nextpnr ``seeds`` in parallel.
+
+    ``platform`` must use a nextpnr-based toolchain. Each seed is built in
+    ``build_dir/seed-<seed>``, with at most ``jobs`` builds (all of them by default) running
+    at once. Additional keyword arguments are passed to ``toolchain_prepare``; any
+    ``nextpnr_opts`` are used for every seed.
+
+    The build whose worst slack across all clocks is the largest (or, if no build reports slack,
+    whose lowest Fmax is the highest) is kept, and the others are removed unless ``keep_all`` is
+    true. If no build can be ranked, all of them are kept. The results of all seeds are written
+    to ``build_dir/seeds.json``. Returns a tuple of the best :class:`SeedResult` (or ``None`` if
+    no build could be ranked) and the list of :class:`SeedResult` for all seeds.
+    """
+    if not any(tool.startswith("nextpnr-") for tool in platform.required_tools):
+        raise ValueError("Platform {!r} does not use nextpnr"
+                         .format(type(platform).__name__))
+
+    seeds = list(seeds)
+    if jobs is None:
+        jobs = len(seeds)
+
+    # Elaborate only once, with a placeholder for the seed in the nextpnr command line, and derive
+    # the build plan for each seed by substituting it. Elaborating the design repeatedly would be
+    # slow, and would require a fresh platform (and possibly design) each time.
+    nextpnr_opts = kwargs.pop("nextpnr_opts", "")
+    if not isinstance(nextpnr_opts, str):
+        nextpnr_opts = " ".join(nextpnr_opts)
+    nextpnr_opts = "{} --seed {}".format(nextpnr_opts, _SEED_PLACEHOLDER)
+    plan = platform.prepare(elaboratable, name, nextpnr_opts=nextpnr_opts.strip(), **kwargs)
+    plans = {}
+    for seed in seeds:
+        plans[seed] = BuildPlan(plan.script)
+        for filename, content in plan.files.items():
+            if isinstance(content, str):
+                content = content.replace(_SEED_PLACEHOLDER, str(int(seed)))
+            plans[seed].add_file(filename, content)
+
+    semaphore = threading.Semaphore(jobs)
+    results = {}
+
+    def build_one(seed):
+        seed_dir = os.path.join(build_dir, "seed-{}".format(seed))
+        with semaphore:
+            try:
+                os.makedirs(seed_dir, exist_ok=True)
+                with open(os.path.join(seed_dir, "{}.log".format(name)), "w") as log_file:
+                    products = run_plan(plans[seed], seed_dir, log_file)
+                clocks = parse_nextpnr_timing(products.get("{}.tim".format(name), mode="t"))
+                results[seed] = SeedResult(seed, build_dir=seed_dir, clocks=clocks)
+            except subprocess.CalledProcessError as e:
+                results[seed] = SeedResult(seed, build_dir=seed_dir,
+                    error="toolchain exited with status {}".format(e.returncode))
+            except Exception as e:
+                results[seed] = SeedResult(seed, build_dir=seed_dir,
+                    error="{}: {}".format(type(e).__name__, e))
+
+    threads = [threading.Thread(target=build_one, args=(seed,), daemon=True) for seed in seeds]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = [results[seed] for seed in seeds]
+    os.makedirs(build_dir, exist_ok=True)
+    best = _best_result(results)
+    if not keep_all and best is not None:
+        for result in results:
+            if result is not best:
+                shutil.rmtree(result.build_dir, ignore_errors=True)
+    with open(os.path.join(build_dir, "seeds.json"), "w") as f:
+        json.dump({
+            "best":    None if best is None else best.seed,
+            "results": [result.as_dict() for result in results],
+        }, f, indent=1)
+    return best, results
+
+
+class TestCase(unittest.TestCase):
+    log = """
+Info: Max frequency for clock '$glbnet$clk': 80.01 MHz (PASS at 12.00 MHz)
+Info: Max frequency for clock '$glbnet$clk': 75.13 MHz (PASS at 12.00 MHz)
+Info: Max frequency for clock 'pix_clk': 24.50 MHz (FAIL at 25.00 MHz)
+Info: Max frequency for clock 'sys_clk': 150.20 MHz
+"""
+
+    def test_parse(self):
+        self.assertEqual(parse_nextpnr_timing(self.log), {
+            "$glbnet$clk": (75.13, 12.0),
+            "pix_clk":     (24.5, 25.0),
+            "sys_clk":     (150.2, None),
+        })
+
+    def test_best(self):
+        results = [
+            SeedResult(1, build_dir="a", clocks={"clk": (90.0, 100.0)}),
+            SeedResult(2, build_dir="b", clocks={"clk": (110.0, 100.0)}),
+            SeedResult(3, build_dir="c", error="failed"),
+        ]
+        self.assertAlmostEqual(results[1].worst_slack, 10 - 1000 / 110)
+        self.assertIs(_best_result(results), results[1])
+        self.assertIsNone(_best_result(results[2:]))
+
+    def test_best_fmax(self):
+        results = [
+            SeedResult(1, build_dir="a", clocks={"clk": (90.0, None), "pix": (30.0, None)}),
+            SeedResult(2, build_dir="b", clocks={"clk": (80.0, None), "pix": (40.0, None)}),
+        ]
+        self.assertIsNone(results[0].worst_slack)
+        self.assertEqual(results[1].fmax, 40.0)
+        self.assertIs(_best_result(results), results[1])
+
+    def test_not_nextpnr(self):
+        from .arty_a7 import ArtyA7_35Platform
+        with self.assertRaisesRegex(ValueError,
+                r"^Platform 'ArtyA7_35Platform' does not use nextpnr$"):
+            seed_sweep(ArtyA7_35Platform(), None, [1, 2])
@@ -0,0 +1,271 @@
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import tempfile
+import argparse
+import subprocess
+import unittest
+import unittest.mock
+
+try:
+    import resource
+except ImportError: # :nocov:
+    resource = None # not available on Windows
+
+
+# This module is also run as the wrapper that measures each tool, and so it does not import
+# Amaranth, which would add to the time measured for every stage.
+
+
+__all__ = ["StageStats", "add_stage_hook", "remove_stage_hook", "execute_profiled",
+           "profiled_build"]
+
+
+# Name of the build stage performed by each tool. Tools that are not listed here are reported
+# under their own name.
+_TOOL_STAGES = {
+    "yosys":         "synth",
+    "nextpnr-ecp5":  "pnr",
+    "nextpnr-ice40": "pnr",
+    "nextpnr-gowin": "pnr",
+    "nextpnr-nexus": "pnr",
+    "ecppack":       "pack",
+    "icepack":       "pack",
+    "gowin_pack":    "pack",
+    "prjoxide":      "pack",
+    "quartus_map":   "map",
+    "quartus_syn":   "map",
+    "quartus_fit":   "fit",
+    "quartus_asm":   "asm",
+    "quartus_sta":   "sta",
+    "xst":           "synth",
+    "ngdbuild":      "translate",
+    "map":           "map",
+    "par":           "par",
+    "bitgen":        "bitstream",
+}
+
+# Vivado runs every stage in one process, and reports the resources used by each command in
+# its log instead.
+_VIVADO_STAGES = {
+    "synth_design":    "synth",
+    "opt_design":      "place",
+    "place_design":    "place",
+    "phys_opt_design": "place",
+    "route_design":    "route",
+    "write_bitstream": "bitstream",
+}
+
+_vivado_time_re = re.compile(
+    r"^(?P<command>\w+): Time \(s\): cpu = (?P<cpu>[\d:]+) ; elapsed = (?P<elapsed>[\d:]+) \. "
+    r"Memory \(MB\): peak = (?P<peak>[\d.]+)", re.MULTILINE)
+
+
+class StageStats:
+    """Resources used by one stage of a build.
+
+    ``wall_time`` and ``cpu_time`` are in seconds; ``cpu_time`` includes all processes started
+    by the tool. ``peak_rss`` is in bytes, and may be ``None`` if it cannot be measured.
+    ``platform`` is the name of the platform class, if known.
+    """
+    def __init__(self, stage, tool, *, wall_time, cpu_time, peak_rss, platform=None):
+        self.stage     = stage
+        self.tool      = tool
+        self.wall_time = wall_time
+        self.cpu_time  = cpu_time
+        self.peak_rss  = peak_rss
+        self.platform  = platform
+
+    def as_dict(self):
+        return {
+            "stage":     self.stage,
+            "tool":      self.tool,
+            "wall_time": self.wall_time,
+            "cpu_time":  self.cpu_time,
+            "peak_rss":  self.peak_rss,
+            "platform":  self.platform,
+        }
+
+    def __repr__(self):
+        return "<StageStats {} ({}) wall={:.3f}s cpu={:.3f}s>".format(
+            self.stage, self.tool, self.wall_time, self.cpu_time)
+
+
+_stage_hooks = []
+
+
+def add_stage_hook(hook):
+    """Call ``hook`` with :class:`StageStats` for every stage of every profiled build."""
+    _stage_hooks.append(hook)
+
+
+def remove_stage_hook(hook):
+    """Stop calling a hook added with :func:`add_stage_hook`."""
+    _stage_hooks.remove(hook)
+
+
+def _tool_env_var(tool):
+    return tool.upper().replace("-", "_").replace("+", "X")
+
+
+def _hms_seconds(text):
+    seconds = 0
+    for part in text.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def _split_vivado_stages(log, platform):
+    stages = {}
+    for match in _vivado_time_re.finditer(log):
+        stage = _VIVADO_STAGES.get(match.group("command"))
+        if stage is None:
+            continue
+        wall_time, cpu_time, peak_rss = stages.get(stage, (0, 0, 0))
+        stages[stage] = (wall_time + _hms_seconds(match.group("elapsed")),
+                         cpu_time  + _hms_seconds(match.group("cpu")),
+                         max(peak_rss, int(float(match.group("peak")) * 2 ** 20)))
+    return [StageStats(stage, "vivado", wall_time=wall_time, cpu_time=cpu_time,
+                       peak_rss=peak_rss, platform=platform)
+            for stage, (wall_time, cpu_time, peak_rss) in stages.items()]
+
+
+def execute_profiled(plan, root="build", *, tools, name="top", platform=None, on_stage=None):
+    """Execute ``plan`` in ``root``, measuring the resources used by each of ``tools``.
+
+    Each tool is replaced with a wrapper that measures it, using the same environment variables
+    that the build script uses to locate tools. The runs of Vivado are further split into
+    the synth, place, route and bitstream stages using the log ``{name}.log``.
+
+    ``on_stage``, if provided, and the hooks added with :func:`add_stage_hook` are called with
+    :class:`StageStats` for each stage once the build finishes (or fails). ``platform`` is
+    the platform name recorded in the statistics.
+
+    Returns a tuple of :class:`LocalBuildProducts` and a list of :class:`StageStats`.
+    """
+    if sys.platform.startswith("win32"):
+        raise NotImplementedError("Profiling builds is not supported on Windows")
+
+    with tempfile.TemporaryDirectory(prefix="amaranth-boards-stages-") as wrapper_dir:
+        stats_filename = os.path.join(wrapper_dir, "stats.jsonl")
+        env = dict(os.environ)
+        for tool in tools:
+            env_var = _tool_env_var(tool)
+            wrapper_filename = os.path.join(wrapper_dir, tool)
+            with open(wrapper_filename, "w") as f:
+                f.write("#!/bin/sh\nexec {} -m amaranth_boards.stages --stats {} --stage {} "
+                        "--tool {} -- {} \"$@\"\n".format(
+                            shlex.quote(sys.executable), shlex.quote(stats_filename),
+                            shlex.quote(_TOOL_STAGES.get(tool, tool)), shlex.quote(tool),
+                            shlex.quote(os.environ.get(env_var, tool))))
+            os.chmod(wrapper_filename, 0o755)
+            env[env_var] = wrapper_filename
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+
+        error = None
+        try:
+            products = plan.execute_local(root, env=env)
+        except subprocess.CalledProcessError as e:
+            error = e
+
+        stages = []
+        if os.path.exists(stats_filename):
+            with open(stats_filename) as f:
+                for line in f:
+                    stats = json.loads(line)
+                    stages.append(StageStats(**stats, platform=platform))
+
+    for index, stats in enumerate(stages):
+        log_filename = os.path.join(root, "{}.log".format(name))
+        if stats.tool == "vivado" and os.path.exists(log_filename):
+            with open(log_filename) as f:
+                vivado_stages = _split_vivado_stages(f.read(), platform)
+            if vivado_stages:
+                stages[index:index + 1] = vivado_stages
+            break
+
+    for stats in stages:
+        if on_stage is not None:
+            on_stage(stats)
+        for hook in _stage_hooks:
+            hook(stats)
+    if error is not None:
+        raise error
+    return products, stages
+
+
+def profiled_build(platform, elaboratable, name="top", build_dir="build", *,
+                   on_stage=None, **kwargs):
+    """Build ``elaboratable`` for ``platform`` like ``platform.build()``, measuring each stage.
+
+    See :func:`execute_profiled`. Returns a tuple of :class:`LocalBuildProducts` and a list of
+    :class:`StageStats`.
+    """
+    plan = platform.prepare(elaboratable, name, **kwargs)
+    return execute_profiled(plan, build_dir, tools=platform.required_tools, name=name,
+                            platform=type(platform).__name__, on_stage=on_stage)
+
+
+def _measure_tool(stats_filename, stage, tool, args):
+    start = time.perf_counter()
+    returncode = subprocess.call(args)
+    wall_time = time.perf_counter() - start
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time = usage.ru_utime + usage.ru_stime
+        peak_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    else: # :nocov:
+        cpu_time = peak_rss = None
+    with open(stats_filename, "a") as f:
+        f.write(json.dumps({"stage": stage, "tool": tool, "wall_time": wall_time,
+                            "cpu_time": cpu_time, "peak_rss": peak_rss}) + "\n")
+    return returncode
+
+
+@unittest.skipIf(sys.platform.startswith("win32"), "build script is a shell script")
+class TestCase(unittest.TestCase):
+    def test_execute_profiled(self):
+        from amaranth.build.run import BuildPlan
+
+        plan = BuildPlan("build_top")
+        plan.add_file("build_top.sh",
+            ": ${YOSYS:=true}\n: ${ECPPACK:=true}\n\"$YOSYS\" a\n\"$ECPPACK\" b\n")
+        seen = []
+        with tempfile.TemporaryDirectory() as root, \
+                unittest.mock.patch.dict(os.environ, {"YOSYS": "true", "ECPPACK": "true"}):
+            products, stages = execute_profiled(plan, root, tools=["yosys", "ecppack"],
+                                                on_stage=seen.append)
+        self.assertEqual([(stats.stage, stats.tool) for stats in stages],
+                         [("synth", "yosys"), ("pack", "ecppack")])
+        self.assertEqual(seen, stages)
+
+    def test_vivado(self):
+        stages = _split_vivado_stages(
+            "synth_design: Time (s): cpu = 00:01:05 ; elapsed = 00:00:48 . "
+            "Memory (MB): peak = 1650.262 ; gain = 389.594\n"
+            "opt_design: Time (s): cpu = 00:00:02 ; elapsed = 00:00:03 . "
+            "Memory (MB): peak = 1700.000 ; gain = 10.000\n"
+            "place_design: Time (s): cpu = 00:00:20 ; elapsed = 00:00:10 . "
+            "Memory (MB): peak = 1800.000 ; gain = 10.000\n", "Genesys2Platform")
+        self.assertEqual([stats.as_dict() for stats in stages], [
+            {"stage": "synth", "tool": "vivado", "wall_time": 48, "cpu_time": 65,
+             "peak_rss": int(1650.262 * 2 ** 20), "platform": "Genesys2Platform"},
+            {"stage": "place", "tool": "vivado", "wall_time": 13, "cpu_time": 22,
+             "peak_rss": 1800 * 2 ** 20, "platform": "Genesys2Platform"},
+        ])
+
+
+if __name__ == "__main__":
+    # Used by the wrappers created by `execute_profiled`.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stats", required=True)
+    parser.add_argument("--stage", required=True)
+    parser.add_argument("--tool", required=True)
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if args.args[:1] == ["--"]:
+        args.args = args.args[1:]
+    sys.exit(_measure_tool(args.stats, args.stage, args.tool, args.args))
@@ -1,9 +1,8 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeECP5Platform
 from .resources import *
+from .programmer import DFUUtilProgrammer
+from .compression import merge_overrides
 
 
 __all__ = ["Supercon19BadgePlatform"]
@@ -153,13 +152,13 @@ class Supercon19BadgePlatform(LatticeECP5Platform):
 
     def toolchain_prepare(self, fragment, name, **kwargs):
         overrides = dict(ecppack_opts="--compress --freq 38.8")
-        overrides.update(kwargs)
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
+
+    programmer = DFUUtilProgrammer(device="1d50:614b", alt=0, bitstream="{name}.bit")
 
-    def toolchain_program(self, products, name):
-        dfu_util = os.environ.get("DFU_UTIL", "dfu-util")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([dfu_util, "-d", "1d50:614b", "-a", "0", "-D", bitstream_filename])
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
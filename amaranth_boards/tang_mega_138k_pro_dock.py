@@ -1,10 +1,8 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import GowinPlatform
 
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 
 __all__ = ["TangMega138kProDockPlatform"]
@@ -43,10 +41,10 @@ class TangMega138kProDockPlatform(GowinPlatform):
                   "A18 A17 A19 B19 - - A20 B20 B21 C21 - -"),
     ]
 
-    def toolchain_program(self, products, name):
-        with products.extract("{}.fs".format(name)) as bitstream_filename:
-            subprocess.check_call(["openFPGALoader", "-b", "tangmega138k",
-                                   bitstream_filename])
+    programmer = OpenFPGALoaderProgrammer(board="tangmega138k", bitstream="{name}.fs")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,8 @@
-import subprocess
 from amaranth.vendor import GowinPlatform
 from amaranth.build import *
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
+from .compression import merge_overrides
 
 
 class TangNanoPlatform(GowinPlatform):
@@ -50,12 +51,13 @@ class TangNanoPlatform(GowinPlatform):
             "gowin_pack_opts":
                 "--sspi_as_gpio --mspi_as_gpio"
         }
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
 
-    def toolchain_program(self, products, name):
-        with products.extract("{}.fs".format(name)) as bitstream_filename:
-            subprocess.check_call(["openFPGALoader", "-b", "tangnano",
-                                   bitstream_filename])
+    programmer = OpenFPGALoaderProgrammer(board="tangnano", bitstream="{name}.fs")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,9 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import GowinPlatform
 
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
+from .compression import merge_overrides
 
 
 __all__ = ["TangNano9kPlatform"]
@@ -62,11 +61,13 @@ class TangNano9kPlatform(GowinPlatform):
             "gowin_pack_opts":
                 "--sspi_as_gpio --mspi_as_gpio"
         }
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
+
+    programmer = OpenFPGALoaderProgrammer(board="tangnano9k", bitstream="{name}.fs")
 
-    def toolchain_program(self, products, name):
-        with products.extract("{}.fs".format(name)) as bitstream_filename:
-            subprocess.check_call(["openFPGALoader", "-b", "tangnano9k", bitstream_filename])
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,9 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import GowinPlatform
 
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
+from .compression import merge_overrides
 
 
 __all__ = [
@@ -109,12 +108,13 @@ class TangPrimer20kPlatform(GowinPlatform):
             "gowin_pack_opts":
                 "--mspi_as_gpio --sspi_as_gpio --ready_as_gpio --done_as_gpio",
         }
-        return super().toolchain_prepare(fragment, name, **overrides, **kwargs)
+        return super().toolchain_prepare(fragment, name,
+                                         **merge_overrides(overrides, kwargs))
+
+    programmer = OpenFPGALoaderProgrammer(board="tangprimer20k", bitstream="{name}.fs")
 
-    def toolchain_program(self, products, name):
-        with products.extract("{}.fs".format(name)) as bitstream_filename:
-            subprocess.check_call(
-                ["openFPGALoader", "-b", "tangprimer20k", bitstream_filename])
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 class TangPrimer20kLitePlatform(TangPrimer20kPlatform):
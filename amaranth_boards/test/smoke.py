@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import argparse
+import traceback
+import unittest
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ..registry import list_boards, get_platform
+
+
+__all__ = ["smoke_test_board", "smoke_test_boards"]
+
+
+def smoke_test_board(name):
+    """Elaborate a blinky design for the board called ``name`` with ``do_build=False``.
+
+    Returns a tuple of ``(name, elapsed, error)``, where ``elapsed`` is the wall time in seconds
+    and ``error`` is the formatted traceback if the build failed, or ``None``.
+    """
+    from .blinky import Blinky
+
+    start = time.perf_counter()
+    try:
+        get_platform(name)().build(Blinky(), do_build=False)
+    except Exception:
+        error = traceback.format_exc()
+    else:
+        error = None
+    return name, time.perf_counter() - start, error
+
+
+def smoke_test_boards(boards=None, *, jobs=None, progress=None):
+    """Smoke test every board in ``boards`` (all known boards by default) in parallel.
+
+    Up to ``jobs`` boards (the number of CPUs by default) are tested at once, each in a worker
+    process. If ``progress`` is provided, it is called with the result of each board as it
+    completes. Returns a list of the results of :func:`smoke_test_board`, sorted by board name.
+    """
+    if boards is None:
+        boards = list_boards()
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(smoke_test_board, name) for name in boards]
+        for future in as_completed(futures):
+            result = future.result()
+            if progress is not None:
+                progress(*result)
+            results.append(result)
+    return sorted(results)
+
+
+class TestCase(unittest.TestCase):
+    def test_smoke_test_boards(self):
+        results = smoke_test_boards(["icebreaker", "ulx3s-12f"], jobs=2)
+        self.assertEqual([(name, error) for name, elapsed, error in results],
+                         [("icebreaker", None), ("ulx3s-12f", None)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m amaranth_boards.test.smoke")
+    parser.add_argument("boards", metavar="BOARD", nargs="*",
+        help="boards to test (default: all)")
+    parser.add_argument("-j", "--jobs", metavar="N", type=int, default=os.cpu_count(),
+        help="number of boards to test in parallel (default: %(default)s)")
+    parser.add_argument("-v", "--verbose", action="store_true",
+        help="print the full traceback of every failure")
+    args = parser.parse_args()
+
+    def progress(name, elapsed, error):
+        print("{} {} ({:.2f}s)".format("FAIL" if error else "ok  ", name, elapsed),
+              file=sys.stderr)
+
+    start = time.perf_counter()
+    results = smoke_test_boards(args.boards or None, jobs=args.jobs, progress=progress)
+    elapsed = time.perf_counter() - start
+
+    failures = [(name, error) for name, _, error in results if error is not None]
+    for name, error in failures:
+        if args.verbose:
+            print("\n{}:\n{}".format(name, error), file=sys.stderr)
+        else:
+            print("\n{}: {}".format(name, error.strip().splitlines()[-1]), file=sys.stderr)
+    print("\n{} boards tested in {:.2f}s, {} failed".format(len(results), elapsed, len(failures)),
+          file=sys.stderr)
+    if failures:
+        sys.exit(1)
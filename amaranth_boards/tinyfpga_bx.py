@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeICE40Platform
 from .resources import *
+from .programmer import TinyprogProgrammer
 
 
 __all__ = ["TinyFPGABXPlatform"]
@@ -42,10 +40,10 @@ class TinyFPGABXPlatform(LatticeICE40Platform):
         ),
     ]
 
-    def toolchain_program(self, products, name):
-        tinyprog = os.environ.get("TINYPROG", "tinyprog")
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            subprocess.check_call([tinyprog, "-p", bitstream_filename])
+    programmer = TinyprogProgrammer()
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,389 @@
+import time
+import random
+import threading
+import unittest
+
+from amaranth import *
+from amaranth.lib import io
+from amaranth.lib.cdc import FFSynchronizer
+from amaranth.lib.fifo import SyncFIFOBuffered
+
+
+__all__ = ["UARTCore", "UART", "UARTLoopback", "loopback_benchmark"]
+
+
+# Width of the phase accumulators of the baud rate generators.
+_PHASE_WIDTH = 24
+
+# Bytes that FTDI chips may still send after RTS# is deasserted.
+_RTS_HEADROOM = 16
+
+
+class UARTCore(Elaboratable):
+    """UART with FIFOs and RTS/CTS flow control, running at ``clk_frequency`` Hz.
+
+    Bytes written to ``tx_data`` while ``tx_valid`` and ``tx_ready`` are asserted are queued in
+    a FIFO of ``fifo_depth`` bytes and sent with 8 data bits, no parity and 1 stop bit. Bytes
+    received are queued in another FIFO, and read from ``rx_data`` while ``rx_valid`` and
+    ``rx_ready`` are asserted. ``rx_overflows`` counts the bytes dropped because the receive FIFO
+    was full, and ``rx_errors`` the bytes without a stop bit.
+
+    The bit period is generated by a fractional divider, so ``baudrate`` need not divide
+    ``clk_frequency``; bit edges jitter by one clock cycle, and there must be at least 4 cycles
+    per bit (e.g. 12 Mbaud, the fastest rate of FTDI high-speed chips, requires a 48 MHz clock).
+
+    ``tx_o`` and ``rx_i`` are the serial lines. If ``flow_control`` is true, bytes are only
+    sent while ``cts_i`` is asserted, and ``rts_o`` is deasserted when the receive FIFO is
+    nearly full, early enough for a peer that sends a few more bytes afterwards. Both are
+    active high; the lines are active low on the wire.
+    """
+    def __init__(self, *, clk_frequency, baudrate=115200, fifo_depth=512, flow_control=False):
+        if clk_frequency / baudrate < 4:
+            raise ValueError("UART baud rate of {} is too high for a {:.3f} MHz clock; at least "
+                             "4 clock cycles per bit are required"
+                             .format(baudrate, clk_frequency / 1e6))
+
+        self.clk_frequency = clk_frequency
+        self.baudrate      = baudrate
+        self.fifo_depth    = fifo_depth
+        self.flow_control  = flow_control
+
+        self.tx_data  = Signal(8)
+        self.tx_valid = Signal()
+        self.tx_ready = Signal()
+        self.rx_data  = Signal(8)
+        self.rx_valid = Signal()
+        self.rx_ready = Signal()
+
+        self.rx_overflows = Signal(32)
+        self.rx_errors    = Signal(32)
+
+        self.tx_o  = Signal(init=1)
+        self.rx_i  = Signal(init=1)
+        self.rts_o = Signal()
+        self.cts_i = Signal(init=1)
+
+    @property
+    def phase_step(self):
+        """Increment of the phase accumulators of the baud rate generators, per clock cycle."""
+        return round(self.baudrate / self.clk_frequency * 2 ** _PHASE_WIDTH)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.tx_fifo = tx_fifo = SyncFIFOBuffered(width=8, depth=self.fifo_depth)
+        m.submodules.rx_fifo = rx_fifo = SyncFIFOBuffered(width=8, depth=self.fifo_depth)
+        m.d.comb += [
+            tx_fifo.w_data.eq(self.tx_data),
+            tx_fifo.w_en.eq(self.tx_valid),
+            self.tx_ready.eq(tx_fifo.w_rdy),
+            self.rx_data.eq(rx_fifo.r_data),
+            self.rx_valid.eq(rx_fifo.r_rdy),
+            rx_fifo.r_en.eq(self.rx_ready),
+        ]
+
+        # Transmitter. The phase accumulator runs freely while bytes are sent back to back, so
+        # that the fractional part of the bit period carries over from one byte to the next.
+        tx_phase = Signal(_PHASE_WIDTH)
+        tx_tick  = Signal()
+        tx_shift = Signal(9)
+        tx_bits  = Signal(range(11))
+        cts      = self.cts_i if self.flow_control else C(1)
+
+        with m.If(tx_bits != 0):
+            m.d.sync += Cat(tx_phase, tx_tick).eq(tx_phase + self.phase_step)
+        with m.Else():
+            m.d.sync += Cat(tx_phase, tx_tick).eq(0)
+        with m.If((tx_bits == 0) | ((tx_bits == 1) & tx_tick)):
+            with m.If(tx_fifo.r_rdy & cts):
+                m.d.comb += tx_fifo.r_en.eq(1)
+                m.d.sync += [
+                    self.tx_o.eq(0),
+                    tx_shift.eq(Cat(tx_fifo.r_data, 1)),
+                    tx_bits.eq(10),
+                ]
+            with m.Elif(tx_bits == 1):
+                m.d.sync += tx_bits.eq(0)
+        with m.Elif(tx_tick):
+            m.d.sync += [
+                self.tx_o.eq(tx_shift[0]),
+                tx_shift.eq(tx_shift >> 1),
+                tx_bits.eq(tx_bits - 1),
+            ]
+
+        # Receiver. The phase accumulator starts half a bit period into the start bit, so that
+        # each bit is sampled in its middle.
+        rx_phase = Signal(_PHASE_WIDTH)
+        rx_tick  = Signal()
+        rx_shift = Signal(8)
+        rx_bits  = Signal(range(11))
+
+        m.d.sync += Cat(rx_phase, rx_tick).eq(rx_phase + self.phase_step)
+        m.d.comb += rx_fifo.w_data.eq(rx_shift)
+        with m.If(rx_bits == 0):
+            with m.If(~self.rx_i):
+                m.d.sync += [
+                    Cat(rx_phase, rx_tick).eq(2 ** (_PHASE_WIDTH - 1) + self.phase_step),
+                    rx_bits.eq(10),
+                ]
+        with m.Elif(rx_tick):
+            m.d.sync += rx_bits.eq(rx_bits - 1)
+            with m.If(rx_bits == 10):
+                with m.If(self.rx_i):
+                    # A glitch, and not a start bit.
+                    m.d.sync += rx_bits.eq(0)
+            with m.Elif(rx_bits != 1):
+                m.d.sync += rx_shift.eq(Cat(rx_shift[1:], self.rx_i))
+            with m.Elif(~self.rx_i):
+                m.d.sync += self.rx_errors.eq(self.rx_errors + 1)
+            with m.Elif(~rx_fifo.w_rdy):
+                m.d.sync += self.rx_overflows.eq(self.rx_overflows + 1)
+            with m.Else():
+                m.d.comb += rx_fifo.w_en.eq(1)
+
+        if self.flow_control:
+            headroom = min(_RTS_HEADROOM, self.fifo_depth // 4)
+            m.d.sync += self.rts_o.eq(rx_fifo.level < self.fifo_depth - headroom)
+        else:
+            m.d.comb += self.rts_o.eq(1)
+
+        return m
+
+
+class UART(Elaboratable):
+    """UART on the ``uart`` resource of a board.
+
+    ``pads`` is the resource, requested with ``platform.request("uart", dir="-")``. The other
+    arguments, and the ``tx_*``, ``rx_*`` signals, are those of :class:`UARTCore`.
+
+    Flow control uses the ``rts`` and ``cts`` lines of the resource, whichever the FPGA drives
+    signalling that it can receive, and whichever the FPGA samples gating transmission; which
+    one is which depends on the ``role`` of the resource. At least one of them is required if
+    ``flow_control`` is true. Boards with only one of them (e.g. ULX3S) only get flow control in
+    one direction.
+    """
+    def __init__(self, pads, *, clk_frequency, baudrate=115200, fifo_depth=512,
+                 flow_control=False):
+        lines = [getattr(pads, name) for name in ("rts", "cts") if hasattr(pads, name)]
+        if flow_control and not lines:
+            raise ValueError("UART resource has neither an RTS nor a CTS line, and cannot use "
+                             "flow control")
+
+        self.pads = pads
+        self.core = UARTCore(clk_frequency=clk_frequency, baudrate=baudrate,
+                             fifo_depth=fifo_depth, flow_control=flow_control)
+
+        for name in ("tx_data", "tx_valid", "tx_ready", "rx_data", "rx_valid", "rx_ready",
+                     "rx_overflows", "rx_errors"):
+            setattr(self, name, getattr(self.core, name))
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads, core = self.pads, self.core
+        m.submodules.core = core
+
+        m.submodules.tx = tx = io.Buffer("o", pads.tx)
+        m.d.comb += tx.o.eq(core.tx_o)
+        m.submodules.rx = rx = io.Buffer("i", pads.rx)
+        m.submodules.rx_sync = FFSynchronizer(rx.i, core.rx_i, init=1)
+
+        if core.flow_control:
+            for name in ("rts", "cts"):
+                if not hasattr(pads, name):
+                    continue
+                port = getattr(pads, name)
+                if port.direction == io.Direction.Output:
+                    m.submodules[name] = buf = io.Buffer("o", port)
+                    m.d.comb += buf.o.eq(~core.rts_o)
+                else:
+                    m.submodules[name] = buf = io.Buffer("i", port)
+                    m.submodules[name + "_sync"] = FFSynchronizer(~buf.i, core.cts_i, init=1)
+
+        return m
+
+
+class UARTLoopback(Elaboratable):
+    """Send back every byte received by the ``uart`` resource of a board, for
+    :func:`loopback_benchmark`.
+
+    The ``sync`` domain is clocked by the default clock of the platform.
+    """
+    def __init__(self, *, baudrate=3_000_000, fifo_depth=2048, flow_control=False):
+        self.baudrate     = baudrate
+        self.fifo_depth   = fifo_depth
+        self.flow_control = flow_control
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.uart = uart = UART(platform.request("uart", 0, dir="-"),
+            clk_frequency=platform.default_clk_frequency, baudrate=self.baudrate,
+            fifo_depth=self.fifo_depth, flow_control=self.flow_control)
+        m.d.comb += [
+            uart.tx_data.eq(uart.rx_data),
+            uart.tx_valid.eq(uart.rx_valid),
+            uart.rx_ready.eq(uart.tx_ready),
+        ]
+
+        return m
+
+
+def loopback_benchmark(port, *, length=1 << 20, chunk_size=4096, seed=0, timeout=10.0):
+    """Measure the throughput of a serial port connected to a board running
+    :class:`UARTLoopback`.
+
+    ``port`` is an open serial port, such as a ``serial.Serial`` of pySerial, with a timeout
+    set; it must have ``write``, ``flush`` and ``read`` methods. ``length`` pseudorandom bytes
+    are written in chunks of ``chunk_size`` bytes, while the bytes sent back are read
+    concurrently; the benchmark gives up once nothing was received for ``timeout`` seconds.
+
+    Returns a dictionary with the number of bytes ``sent`` and ``received``, the number of
+    ``errors`` (bytes received that differ from the ones sent, and bytes not received), the
+    ``elapsed`` time in seconds, and the ``throughput`` in bytes per second.
+    """
+    data = random.Random(seed).randbytes(length)
+
+    failure = []
+    def writer():
+        try:
+            for offset in range(0, length, chunk_size):
+                port.write(data[offset:offset + chunk_size])
+            port.flush()
+        except Exception as e:
+            failure.append(e)
+
+    received  = bytearray()
+    start     = time.perf_counter()
+    thread    = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    last_data = start
+    while len(received) < length and time.perf_counter() - last_data < timeout:
+        chunk = port.read(min(chunk_size, length - len(received)))
+        if chunk:
+            received += chunk
+            last_data = time.perf_counter()
+    elapsed = time.perf_counter() - start
+    thread.join()
+    if failure:
+        raise failure[0]
+
+    errors = sum(1 for sent, echoed in zip(data, received) if sent != echoed)
+    errors += length - len(received)
+    return {
+        "sent":       length,
+        "received":   len(received),
+        "errors":     errors,
+        "elapsed":    elapsed,
+        "throughput": len(received) / elapsed if elapsed else 0.0,
+    }
+
+
+class TestCase(unittest.TestCase):
+    def simulate(self, core, *, send, receive_after=0, connect=lambda m, core: None):
+        from amaranth.sim import Simulator
+
+        m = Module()
+        m.submodules.core = core
+        m.d.comb += core.rx_i.eq(core.tx_o)
+        connect(m, core)
+
+        cycles   = []
+        received = []
+        overflows = []
+        async def producer(ctx):
+            for byte in send:
+                ctx.set(core.tx_data, byte)
+                ctx.set(core.tx_valid, 1)
+                await ctx.tick().until(core.tx_ready)
+            ctx.set(core.tx_valid, 0)
+
+        async def consumer(ctx):
+            await ctx.tick().repeat(receive_after + 1)
+            ctx.set(core.rx_ready, 1)
+            count = 0
+            while len(received) < len(send) and count < 100 * len(send) * core.clk_frequency / \
+                    core.baudrate:
+                if ctx.get(core.rx_valid):
+                    received.append(ctx.get(core.rx_data))
+                    cycles.append(count)
+                await ctx.tick()
+                count += 1
+            overflows.append(ctx.get(core.rx_overflows))
+
+        sim = Simulator(m)
+        sim.add_clock(1 / core.clk_frequency)
+        sim.add_testbench(producer, background=True)
+        sim.add_testbench(consumer)
+        sim.run()
+        return received, cycles, overflows[0]
+
+    def test_baud_rate(self):
+        # 12 Mbaud from 50 MHz is 4.1667 cycles per bit.
+        core = UARTCore(clk_frequency=50e6, baudrate=12_000_000, fifo_depth=16)
+        send = list(range(0, 256, 3))
+        received, cycles, _ = self.simulate(core, send=send)
+        self.assertEqual(received, send)
+        # Bytes are sent back to back, at 10 bits each.
+        per_byte = (cycles[-1] - cycles[0]) / (len(cycles) - 1)
+        self.assertAlmostEqual(per_byte, 10 * 50e6 / 12e6, delta=0.05)
+
+    def test_flow_control(self):
+        core = UARTCore(clk_frequency=10e6, baudrate=1_000_000, fifo_depth=32,
+                        flow_control=True)
+        send = [(n * 37) & 0xff for n in range(100)]
+        def connect(m, core):
+            m.d.comb += core.cts_i.eq(core.rts_o)
+        # The receiver is not read until the transmitter had time to send everything, and
+        # stops the transmitter instead of dropping bytes.
+        received, _, overflows = self.simulate(core, send=send, receive_after=8000,
+                                               connect=connect)
+        self.assertEqual((received, overflows), (send, 0))
+
+        # Without flow control, the receive FIFO overflows.
+        core = UARTCore(clk_frequency=10e6, baudrate=1_000_000, fifo_depth=32)
+        received, _, overflows = self.simulate(core, send=send, receive_after=8000)
+        self.assertLess(len(received), len(send))
+        self.assertGreater(overflows, 0)
+
+    def test_loopback_benchmark(self):
+        import os
+
+        class Loopback:
+            # A serial port whose output is connected to its input.
+            def __init__(self):
+                self.r, self.w = os.pipe()
+            def write(self, data):
+                os.write(self.w, data)
+            def flush(self):
+                pass
+            def read(self, size):
+                return os.read(self.r, size)
+            def close(self):
+                os.close(self.r)
+                os.close(self.w)
+
+        port = Loopback()
+        try:
+            result = loopback_benchmark(port, length=100000, chunk_size=1000)
+        finally:
+            port.close()
+        self.assertEqual((result["received"], result["errors"]), (100000, 0))
+        self.assertGreater(result["throughput"], 0)
+
+    def test_elaborate(self):
+        from .ulx3s import ULX3S_85F_Platform
+        from .machxo2_breakout import MachXO2_7000HE_BreakoutPlatform
+        from .icebreaker import ICEBreakerPlatform
+
+        machxo2 = MachXO2_7000HE_BreakoutPlatform()
+        machxo2.add_resources([machxo2.serial])
+        for platform, baudrate, flow_control in ((ULX3S_85F_Platform(), 3_000_000, True),
+                                                 (machxo2, 115200, True),
+                                                 (ICEBreakerPlatform(), 3_000_000, False)):
+            with self.subTest(platform=type(platform).__name__):
+                plan = platform.prepare(UARTLoopback(baudrate=baudrate,
+                                                     flow_control=flow_control))
+                netlist = plan.files.get("top.il", plan.files.get("top.v"))
+                self.assertEqual("uart_0__rts__io" in netlist, flow_control)
+
@@ -1,12 +1,11 @@
-import os
 import argparse
-import subprocess
 import shutil
 import unittest
 
 from amaranth.build import *
 from amaranth.vendor import LatticeECP5Platform
 from .resources import *
+from .programmer import OpenFPGALoaderProgrammer
 
 
 __all__ = [
@@ -156,10 +155,10 @@ class _ULX3SPlatform(LatticeECP5Platform):
         overrides.update(kwargs)
         return super().toolchain_prepare(fragment, name, **overrides)
 
-    def toolchain_program(self, products, name):
-        tool = os.environ.get("OPENFPGALOADER", "openFPGALoader")
-        with products.extract("{}.bit".format(name)) as bitstream_filename:
-            subprocess.check_call([tool, "-b", "ulx3s", '-m', bitstream_filename])
+    programmer = OpenFPGALoaderProgrammer(board="ulx3s", sram=True, usb_ids=["0403:6015"])
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 class ULX3S_12F_Platform(_ULX3SPlatform):
@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeICE40Platform
 from .resources import *
+from .programmer import IceprogProgrammer
 from .upduino_v1 import UpduinoV1Platform
 
 
@@ -19,10 +17,10 @@ class UpduinoV2Platform(UpduinoV1Platform):
                  Clock(12e6), Attrs(IO_STANDARD="SB_LVCMOS")),
     ]
 
-    def toolchain_program(self, products, name):
-        iceprog = os.environ.get("ICEPROG", "iceprog")
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            subprocess.check_call([iceprog, bitstream_filename])
+    programmer = IceprogProgrammer(usb_id="0x0403:0x6014")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
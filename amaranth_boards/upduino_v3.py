@@ -1,9 +1,7 @@
-import os
-import subprocess
-
 from amaranth.build import *
 from amaranth.vendor import LatticeICE40Platform
 from amaranth_boards.resources import *
+from .programmer import IceprogProgrammer
 
 
 __all__ = ["UpduinoV3Platform"]
@@ -38,10 +36,10 @@ class UpduinoV3Platform(LatticeICE40Platform):
         Connector("j", 1, "20 10 - - 12 21 13 19 18 11 9 6 44 4 3 48 45 47 46 2")
     ]
 
-    def toolchain_program(self, products, name):
-        iceprog = os.environ.get("ICEPROG", "iceprog")
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            subprocess.check_call([iceprog, bitstream_filename])
+    programmer = IceprogProgrammer(usb_id="0x0403:0x6014")
+
+    def toolchain_program(self, products, name, **kwargs):
+        self.programmer.program(products, name, **kwargs)
 
 
 if __name__ == "__main__":
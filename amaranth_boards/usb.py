@@ -0,0 +1,1848 @@
+import time
+import unittest
+from functools import reduce
+from operator import xor
+
+from amaranth import *
+from amaranth.lib import io
+from amaranth.lib.cdc import FFSynchronizer
+from amaranth.lib.memory import Memory
+
+
+__all__ = [
+    "USBPHY", "USBFSPHY", "ULPIPHY", "usb_phy", "USBBulkEndpoint", "USBDevice", "USBBenchmark",
+    "bulk_benchmark",
+]
+
+
+def _crc_terms(poly, width):
+    # USB CRCs are shifted in LSB first, and are linear in the previous CRC and the data, so each
+    # bit of the next CRC is the XOR of some bits of each, for a byte of data.
+    def step(crc, data):
+        for bit in range(8):
+            crc = (crc >> 1) ^ (poly if (crc ^ data >> bit) & 1 else 0)
+        return crc
+    return [([bit for bit in range(width) if step(1 << bit, 0) >> out & 1],
+             [bit for bit in range(8) if step(0, 1 << bit) >> out & 1])
+            for out in range(width)]
+
+
+def _crc_next(terms, crc, data):
+    return Cat(reduce(xor, [crc[bit] for bit in crc_bits] + [data[bit] for bit in data_bits],
+                      C(0, 1))
+               for crc_bits, data_bits in terms)
+
+
+_CRC5_TERMS  = _crc_terms(0x14, 5)
+_CRC16_TERMS = _crc_terms(0xa001, 16)
+
+# Value of the CRC registers after a packet and its correct CRC.
+_CRC5_RESIDUE  = 0x06
+_CRC16_RESIDUE = 0xb001
+
+
+_PID_OUT   = 0x1
+_PID_IN    = 0x9
+_PID_SOF   = 0x5
+_PID_SETUP = 0xd
+_PID_DATA0 = 0x3
+_PID_DATA1 = 0xb
+_PID_ACK   = 0x2
+_PID_NAK   = 0xa
+_PID_STALL = 0xe
+
+
+def _pid_byte(pid):
+    return Cat(pid, ~pid)
+
+
+class USBPHY(Elaboratable):
+    """Byte-wide interface to a USB transceiver, common to full-speed and high-speed PHYs.
+
+    Everything is in the ``domain`` clock domain. A packet is received while ``rx_active`` is
+    asserted, and its bytes, starting with the PID, are ``rx_data`` in the cycles in which
+    ``rx_valid`` is asserted; ``rx_error`` is asserted, at the latest in the first cycle in
+    which ``rx_active`` is deasserted, if the packet was received with an error. A packet is sent
+    by asserting ``tx_valid`` with its PID in ``tx_data``; ``tx_ready`` is asserted in each
+    cycle in which a byte is taken, after which the next byte must be in ``tx_data``, or
+    ``tx_valid`` deasserted to end the packet.
+
+    ``bus_reset`` is asserted while the host resets the bus, and ``high_speed`` while the
+    device runs at high speed, which is only possible if ``high_speed_capable`` is true.
+    """
+    high_speed_capable = False
+
+    def __init__(self, *, domain):
+        self.domain = domain
+
+        self.rx_data   = Signal(8)
+        self.rx_valid  = Signal()
+        self.rx_active = Signal()
+        self.rx_error  = Signal()
+        self.tx_data   = Signal(8)
+        self.tx_valid  = Signal()
+        self.tx_ready  = Signal()
+
+        self.bus_reset  = Signal()
+        self.high_speed = Signal()
+
+
+# Length of a bus reset, 2.5 µs, at 48 MHz.
+_FS_RESET_CYCLES = 120
+
+
+class USBFSPHY(USBPHY):
+    """Full-speed USB transceiver made of the I/O buffers of the FPGA.
+
+    ``pads`` is a ``usb`` resource made with ``DirectUSBResource``. The ``domain`` clock domain
+    must run at 48 MHz, 4 times the bit rate, and the received bits are recovered by
+    oversampling the lines. If the pull-up resistor on D+ is controlled by the FPGA, the device
+    is connected while ``connect`` is asserted, which it is by default, and VBUS is present, if
+    the board senses it.
+    """
+    def __init__(self, pads, *, domain="usb"):
+        super().__init__(domain=domain)
+        self.pads    = pads
+        self.connect = Signal(init=1)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads = self.pads
+        sync = m.d[self.domain]
+
+        m.submodules.d_p = d_p = io.Buffer("io", pads.d_p)
+        m.submodules.d_n = d_n = io.Buffer("io", pads.d_n)
+
+        if hasattr(pads, "pullup"):
+            m.submodules.pullup = pullup = io.Buffer("o", pads.pullup)
+            connect = self.connect
+            if hasattr(pads, "vbus_valid"):
+                m.submodules.vbus_valid = vbus_valid = io.Buffer("i", pads.vbus_valid)
+                vbus = Signal()
+                m.submodules.vbus_cdc = FFSynchronizer(vbus_valid.i, vbus, o_domain=self.domain)
+                connect = connect & vbus
+            m.d.comb += pullup.o.eq(connect)
+
+        # Transmitter. Bytes are sent LSB first after the SYNC pattern, a zero is stuffed after
+        # six ones in a row, and the bits are NRZI encoded: a zero toggles the lines, starting
+        # from J (D+ high). The end of packet is SE0 for 2 bits followed by J for 1 bit.
+        tx_oe    = Signal()
+        tx_level = Signal(init=1)
+        tx_se0   = Signal()
+        tx_phase = Signal(2)
+        tx_shreg = Signal(8)
+        tx_bits  = Signal(3)
+        tx_ones  = Signal(range(7))
+        tx_empty = Signal()
+        tx_eop   = Signal(2)
+        tx_strobe = tx_phase == 3
+
+        m.d.comb += [
+            d_p.oe.eq(tx_oe),
+            d_n.oe.eq(tx_oe),
+            d_p.o.eq(tx_level & ~tx_se0),
+            d_n.o.eq(~tx_level & ~tx_se0),
+        ]
+
+        with m.FSM(domain=self.domain):
+            with m.State("IDLE"):
+                with m.If(self.tx_valid):
+                    sync += [
+                        tx_oe.eq(1),
+                        tx_level.eq(1),
+                        tx_phase.eq(0),
+                        tx_shreg.eq(0x80),
+                        tx_bits.eq(0),
+                        tx_ones.eq(0),
+                        tx_empty.eq(0),
+                    ]
+                    m.next = "DATA"
+
+            with m.State("DATA"):
+                sync += tx_phase.eq(tx_phase + 1)
+                with m.If(tx_strobe):
+                    with m.If(tx_ones == 6):
+                        sync += [
+                            tx_level.eq(~tx_level),
+                            tx_ones.eq(0),
+                        ]
+                    with m.Elif(tx_empty):
+                        sync += [
+                            tx_se0.eq(1),
+                            tx_eop.eq(0),
+                        ]
+                        m.next = "EOP"
+                    with m.Else():
+                        sync += [
+                            tx_level.eq(Mux(tx_shreg[0], tx_level, ~tx_level)),
+                            tx_ones.eq(Mux(tx_shreg[0], tx_ones + 1, 0)),
+                            tx_shreg.eq(tx_shreg >> 1),
+                            tx_bits.eq(tx_bits + 1),
+                        ]
+                        with m.If(tx_bits == 7):
+                            with m.If(self.tx_valid):
+                                m.d.comb += self.tx_ready.eq(1)
+                                sync += tx_shreg.eq(self.tx_data)
+                            with m.Else():
+                                sync += tx_empty.eq(1)
+
+            with m.State("EOP"):
+                sync += tx_phase.eq(tx_phase + 1)
+                with m.If(tx_strobe):
+                    sync += tx_eop.eq(tx_eop + 1)
+                    with m.If(tx_eop == 1):
+                        sync += [
+                            tx_se0.eq(0),
+                            tx_level.eq(1),
+                        ]
+                    with m.If(tx_eop == 2):
+                        sync += tx_oe.eq(0)
+                        m.next = "IDLE"
+
+        # Receiver. A transition of the lines restarts the bit period, and the lines are sampled
+        # two cycles later, in the middle of the bit.
+        line   = Signal(2)
+        line_q = Signal(2)
+        m.submodules.line_cdc = FFSynchronizer(Cat(d_p.i, d_n.i), line, o_domain=self.domain)
+        sync += line_q.eq(line)
+
+        rx_phase = Signal(2)
+        with m.If(line != line_q):
+            sync += rx_phase.eq(1)
+        with m.Else():
+            sync += rx_phase.eq(rx_phase + 1)
+        rx_sample = (rx_phase == 2) & (line == line_q)
+
+        se0_cycles = Signal(range(_FS_RESET_CYCLES + 1))
+        with m.If(line == 0b00):
+            with m.If(se0_cycles != _FS_RESET_CYCLES):
+                sync += se0_cycles.eq(se0_cycles + 1)
+        with m.Else():
+            sync += se0_cycles.eq(0)
+        m.d.comb += self.bus_reset.eq(se0_cycles == _FS_RESET_CYCLES)
+
+        rx_last  = Signal(init=1)
+        rx_bit   = Signal()
+        rx_zeros = Signal(range(4))
+        rx_ones  = Signal(range(7))
+        rx_shreg = Signal(8)
+        rx_bits  = Signal(3)
+        m.d.comb += rx_bit.eq(line[0] == rx_last)
+
+        sync += [
+            self.rx_valid.eq(0),
+            self.rx_error.eq(0),
+        ]
+        # The transmitter would otherwise receive its own packets.
+        with m.If(tx_oe):
+            sync += [
+                self.rx_active.eq(0),
+                rx_zeros.eq(0),
+                rx_last.eq(1),
+            ]
+        with m.Elif(rx_sample):
+            sync += rx_last.eq(Mux(line == 0b00, 1, line[0]))
+            with m.If(line == 0b00):
+                # The packet ends with SE0, on a byte boundary.
+                with m.If(self.rx_active):
+                    sync += [
+                        self.rx_active.eq(0),
+                        self.rx_error.eq(rx_bits != 0),
+                    ]
+                sync += rx_zeros.eq(0)
+            with m.Elif(~self.rx_active):
+                # SYNC is KJKJKJKK, i.e. seven zeros followed by a one.
+                with m.If(~rx_bit):
+                    with m.If(rx_zeros != 3):
+                        sync += rx_zeros.eq(rx_zeros + 1)
+                with m.Else():
+                    with m.If(rx_zeros == 3):
+                        sync += [
+                            self.rx_active.eq(1),
+                            rx_ones.eq(1),
+                            rx_bits.eq(0),
+                        ]
+                    sync += rx_zeros.eq(0)
+            with m.Elif(rx_ones == 6):
+                # Stuffed bit, which must be a zero.
+                sync += rx_ones.eq(0)
+                with m.If(rx_bit):
+                    sync += self.rx_error.eq(1)
+            with m.Else():
+                sync += [
+                    rx_shreg.eq(Cat(rx_shreg[1:], rx_bit)),
+                    rx_bits.eq(rx_bits + 1),
+                    rx_ones.eq(Mux(rx_bit, rx_ones + 1, 0)),
+                ]
+                with m.If(rx_bits == 7):
+                    sync += [
+                        self.rx_data.eq(Cat(rx_shreg[1:], rx_bit)),
+                        self.rx_valid.eq(1),
+                    ]
+
+        return m
+
+
+_ULPI_FUNCTION_CONTROL = 0x04
+_ULPI_OTG_CONTROL      = 0x0a
+
+# Function Control register: SuspendM, OpMode, TermSelect and XcvrSelect.
+_ULPI_FULL_SPEED = 0x45
+_ULPI_CHIRP      = 0x54
+_ULPI_HIGH_SPEED = 0x40
+
+# Timings of the high-speed handshake at 60 MHz: a bus reset or a chirp of the host lasts at
+# least 2.5 µs, the chirp of the device 1 to 7 ms, the host answers it within 2 ms, and a
+# high-speed bus is idle for 3 ms before a reset or a suspend.
+_ULPI_RESET_CYCLES      = 150
+_ULPI_CHIRP_CYCLES      = 72_000
+_ULPI_HOST_CHIRP_CYCLES = 120_000
+_ULPI_IDLE_CYCLES       = 180_000
+
+_LINE_SE0 = 0b00
+_LINE_J   = 0b01
+_LINE_K   = 0b10
+
+
+class ULPIPHY(USBPHY):
+    """High-speed USB transceiver connected through ULPI.
+
+    ``pads`` is a resource made with ``ULPIResource``. The ``domain`` clock domain is clocked by
+    the 60 MHz clock of the PHY, and must be defined by the design, e.g. with
+    ``m.domains.usb = ClockDomain()``; if the PHY takes its clock from the FPGA instead, the
+    clock domain must be provided, and drives it.
+
+    The device starts at full speed, and negotiates high speed with the chirp handshake after
+    each bus reset. Suspend and resume are not supported.
+    """
+    high_speed_capable = True
+
+    def __init__(self, pads, *, domain="usb"):
+        super().__init__(domain=domain)
+        self.pads = pads
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads = self.pads
+        sync = m.d[self.domain]
+
+        if pads.clk.direction == io.Direction.Input:
+            m.submodules.clk = clk = io.Buffer("i", pads.clk)
+            m.d.comb += ClockSignal(self.domain).eq(clk.i)
+            if platform is not None:
+                platform.add_clock_constraint(clk.i, 60e6)
+        else:
+            m.submodules.clk = clk = io.DDRBuffer("o", pads.clk, o_domain=self.domain)
+            m.d.comb += [
+                clk.o[0].eq(1),
+                clk.o[1].eq(0),
+            ]
+        if hasattr(pads, "rst"):
+            m.submodules.rst = rst = io.Buffer("o", pads.rst)
+            m.d.comb += rst.o.eq(0)
+
+        m.submodules.data = data = io.Buffer("io", pads.data)
+        m.submodules.dir  = dir  = io.Buffer("i", pads.dir)
+        m.submodules.nxt  = nxt  = io.Buffer("i", pads.nxt)
+        m.submodules.stp  = stp  = io.Buffer("o", pads.stp)
+
+        # The bus is turned around for a cycle whenever `dir` changes.
+        dir_q = Signal()
+        sync += dir_q.eq(dir.i)
+        turnaround = dir.i != dir_q
+
+        data_o = Signal(8)
+        m.d.comb += [
+            data.o.eq(data_o),
+            data.oe.eq(~dir.i & ~dir_q),
+        ]
+
+        # Receive data, and RX CMD bytes carrying the line state and the receiver state.
+        linestate = Signal(2, init=_LINE_J)
+        sync += [
+            self.rx_valid.eq(0),
+            self.rx_error.eq(0),
+        ]
+        with m.If(dir.i & ~turnaround):
+            with m.If(nxt.i):
+                sync += [
+                    self.rx_data.eq(data.i),
+                    self.rx_valid.eq(1),
+                ]
+            with m.Else():
+                sync += [
+                    linestate.eq(data.i[0:2]),
+                    self.rx_active.eq(data.i[4]),
+                    self.rx_error.eq(data.i[4:6] == 0b11),
+                ]
+        with m.Elif(dir.i & nxt.i):
+            sync += self.rx_active.eq(1)
+        with m.Elif(~dir.i):
+            sync += self.rx_active.eq(0)
+
+        reg_pending = Signal()
+        reg_addr    = Signal(6)
+        reg_data    = Signal(8)
+        chirp       = Signal()
+        tx_enable   = Signal()
+
+        with m.FSM(domain=self.domain):
+            with m.State("IDLE"):
+                with m.If(~dir.i & ~dir_q):
+                    with m.If(reg_pending):
+                        m.next = "REG_CMD"
+                    with m.Elif(chirp):
+                        m.next = "CHIRP_CMD"
+                    with m.Elif(self.tx_valid & tx_enable):
+                        m.next = "TX_CMD"
+
+            with m.State("REG_CMD"):
+                m.d.comb += data_o.eq(0x80 | reg_addr)
+                with m.If(dir.i):
+                    m.next = "IDLE"
+                with m.Elif(nxt.i):
+                    m.next = "REG_DATA"
+
+            with m.State("REG_DATA"):
+                m.d.comb += data_o.eq(reg_data)
+                with m.If(dir.i):
+                    m.next = "IDLE"
+                with m.Elif(nxt.i):
+                    m.next = "REG_STP"
+
+            with m.State("REG_STP"):
+                m.d.comb += stp.o.eq(1)
+                sync += reg_pending.eq(0)
+                m.next = "IDLE"
+
+            # The PHY sends the PID itself, from the transmit command.
+            with m.State("TX_CMD"):
+                m.d.comb += data_o.eq(0x40 | self.tx_data[:4])
+                with m.If(dir.i):
+                    m.next = "IDLE"
+                with m.Elif(nxt.i):
+                    m.d.comb += self.tx_ready.eq(1)
+                    m.next = "TX_DATA"
+
+            with m.State("TX_DATA"):
+                with m.If(~self.tx_valid):
+                    m.d.comb += stp.o.eq(1)
+                    m.next = "IDLE"
+                with m.Else():
+                    m.d.comb += [
+                        data_o.eq(self.tx_data),
+                        self.tx_ready.eq(nxt.i),
+                    ]
+
+            # With bit stuffing and NRZI encoding disabled, zeros are sent as a chirp K.
+            with m.State("CHIRP_CMD"):
+                m.d.comb += data_o.eq(0x40)
+                with m.If(dir.i):
+                    m.next = "IDLE"
+                with m.Elif(nxt.i):
+                    m.next = "CHIRP_DATA"
+
+            with m.State("CHIRP_DATA"):
+                with m.If(~chirp):
+                    m.d.comb += stp.o.eq(1)
+                    m.next = "IDLE"
+
+        def write_register(addr, value):
+            return [
+                reg_pending.eq(1),
+                reg_addr.eq(addr),
+                reg_data.eq(value),
+            ]
+
+        timer       = Signal(range(_ULPI_IDLE_CYCLES + 1))
+        armed       = Signal(init=1)
+        stable      = Signal(range(_ULPI_RESET_CYCLES + 1))
+        linestate_q = Signal(2)
+        chirps      = Signal(range(7))
+        last_chirp  = Signal(2)
+
+        sync += linestate_q.eq(linestate)
+        with m.If(linestate != linestate_q):
+            sync += stable.eq(0)
+        with m.Elif(stable != _ULPI_RESET_CYCLES):
+            sync += stable.eq(stable + 1)
+
+        with m.FSM(domain=self.domain):
+            with m.State("INIT"):
+                # Most PHYs enable the pull-down resistors of a host after a reset.
+                sync += write_register(_ULPI_OTG_CONTROL, 0x00)
+                m.next = "INIT_WAIT"
+
+            with m.State("INIT_WAIT"):
+                with m.If(~reg_pending):
+                    sync += write_register(_ULPI_FUNCTION_CONTROL, _ULPI_FULL_SPEED)
+                    m.next = "FS_WAIT"
+
+            with m.State("FS_WAIT"):
+                with m.If(~reg_pending):
+                    m.next = "FS"
+
+            with m.State("FS"):
+                m.d.comb += tx_enable.eq(1)
+                with m.If(linestate != _LINE_SE0):
+                    sync += armed.eq(1)
+                with m.If((linestate == _LINE_SE0) & (stable == _ULPI_RESET_CYCLES)):
+                    m.d.comb += self.bus_reset.eq(1)
+                    # After a failed handshake, the bus reset continues at full speed.
+                    with m.If(armed):
+                        sync += [
+                            write_register(_ULPI_FUNCTION_CONTROL, _ULPI_CHIRP),
+                            armed.eq(0),
+                        ]
+                        m.next = "CHIRP_SETUP"
+
+            with m.State("CHIRP_SETUP"):
+                m.d.comb += self.bus_reset.eq(1)
+                with m.If(~reg_pending):
+                    sync += [
+                        chirp.eq(1),
+                        timer.eq(0),
+                    ]
+                    m.next = "CHIRP"
+
+            with m.State("CHIRP"):
+                m.d.comb += self.bus_reset.eq(1)
+                sync += timer.eq(timer + 1)
+                with m.If(timer == _ULPI_CHIRP_CYCLES):
+                    sync += [
+                        chirp.eq(0),
+                        timer.eq(0),
+                        chirps.eq(0),
+                        last_chirp.eq(_LINE_J),
+                    ]
+                    m.next = "HOST_CHIRP"
+
+            with m.State("HOST_CHIRP"):
+                # The host answers with alternating K and J chirps; three pairs of them complete
+                # the handshake.
+                m.d.comb += self.bus_reset.eq(1)
+                sync += timer.eq(timer + 1)
+                with m.If((stable == _ULPI_RESET_CYCLES) & (linestate != last_chirp) &
+                          ((linestate == _LINE_J) | (linestate == _LINE_K))):
+                    sync += [
+                        chirps.eq(chirps + 1),
+                        last_chirp.eq(linestate),
+                    ]
+                with m.If(chirps == 6):
+                    sync += write_register(_ULPI_FUNCTION_CONTROL, _ULPI_HIGH_SPEED)
+                    m.next = "HS_WAIT"
+                with m.Elif(timer == _ULPI_HOST_CHIRP_CYCLES):
+                    sync += write_register(_ULPI_FUNCTION_CONTROL, _ULPI_FULL_SPEED)
+                    m.next = "FS_WAIT"
+
+            with m.State("HS_WAIT"):
+                m.d.comb += self.bus_reset.eq(1)
+                with m.If(~reg_pending):
+                    sync += timer.eq(0)
+                    m.next = "HS"
+
+            with m.State("HS"):
+                # The host sends a start-of-frame packet every 125 µs; without them, it is
+                # resetting or suspending the bus, which is told apart at full speed.
+                m.d.comb += [
+                    tx_enable.eq(1),
+                    self.high_speed.eq(1),
+                ]
+                with m.If(dir.i):
+                    sync += timer.eq(0)
+                with m.Else():
+                    sync += timer.eq(timer + 1)
+                with m.If(timer == _ULPI_IDLE_CYCLES):
+                    sync += [
+                        write_register(_ULPI_FUNCTION_CONTROL, _ULPI_FULL_SPEED),
+                        armed.eq(1),
+                    ]
+                    m.next = "FS_WAIT"
+
+        return m
+
+
+def usb_phy(platform, number=0):
+    """Return a :class:`USBPHY` for the USB port ``number`` of ``platform``, high-speed if it is
+    connected through a ULPI PHY, and requesting its resources.
+    """
+    for name in ("ulpi", "usb"):
+        if (name, number) in platform.resources:
+            subsignals = {subsignal.name for subsignal in platform.resources[name, number].ios}
+            pads = platform.request(name, number, dir="-")
+            if "nxt" in subsignals:
+                return ULPIPHY(pads)
+            return USBFSPHY(pads)
+    raise NotImplementedError("{} has no USB port"
+                              .format(type(platform).__name__))
+
+
+def _string_descriptor(string):
+    data = string.encode("utf-16-le")
+    return bytes([2 + len(data), 3]) + data
+
+
+def _descriptors(*, vendor_id, product_id, manufacturer, product, serial, endpoints,
+                 high_speed_capable):
+    # Return the descriptors as a dictionary of bytes at full speed and at high speed, keyed
+    # by their type and index.
+    def u16(value):
+        return value.to_bytes(2, "little")
+
+    def configuration(max_packet, descriptor_type=2):
+        interface = bytes([9, 4, 0, 0, 2 * endpoints, 0xff, 0, 0, 0])
+        for number in range(1, endpoints + 1):
+            for address in (0x80 | number, number):
+                interface += bytes([7, 5, address, 2]) + u16(max_packet) + bytes([0])
+        return (bytes([9, descriptor_type]) + u16(9 + len(interface)) +
+                bytes([1, 1, 0, 0x80, 50]) + interface)
+
+    strings = [manufacturer, product] + ([serial] if serial is not None else [])
+    device = (bytes([18, 1]) + u16(0x0200) + bytes([0, 0, 0, 64]) + u16(vendor_id) +
+              u16(product_id) + u16(0x0100) + bytes([1, 2, 3 if serial is not None else 0, 1]))
+    descriptors = {
+        (1, 0): (device, device),
+        (2, 0): (configuration(64), configuration(512)),
+        (3, 0): (bytes([4, 3, 0x09, 0x04]),) * 2,
+    }
+    for index, string in enumerate(strings, 1):
+        descriptors[3, index] = (_string_descriptor(string),) * 2
+    if high_speed_capable:
+        qualifier = bytes([10, 6]) + u16(0x0200) + bytes([0, 0, 0, 64, 1, 0])
+        descriptors[6, 0] = (qualifier, qualifier)
+        descriptors[7, 0] = (configuration(512, 7), configuration(64, 7))
+    return descriptors
+
+
+class USBBulkEndpoint:
+    """A pair of bulk endpoints of a :class:`USBDevice`, IN and OUT with the same ``number``.
+
+    Bytes written to the IN endpoint are taken in each cycle in which ``in_valid`` and
+    ``in_ready`` are asserted, and are sent to the host in packets of the maximum size, or
+    shorter if ``in_last`` is asserted with their last byte. Bytes received on the OUT endpoint
+    are ``out_data`` in the cycles in which ``out_valid`` and ``out_ready`` are asserted, and
+    ``out_last`` is asserted with the last byte of each packet. Both sides are in the clock
+    domain of the PHY.
+    """
+    def __init__(self, number):
+        self.number = number
+
+        self.in_data   = Signal(8)
+        self.in_valid  = Signal()
+        self.in_last   = Signal()
+        self.in_ready  = Signal()
+
+        self.out_data  = Signal(8)
+        self.out_valid = Signal()
+        self.out_last  = Signal()
+        self.out_ready = Signal()
+
+
+class _PacketBuffer(Elaboratable):
+    # Two buffers of `max_packet` bytes, each filled with a packet on the write side, and released
+    # in the same order on the read side. `r_data` is the byte at `r_addr` in the previous cycle
+    # in which `r_en` was asserted.
+    def __init__(self, max_packet, domain):
+        self.max_packet = max_packet
+        self.domain     = domain
+
+        self.w_ready   = Signal()
+        self.w_en      = Signal()
+        self.w_addr    = Signal(range(max_packet))
+        self.w_data    = Signal(8)
+        self.w_commit  = Signal()
+        self.w_length  = Signal(range(max_packet + 1))
+
+        self.r_valid   = Signal()
+        self.r_length  = Signal(range(max_packet + 1))
+        self.r_en      = Signal()
+        self.r_addr    = Signal(range(max_packet))
+        self.r_data    = Signal(8)
+        self.r_release = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        sync = m.d[self.domain]
+
+        m.submodules.mem = mem = Memory(shape=8, depth=2 * self.max_packet, init=[])
+        wr_port = mem.write_port(domain=self.domain)
+        rd_port = mem.read_port(domain=self.domain)
+
+        filled  = Signal(2)
+        lengths = Array(Signal.like(self.w_length, name="length{}".format(n)) for n in range(2))
+        w_slot  = Signal()
+        r_slot  = Signal()
+
+        m.d.comb += [
+            self.w_ready.eq(~filled.bit_select(w_slot, 1)),
+            wr_port.addr.eq(Cat(self.w_addr, w_slot)),
+            wr_port.data.eq(self.w_data),
+            wr_port.en.eq(self.w_en & self.w_ready),
+            self.r_valid.eq(filled.bit_select(r_slot, 1)),
+            self.r_length.eq(lengths[r_slot]),
+            rd_port.addr.eq(Cat(self.r_addr, r_slot)),
+            rd_port.en.eq(self.r_en),
+            self.r_data.eq(rd_port.data),
+        ]
+        with m.If(self.w_commit & self.w_ready):
+            sync += [
+                filled.bit_select(w_slot, 1).eq(1),
+                lengths[w_slot].eq(self.w_length),
+                w_slot.eq(~w_slot),
+            ]
+        with m.If(self.r_release & self.r_valid):
+            sync += [
+                filled.bit_select(r_slot, 1).eq(0),
+                r_slot.eq(~r_slot),
+            ]
+
+        return m
+
+
+# Control transfer stages.
+_CTRL_IDLE       = 0
+_CTRL_DATA_IN    = 1
+_CTRL_STATUS_IN  = 2
+_CTRL_STATUS_OUT = 3
+_CTRL_STALL      = 4
+
+# Idle cycles to wait for the packet following a token or a data packet.
+_TIMEOUT = 1024
+
+
+class USBDevice(Elaboratable):
+    """USB device with ``endpoints`` pairs of bulk endpoints, for ``phy``, a :class:`USBPHY`.
+
+    The device has a single configuration, with a vendor-specific interface holding the
+    endpoints, listed in :attr:`endpoints` as :class:`USBBulkEndpoint` objects; their maximum
+    packet size is 512 bytes at high speed and 64 bytes at full speed. The descriptors are
+    generated from ``vendor_id``, ``product_id`` and the ``manufacturer``, ``product`` and
+    ``serial`` strings; the default IDs are a test PID of pid.codes, to be replaced by real ones.
+
+    Each endpoint has two packet buffers, so that a packet can be transferred over USB while
+    the other one is read or written by the design. ``address`` is the address assigned by the
+    host, and ``configured`` is asserted once the host has selected the configuration. A bus
+    reset resets the whole device, except the PHY.
+    """
+    def __init__(self, phy, *, vendor_id=0x1209, product_id=0x0001, manufacturer="amaranth-boards",
+                 product="USB bulk device", serial=None, endpoints=1):
+        if not 1 <= endpoints <= 15:
+            raise ValueError("USB device must have between 1 and 15 bulk endpoints, not {}"
+                             .format(endpoints))
+
+        self.phy         = phy
+        self.max_packet  = 512 if phy.high_speed_capable else 64
+        self.descriptors = _descriptors(vendor_id=vendor_id, product_id=product_id,
+                                        manufacturer=manufacturer, product=product, serial=serial,
+                                        endpoints=endpoints,
+                                        high_speed_capable=phy.high_speed_capable)
+        self.endpoints   = [USBBulkEndpoint(number) for number in range(1, endpoints + 1)]
+
+        self.address    = Signal(7)
+        self.configured = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        phy = self.phy
+        m.submodules.phy = phy
+
+        core = Module()
+        m.submodules.core = ResetInserter({phy.domain: phy.bus_reset})(core)
+        sync = core.d[phy.domain]
+
+        max_packet = self.max_packet
+        mps = Signal(range(max_packet + 1))
+        if phy.high_speed_capable:
+            core.d.comb += mps.eq(Mux(phy.high_speed, 512, 64))
+        else:
+            core.d.comb += mps.eq(64)
+
+        # The descriptors and the constant responses to requests are stored in a ROM.
+        rom_init = bytearray([0x00, 0x00, 0x01])
+        table    = {}
+        for key, speeds in self.descriptors.items():
+            table[key] = []
+            for descriptor in speeds:
+                table[key].append((len(rom_init), len(descriptor)))
+                rom_init += descriptor
+        core.submodules.rom = rom = Memory(shape=8, depth=len(rom_init), init=rom_init)
+        rom_port = rom.read_port(domain=phy.domain)
+
+        # Bulk endpoints.
+        in_buffers  = []
+        out_buffers = []
+        for endpoint in self.endpoints:
+            in_buffer  = _PacketBuffer(max_packet, phy.domain)
+            out_buffer = _PacketBuffer(max_packet, phy.domain)
+            core.submodules["ep{}_in".format(endpoint.number)]  = in_buffer
+            core.submodules["ep{}_out".format(endpoint.number)] = out_buffer
+            in_buffers.append(in_buffer)
+            out_buffers.append(out_buffer)
+
+            w_index = Signal(range(max_packet))
+            w_end   = endpoint.in_last | (w_index == mps - 1)
+            core.d.comb += [
+                endpoint.in_ready.eq(in_buffer.w_ready),
+                in_buffer.w_en.eq(endpoint.in_valid),
+                in_buffer.w_addr.eq(w_index),
+                in_buffer.w_data.eq(endpoint.in_data),
+                in_buffer.w_commit.eq(endpoint.in_valid & w_end),
+                in_buffer.w_length.eq(w_index + 1),
+            ]
+            with core.If(endpoint.in_valid & endpoint.in_ready):
+                sync += w_index.eq(Mux(w_end, 0, w_index + 1))
+
+            # Bytes are read from the buffer a cycle before they are presented.
+            r_index = Signal(range(max_packet))
+            r_end   = r_index == out_buffer.r_length - 1
+            fetch   = out_buffer.r_valid & (~endpoint.out_valid | endpoint.out_ready)
+            core.d.comb += [
+                out_buffer.r_en.eq(fetch),
+                out_buffer.r_addr.eq(r_index),
+                out_buffer.r_release.eq(fetch & r_end),
+                endpoint.out_data.eq(out_buffer.r_data),
+            ]
+            with core.If(fetch):
+                sync += [
+                    endpoint.out_valid.eq(1),
+                    endpoint.out_last.eq(r_end),
+                    r_index.eq(Mux(r_end, 0, r_index + 1)),
+                ]
+            with core.Elif(endpoint.out_ready):
+                sync += endpoint.out_valid.eq(0)
+
+        # Packet receiver.
+        rx_active_q = Signal()
+        rx_count    = Signal(range(max_packet + 5))
+        rx_pid      = Signal(4)
+        rx_pid_ok   = Signal()
+        rx_err      = Signal()
+        rx_crc5     = Signal(5)
+        rx_crc16    = Signal(16)
+        rx_addr     = Signal(7)
+        rx_endp     = Signal(4)
+
+        sync += rx_active_q.eq(phy.rx_active)
+        rx_end = rx_active_q & ~phy.rx_active
+        with core.If(phy.rx_valid):
+            with core.If(rx_count != max_packet + 4):
+                sync += rx_count.eq(rx_count + 1)
+            with core.If(rx_count == 0):
+                sync += [
+                    rx_pid.eq(phy.rx_data[:4]),
+                    rx_pid_ok.eq(phy.rx_data[:4] == ~phy.rx_data[4:]),
+                    rx_crc5.eq(0x1f),
+                    rx_crc16.eq(0xffff),
+                ]
+            with core.Else():
+                sync += [
+                    rx_crc5.eq(_crc_next(_CRC5_TERMS, rx_crc5, phy.rx_data)),
+                    rx_crc16.eq(_crc_next(_CRC16_TERMS, rx_crc16, phy.rx_data)),
+                ]
+            with core.If(rx_count == 1):
+                sync += Cat(rx_addr, rx_endp[0]).eq(phy.rx_data)
+            with core.If(rx_count == 2):
+                sync += rx_endp[1:].eq(phy.rx_data[:3])
+        with core.If(phy.rx_error):
+            sync += rx_err.eq(1)
+        with core.If(rx_end):
+            sync += [
+                rx_count.eq(0),
+                rx_err.eq(0),
+            ]
+
+        rx_ok        = rx_end & rx_pid_ok & ~rx_err & ~phy.rx_error
+        rx_token     = rx_ok & (rx_pid[:2] == 0b01) & (rx_count == 3) & \
+                       (rx_crc5 == _CRC5_RESIDUE)
+        rx_data      = rx_ok & (rx_pid[:2] == 0b11) & (rx_count >= 3) & (rx_count <= mps + 3) & \
+                       (rx_crc16 == _CRC16_RESIDUE)
+        rx_handshake = rx_ok & (rx_pid[:2] == 0b10) & (rx_count == 1)
+        rx_length    = (rx_count - 3)[:len(rx_count)]
+        rx_for_us    = rx_token & (rx_addr == self.address)
+
+        # Control endpoint.
+        setup          = Signal(64)
+        setup_pending  = Signal()
+        ctrl_stage     = Signal(range(5))
+        ctrl_offset    = Signal(range(len(rom_init)))
+        ctrl_remaining = Signal(16)
+        ctrl_short     = Signal()
+        new_address    = Signal(7)
+        set_address    = Signal()
+
+        in_toggle  = Signal(len(self.endpoints) + 1)
+        out_toggle = Signal(len(self.endpoints) + 1)
+
+        with core.If(setup_pending):
+            request = Cat(setup[8:16], setup[0:8])
+            value   = setup[16:32]
+            index   = setup[32:48]
+            length  = setup[48:64]
+
+            def data_in(offset, size):
+                return [
+                    ctrl_offset.eq(offset),
+                    ctrl_remaining.eq(Mux(length > size, size, length)),
+                    ctrl_short.eq(length > size),
+                    ctrl_stage.eq(Mux(length == 0, _CTRL_STATUS_IN, _CTRL_DATA_IN)),
+                ]
+
+            sync += [
+                setup_pending.eq(0),
+                set_address.eq(0),
+            ]
+            with core.Switch(request):
+                with core.Case(0x8006): # GET_DESCRIPTOR
+                    with core.Switch(value):
+                        for (descriptor_type, descriptor_index), speeds in table.items():
+                            with core.Case(descriptor_type << 8 | descriptor_index):
+                                (fs_offset, fs_size), (hs_offset, hs_size) = speeds
+                                sync += data_in(Mux(phy.high_speed, hs_offset, fs_offset),
+                                                Mux(phy.high_speed, hs_size, fs_size))
+                        with core.Default():
+                            sync += ctrl_stage.eq(_CTRL_STALL)
+                with core.Case(0x0005): # SET_ADDRESS
+                    sync += [
+                        new_address.eq(value[:7]),
+                        set_address.eq(1),
+                        ctrl_stage.eq(_CTRL_STATUS_IN),
+                    ]
+                with core.Case(0x0009): # SET_CONFIGURATION
+                    with core.If(value[:8] <= 1):
+                        sync += [
+                            self.configured.eq(value[0]),
+                            in_toggle.eq(0),
+                            out_toggle.eq(0),
+                            ctrl_stage.eq(_CTRL_STATUS_IN),
+                        ]
+                    with core.Else():
+                        sync += ctrl_stage.eq(_CTRL_STALL)
+                with core.Case(0x8008): # GET_CONFIGURATION
+                    sync += data_in(Mux(self.configured, 2, 1), 1)
+                with core.Case(0x8000, 0x8100, 0x8200): # GET_STATUS
+                    sync += data_in(0, 2)
+                with core.Case(0x0201): # CLEAR_FEATURE(ENDPOINT_HALT), resets the data toggle
+                    with core.If(index[7]):
+                        sync += in_toggle.bit_select(index[:4], 1).eq(0)
+                    with core.Else():
+                        sync += out_toggle.bit_select(index[:4], 1).eq(0)
+                    sync += ctrl_stage.eq(_CTRL_STATUS_IN)
+                with core.Case(0x810a): # GET_INTERFACE
+                    sync += data_in(0, 1)
+                with core.Case(0x010b): # SET_INTERFACE
+                    sync += ctrl_stage.eq(_CTRL_STATUS_IN)
+                with core.Default():
+                    sync += ctrl_stage.eq(_CTRL_STALL)
+
+        # Transactions.
+        ep         = Signal(4)
+        ep_ok      = Signal()
+        out_free   = Signal()
+        handshake  = Signal(4)
+        tx_pid     = Signal(4)
+        tx_length  = Signal(range(max_packet + 1))
+        tx_index   = Signal(range(max_packet + 1))
+        tx_crc     = Signal(16)
+        timer      = Signal(range(_TIMEOUT + 1))
+
+        bulk_ok = self.configured & (rx_endp != 0) & (rx_endp <= len(self.endpoints))
+        in_ready  = Array(buffer.r_valid for buffer in in_buffers)
+        in_length = Array(buffer.r_length for buffer in in_buffers)
+        out_ready = Array(buffer.w_ready for buffer in out_buffers)
+        tx_source = Array([rom_port.data] + [buffer.r_data for buffer in in_buffers])
+
+        # Bytes are read from the ROM or the buffer a cycle before they are sent.
+        tx_next = Signal.like(tx_index)
+        core.d.comb += rom_port.addr.eq(ctrl_offset + tx_next)
+        for buffer in in_buffers:
+            core.d.comb += [
+                buffer.r_en.eq(1),
+                buffer.r_addr.eq(tx_next),
+            ]
+
+        # A token received while waiting for a handshake, e.g. an IN token retried by the host
+        # after our data packet was lost, is handled once the transaction is abandoned.
+        token_retry = Signal()
+
+        with core.FSM(domain=phy.domain):
+            with core.State("IDLE"):
+                sync += [
+                    timer.eq(0),
+                    token_retry.eq(0),
+                ]
+                with core.If(rx_for_us | token_retry):
+                    sync += [
+                        ep.eq(rx_endp),
+                        ep_ok.eq((rx_endp == 0) | bulk_ok),
+                        out_free.eq(out_ready[(rx_endp - 1)[:4]]),
+                    ]
+                    with core.Switch(rx_pid):
+                        with core.Case(_PID_SETUP):
+                            with core.If(rx_endp == 0):
+                                core.next = "SETUP_DATA"
+                        with core.Case(_PID_OUT):
+                            core.next = "OUT_DATA"
+                        with core.Case(_PID_IN):
+                            sync += [
+                                tx_index.eq(0),
+                                tx_crc.eq(0xffff),
+                            ]
+                            with core.If(rx_endp == 0):
+                                with core.Switch(ctrl_stage):
+                                    with core.Case(_CTRL_DATA_IN):
+                                        sync += [
+                                            tx_pid.eq(Mux(in_toggle[0], _PID_DATA1, _PID_DATA0)),
+                                            tx_length.eq(Mux(ctrl_remaining > 64, 64,
+                                                             ctrl_remaining)),
+                                        ]
+                                        core.next = "SEND_PID"
+                                    with core.Case(_CTRL_STATUS_IN):
+                                        sync += [
+                                            tx_pid.eq(_PID_DATA1),
+                                            tx_length.eq(0),
+                                        ]
+                                        core.next = "SEND_PID"
+                                    with core.Case(_CTRL_STALL):
+                                        sync += handshake.eq(_PID_STALL)
+                                        core.next = "HANDSHAKE"
+                                    with core.Default():
+                                        sync += handshake.eq(_PID_NAK)
+                                        core.next = "HANDSHAKE"
+                            with core.Elif(~bulk_ok):
+                                sync += handshake.eq(_PID_STALL)
+                                core.next = "HANDSHAKE"
+                            with core.Elif(in_ready[(rx_endp - 1)[:4]]):
+                                sync += [
+                                    tx_pid.eq(Mux(in_toggle.bit_select(rx_endp, 1),
+                                                  _PID_DATA1, _PID_DATA0)),
+                                    tx_length.eq(in_length[(rx_endp - 1)[:4]]),
+                                ]
+                                core.next = "SEND_PID"
+                            with core.Else():
+                                sync += handshake.eq(_PID_NAK)
+                                core.next = "HANDSHAKE"
+
+            with core.State("SETUP_DATA"):
+                with core.If(~phy.rx_active):
+                    sync += timer.eq(timer + 1)
+                with core.If(phy.rx_valid & (rx_count != 0) & (rx_count <= 8)):
+                    sync += setup.word_select((rx_count - 1)[:3], 8).eq(phy.rx_data)
+                with core.If(rx_end):
+                    with core.If(rx_data & (rx_pid == _PID_DATA0) & (rx_length == 8)):
+                        sync += [
+                            setup_pending.eq(1),
+                            in_toggle[0].eq(1),
+                            handshake.eq(_PID_ACK),
+                        ]
+                        core.next = "HANDSHAKE"
+                    with core.Else():
+                        core.next = "IDLE"
+                with core.Elif(timer == _TIMEOUT):
+                    core.next = "IDLE"
+
+            with core.State("OUT_DATA"):
+                with core.If(~phy.rx_active):
+                    sync += timer.eq(timer + 1)
+                for number, buffer in enumerate(out_buffers, 1):
+                    core.d.comb += [
+                        buffer.w_en.eq((ep == number) & out_free & phy.rx_valid &
+                                       (rx_count != 0) & (rx_count <= max_packet)),
+                        buffer.w_addr.eq(rx_count - 1),
+                        buffer.w_data.eq(phy.rx_data),
+                        buffer.w_length.eq(rx_length),
+                    ]
+                with core.If(rx_end):
+                    with core.If(~rx_data):
+                        core.next = "IDLE"
+                    with core.Elif(~ep_ok):
+                        sync += handshake.eq(_PID_STALL)
+                        core.next = "HANDSHAKE"
+                    with core.Elif(ep == 0):
+                        # Status stage of a control read, or data stage of a control write,
+                        # which is ignored.
+                        with core.If(ctrl_stage == _CTRL_STALL):
+                            sync += handshake.eq(_PID_STALL)
+                        with core.Else():
+                            sync += handshake.eq(_PID_ACK)
+                            with core.If((ctrl_stage == _CTRL_DATA_IN) |
+                                         (ctrl_stage == _CTRL_STATUS_OUT)):
+                                sync += ctrl_stage.eq(_CTRL_IDLE)
+                        core.next = "HANDSHAKE"
+                    with core.Elif(~out_free):
+                        sync += handshake.eq(_PID_NAK)
+                        core.next = "HANDSHAKE"
+                    with core.Else():
+                        # A packet with the wrong data toggle is a retransmission of a packet
+                        # whose handshake the host did not receive.
+                        with core.If(rx_pid[3] == out_toggle.bit_select(ep, 1)):
+                            sync += out_toggle.bit_select(ep, 1).eq(~rx_pid[3])
+                            for number, buffer in enumerate(out_buffers, 1):
+                                core.d.comb += buffer.w_commit.eq((ep == number) &
+                                                                  (rx_length != 0))
+                        sync += handshake.eq(_PID_ACK)
+                        core.next = "HANDSHAKE"
+                with core.Elif(timer == _TIMEOUT):
+                    core.next = "IDLE"
+
+            with core.State("HANDSHAKE"):
+                core.d.comb += [
+                    phy.tx_valid.eq(1),
+                    phy.tx_data.eq(_pid_byte(handshake)),
+                ]
+                with core.If(phy.tx_ready):
+                    core.next = "IDLE"
+
+            with core.State("SEND_PID"):
+                core.d.comb += [
+                    phy.tx_valid.eq(1),
+                    phy.tx_data.eq(_pid_byte(tx_pid)),
+                ]
+                with core.If(phy.tx_ready):
+                    with core.If(tx_length == 0):
+                        core.next = "SEND_CRC0"
+                    with core.Else():
+                        core.next = "SEND_DATA"
+
+            with core.State("SEND_DATA"):
+                core.d.comb += [
+                    phy.tx_valid.eq(1),
+                    phy.tx_data.eq(tx_source[ep]),
+                    tx_next.eq(tx_index + phy.tx_ready),
+                ]
+                with core.If(phy.tx_ready):
+                    sync += [
+                        tx_crc.eq(_crc_next(_CRC16_TERMS, tx_crc, phy.tx_data)),
+                        tx_index.eq(tx_index + 1),
+                    ]
+                    with core.If(tx_index == tx_length - 1):
+                        core.next = "SEND_CRC0"
+
+            with core.State("SEND_CRC0"):
+                core.d.comb += [
+                    phy.tx_valid.eq(1),
+                    phy.tx_data.eq(~tx_crc[:8]),
+                ]
+                with core.If(phy.tx_ready):
+                    core.next = "SEND_CRC1"
+
+            with core.State("SEND_CRC1"):
+                core.d.comb += [
+                    phy.tx_valid.eq(1),
+                    phy.tx_data.eq(~tx_crc[8:]),
+                ]
+                with core.If(phy.tx_ready):
+                    sync += timer.eq(0)
+                    core.next = "WAIT_ACK"
+
+            with core.State("WAIT_ACK"):
+                with core.If(~phy.rx_active):
+                    sync += timer.eq(timer + 1)
+                with core.If(rx_end):
+                    with core.If(rx_handshake & (rx_pid == _PID_ACK)):
+                        sync += in_toggle.bit_select(ep, 1).eq(~in_toggle.bit_select(ep, 1))
+                        with core.If(ep == 0):
+                            with core.If(ctrl_stage == _CTRL_DATA_IN):
+                                sync += [
+                                    ctrl_offset.eq(ctrl_offset + tx_length),
+                                    ctrl_remaining.eq(ctrl_remaining - tx_length),
+                                ]
+                                with core.If((tx_length < 64) |
+                                             ((ctrl_remaining == tx_length) & ~ctrl_short)):
+                                    sync += ctrl_stage.eq(_CTRL_STATUS_OUT)
+                            with core.If(ctrl_stage == _CTRL_STATUS_IN):
+                                sync += ctrl_stage.eq(_CTRL_IDLE)
+                                with core.If(set_address):
+                                    sync += [
+                                        self.address.eq(new_address),
+                                        set_address.eq(0),
+                                    ]
+                        for number, buffer in enumerate(in_buffers, 1):
+                            core.d.comb += buffer.r_release.eq(ep == number)
+                    with core.Elif(rx_for_us):
+                        sync += token_retry.eq(1)
+                    core.next = "IDLE"
+                with core.Elif(timer == _TIMEOUT):
+                    core.next = "IDLE"
+
+        return m
+
+
+class USBBenchmark(Elaboratable):
+    """Stream data through the bulk endpoints of a :class:`USBDevice` for ``phy`` as fast as the
+    host transfers it, for :func:`bulk_benchmark`.
+
+    Endpoint 1 IN sends a counting pattern, in which each byte is the previous one plus one,
+    modulo 256; ``in_bytes`` counts the bytes written to it. Endpoint 1 OUT counts the bytes it
+    receives in ``out_bytes``, and the ones that do not follow the same pattern, starting from 0
+    when the host selects the configuration, in ``out_errors``. The keyword arguments are passed
+    to :class:`USBDevice`.
+    """
+    def __init__(self, phy, **kwargs):
+        self.device = USBDevice(phy, endpoints=1, **kwargs)
+
+        self.in_bytes   = Signal(48)
+        self.out_bytes  = Signal(48)
+        self.out_errors = Signal(32)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.device = device = self.device
+        sync = m.d[device.phy.domain]
+        endpoint = device.endpoints[0]
+
+        m.d.comb += [
+            endpoint.in_data.eq(self.in_bytes[:8]),
+            endpoint.in_valid.eq(1),
+            endpoint.out_ready.eq(1),
+        ]
+        with m.If(endpoint.in_ready):
+            sync += self.in_bytes.eq(self.in_bytes + 1)
+
+        with m.If(~device.configured):
+            sync += [
+                self.out_bytes.eq(0),
+                self.out_errors.eq(0),
+            ]
+        with m.Elif(endpoint.out_valid):
+            sync += self.out_bytes.eq(self.out_bytes + 1)
+            with m.If(endpoint.out_data != self.out_bytes[:8]):
+                sync += self.out_errors.eq(self.out_errors + 1)
+
+        return m
+
+
+def bulk_benchmark(device, *, length=16 << 20, chunk_size=64 << 10, timeout=1000):
+    """Measure the throughput of a board running :class:`USBBenchmark`.
+
+    ``device`` is a configured USB device, such as a ``usb.core.Device`` of PyUSB, with ``read``
+    and ``write`` methods taking an endpoint address, a size or data, and a timeout in
+    milliseconds. ``length`` bytes are read from endpoint 1 IN, and then written to endpoint 1
+    OUT, in chunks of ``chunk_size`` bytes.
+
+    Returns a dictionary with the number of bytes ``read`` and ``written``, the number of
+    ``errors`` (bytes read that do not follow the counting pattern), and the ``read_throughput``
+    and ``write_throughput`` in bytes per second.
+    """
+    pattern = bytes(range(256)) * (chunk_size // 256 + 2)
+
+    read     = 0
+    errors   = 0
+    expected = None
+    start    = time.perf_counter()
+    while read < length:
+        chunk = bytes(device.read(0x81, min(chunk_size, length - read), timeout))
+        if not chunk:
+            break
+        if expected is None:
+            expected = chunk[0]
+        reference = pattern[expected:expected + len(chunk)]
+        if chunk != reference:
+            errors += sum(1 for byte, ref in zip(chunk, reference) if byte != ref)
+        expected = (chunk[-1] + 1) % 256
+        read += len(chunk)
+    read_elapsed = time.perf_counter() - start
+
+    written = 0
+    start   = time.perf_counter()
+    while written < length:
+        size = min(chunk_size, length - written)
+        written += device.write(0x01, pattern[written % 256:written % 256 + size], timeout)
+    write_elapsed = time.perf_counter() - start
+
+    return {
+        "read":             read,
+        "written":          written,
+        "errors":           errors,
+        "read_throughput":  read / read_elapsed if read_elapsed else 0.0,
+        "write_throughput": written / write_elapsed if write_elapsed else 0.0,
+    }
+
+
+def _crc_bits(bits, poly, crc):
+    for bit in bits:
+        crc = (crc >> 1) ^ (poly if (crc ^ bit) & 1 else 0)
+    return crc
+
+
+def _token(pid, addr, endp):
+    value = addr | endp << 7
+    crc5  = ~_crc_bits([value >> bit & 1 for bit in range(11)], 0x14, 0x1f) & 0x1f
+    value |= crc5 << 11
+    return bytes([pid | (~pid & 0xf) << 4, value & 0xff, value >> 8])
+
+
+def _crc16(data):
+    return ~_crc_bits([byte >> bit & 1 for byte in data for bit in range(8)],
+                      0xa001, 0xffff) & 0xffff
+
+
+def _packet(pid, payload=None):
+    packet = bytes([pid | (~pid & 0xf) << 4])
+    if payload is not None:
+        packet += payload + _crc16(payload).to_bytes(2, "little")
+    return packet
+
+
+class _SimulatedPHY(USBPHY):
+    # PHY whose signals are driven by a testbench, in the `sync` domain.
+    def __init__(self, *, high_speed_capable):
+        super().__init__(domain="sync")
+        self.high_speed_capable = high_speed_capable
+
+    def elaborate(self, platform):
+        return Module()
+
+
+class _PHYTransport:
+    # Packets exchanged through a simulated PHY, a byte every `byte_cycles` cycles, and `gap`
+    # cycles between packets.
+    def __init__(self, ctx, phy, *, byte_cycles, gap):
+        self.ctx         = ctx
+        self.phy         = phy
+        self.byte_cycles = byte_cycles
+        self.gap         = gap
+
+    async def send(self, packet):
+        ctx, phy = self.ctx, self.phy
+        ctx.set(phy.rx_active, 1)
+        await ctx.tick()
+        for byte in packet:
+            ctx.set(phy.rx_data, byte)
+            ctx.set(phy.rx_valid, 1)
+            await ctx.tick()
+            ctx.set(phy.rx_valid, 0)
+            for _ in range(self.byte_cycles - 1):
+                await ctx.tick()
+        ctx.set(phy.rx_active, 0)
+        for _ in range(self.gap):
+            await ctx.tick()
+
+    async def receive(self, timeout=100):
+        ctx, phy = self.ctx, self.phy
+        for _ in range(timeout):
+            if ctx.get(phy.tx_valid):
+                break
+            await ctx.tick()
+        else:
+            return None
+        packet = bytearray()
+        while ctx.get(phy.tx_valid):
+            packet.append(ctx.get(phy.tx_data))
+            ctx.set(phy.tx_ready, 1)
+            await ctx.tick()
+            ctx.set(phy.tx_ready, 0)
+            for _ in range(self.byte_cycles - 1):
+                await ctx.tick()
+        for _ in range(self.gap):
+            await ctx.tick()
+        return bytes(packet)
+
+
+class _ULPITransport:
+    # Packets exchanged through a model of a ULPI PHY, which accepts a byte in every cycle.
+    def __init__(self, ctx, pads):
+        self.ctx       = ctx
+        self.pads      = pads
+        self.state     = "IDLE"
+        self.registers = {}
+        self.packets   = []
+        self.chirps    = 0
+
+    async def cycle(self, *, dir=0, nxt=0, data=0):
+        ctx, pads = self.ctx, self.pads
+        if dir:
+            self.state = "IDLE"
+        else:
+            command = ctx.get(pads.data.oe) != 0
+            value   = ctx.get(pads.data.o)
+            stp     = ctx.get(pads.stp.o)
+            if self.state == "IDLE" and command and value & 0xc0 == 0x80:
+                self.state    = "REG_DATA"
+                self.reg_addr = value & 0x3f
+                nxt = 1
+            elif self.state == "IDLE" and command and value == 0x40:
+                self.state = "CHIRP"
+                nxt = 1
+            elif self.state == "IDLE" and command and value & 0xc0 == 0x40:
+                self.state  = "TX"
+                self.packet = bytearray([value & 0xf | (~value & 0xf) << 4])
+                nxt = 1
+            elif self.state == "REG_DATA":
+                self.state    = "REG_STP"
+                self.reg_data = value
+                nxt = 1
+            elif self.state == "REG_STP" and stp:
+                self.registers[self.reg_addr] = self.reg_data
+                self.state = "IDLE"
+            elif self.state in ("TX", "CHIRP") and stp:
+                if self.state == "TX":
+                    self.packets.append(bytes(self.packet))
+                else:
+                    self.chirps += 1
+                self.state = "IDLE"
+            elif self.state in ("TX", "CHIRP"):
+                # Chirps are sent as zeros, which are not recorded.
+                if self.state == "TX":
+                    self.packet.append(value)
+                nxt = 1
+        ctx.set(pads.dir.i, dir)
+        ctx.set(pads.nxt.i, nxt)
+        ctx.set(pads.data.i, data)
+        await ctx.tick()
+
+    async def idle(self, cycles):
+        for _ in range(cycles):
+            await self.cycle()
+
+    async def linestate(self, linestate):
+        while self.state != "IDLE":
+            await self.cycle()
+        await self.cycle(dir=1)
+        await self.cycle(dir=1, data=linestate)
+        await self.cycle()
+
+    async def send(self, packet):
+        while self.state != "IDLE":
+            await self.cycle()
+        await self.cycle(dir=1, nxt=1)
+        for byte in packet:
+            await self.cycle(dir=1, nxt=1, data=byte)
+        await self.cycle()
+        await self.idle(4)
+
+    async def receive(self, timeout=100):
+        for _ in range(timeout):
+            if self.packets:
+                break
+            await self.cycle()
+        else:
+            return None
+        await self.idle(4)
+        return self.packets.pop(0)
+
+
+class _SimulatedHost:
+    # USB host issuing transactions to the device at address `address`, and checking the
+    # responses with `test`.
+    def __init__(self, transport, test):
+        self.transport = transport
+        self.test      = test
+        self.address   = 0
+        self.toggles   = {}
+
+    async def setup(self, request):
+        await self.transport.send(_token(_PID_SETUP, self.address, 0))
+        await self.transport.send(_packet(_PID_DATA0, request))
+        return await self.transport.receive()
+
+    async def control_in(self, request):
+        self.test.assertEqual(await self.setup(request), _packet(_PID_ACK))
+        length = int.from_bytes(request[6:8], "little")
+        data   = bytearray()
+        toggle = 1
+        while len(data) < length:
+            await self.transport.send(_token(_PID_IN, self.address, 0))
+            response = await self.transport.receive()
+            if response == _packet(_PID_STALL):
+                return None
+            self.test.assertEqual(response[0] & 0xf, _PID_DATA1 if toggle else _PID_DATA0)
+            self.test.assertEqual(_crc16(response[1:-2]).to_bytes(2, "little"), response[-2:])
+            await self.transport.send(_packet(_PID_ACK))
+            data += response[1:-2]
+            toggle ^= 1
+            if len(response) - 3 < 64:
+                break
+        await self.transport.send(_token(_PID_OUT, self.address, 0))
+        await self.transport.send(_packet(_PID_DATA1, b""))
+        self.test.assertEqual(await self.transport.receive(), _packet(_PID_ACK))
+        return bytes(data)
+
+    async def control_out(self, request):
+        self.test.assertEqual(await self.setup(request), _packet(_PID_ACK))
+        await self.transport.send(_token(_PID_IN, self.address, 0))
+        response = await self.transport.receive()
+        if response == _packet(_PID_STALL):
+            return False
+        self.test.assertEqual(response, _packet(_PID_DATA1, b""))
+        await self.transport.send(_packet(_PID_ACK))
+        return True
+
+    async def get_descriptor(self, descriptor_type, index=0, length=0xff):
+        return await self.control_in(bytes([0x80, 6, index, descriptor_type, 0, 0]) +
+                                     length.to_bytes(2, "little"))
+
+    async def enumerate(self, address):
+        self.test.assertTrue(await self.control_out(bytes([0x00, 5, address, 0, 0, 0, 0, 0])))
+        self.address = address
+        self.test.assertTrue(await self.control_out(bytes([0x00, 9, 1, 0, 0, 0, 0, 0])))
+
+    async def bulk_in(self, endp, *, ack=True):
+        await self.transport.send(_token(_PID_IN, self.address, endp))
+        response = await self.transport.receive()
+        if response[0] & 0xf in (_PID_NAK, _PID_STALL):
+            return response[0] & 0xf
+        toggle = self.toggles.get((endp, "in"), 0)
+        self.test.assertEqual(response[0] & 0xf, _PID_DATA1 if toggle else _PID_DATA0)
+        self.test.assertEqual(_crc16(response[1:-2]).to_bytes(2, "little"), response[-2:])
+        if ack:
+            await self.transport.send(_packet(_PID_ACK))
+            self.toggles[endp, "in"] = toggle ^ 1
+        return response[1:-2]
+
+    async def bulk_out(self, endp, payload):
+        toggle = self.toggles.get((endp, "out"), 0)
+        await self.transport.send(_token(_PID_OUT, self.address, endp))
+        await self.transport.send(_packet(_PID_DATA1 if toggle else _PID_DATA0, payload))
+        response = await self.transport.receive()
+        if response == _packet(_PID_ACK):
+            self.toggles[endp, "out"] = toggle ^ 1
+        return response[0] & 0xf
+
+
+class TestCase(unittest.TestCase):
+    def test_crc(self):
+        from amaranth.sim import Simulator
+
+        token = _token(_PID_IN, 0x15, 0xe)
+        data  = _packet(_PID_DATA0, bytes(range(37)))
+        crc5  = Signal(5, init=0x1f)
+        crc16 = Signal(16, init=0xffff)
+        byte  = Signal(8)
+        m = Module()
+        m.d.sync += [
+            crc5.eq(_crc_next(_CRC5_TERMS, crc5, byte)),
+            crc16.eq(_crc_next(_CRC16_TERMS, crc16, byte)),
+        ]
+
+        async def testbench(ctx):
+            for value in token[1:]:
+                ctx.set(byte, value)
+                await ctx.tick()
+            self.assertEqual(ctx.get(crc5), _CRC5_RESIDUE)
+            ctx.set(crc16, 0xffff)
+            for value in data[1:]:
+                ctx.set(byte, value)
+                await ctx.tick()
+            self.assertEqual(ctx.get(crc16), _CRC16_RESIDUE)
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_full_speed_phy(self):
+        from amaranth.sim import Simulator
+
+        class Pads:
+            def __init__(self):
+                self.d_p = io.SimulationPort("io", 1)
+                self.d_n = io.SimulationPort("io", 1)
+
+        tx_pads, rx_pads = Pads(), Pads()
+        tx_phy, rx_phy = USBFSPHY(tx_pads), USBFSPHY(rx_pads)
+        se0 = Signal()
+        m = Module()
+        m.submodules.tx = tx_phy
+        m.submodules.rx = rx_phy
+        m.d.comb += [
+            rx_pads.d_p.i.eq(Mux(tx_pads.d_p.oe, tx_pads.d_p.o, ~se0)),
+            rx_pads.d_n.i.eq(Mux(tx_pads.d_n.oe, tx_pads.d_n.o, 0)),
+        ]
+
+        # Runs of ones exercise bit stuffing, including right before the end of packet.
+        packet = _packet(_PID_DATA1, bytes([0xff, 0x7e, 0x3f, 0x00, 0xfc, 0xff]))
+        received = []
+        async def transmitter(ctx):
+            for count in range(1, 3):
+                ctx.set(tx_phy.tx_valid, 1)
+                for byte in packet:
+                    ctx.set(tx_phy.tx_data, byte)
+                    await ctx.tick("usb").until(tx_phy.tx_ready)
+                ctx.set(tx_phy.tx_valid, 0)
+                while len(received) < count:
+                    await ctx.tick("usb")
+                await ctx.tick("usb").repeat(20)
+            self.assertFalse(ctx.get(rx_phy.bus_reset))
+            ctx.set(se0, 1)
+            await ctx.tick("usb").repeat(_FS_RESET_CYCLES + 4)
+            self.assertTrue(ctx.get(rx_phy.bus_reset))
+
+        async def receiver(ctx):
+            data  = bytearray()
+            error = False
+            async for _, _, rx_active, rx_valid, rx_data, rx_error in ctx.tick("usb").sample(
+                    rx_phy.rx_active, rx_phy.rx_valid, rx_phy.rx_data, rx_phy.rx_error):
+                if rx_valid:
+                    data.append(rx_data)
+                error |= bool(rx_error)
+                if data and not rx_active:
+                    received.append((bytes(data), error))
+                    data  = bytearray()
+                    error = False
+
+        sim = Simulator(m)
+        sim.add_clock(1 / 48e6, domain="usb")
+        sim.add_testbench(transmitter)
+        sim.add_testbench(receiver, background=True)
+        sim.run()
+
+        self.assertEqual(received, [(packet, False)] * 2)
+
+    def test_ulpi(self):
+        from amaranth.sim import Simulator
+
+        class Pads:
+            def __init__(self):
+                self.data = io.SimulationPort("io", 8)
+                self.clk  = io.SimulationPort("i", 1)
+                self.dir  = io.SimulationPort("i", 1)
+                self.nxt  = io.SimulationPort("i", 1)
+                self.stp  = io.SimulationPort("o", 1)
+
+        pads   = Pads()
+        phy    = ULPIPHY(pads, domain="sync")
+        device = USBDevice(phy)
+        descriptors = device.descriptors
+        finished = False
+
+        async def testbench(ctx):
+            ulpi = _ULPITransport(ctx, pads)
+            await ulpi.idle(10)
+            self.assertEqual(ulpi.registers, {
+                _ULPI_OTG_CONTROL:      0x00,
+                _ULPI_FUNCTION_CONTROL: _ULPI_FULL_SPEED,
+            })
+
+            host = _SimulatedHost(ulpi, self)
+            self.assertEqual(await host.get_descriptor(1, length=64), descriptors[1, 0][0])
+            await host.enumerate(3)
+
+            # Bus reset, followed by the chirp handshake.
+            await ulpi.linestate(_LINE_SE0)
+            await ulpi.idle(_ULPI_RESET_CYCLES + 10)
+            self.assertEqual(ulpi.registers[_ULPI_FUNCTION_CONTROL], _ULPI_CHIRP)
+            while not ulpi.chirps:
+                await ulpi.cycle()
+            for _ in range(3):
+                for linestate in (_LINE_K, _LINE_J):
+                    await ulpi.linestate(linestate)
+                    await ulpi.idle(2 * _ULPI_RESET_CYCLES)
+            await ulpi.linestate(_LINE_SE0)
+            await ulpi.idle(10)
+            self.assertEqual(ulpi.registers[_ULPI_FUNCTION_CONTROL], _ULPI_HIGH_SPEED)
+            self.assertTrue(ctx.get(phy.high_speed))
+            self.assertEqual(ctx.get(device.address), 0)
+
+            host = _SimulatedHost(ulpi, self)
+            self.assertEqual(await host.get_descriptor(2), descriptors[2, 0][1])
+            await host.enumerate(3)
+            self.assertEqual(await host.bulk_in(1), _PID_NAK)
+            self.assertEqual(await host.bulk_out(1, bytes(512)), _PID_ACK)
+            nonlocal finished
+            finished = True
+
+        async def clock(ctx):
+            while not finished:
+                ctx.set(pads.clk.i, 1)
+                await ctx.delay(1 / 120e6)
+                ctx.set(pads.clk.i, 0)
+                await ctx.delay(1 / 120e6)
+
+        sim = Simulator(device)
+        sim.add_process(clock)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def simulate_device(self, dut, phy, process, *, high_speed=False):
+        from amaranth.sim import Simulator
+
+        m = Module()
+        m.submodules.dut = dut
+        cycles = Signal(32)
+        m.d.sync += cycles.eq(cycles + 1)
+
+        async def testbench(ctx):
+            ctx.set(phy.high_speed, high_speed)
+            # A byte takes 32 cycles at full speed (48 MHz), and a cycle at high speed (60 MHz).
+            # The gaps between packets include the SYNC and end of packet.
+            if high_speed:
+                transport = _PHYTransport(ctx, phy, byte_cycles=1, gap=8)
+            else:
+                transport = _PHYTransport(ctx, phy, byte_cycles=32, gap=64)
+            host = _SimulatedHost(transport, self)
+            await process(ctx, host, cycles)
+
+        sim = Simulator(m)
+        sim.add_clock(1 / 60e6 if high_speed else 1 / 48e6)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_enumerate(self):
+        for high_speed_capable in (False, True):
+            with self.subTest(high_speed_capable=high_speed_capable):
+                phy    = _SimulatedPHY(high_speed_capable=high_speed_capable)
+                device = USBDevice(phy, serial="1234", endpoints=2)
+                descriptors = device.descriptors
+
+                async def process(ctx, host, cycles):
+                    self.assertEqual(await host.get_descriptor(1, length=64),
+                                     descriptors[1, 0][0])
+                    await host.enumerate(5)
+                    self.assertEqual(ctx.get(device.address), 5)
+                    self.assertEqual(ctx.get(device.configured), 1)
+                    # Read the configuration descriptor as hosts do, first its header only.
+                    self.assertEqual(await host.get_descriptor(2, length=9),
+                                     descriptors[2, 0][0][:9])
+                    self.assertEqual(await host.get_descriptor(2), descriptors[2, 0][0])
+                    self.assertEqual(await host.get_descriptor(3, 3), _string_descriptor("1234"))
+                    self.assertEqual(await host.get_descriptor(3, 9), None)
+                    self.assertEqual(await host.get_descriptor(6, length=10),
+                                     descriptors[6, 0][0] if high_speed_capable else None)
+                    self.assertEqual(await host.control_in(bytes([0x80, 8, 0, 0, 0, 0, 1, 0])),
+                                     b"\x01")
+                    self.assertFalse(await host.control_out(bytes([0x00, 3, 1, 0, 0, 0, 0, 0])))
+                    self.assertEqual(await host.bulk_in(3), _PID_STALL)
+
+                self.simulate_device(device, phy, process)
+
+    def test_bulk(self):
+        phy    = _SimulatedPHY(high_speed_capable=True)
+        device = USBDevice(phy)
+        endpoint = device.endpoints[0]
+
+        async def process(ctx, host, cycles):
+            await host.enumerate(1)
+            self.assertEqual(await host.bulk_in(1), _PID_NAK)
+
+            # A short packet is sent once the last byte is written.
+            for n, byte in enumerate(b"hello"):
+                ctx.set(endpoint.in_data, byte)
+                ctx.set(endpoint.in_valid, 1)
+                ctx.set(endpoint.in_last, n == 4)
+                await ctx.tick()
+            ctx.set(endpoint.in_valid, 0)
+            # If the ACK of the host is lost, the same packet is sent again.
+            self.assertEqual(await host.bulk_in(1, ack=False), b"hello")
+            self.assertEqual(await host.bulk_in(1), b"hello")
+            self.assertEqual(await host.bulk_in(1), _PID_NAK)
+
+            # Both packet buffers can be filled before the design reads them.
+            packets = [bytes(range(n, n + 64)) for n in range(3)]
+            self.assertEqual(await host.bulk_out(1, packets[0]), _PID_ACK)
+            self.assertEqual(await host.bulk_out(1, packets[1]), _PID_ACK)
+            self.assertEqual(await host.bulk_out(1, packets[2]), _PID_NAK)
+            received = bytearray()
+            ctx.set(endpoint.out_ready, 1)
+            lasts = 0
+            for _ in range(200):
+                if ctx.get(endpoint.out_valid):
+                    received.append(ctx.get(endpoint.out_data))
+                    lasts += ctx.get(endpoint.out_last)
+                await ctx.tick()
+            self.assertEqual(bytes(received), packets[0] + packets[1])
+            self.assertEqual(lasts, 2)
+            self.assertEqual(await host.bulk_out(1, packets[2]), _PID_ACK)
+
+            # A retransmitted packet, with the same data toggle, is acknowledged and dropped.
+            host.toggles[1, "out"] ^= 1
+            self.assertEqual(await host.bulk_out(1, packets[2]), _PID_ACK)
+            await ctx.tick().repeat(10)
+            self.assertFalse(ctx.get(endpoint.out_valid))
+
+        self.simulate_device(device, phy, process)
+
+    def test_benchmark(self):
+        for high_speed in (False, True):
+            with self.subTest(high_speed=high_speed):
+                phy   = _SimulatedPHY(high_speed_capable=True)
+                bench = USBBenchmark(phy)
+
+                async def process(ctx, host, cycles, high_speed=high_speed):
+                    await host.enumerate(1)
+                    max_packet = 512 if high_speed else 64
+                    clk_frequency = 60e6 if high_speed else 48e6
+                    count = 32 if high_speed else 8
+                    # Let the packet buffers fill, as they would while the host is idle.
+                    await ctx.tick().repeat(2 * max_packet)
+
+                    data  = bytearray()
+                    start = ctx.get(cycles)
+                    for _ in range(count):
+                        data += await host.bulk_in(1)
+                    elapsed = (ctx.get(cycles) - start) / clk_frequency
+                    self.assertEqual(len(data), count * max_packet)
+                    self.assertEqual(bytes(data), bytes((data[0] + n) % 256
+                                                        for n in range(len(data))))
+                    throughput = len(data) / elapsed
+                    self.assertGreater(throughput, 40e6 if high_speed else 0.9e6)
+
+                    pattern = bytes(n % 256 for n in range(count * max_packet))
+                    start   = ctx.get(cycles)
+                    for offset in range(0, len(pattern), max_packet):
+                        self.assertEqual(await host.bulk_out(1, pattern[offset:][:max_packet]),
+                                         _PID_ACK)
+                    elapsed = (ctx.get(cycles) - start) / clk_frequency
+                    self.assertGreater(len(pattern) / elapsed, 40e6 if high_speed else 0.9e6)
+                    await ctx.tick().repeat(max_packet + 10)
+                    self.assertEqual(ctx.get(bench.out_bytes), len(pattern))
+                    self.assertEqual(ctx.get(bench.out_errors), 0)
+
+                self.simulate_device(bench, phy, process, high_speed=high_speed)
+
+    def test_bulk_benchmark(self):
+        class Device:
+            def __init__(self):
+                self.offset  = 7
+                self.written = bytearray()
+
+            def read(self, endpoint, size, timeout):
+                assert endpoint == 0x81
+                data = bytes((self.offset + n) % 256 for n in range(min(size, 1000)))
+                self.offset += len(data)
+                return data
+
+            def write(self, endpoint, data, timeout):
+                assert endpoint == 0x01
+                self.written += data[:700]
+                return min(len(data), 700)
+
+        device  = Device()
+        results = bulk_benchmark(device, length=10000, chunk_size=4096)
+        self.assertEqual(results["read"], 10000)
+        self.assertEqual(results["written"], 10000)
+        self.assertEqual(results["errors"], 0)
+        self.assertEqual(bytes(device.written), bytes(n % 256 for n in range(10000)))
+        self.assertGreater(results["read_throughput"], 0)
+
+    def test_elaborate(self):
+        from .ulx3s import ULX3S_85F_Platform
+        from .tang_primer_20k import TangPrimer20kDockPlatform
+        from .ecpix5 import ECPIX545Platform
+        from .icebreaker import ICEBreakerPlatform
+
+        class Top(Elaboratable):
+            def elaborate(self, platform):
+                m = Module()
+                self.phy = phy = usb_phy(platform)
+                m.submodules.bench = USBBenchmark(phy)
+                m.domains.usb = ClockDomain()
+                if isinstance(phy, USBFSPHY):
+                    # In a real design, the 48 MHz clock is generated by a PLL.
+                    m.d.comb += ClockSignal("usb").eq(ClockSignal())
+                return m
+
+        for platform, phy_type in ((ULX3S_85F_Platform(), USBFSPHY),
+                                   (TangPrimer20kDockPlatform(), ULPIPHY),
+                                   (ECPIX545Platform(), ULPIPHY)):
+            with self.subTest(platform=type(platform).__name__):
+                top = Top()
+                platform.prepare(top)
+                self.assertIsInstance(top.phy, phy_type)
+
+        with self.assertRaisesRegex(NotImplementedError, r"^ICEBreakerPlatform has no USB port$"):
+            usb_phy(ICEBreakerPlatform())
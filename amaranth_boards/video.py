@@ -0,0 +1,1052 @@
+import re
+import unittest
+
+from amaranth import *
+from amaranth.lib import io
+from amaranth.lib.cdc import FFSynchronizer
+from amaranth.lib.memory import Memory
+
+
+__all__ = [
+    "VideoMode", "video_mode", "VideoTiming", "TMDSEncoder", "VideoOutput", "DVIOutput",
+    "ADV7513Output", "IT6613EOutput", "video_output",
+]
+
+
+class VideoMode:
+    """Timings of a video mode.
+
+    ``pixel_clock`` is in Hz. The horizontal timings are in pixels and the vertical timings in
+    lines: each line or frame is made of the active area, the front porch, the sync pulse and
+    the back porch, in this order. The sync pulses are active high if ``h_sync_positive`` and
+    ``v_sync_positive`` are true.
+    """
+    def __init__(self, name, *, pixel_clock, h_active, h_front, h_sync, h_back, v_active,
+                 v_front, v_sync, v_back, h_sync_positive=True, v_sync_positive=True):
+        self.name            = name
+        self.pixel_clock     = pixel_clock
+        self.h_active        = h_active
+        self.h_front         = h_front
+        self.h_sync          = h_sync
+        self.h_back          = h_back
+        self.v_active        = v_active
+        self.v_front         = v_front
+        self.v_sync          = v_sync
+        self.v_back          = v_back
+        self.h_sync_positive = h_sync_positive
+        self.v_sync_positive = v_sync_positive
+
+    @property
+    def h_total(self):
+        return self.h_active + self.h_front + self.h_sync + self.h_back
+
+    @property
+    def v_total(self):
+        return self.v_active + self.v_front + self.v_sync + self.v_back
+
+    @property
+    def refresh_rate(self):
+        return self.pixel_clock / (self.h_total * self.v_total)
+
+    def __repr__(self):
+        return "VideoMode({!r})".format(self.name)
+
+
+# CEA-861 and VESA DMT timings.
+_VIDEO_MODES = {mode.name: mode for mode in (
+    VideoMode("640x480@60", pixel_clock=25.175e6,
+              h_active=640, h_front=16, h_sync=96, h_back=48,
+              v_active=480, v_front=10, v_sync=2, v_back=33,
+              h_sync_positive=False, v_sync_positive=False),
+    VideoMode("800x600@60", pixel_clock=40e6,
+              h_active=800, h_front=40, h_sync=128, h_back=88,
+              v_active=600, v_front=1, v_sync=4, v_back=23),
+    VideoMode("1280x720@60", pixel_clock=74.25e6,
+              h_active=1280, h_front=110, h_sync=40, h_back=220,
+              v_active=720, v_front=5, v_sync=5, v_back=20),
+    VideoMode("1920x1080@30", pixel_clock=74.25e6,
+              h_active=1920, h_front=88, h_sync=44, h_back=148,
+              v_active=1080, v_front=4, v_sync=5, v_back=36),
+    VideoMode("1920x1080@60", pixel_clock=148.5e6,
+              h_active=1920, h_front=88, h_sync=44, h_back=148,
+              v_active=1080, v_front=4, v_sync=5, v_back=36),
+)}
+
+
+def video_mode(name):
+    """Return the :class:`VideoMode` named ``name``, e.g. ``"1280x720@60"``."""
+    if name not in _VIDEO_MODES:
+        raise ValueError("Unknown video mode {!r}; known modes are {}"
+                         .format(name, ", ".join(_VIDEO_MODES)))
+    return _VIDEO_MODES[name]
+
+
+class VideoTiming(Elaboratable):
+    """Sync and blanking signals of ``mode``, a :class:`VideoMode`, in the ``domain`` clock
+    domain, which runs at its pixel clock.
+
+    ``x`` and ``y`` count the pixels and the lines from the top left corner of the active area,
+    in which ``active`` is asserted; ``hsync`` and ``vsync`` have the polarity of the mode, and
+    ``frame`` is asserted in the first cycle of each frame.
+    """
+    def __init__(self, mode, *, domain="pixel"):
+        self.mode   = mode
+        self.domain = domain
+
+        self.x      = Signal(range(mode.h_total))
+        self.y      = Signal(range(mode.v_total))
+        self.active = Signal()
+        self.hsync  = Signal()
+        self.vsync  = Signal()
+        self.frame  = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        mode = self.mode
+        sync = m.d[self.domain]
+
+        with m.If(self.x == mode.h_total - 1):
+            sync += self.x.eq(0)
+            with m.If(self.y == mode.v_total - 1):
+                sync += self.y.eq(0)
+            with m.Else():
+                sync += self.y.eq(self.y + 1)
+        with m.Else():
+            sync += self.x.eq(self.x + 1)
+
+        h_sync_start = mode.h_active + mode.h_front
+        v_sync_start = mode.v_active + mode.v_front
+        m.d.comb += [
+            self.active.eq((self.x < mode.h_active) & (self.y < mode.v_active)),
+            self.hsync.eq(((self.x >= h_sync_start) & (self.x < h_sync_start + mode.h_sync)) ==
+                          mode.h_sync_positive),
+            self.vsync.eq(((self.y >= v_sync_start) & (self.y < v_sync_start + mode.v_sync)) ==
+                          mode.v_sync_positive),
+            self.frame.eq((self.x == 0) & (self.y == 0)),
+        ]
+
+        return m
+
+
+# Symbols sent during blanking for each value of C1 and C0.
+_TMDS_CONTROL = [0b1101010100, 0b0010101011, 0b0101010100, 0b1010101011]
+
+
+class TMDSEncoder(Elaboratable):
+    """TMDS encoder of a channel of DVI, in the ``domain`` clock domain.
+
+    Encodes ``data`` while ``de`` is asserted, and the control bits ``c`` otherwise, into
+    ``symbol``, to be sent LSB first, two cycles later. The DC balance of the channel is kept
+    as described in the DVI 1.0 specification.
+    """
+    def __init__(self, *, domain="pixel"):
+        self.domain = domain
+
+        self.data   = Signal(8)
+        self.c      = Signal(2)
+        self.de     = Signal()
+        self.symbol = Signal(10)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        sync = m.d[self.domain]
+
+        # Stage 1: minimize the transitions with XOR or XNOR.
+        ones = sum(self.data[bit] for bit in range(8))
+        use_xnor = (ones > 4) | ((ones == 4) & ~self.data[0])
+        q_m = [self.data[0]]
+        for bit in range(1, 8):
+            q_m.append(Mux(use_xnor, ~(q_m[-1] ^ self.data[bit]), q_m[-1] ^ self.data[bit]))
+
+        q_m_r  = Signal(9)
+        c_r    = Signal(2)
+        de_r   = Signal()
+        sync += [
+            q_m_r.eq(Cat(*q_m, ~use_xnor)),
+            c_r.eq(self.c),
+            de_r.eq(self.de),
+        ]
+
+        # Stage 2: invert the data bits or not, to bring the running disparity towards zero.
+        count = Signal(signed(5))
+        ones  = Signal(4)
+        m.d.comb += ones.eq(sum(q_m_r[bit] for bit in range(8)))
+        diff = Signal(signed(5))
+        m.d.comb += diff.eq(ones - (8 - ones))
+
+        with m.If(~de_r):
+            sync += [
+                self.symbol.eq(Array(_TMDS_CONTROL)[c_r]),
+                count.eq(0),
+            ]
+        with m.Elif((count == 0) | (diff == 0)):
+            sync += self.symbol.eq(Cat(Mux(q_m_r[8], q_m_r[:8], ~q_m_r[:8]), q_m_r[8],
+                                       ~q_m_r[8]))
+            with m.If(q_m_r[8]):
+                sync += count.eq(count + diff)
+            with m.Else():
+                sync += count.eq(count - diff)
+        with m.Elif((~count[-1] & ~diff[-1]) | (count[-1] & diff[-1])):
+            sync += [
+                self.symbol.eq(Cat(~q_m_r[:8], q_m_r[8], 1)),
+                count.eq(count + Mux(q_m_r[8], 2, 0) - diff),
+            ]
+        with m.Else():
+            sync += [
+                self.symbol.eq(Cat(q_m_r[:8], q_m_r[8], 0)),
+                count.eq(count - Mux(q_m_r[8], 0, 2) + diff),
+            ]
+
+        return m
+
+
+class VideoOutput(Elaboratable):
+    """Video output in ``mode``, a :class:`VideoMode`, clocked by the ``domain`` clock domain
+    at its pixel clock, which must be defined by the design, e.g. with a PLL.
+
+    The design drives ``r``, ``g`` and ``b`` with the color of the pixel at ``x`` and ``y``, in
+    the same cycle; they are ignored outside of the active area, i.e. when ``active`` is
+    deasserted. ``frame`` is asserted in the first cycle of each frame.
+    """
+    def __init__(self, mode, *, domain):
+        self.mode   = mode
+        self.domain = domain
+
+        self.timing = VideoTiming(mode, domain=domain)
+        self.x      = self.timing.x
+        self.y      = self.timing.y
+        self.active = self.timing.active
+        self.frame  = self.timing.frame
+
+        self.r = Signal(8)
+        self.g = Signal(8)
+        self.b = Signal(8)
+
+    def _elaborate_pixels(self, m):
+        # Returns the color and the sync and data enable signals, registered together.
+        m.submodules.timing = timing = self.timing
+        r, g, b = Signal(8), Signal(8), Signal(8)
+        hsync   = Signal()
+        vsync   = Signal()
+        de      = Signal()
+        m.d[self.domain] += [
+            r.eq(Mux(timing.active, self.r, 0)),
+            g.eq(Mux(timing.active, self.g, 0)),
+            b.eq(Mux(timing.active, self.b, 0)),
+            hsync.eq(timing.hsync),
+            vsync.eq(timing.vsync),
+            de.eq(timing.active),
+        ]
+        return r, g, b, hsync, vsync, de
+
+
+class _ShiftSerializer(Elaboratable):
+    # Serializes `symbols`, sampled every 5 cycles of `domain`, which runs at 5 times the pixel
+    # clock and is aligned with it, into 2 bits per cycle for DDR outputs, `o[0]` first.
+    def __init__(self, width, *, domain):
+        self.domain  = domain
+        self.symbols = [Signal(10, name="symbol{}".format(n)) for n in range(width)]
+        self.o       = [Signal(width, name="o{}".format(n)) for n in range(2)]
+
+    def elaborate(self, platform):
+        m = Module()
+
+        sync = m.d[self.domain]
+
+        # The load enable comes straight from a flip-flop, as the domain runs at up to 371 MHz.
+        phase = Signal(5, init=1)
+        sync += phase.eq(phase.rotate_left(1))
+
+        for lane, symbol in enumerate(self.symbols):
+            shreg = Signal(10, name="shreg{}".format(lane))
+            with m.If(phase[4]):
+                sync += shreg.eq(symbol)
+            with m.Else():
+                sync += shreg.eq(shreg >> 2)
+            m.d.comb += [
+                self.o[0][lane].eq(shreg[0]),
+                self.o[1][lane].eq(shreg[1]),
+            ]
+
+        return m
+
+
+def _family(platform):
+    family = getattr(platform, "family", None)
+    if family in ("ecp5", "series7"):
+        return family
+    if str(getattr(platform, "series", "")).startswith("GW"):
+        return "gowin"
+    return None
+
+
+class DVIOutput(VideoOutput):
+    """DVI output on the TMDS pairs of an ``hdmi`` resource, ``pads``, requested with
+    ``dir="-"``.
+
+    Besides the ``domain`` clock domain at the pixel clock, requires the ``serial_domain`` clock
+    domain at 5 times the pixel clock and aligned with it, as the 10 bits of each symbol are
+    sent at both edges of its clock. The symbols are serialized with ``OSERDESE2`` on Xilinx
+    7-series FPGAs and ``OSER10`` on Gowin FPGAs, which run modes with a pixel clock of
+    74.25 MHz, i.e. 1280x720 at 60 Hz and 1920x1080 at 30 Hz. On other FPGAs, including the
+    ECP5, whose gearing is not available in the banks that boards wire to HDMI, a shift
+    register in the ``serial_domain`` clock domain feeds DDR output buffers; at 371.25 MHz, it
+    only meets timing on the faster speed grades.
+    """
+    def __init__(self, pads, mode, *, domain="pixel", serial_domain="pixel5x"):
+        super().__init__(mode, domain=domain)
+        self.pads          = pads
+        self.serial_domain = serial_domain
+
+    def _serialize_series7(self, m, symbols):
+        outputs = []
+        for lane, symbol in enumerate(symbols):
+            q      = Signal(name="tmds{}_q".format(lane))
+            shift1 = Signal(name="tmds{}_shift1".format(lane))
+            shift2 = Signal(name="tmds{}_shift2".format(lane))
+            common = dict(
+                p_DATA_RATE_OQ="DDR",
+                p_DATA_RATE_TQ="SDR",
+                p_DATA_WIDTH=10,
+                p_TRISTATE_WIDTH=1,
+                i_CLK=ClockSignal(self.serial_domain),
+                i_CLKDIV=ClockSignal(self.domain),
+                i_RST=ResetSignal(self.domain),
+                i_OCE=1,
+                i_TCE=0,
+                i_T1=0,
+            )
+            # The first bit sent is D1; the slave holds the last two in D3 and D4.
+            m.submodules["tmds{}_master".format(lane)] = Instance("OSERDESE2",
+                p_SERDES_MODE="MASTER",
+                **common,
+                **{"i_D{}".format(n + 1): symbol[n] for n in range(8)},
+                i_SHIFTIN1=shift1,
+                i_SHIFTIN2=shift2,
+                o_OQ=q,
+            )
+            m.submodules["tmds{}_slave".format(lane)] = Instance("OSERDESE2",
+                p_SERDES_MODE="SLAVE",
+                **common,
+                i_D1=0, i_D2=0, i_D3=symbol[8], i_D4=symbol[9],
+                i_D5=0, i_D6=0, i_D7=0, i_D8=0,
+                i_SHIFTIN1=0,
+                i_SHIFTIN2=0,
+                o_SHIFTOUT1=shift1,
+                o_SHIFTOUT2=shift2,
+            )
+            outputs.append(q)
+        return outputs
+
+    def _serialize_gowin(self, m, symbols):
+        outputs = []
+        for lane, symbol in enumerate(symbols):
+            q = Signal(name="tmds{}_q".format(lane))
+            m.submodules["tmds{}_oser10".format(lane)] = Instance("OSER10",
+                p_GSREN="false",
+                p_LSREN="true",
+                i_PCLK=ClockSignal(self.domain),
+                i_FCLK=ClockSignal(self.serial_domain),
+                i_RESET=ResetSignal(self.domain),
+                **{"i_D{}".format(n): symbol[n] for n in range(10)},
+                o_Q=q,
+            )
+            outputs.append(q)
+        return outputs
+
+    def elaborate(self, platform):
+        m = Module()
+
+        r, g, b, hsync, vsync, de = self._elaborate_pixels(m)
+
+        # Channel 0 carries blue and the sync signals; the clock is sent as a symbol as well, so
+        # that it is aligned with the data.
+        symbols = []
+        for lane, (data, c) in enumerate(((b, Cat(hsync, vsync)), (g, 0), (r, 0))):
+            encoder = TMDSEncoder(domain=self.domain)
+            m.submodules["tmds{}".format(lane)] = encoder
+            m.d.comb += [
+                encoder.data.eq(data),
+                encoder.c.eq(c),
+                encoder.de.eq(de),
+            ]
+            symbols.append(encoder.symbol)
+        symbols.append(C(0b0000011111, 10))
+
+        pads   = self.pads
+        family = _family(platform)
+        if family in ("series7", "gowin"):
+            if family == "series7":
+                outputs = self._serialize_series7(m, symbols)
+            else:
+                outputs = self._serialize_gowin(m, symbols)
+            # Emulated LVDS outputs are available in all the banks of GW1N devices, unlike true
+            # LVDS outputs.
+            if family == "gowin" and platform.series.startswith("GW1N"):
+                obuf = "ELVDS_OBUF"
+            else:
+                obuf = {"series7": "OBUFDS", "gowin": "TLVDS_OBUF"}[family]
+            for lane, q in enumerate(outputs):
+                port = pads.clk if lane == 3 else pads.d
+                bit  = 0 if lane == 3 else lane
+                m.submodules["tmds{}_buf".format(lane)] = Instance(obuf,
+                    i_I=q, o_O=port.p[bit], o_OB=port.n[bit])
+        else:
+            m.submodules.serializer = serializer = _ShiftSerializer(4, domain=self.serial_domain)
+            for symbol, input in zip(symbols, serializer.symbols):
+                m.d.comb += input.eq(symbol)
+            m.submodules.d   = d   = io.DDRBuffer("o", pads.d,   o_domain=self.serial_domain)
+            m.submodules.clk = clk = io.DDRBuffer("o", pads.clk, o_domain=self.serial_domain)
+            m.d.comb += [
+                d.o[0].eq(serializer.o[0][:3]),
+                d.o[1].eq(serializer.o[1][:3]),
+                clk.o[0].eq(serializer.o[0][3]),
+                clk.o[1].eq(serializer.o[1][3]),
+            ]
+
+        return m
+
+
+class _I2CSequencer(Elaboratable):
+    # Writes the registers of the I2C device at `address`, as listed in `sequence` by tuples of
+    # the register, a mask of the bits to change, and their value, at 100 kHz, starting
+    # `delay` cycles after reset. Registers with a partial mask are read first. If the device
+    # does not acknowledge a byte, the sequence is restarted after the same delay.
+    def __init__(self, pads, *, address, sequence, clk_frequency, domain, delay):
+        self.pads     = pads
+        self.address  = address
+        self.sequence = sequence
+        self.domain   = domain
+        self.quarter  = max(1, int(clk_frequency // 400e3))
+        self.delay    = delay
+
+        self.done  = Signal()
+        self.nacks = Signal(8)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        sync = m.d[self.domain]
+
+        # The lines are open drain: they are pulled low while the output is enabled.
+        m.submodules.scl = scl = io.Buffer("io", self.pads.scl)
+        m.submodules.sda = sda = io.Buffer("io", self.pads.sda)
+        scl_o = Signal(init=1)
+        sda_o = Signal(init=1)
+        sda_i = Signal()
+        m.d.comb += [
+            scl.o.eq(0),
+            scl.oe.eq(~scl_o),
+            sda.o.eq(0),
+            sda.oe.eq(~sda_o),
+        ]
+        m.submodules.sda_cdc = FFSynchronizer(sda.i, sda_i, o_domain=self.domain, init=1)
+
+        m.submodules.rom = rom = Memory(shape=24, depth=len(self.sequence),
+            init=[register | mask << 8 | value << 16 for register, mask, value in self.sequence])
+        rom_port = rom.read_port(domain="comb")
+        index = Signal(range(len(self.sequence) + 1))
+        m.d.comb += rom_port.addr.eq(index)
+        register = rom_port.data[0:8]
+        mask     = rom_port.data[8:16]
+        value    = rom_port.data[16:24]
+
+        # A register is read, then written, by these operations; a register with a full mask
+        # is only written, from `_OP_WRITE_FIRST` on.
+        read  = Signal(8)
+        write = (read & ~mask) | (value & mask)
+        ops = [
+            (_OP_START, 0), (_OP_BYTE, self.address << 1), (_OP_BYTE, register),
+            (_OP_START, 0), (_OP_BYTE, self.address << 1 | 1), (_OP_READ, 0), (_OP_STOP, 0),
+            (_OP_START, 0), (_OP_BYTE, self.address << 1), (_OP_BYTE, register),
+            (_OP_BYTE, write), (_OP_STOP, 0),
+        ]
+        step    = Signal(range(len(ops)))
+        op_kind = Signal(2)
+        op_data = Signal(8)
+        with m.Switch(step):
+            for n, (kind, data) in enumerate(ops):
+                with m.Case(n):
+                    m.d.comb += [
+                        op_kind.eq(kind),
+                        op_data.eq(data),
+                    ]
+
+        # The first transaction starts after the delay.
+        timer = Signal(range(max(self.delay, self.quarter) + 1), init=self.delay)
+        tick  = timer == 0
+        phase = Signal(2)
+        shreg = Signal(9)
+        bits  = Signal(range(10))
+        nack  = Signal()
+
+        with m.If(~tick):
+            sync += timer.eq(timer - 1)
+
+        with m.FSM(domain=self.domain):
+            with m.State("DELAY"):
+                with m.If(tick):
+                    sync += [
+                        index.eq(0),
+                        nack.eq(0),
+                    ]
+                    m.next = "NEXT"
+
+            with m.State("FETCH"):
+                sync += [
+                    phase.eq(0),
+                    timer.eq(self.quarter - 1),
+                ]
+                with m.Switch(op_kind):
+                    with m.Case(_OP_START):
+                        m.next = "START"
+                    with m.Case(_OP_BYTE):
+                        # The 9th bit is released for the acknowledgement of the device.
+                        sync += [
+                            shreg.eq(Cat(1, op_data)),
+                            bits.eq(9),
+                        ]
+                        m.next = "BIT"
+                    with m.Case(_OP_READ):
+                        # The last byte read is not acknowledged.
+                        sync += [
+                            shreg.eq(0x1ff),
+                            bits.eq(9),
+                        ]
+                        m.next = "BIT"
+                    with m.Case(_OP_STOP):
+                        m.next = "STOP"
+
+            with m.State("START"):
+                with m.If(tick):
+                    sync += [
+                        phase.eq(phase + 1),
+                        timer.eq(self.quarter - 1),
+                    ]
+                    with m.Switch(phase):
+                        with m.Case(0):
+                            sync += sda_o.eq(1)
+                        with m.Case(1):
+                            sync += scl_o.eq(1)
+                        with m.Case(2):
+                            sync += sda_o.eq(0)
+                        with m.Case(3):
+                            sync += [
+                                scl_o.eq(0),
+                                step.eq(step + 1),
+                            ]
+                            m.next = "FETCH"
+
+            with m.State("BIT"):
+                with m.If(tick):
+                    sync += [
+                        phase.eq(phase + 1),
+                        timer.eq(self.quarter - 1),
+                    ]
+                    with m.Switch(phase):
+                        with m.Case(0):
+                            sync += sda_o.eq(shreg[8])
+                        with m.Case(1):
+                            sync += scl_o.eq(1)
+                        with m.Case(2):
+                            sync += shreg.eq(Cat(sda_i, shreg[:8]))
+                        with m.Case(3):
+                            sync += [
+                                scl_o.eq(0),
+                                bits.eq(bits - 1),
+                            ]
+                            with m.If(bits == 1):
+                                with m.If(op_kind == _OP_READ):
+                                    sync += read.eq(shreg[1:9])
+                                with m.Elif(shreg[0]):
+                                    sync += nack.eq(1)
+                                sync += step.eq(step + 1)
+                                m.next = "FETCH"
+
+            with m.State("STOP"):
+                with m.If(tick):
+                    sync += [
+                        phase.eq(phase + 1),
+                        timer.eq(self.quarter - 1),
+                    ]
+                    with m.Switch(phase):
+                        with m.Case(0):
+                            sync += sda_o.eq(0)
+                        with m.Case(1):
+                            sync += scl_o.eq(1)
+                        with m.Case(2):
+                            sync += sda_o.eq(1)
+                        with m.Case(3):
+                            with m.If(nack):
+                                sync += [
+                                    self.nacks.eq(self.nacks + 1),
+                                    timer.eq(self.delay),
+                                ]
+                                m.next = "DELAY"
+                            with m.Elif(step != len(ops) - 1):
+                                sync += step.eq(step + 1)
+                                m.next = "FETCH"
+                            with m.Elif(index == len(self.sequence) - 1):
+                                m.next = "DONE"
+                            with m.Else():
+                                sync += index.eq(index + 1)
+                                m.next = "NEXT"
+
+            with m.State("NEXT"):
+                sync += step.eq(Mux(mask == 0xff, _OP_WRITE_FIRST, 0))
+                m.next = "FETCH"
+
+            with m.State("DONE"):
+                m.d.comb += self.done.eq(1)
+
+        return m
+
+
+_OP_START = 0
+_OP_BYTE  = 1
+_OP_READ  = 2
+_OP_STOP  = 3
+
+_OP_WRITE_FIRST = 7
+
+
+# Configuration of the ADV7513 for 24-bit RGB input with separate syncs and DVI output, from
+# its programming guide.
+_ADV7513_ADDRESS = 0x39
+_ADV7513_SEQUENCE = [
+    (0xd6, 0xff, 0xc0), # HPD always high, so that the registers are kept without a monitor
+    (0x41, 0xff, 0x10), # power up
+    (0x98, 0xff, 0x03), # fixed values required for proper operation
+    (0x9a, 0xff, 0xe0),
+    (0x9c, 0xff, 0x30),
+    (0x9d, 0xff, 0x61),
+    (0xa2, 0xff, 0xa4),
+    (0xa3, 0xff, 0xa4),
+    (0xe0, 0xff, 0xd0),
+    (0xf9, 0xff, 0x00),
+    (0x15, 0xff, 0x00), # 24-bit RGB 4:4:4 input with separate syncs
+    (0x16, 0xff, 0x30), # 8 bits per color, 4:4:4 output
+    (0x18, 0xff, 0x46), # color space converter disabled
+    (0xaf, 0xff, 0x04), # DVI mode
+    (0xba, 0xff, 0x60), # no input clock delay
+]
+
+
+def _it6613e_sequence(pixel_clock):
+    # Configuration of the IT6613E for 24-bit RGB input and DVI output, following the it66121
+    # driver of Linux; the analog front end is set up differently above 80 MHz.
+    high = pixel_clock > 80e6
+    return [
+        (0x0f, 0x41, 0x00), # register bank 0, RCLK on
+        (0x05, 0x01, 0x00), # TX clock on
+        (0x61, 0x20, 0x00), # AFE driver powered up
+        (0x62, 0x44, 0x00), # AFE XP and its PLL powered up
+        (0x64, 0x40, 0x00), # AFE IP PLL powered up
+        (0x61, 0x10, 0x00), # AFE driver out of reset
+        (0x62, 0x08, 0x08), # AFE XP out of reset
+        (0x64, 0x04, 0x04), # AFE IP out of reset
+        (0xc0, 0x01, 0x00), # DVI mode
+        (0x70, 0xff, 0x00), # RGB input, separate syncs, single data rate
+        (0x72, 0xff, 0x00), # no color space conversion
+        (0x04, 0x08, 0x08), # video reset
+        (0x61, 0xff, 0x10), # AFE driver reset
+        (0x62, 0x90, 0x80 if high else 0x10),
+        (0x64, 0x89, 0x80 if high else 0x09),
+        (0x68, 0x10, 0x00 if high else 0x10),
+        (0x04, 0x28, 0x00), # reference and video out of reset
+        (0x61, 0xff, 0x00), # AFE driver enabled
+        (0xc1, 0x01, 0x00), # audio/video mute off
+        (0xc6, 0xff, 0x03), # general control packet sent in each frame
+    ]
+
+
+class _ParallelOutput(VideoOutput):
+    # Output to an HDMI transmitter with a parallel RGB interface, configured over I2C. The
+    # pixel clock is forwarded inverted, so that its rising edge is in the middle of the data.
+    def _elaborate_parallel(self, m, *, clk, data, hsync, vsync, de, address, sequence,
+                            delay):
+        r, g, b, hsync_o, vsync_o, de_o = self._elaborate_pixels(m)
+
+        for name, port, value in (("data", data, None), ("hsync", hsync, hsync_o),
+                                  ("vsync", vsync, vsync_o), ("de", de, de_o)):
+            m.submodules[name] = buf = io.FFBuffer("o", port, o_domain=self.domain)
+            if value is not None:
+                m.d.comb += buf.o.eq(value)
+        m.submodules.clk = clk_buf = io.DDRBuffer("o", clk, o_domain=self.domain)
+        m.d.comb += [
+            clk_buf.o[0].eq(0),
+            clk_buf.o[1].eq(1),
+        ]
+
+        m.submodules.i2c = i2c = _I2CSequencer(self.pads, address=address, sequence=sequence,
+            clk_frequency=self.mode.pixel_clock, domain=self.domain, delay=delay)
+        m.d.comb += self.configured.eq(i2c.done)
+
+        return m.submodules.data, (r, g, b)
+
+
+class ADV7513Output(_ParallelOutput):
+    """Output to the ADV7513 HDMI transmitter of an ``adv7513`` resource, ``pads``, requested
+    with ``dir="-"``.
+
+    The transmitter is configured over I2C for 24-bit RGB input and DVI output after reset, and
+    ``configured`` is asserted once it is done. It runs modes with a pixel clock of up to
+    165 MHz.
+    """
+    def __init__(self, pads, mode, *, domain="pixel"):
+        super().__init__(mode, domain=domain)
+        self.pads       = pads
+        self.configured = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads = self.pads
+        buf, (r, g, b) = self._elaborate_parallel(m,
+            clk=pads.tx_clk, data=pads.tx_d_r + pads.tx_d_g + pads.tx_d_b, hsync=pads.tx_hs,
+            vsync=pads.tx_vs, de=pads.tx_de, address=_ADV7513_ADDRESS,
+            sequence=_ADV7513_SEQUENCE, delay=int(self.mode.pixel_clock // 100))
+        m.d.comb += buf.o.eq(Cat(r, g, b))
+
+        return m
+
+
+class IT6613EOutput(_ParallelOutput):
+    """Output to the IT6613E HDMI transmitter of an ``it6613e`` resource, ``pads``, requested
+    with ``dir="-"``.
+
+    The transmitter is held in reset for 10 ms, then configured over I2C for 24-bit RGB input
+    and DVI output, and ``configured`` is asserted once it is done. If the resource has more
+    than 8 bits per color, the color is output on the 8 most significant ones. It runs modes
+    with a pixel clock of up to 165 MHz.
+    """
+    def __init__(self, pads, mode, *, domain="pixel"):
+        super().__init__(mode, domain=domain)
+        self.pads       = pads
+        self.configured = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        pads  = self.pads
+        delay = int(self.mode.pixel_clock // 100)
+        buf, (r, g, b) = self._elaborate_parallel(m,
+            clk=pads.pclk, data=pads.d.b + pads.d.g + pads.d.r, hsync=pads.hsync,
+            vsync=pads.vsync, de=pads.de, address=0x4c,
+            sequence=_it6613e_sequence(self.mode.pixel_clock), delay=2 * delay)
+        extra = len(pads.d.r) - 8
+        m.d.comb += buf.o.eq(Cat(C(0, extra), b, C(0, extra), g, C(0, extra), r))
+
+        reset = Signal(range(delay + 1), init=delay)
+        with m.If(reset != 0):
+            m.d[self.domain] += reset.eq(reset - 1)
+        m.submodules.rst = rst = io.Buffer("o", pads.rst)
+        m.d.comb += rst.o.eq(reset != 0)
+
+        return m
+
+
+def video_output(platform, mode, number=0):
+    """Return a :class:`VideoOutput` in ``mode`` for the video output ``number`` of
+    ``platform``, requesting its resources: a :class:`DVIOutput` for an ``hdmi`` resource, or
+    an :class:`ADV7513Output` or :class:`IT6613EOutput` for a board with such a transmitter.
+    """
+    for name in ("hdmi", "hdmi_tx"):
+        if (name, number) in platform.resources:
+            for subsignal in platform.resources[name, number].ios:
+                if subsignal.name == "clk" and subsignal.ios[0].dir == "i":
+                    raise ValueError("{} {} of {} is an input".format(
+                                     name, number, type(platform).__name__))
+            return DVIOutput(platform.request(name, number, dir="-"), mode)
+    for name, cls in (("adv7513", ADV7513Output), ("it6613e", IT6613EOutput)):
+        if (name, number) in platform.resources:
+            return cls(platform.request(name, number, dir="-"), mode)
+    raise NotImplementedError("{} has no video output"
+                              .format(type(platform).__name__))
+
+
+class _TestTop(Elaboratable):
+    def __init__(self, mode):
+        self.mode = mode
+
+    def elaborate(self, platform):
+        m = Module()
+        m.domains.pixel   = ClockDomain()
+        m.domains.pixel5x = ClockDomain()
+        m.submodules.output = output = video_output(platform, self.mode)
+        m.d.comb += [
+            output.r.eq(output.x),
+            output.g.eq(output.y),
+            output.b.eq(output.x ^ output.y),
+        ]
+        return m
+
+
+def _tmds_encode(data, count):
+    # Reference encoder, returning the symbol and the new running disparity.
+    ones = bin(data).count("1")
+    xnor = ones > 4 or (ones == 4 and not data & 1)
+    q_m = data & 1
+    for bit in range(1, 8):
+        prev = q_m >> (bit - 1) & 1
+        this = (prev ^ data >> bit & 1) ^ xnor
+        q_m |= this << bit
+    q_m |= (not xnor) << 8
+    diff = 2 * bin(q_m & 0xff).count("1") - 8
+    if count == 0 or diff == 0:
+        if q_m >> 8:
+            return q_m, count + diff
+        return (~q_m & 0xff) | 1 << 9, count - diff
+    if (count > 0) == (diff > 0):
+        return (~q_m & 0xff) | (q_m & 0x100) | 1 << 9, count + 2 * (q_m >> 8) - diff
+    return q_m, count - 2 * (not q_m >> 8) + diff
+
+
+def _tmds_decode(symbol):
+    data = symbol & 0xff
+    if symbol >> 9 & 1:
+        data ^= 0xff
+    result = data & 1
+    for bit in range(1, 8):
+        value = (data >> bit ^ data >> (bit - 1)) & 1
+        if not symbol >> 8 & 1:
+            value ^= 1
+        result |= value << bit
+    return result
+
+
+class _I2CTarget:
+    # Model of an I2C register file, to be run as a background testbench.
+    def __init__(self, pads, address, registers):
+        self.pads      = pads
+        self.address   = address
+        self.registers = registers
+        self.writes    = []
+
+    async def run(self, ctx):
+        pads    = self.pads
+        drive   = 1
+        state   = "IDLE"
+        byte    = 0
+        bits    = 0
+        pointer = 0
+        reading = None
+        prev_scl, prev_sda = 1, 1
+        while True:
+            scl = int(not ctx.get(pads.scl.oe))
+            sda = int(not ctx.get(pads.sda.oe)) & drive
+            ctx.set(pads.sda.i, sda)
+            if prev_scl and scl and prev_sda and not sda:
+                state, byte, bits, drive = "ADDR", 0, 0, 1
+            elif prev_scl and scl and not prev_sda and sda:
+                state, drive = "IDLE", 1
+            elif not prev_scl and scl and state != "IDLE":
+                bits += 1
+                if bits <= 8:
+                    byte = byte << 1 | sda
+                elif state == "READ" and sda:
+                    state = "IDLE"
+            elif prev_scl and not scl and state != "IDLE":
+                if bits == 8 and state != "READ":
+                    drive = 1
+                    if state == "ADDR" and byte >> 1 != self.address:
+                        state = "IDLE"
+                    else:
+                        drive = 0
+                elif bits == 9:
+                    drive = 1
+                    if state == "ADDR":
+                        state = "READ" if byte & 1 else "REGISTER"
+                    elif state == "REGISTER":
+                        pointer = byte
+                        state = "DATA"
+                    elif state == "DATA":
+                        self.registers[pointer] = byte
+                        self.writes.append((pointer, byte))
+                        pointer += 1
+                    if state == "READ":
+                        reading = self.registers.get(pointer, 0)
+                        pointer += 1
+                    bits, byte = 0, 0
+                if state == "READ" and bits < 8:
+                    drive = reading >> (7 - bits) & 1
+            prev_scl, prev_sda = scl, sda
+            await ctx.tick()
+
+
+class TestCase(unittest.TestCase):
+    def test_modes(self):
+        self.assertAlmostEqual(video_mode("1280x720@60").refresh_rate, 60, places=2)
+        self.assertAlmostEqual(video_mode("1920x1080@30").refresh_rate, 30, places=2)
+        with self.assertRaisesRegex(ValueError, r"^Unknown video mode '1x1@1'"):
+            video_mode("1x1@1")
+
+    def test_timing(self):
+        from amaranth.sim import Simulator
+
+        mode = VideoMode("test", pixel_clock=1e6, h_active=4, h_front=1, h_sync=2, h_back=1,
+                         v_active=3, v_front=1, v_sync=1, v_back=2, v_sync_positive=False)
+        dut = VideoTiming(mode)
+
+        async def testbench(ctx):
+            for frame in range(2):
+                for y in range(mode.v_total):
+                    for x in range(mode.h_total):
+                        self.assertEqual(ctx.get(dut.active), x < 4 and y < 3)
+                        self.assertEqual(ctx.get(dut.hsync), x in (5, 6))
+                        self.assertEqual(ctx.get(dut.vsync), y != 4)
+                        self.assertEqual(ctx.get(dut.frame), x == 0 and y == 0)
+                        await ctx.tick("pixel")
+
+        sim = Simulator(dut)
+        sim.add_clock(1e-6, domain="pixel")
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_tmds(self):
+        import random
+        from amaranth.sim import Simulator
+
+        dut = TMDSEncoder()
+        rng = random.Random(0)
+        inputs = [(rng.randrange(256), rng.randrange(4), rng.random() < 0.8)
+                  for _ in range(2000)]
+
+        async def testbench(ctx):
+            symbols = []
+            for data, c, de in inputs + [(0, 0, 0)]:
+                ctx.set(dut.data, data)
+                ctx.set(dut.c, c)
+                ctx.set(dut.de, de)
+                await ctx.tick("pixel")
+                symbols.append(ctx.get(dut.symbol))
+            count = disparity = 0
+            for (data, c, de), symbol in zip(inputs, symbols[1:]):
+                if de:
+                    expected, count = _tmds_encode(data, count)
+                    self.assertEqual(symbol, expected)
+                    self.assertEqual(_tmds_decode(symbol), data)
+                    disparity += 2 * bin(symbol).count("1") - 10
+                    self.assertLessEqual(abs(disparity), 10)
+                else:
+                    count = disparity = 0
+                    self.assertEqual(symbol, _TMDS_CONTROL[c])
+
+        sim = Simulator(dut)
+        sim.add_clock(1e-6, domain="pixel")
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_serializer(self):
+        from amaranth.sim import Simulator
+
+        m = Module()
+        m.domains.pixel5x = ClockDomain()
+        m.submodules.dut = dut = _ShiftSerializer(2, domain="pixel5x")
+        symbols = [(0x3a5, 0x0f0), (0x1c3, 0x2aa), (0x000, 0x3ff)]
+
+        async def testbench(ctx):
+            received = [[], []]
+            for symbol in symbols:
+                for lane in range(2):
+                    ctx.set(dut.symbols[lane], symbol[lane])
+                for _ in range(5):
+                    await ctx.tick("pixel5x")
+                    o0, o1 = ctx.get(dut.o[0]), ctx.get(dut.o[1])
+                    for lane in range(2):
+                        received[lane] += [o0 >> lane & 1, o1 >> lane & 1]
+            # The first symbol is loaded on the 5th edge.
+            for lane in range(2):
+                bits = received[lane][8:]
+                for n, symbol in enumerate(symbols[:-1]):
+                    value = sum(bit << i for i, bit in enumerate(bits[10 * n:10 * n + 10]))
+                    self.assertEqual(value, symbol[lane])
+
+        sim = Simulator(m)
+        sim.add_clock(1e-6, domain="pixel5x")
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_i2c(self):
+        from amaranth.sim import Simulator
+        from amaranth.lib.io import SimulationPort
+
+        pads = type("Pads", (), {})()
+        pads.scl = SimulationPort("io", 1)
+        pads.sda = SimulationPort("io", 1)
+        sequence = [(0x10, 0xff, 0x5a), (0x11, 0x0f, 0x03), (0x12, 0xc0, 0x40)]
+        dut = _I2CSequencer(pads, address=0x39, sequence=sequence, clk_frequency=4e6,
+                            domain="sync", delay=20)
+        target = _I2CTarget(pads, 0x39, {0x11: 0xa5, 0x12: 0xff})
+
+        async def testbench(ctx):
+            await ctx.tick().until(dut.done)
+            self.assertEqual(target.writes, [(0x10, 0x5a), (0x11, 0xa3), (0x12, 0x7f)])
+            self.assertEqual(ctx.get(dut.nacks), 0)
+
+        sim = Simulator(dut)
+        sim.add_clock(1e-6)
+        sim.add_testbench(target.run, background=True)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_i2c_retry(self):
+        from amaranth.sim import Simulator
+        from amaranth.lib.io import SimulationPort
+
+        pads = type("Pads", (), {})()
+        pads.scl = SimulationPort("io", 1)
+        pads.sda = SimulationPort("io", 1)
+        dut = _I2CSequencer(pads, address=0x39, sequence=_ADV7513_SEQUENCE,
+                            clk_frequency=4e6, domain="sync", delay=20)
+        target = _I2CTarget(pads, 0x3d, {})
+
+        async def testbench(ctx):
+            await ctx.tick().until(dut.nacks == 2)
+            self.assertEqual(target.writes, [])
+            # The device appears at the right address.
+            target.address = 0x39
+            await ctx.tick().until(dut.done)
+            self.assertEqual(target.writes, [(register, value)
+                                             for register, mask, value in _ADV7513_SEQUENCE])
+
+        sim = Simulator(dut)
+        sim.add_clock(1e-6)
+        sim.add_testbench(target.run, background=True)
+        sim.add_testbench(testbench)
+        sim.run()
+
+    def test_elaborate(self):
+        from .de10_nano import DE10NanoPlatform
+        from .ecpix5 import ECPIX545Platform
+        from .genesys2 import Genesys2Platform
+        from .tang_nano_9k import TangNano9kPlatform
+        from .tang_primer_20k import TangPrimer20kDockPlatform
+        from .ulx3s import ULX3S_85F_Platform
+
+        mode = video_mode("1280x720@60")
+        for platform, primitive, count in ((ULX3S_85F_Platform(), "ODDRX1F", 4),
+                                           (Genesys2Platform(), "OSERDESE2", 8),
+                                           (TangPrimer20kDockPlatform(), "OSER10", 4),
+                                           (TangNano9kPlatform(), "ELVDS_OBUF", 4),
+                                           (DE10NanoPlatform(), "altddio_out", 1),
+                                           (ECPIX545Platform(), "ODDRX1F", 1)):
+            with self.subTest(platform=type(platform).__name__):
+                plan = platform.prepare(_TestTop(mode))
+                netlist = plan.files.get("top.il", plan.files.get("top.v"))
+                self.assertEqual(len(re.findall(r"\b{}\b".format(primitive), netlist)), count)
+
+    def test_unsupported(self):
+        from .atlys import AtlysPlatform
+        from .icebreaker import ICEBreakerPlatform
+        with self.assertRaisesRegex(NotImplementedError,
+                r"^ICEBreakerPlatform has no video output$"):
+            video_output(ICEBreakerPlatform(), video_mode("640x480@60"))
+        with self.assertRaisesRegex(ValueError, r"^hdmi 0 of AtlysPlatform is an input$"):
+            video_output(AtlysPlatform(), video_mode("640x480@60"))
+
+
+if __name__ == "__main__":
+    unittest.main()